@@ -1,14 +1,23 @@
 """
 AI Agents for fitness planning.
+
+The agent classes are imported on first access: importing this package (as
+importing any of its modules does) doesn't load langchain or the OpenAI
+client.
 """
-from app.agents.fitness_agent import FitnessAgent
-from app.agents.workout_planner import WorkoutPlannerAgent
-from app.agents.nutrition_planner import NutritionPlannerAgent
-from app.agents.progress_analyzer import ProgressAnalyzerAgent
-
-__all__ = [
-    "FitnessAgent",
-    "WorkoutPlannerAgent",
-    "NutritionPlannerAgent",
-    "ProgressAnalyzerAgent",
-]
+import importlib
+
+_MODULES = {
+    "FitnessAgent": "app.agents.fitness_agent",
+    "WorkoutPlannerAgent": "app.agents.workout_planner",
+    "NutritionPlannerAgent": "app.agents.nutrition_planner",
+    "ProgressAnalyzerAgent": "app.agents.progress_analyzer",
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,132 @@
+"""
+LangChain callbacks attached to every agent LLM client by ``create_llm``.
+
+LLMTelemetryHandler adds LLM call spans and metrics to request telemetry;
+UsageCallbackHandler records each call's tokens in the usage ledger. They
+live with the agents rather than in app.core.telemetry and
+app.services.usage so those modules, which every request uses, import
+without langchain.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from app.core.telemetry import LLM_DURATION, LLM_REQUESTS, LLM_TOKENS, Span, current_span, current_trace, record_span
+from app.services.usage import UsageLedger, current_user, estimate_tokens, usage_ledger
+
+
+class LLMTelemetryHandler(AsyncCallbackHandler):
+    """LangChain callback recording LLM call spans, durations and token usage."""
+
+    def __init__(self):
+        # run id -> (start, parent span, model)
+        self._runs: Dict[UUID, Tuple[float, Optional[Span], str]] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._finish(run_id, "ok", usage)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, "error", {}, error=type(error).__name__)
+
+    def _start(self, run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._runs[run_id] = (time.perf_counter(), current_span(), model)
+
+    def _finish(self, run_id: UUID, status: str, usage: Dict[str, int], **attributes: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, parent, model = run
+        end = time.perf_counter()
+
+        LLM_REQUESTS.inc(model=model, status=status)
+        LLM_DURATION.observe(end - start, model=model)
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
+
+        record_span(
+            "llm", "llm", start, end, parent,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            **attributes,
+        )
+
+
+llm_telemetry = LLMTelemetryHandler()
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """
+    LangChain callback that records each LLM call in the ledger.
+
+    Agent and method come from the run metadata key "operation"
+    ("agent.method"); user and route are captured when the call starts.
+    """
+
+    def __init__(self, ledger: UsageLedger):
+        self.ledger = ledger
+        # run id -> (operation, endpoint, user id, model, prompt texts)
+        self._runs: Dict[UUID, Tuple[str, Optional[str], Optional[int], str, List[Any]]] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs, [message.content for batch in messages for message in batch])
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs, prompts)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        operation, endpoint, user_id, model, prompts = run
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage")
+        if not usage:
+            # Streamed: the provider sent no usage
+            usage = {
+                "prompt_tokens": sum(estimate_tokens(text) for text in prompts if isinstance(text, str)),
+                "completion_tokens": sum(
+                    estimate_tokens(generation.text) for generations in response.generations for generation in generations
+                ),
+            }
+        agent, _, method = operation.partition(".")
+
+        self.ledger.record(
+            model=llm_output.get("model_name") or model,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            agent=agent,
+            method=method or "unknown",
+            endpoint=endpoint,
+            user_id=user_id,
+        )
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs.pop(run_id, None)
+
+    def _start(self, run_id: UUID, kwargs: Dict[str, Any], prompts: List[Any]) -> None:
+        metadata = kwargs.get("metadata") or {}
+        params = kwargs.get("invocation_params") or {}
+        trace = current_trace()
+        self._runs[run_id] = (
+            metadata.get("operation", "unknown"),
+            trace.route if trace is not None else None,
+            current_user(),
+            params.get("model") or params.get("model_name") or "unknown",
+            prompts,
+        )
+
+
+usage_callback = UsageCallbackHandler(usage_ledger)
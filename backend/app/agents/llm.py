@@ -0,0 +1,259 @@
+"""
+LLM client construction and structured generation shared by all agents.
+"""
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Type
+import openai
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.telemetry import PARSE_DURATION, span
+from app.services.usage import usage_ledger
+from app.agents.callbacks import llm_telemetry, usage_callback
+from app.agents.output_parser import OutputParseError, parse_output
+from app.agents.prompts import CompiledPrompt
+from app.agents.routing import model_router
+from app.agents.scheduler import llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Model families that support tool calling and JSON mode
+STRUCTURED_OUTPUT_MODELS = (
+    "gpt-4-turbo",
+    "gpt-4-1106",
+    "gpt-4-0125",
+    "gpt-4o",
+    "gpt-3.5-turbo",
+)
+
+STRUCTURED_OUTPUT_MODES = ("auto", "tools", "json_mode", "prompt")
+
+# Request parameters a model without structured output support rejects
+STRUCTURED_OUTPUT_PARAMS = ("tools", "tool_choice", "response_format")
+
+# Models that rejected a structured request at runtime (auto mode only)
+_unsupported_models = set()
+
+
+def create_llm(temperature: float, max_tokens: int, model: Optional[str] = None) -> ChatOpenAI:
+    """Create a chat model client with the application's settings."""
+    return ChatOpenAI(
+        model=model or settings.LLM_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_api_base=settings.LLM_BASE_URL or None,
+        callbacks=[llm_telemetry, usage_callback],
+        # Retried by the scheduler, which adapts its concurrency to 429s
+        max_retries=0,
+    )
+
+
+def structured_output_mode(model: str) -> str:
+    """
+    Pick how to request structured output from a model.
+
+    Returns one of "tools", "json_mode" or "prompt" (fenced JSON requested
+    in the prompt text). An explicitly configured mode is always used; in
+    auto mode, models that rejected structured output get prompt mode.
+    """
+    mode = settings.LLM_STRUCTURED_OUTPUT
+    if mode not in STRUCTURED_OUTPUT_MODES:
+        raise ValueError(f"Unknown LLM_STRUCTURED_OUTPUT mode: {mode}")
+
+    if mode != "auto":
+        return mode
+    if model in _unsupported_models:
+        return "prompt"
+
+    return "tools" if model.startswith(STRUCTURED_OUTPUT_MODELS) else "prompt"
+
+
+@lru_cache(maxsize=None)
+def tool_definition(schema: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAI tool definition derived from a response schema."""
+    name = re.sub(r"(?<!^)(?=[A-Z])", "_", schema.__name__).lower()
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": (schema.__doc__ or name).strip(),
+            "parameters": schema.model_json_schema(),
+        },
+    }
+
+
+class StructuredOutput:
+    """Result of a structured generation: parsed data plus the raw text."""
+
+    def __init__(self, data: Optional[Dict[str, Any]], raw: str, mode: str):
+        self.data = data
+        self.raw = raw
+        self.mode = mode
+
+    def result(self, fallback: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Parsed data, or the fallback (default: the usual error payload)."""
+        if self.data is not None:
+            return self.data
+        if fallback is not None:
+            return fallback
+        return {
+            "error": "Failed to parse response",
+            "raw_response": self.raw
+        }
+
+
+async def generate_structured(
+    llm: ChatOpenAI,
+    prompt: CompiledPrompt,
+    schema: Type[BaseModel],
+    /,
+    **values: Any
+) -> StructuredOutput:
+    """
+    Generate a response matching ``schema``.
+
+    Uses tool calling or JSON mode where the model supports it, which avoids
+    markdown fences and explanations in the output. Falls back to asking for
+    fenced JSON in the prompt when the model rejects the structured request.
+
+    The model comes from the method's route: cheap methods try the small
+    model first and escalate to ``llm``'s model when the output doesn't
+    validate.
+    """
+    await usage_ledger.check_quota()
+    models = model_router.cascade(prompt.name, llm.model_name)
+
+    for attempt, model in enumerate(models, start=1):
+        last = attempt == len(models)
+        try:
+            client = llm if model == llm.model_name else _routed_llm(llm.temperature, llm.max_tokens, model)
+            output = await _generate(client, prompt, schema, values)
+        except openai.NotFoundError as e:
+            # Model not available on this endpoint
+            if last:
+                raise
+            logger.warning("Model %s unavailable for %s, escalating: %s", model, prompt.name, e)
+            continue
+
+        if output.data is not None or last:
+            model_router.record(prompt.name, model, attempt, valid=output.data is not None)
+            return output
+        logger.info("Escalating %s: %s output did not validate", prompt.name, model)
+
+
+@lru_cache(maxsize=None)
+def _routed_llm(temperature: float, max_tokens: int, model: str) -> ChatOpenAI:
+    """Client for a routed model with an agent's sampling parameters."""
+    return create_llm(temperature=temperature, max_tokens=max_tokens, model=model)
+
+
+async def _generate(
+    llm: ChatOpenAI,
+    prompt: CompiledPrompt,
+    schema: Type[BaseModel],
+    values: Dict[str, Any],
+) -> StructuredOutput:
+    """One structured generation attempt on ``llm``'s model."""
+    mode = structured_output_mode(llm.model_name)
+    # Tags the call in the usage ledger
+    config = {"metadata": {"operation": prompt.name}}
+
+    with span(prompt.name, schema=schema.__name__, mode=mode, model=llm.model_name):
+        if mode == "tools":
+            tool = tool_definition(schema)
+            bound = llm.bind(
+                tools=[tool],
+                tool_choice={"type": "function", "function": {"name": tool["function"]["name"]}},
+            )
+            with span("prompt", "prompt"):
+                messages = prompt.to_structured_messages(**values)
+            message = await _invoke_structured(prompt.name, mode, bound, llm, messages, config)
+            if message is not None:
+                raw = _tool_arguments(message)
+                return StructuredOutput(_parse(raw, schema), raw, mode)
+
+        elif mode == "json_mode":
+            bound = llm.bind(response_format={"type": "json_object"})
+            with span("prompt", "prompt"):
+                messages = prompt.to_messages(**values)
+            message = await _invoke_structured(prompt.name, mode, bound, llm, messages, config)
+            if message is not None:
+                return StructuredOutput(_parse(message.content, schema), message.content, mode)
+
+        with span("prompt", "prompt"):
+            messages = prompt.to_messages(**values)
+        message = await _invoke(prompt.name, "prompt", llm, llm, messages, config)
+        return StructuredOutput(_parse(message.content, schema), message.content, "prompt")
+
+
+async def _invoke(operation: str, mode: str, runnable, llm: ChatOpenAI, messages, config) -> BaseMessage:
+    """Invoke through the scheduler; identical concurrent requests share one call."""
+    key = (
+        llm.model_name,
+        llm.temperature,
+        llm.max_tokens,
+        mode,
+        tuple((message.type, message.content) for message in messages),
+    )
+    return await llm_scheduler.submit(
+        operation,
+        lambda: runnable.ainvoke(messages, config=config),
+        key=key,
+    )
+
+
+async def _invoke_structured(operation: str, mode: str, bound, llm: ChatOpenAI, messages, config) -> Optional[BaseMessage]:
+    """
+    Invoke a structured request; None if the model doesn't support it.
+
+    Only in auto mode, and only for errors about the structured output
+    parameters: other 400s (context length, content filter, a bad schema)
+    concern this request, not the model, and are raised.
+    """
+    try:
+        return await _invoke(operation, mode, bound, llm, messages, config)
+    except openai.BadRequestError as e:
+        if settings.LLM_STRUCTURED_OUTPUT != "auto" or not _rejects_structured_output(e):
+            raise
+        logger.warning("Model %s rejected structured output, using prompt mode: %s", llm.model_name, e)
+        _unsupported_models.add(llm.model_name)
+        return None
+
+
+def _rejects_structured_output(error: openai.BadRequestError) -> bool:
+    """
+    Whether a 400 rejects the tools, tool_choice or response_format parameter
+    itself; errors inside a tool definition (tools[0].function...) are about
+    that schema.
+    """
+    return error.param in STRUCTURED_OUTPUT_PARAMS or (
+        error.code in ("unsupported_parameter", "unsupported_value")
+        and any(name in str(error) for name in STRUCTURED_OUTPUT_PARAMS)
+    )
+
+
+def _tool_arguments(message: BaseMessage) -> str:
+    """Arguments of the first tool call, or the message text if there is none."""
+    tool_calls = message.additional_kwargs.get("tool_calls") or []
+    if tool_calls:
+        return tool_calls[0]["function"]["arguments"]
+    return message.content
+
+
+def _parse(text: str, schema: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    with span("parse", "parse", schema=schema.__name__) as parse_span:
+        start = time.perf_counter()
+        try:
+            return parse_output(text, schema)
+        except OutputParseError as e:
+            logger.warning("%s", e)
+            if parse_span is not None:
+                parse_span.attributes["error"] = "OutputParseError"
+            return None
+        finally:
+            PARSE_DURATION.observe(time.perf_counter() - start, schema=schema.__name__)
@@ -0,0 +1,279 @@
+"""
+Structured output parser shared by all agents.
+
+Turns raw LLM text into a validated dictionary. Parsing goes through
+increasingly expensive stages and stops at the first one that yields a
+document matching the response schema:
+
+1. Fast path: the whole response is JSON.
+2. Extraction: fenced blocks (closed or still open, as in a truncated or
+   streamed response) and the first balanced ``{...}`` object in prose.
+3. Repair: trailing commas, Python literals, truncated strings and missing
+   closing brackets, and finally backtracking to the last complete element.
+
+A failed parse is retried against the already generated text only; the
+LLM is never called again.
+"""
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+
+# Opening fence with optional language tag; the block runs to the closing
+# fence or, for truncated output, to the end of the text.
+_FENCE_RE = re.compile(r"```[A-Za-z]*[ \t]*\r?\n?(.*?)(?:```|\Z)", re.DOTALL)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Give up backtracking after this many cut points
+_MAX_BACKTRACK = 16
+
+# Which stage produced each parse result; served by /stats/llm
+parse_stats: Counter = Counter()
+
+
+class OutputParseError(ValueError):
+    """Raised when no stage produces a document matching the schema."""
+
+    def __init__(self, message: str, raw_response: str):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+def parse_output(text: str, schema: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Parse and validate an LLM response.
+
+    Args:
+        text: Raw LLM response
+        schema: Pydantic model the response must match
+
+    Returns:
+        Validated response as a dictionary (unknown keys preserved)
+
+    Raises:
+        OutputParseError: if no stage yields a valid document
+    """
+    last_error: Optional[Exception] = None
+
+    for stage, document in _documents(text):
+        try:
+            result = schema.model_validate(document).model_dump()
+        except ValidationError as e:
+            last_error = e
+            continue
+        parse_stats[stage] += 1
+        return result
+
+    parse_stats["failed"] += 1
+    reason = f"schema validation failed: {last_error}" if last_error else "no JSON object found"
+    raise OutputParseError(f"Could not parse {schema.__name__}: {reason}", text)
+
+
+def extract_candidates(text: str) -> List[str]:
+    """Candidate JSON snippets in the order they should be tried."""
+    candidates = []
+
+    stripped = text.strip()
+    if stripped.startswith(("{", "[")):
+        candidates.append(stripped)
+
+    if "```" in text:
+        for match in _FENCE_RE.finditer(text):
+            block = match.group(1).strip()
+            if block:
+                candidates.append(block)
+
+    start = text.find("{")
+    if start != -1:
+        candidates.append(_balanced_object(text, start))
+
+    # Preserve order, drop duplicates
+    return list(dict.fromkeys(candidates))
+
+
+def repair_json(snippet: str) -> Iterator[str]:
+    """
+    Repaired variants of a malformed JSON snippet, least invasive first.
+
+    Variants are produced lazily so the common one-defect case stays cheap.
+    """
+    cleaned = _strip_trailing_commas(_replace_python_literals(snippet))
+    seen = {snippet}
+
+    def fresh(variant: str) -> bool:
+        if variant in seen:
+            return False
+        seen.add(variant)
+        return True
+
+    for variant in (cleaned, _close_truncated(cleaned)):
+        if fresh(variant):
+            yield variant
+
+    # Backtrack to the last complete element before each comma, dropping
+    # a partially generated trailing value or key
+    for cut in reversed(_comma_positions(cleaned)[-_MAX_BACKTRACK:]):
+        variant = _close_truncated(cleaned[:cut])
+        if fresh(variant):
+            yield variant
+
+
+def _documents(text: str):
+    """Yield (stage, decoded document) pairs, cheapest stages first."""
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            yield "fast_path", json.loads(stripped, strict=False)
+        except json.JSONDecodeError:
+            pass
+
+    candidates = extract_candidates(text)
+    for candidate in candidates:
+        try:
+            yield "extracted", json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+
+    for candidate in candidates:
+        for variant in repair_json(candidate):
+            try:
+                yield "repaired", json.loads(variant, strict=False)
+            except json.JSONDecodeError:
+                continue
+
+
+def _scan(snippet: str) -> Tuple[List[str], bool]:
+    """Return the open bracket stack and whether the text ends inside a string."""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+
+    for char in snippet:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]" and stack:
+            stack.pop()
+
+    return stack, in_string
+
+
+def _balanced_object(text: str, start: int) -> str:
+    """The object starting at ``start``, or the rest of the text if it never closes."""
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+
+    return text[start:]
+
+
+def _outside_strings(snippet: str):
+    """Yield (index, char, in_string) for every character."""
+    in_string = False
+    escaped = False
+
+    for index, char in enumerate(snippet):
+        yield index, char, in_string
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+
+
+def _strip_trailing_commas(snippet: str) -> str:
+    """Remove commas directly followed by a closing bracket."""
+    if "," not in snippet:
+        return snippet
+
+    drop = set()
+    pending_comma = None
+    for index, char, in_string in _outside_strings(snippet):
+        if in_string:
+            pending_comma = None
+            continue
+        if char == ",":
+            pending_comma = index
+        elif char in "}]":
+            if pending_comma is not None:
+                drop.add(pending_comma)
+            pending_comma = None
+        elif not char.isspace():
+            pending_comma = None
+
+    if not drop:
+        return snippet
+    return "".join(char for index, char in enumerate(snippet) if index not in drop)
+
+
+def _replace_python_literals(snippet: str) -> str:
+    """Replace True/False/None outside strings with JSON literals."""
+    if not _PY_LITERAL_RE.search(snippet):
+        return snippet
+
+    in_string = [state for _, _, state in _outside_strings(snippet)]
+    out = []
+    last = 0
+    for match in _PY_LITERAL_RE.finditer(snippet):
+        if not in_string[match.start()]:
+            out.append(snippet[last:match.start()])
+            out.append(_PY_LITERALS[match.group()])
+            last = match.end()
+    out.append(snippet[last:])
+    return "".join(out)
+
+
+def _comma_positions(snippet: str) -> List[int]:
+    """Indexes of commas outside strings."""
+    return [
+        index for index, char, in_string in _outside_strings(snippet)
+        if char == "," and not in_string
+    ]
+
+
+def _close_truncated(snippet: str) -> str:
+    """Close an unterminated string and any open brackets."""
+    stack, in_string = _scan(snippet)
+    if in_string:
+        snippet += '"'
+
+    snippet = snippet.rstrip()
+    if snippet.endswith(","):
+        snippet = snippet[:-1]
+    elif snippet.endswith(":"):
+        snippet += " null"
+
+    return snippet + "".join(_CLOSERS[opener] for opener in reversed(stack))
@@ -2,12 +2,50 @@
 Progress Analysis Agent - Analyzes user progress and provides recommendations.
 """
 from typing import Dict, List, Any
-from langchain_openai import ChatOpenAI
-from app.core.config import settings
+from app.agents.llm import create_llm, generate_structured
+from app.agents.prompts import (
+    PROGRESS_TRAINING,
+    PROGRESS_BODY_METRICS,
+    PROGRESS_WEEKLY_REPORT,
+    PROGRESS_ADJUSTMENTS,
+    PROGRESS_ISSUES,
+)
+from app.schemas.agent_outputs import (
+    TrainingProgressOutput,
+    BodyMetricsAnalysisOutput,
+    WeeklyReportOutput,
+    PlanAdjustmentsOutput,
+    IssueDetectionOutput,
+)
+from app.services.health_rules import HealthSeries, RuleEngine, compute_metrics, health_score, metric_snapshot
 import json
 from datetime import datetime, timedelta
 
 
+def _apply_week_summary(report: Dict[str, Any], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Overwrite the report's statistics with the exact values from the summary."""
+    training = summary["training"]
+    nutrition = summary["nutrition"]
+    metrics = summary["body_metrics"]
+
+    report["week_number"] = summary["week_number"]
+    report["date_range"] = f"{summary['week_start']} - {summary['week_end']}"
+    report.setdefault("training_summary", {}).update(
+        workouts_completed=training["sessions_completed"],
+        workouts_planned=training["sessions_planned"],
+        completion_rate=training["completion_rate"],
+        total_volume=training["total_volume_kg"],
+    )
+    report.setdefault("nutrition_summary", {}).update(
+        average_calories=nutrition["average_calories"],
+        average_protein=nutrition["average_protein_g"],
+    )
+    report.setdefault("body_metrics_change", {}).update(
+        weight_change=metrics["weight_change"],
+    )
+    return report
+
+
 class ProgressAnalyzerAgent:
     """
     Specialized agent for analyzing user progress and providing adjustments.
@@ -16,12 +54,11 @@ class ProgressAnalyzerAgent:
 
     def __init__(self):
         """Initialize the progress analyzer agent."""
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
+        self.llm = create_llm(
             temperature=0.4,
             max_tokens=2500,
-            openai_api_key=settings.OPENAI_API_KEY,
         )
+        self.rule_engine = RuleEngine()
 
     async def analyze_training_progress(
         self,
@@ -38,55 +75,15 @@ class ProgressAnalyzerAgent:
         Returns:
             Analysis and recommendations
         """
-        prompt = f"""分析用户的训练进度：
-
-**用户目标**：{user_goal}
-
-**训练历史**：
-{json.dumps(workout_history, ensure_ascii=False, indent=2)}
-
-**分析要点**：
-1. 训练一致性（是否按计划完成）
-2. 力量/耐力进步趋势
-3. 主要动作的表现变化
-4. 是否存在平台期
-5. 建议的调整方向
-
-请以JSON格式返回：
-```json
-{{
-    "consistency_score": 0-100,
-    "consistency_analysis": "训练一致性评估",
-    "strength_progress": {{
-        "trend": "improving/stable/declining",
-        "key_lifts": [
-            {{
-                "exercise": "动作名称",
-                "initial_weight": 初始重量,
-                "current_weight": 当前重量,
-                "improvement_percentage": 提升百分比,
-                "trend": "上升/稳定/下降"
-            }}
-        ]
-    }},
-    "plateau_detected": true/false,
-    "plateau_analysis": "平台期分析（如果存在）",
-    "recommendations": [
-        {{
-            "category": "训练/营养/恢复",
-            "recommendation": "具体建议",
-            "priority": "high/medium/low",
-            "rationale": "建议原因"
-        }}
-    ],
-    "overall_assessment": "总体评估",
-    "motivation_message": "鼓励的话"
-}}
-```
-"""
+        output = await generate_structured(
+            self.llm,
+            PROGRESS_TRAINING,
+            TrainingProgressOutput,
+            user_goal=user_goal,
+            workout_history=json.dumps(workout_history, ensure_ascii=False, indent=2),
+        )
 
-        response = await self.llm.apredict(prompt)
-        return self._parse_json_response(response)
+        return output.result()
 
     async def analyze_body_metrics(
         self,
@@ -105,61 +102,16 @@ class ProgressAnalyzerAgent:
         Returns:
             Analysis of progress towards goals
         """
-        prompt = f"""分析用户的身体指标变化：
-
-**用户目标**：{user_goal}
-
-**目标指标**：
-{json.dumps(target_metrics, ensure_ascii=False, indent=2)}
-
-**历史数据**：
-{json.dumps(metrics_history, ensure_ascii=False, indent=2)}
-
-**分析要点**：
-1. 体重变化趋势和速率
-2. 体脂率变化（如果有数据）
-3. 是否朝着目标前进
-4. 变化速度是否健康和可持续
-5. 需要的调整建议
-
-请以JSON格式返回：
-```json
-{{
-    "weight_analysis": {{
-        "start_weight": 起始体重,
-        "current_weight": 当前体重,
-        "change": 变化量,
-        "change_percentage": 变化百分比,
-        "trend": "increasing/decreasing/stable",
-        "weekly_average_change": 周均变化,
-        "is_healthy_rate": true/false
-    }},
-    "body_fat_analysis": {{
-        "start_bf": 起始体脂,
-        "current_bf": 当前体脂,
-        "change": 变化量,
-        "trend": "improving/stable/worsening"
-    }},
-    "goal_progress": {{
-        "target_weight": 目标体重,
-        "current_weight": 当前体重,
-        "remaining": 剩余差距,
-        "percentage_complete": 完成百分比,
-        "estimated_weeks_to_goal": 预估达成周数
-    }},
-    "health_assessment": "健康状况评估",
-    "recommendations": [
-        "调整建议"
-    ],
-    "concerns": [
-        "需要注意的问题（如果有）"
-    ]
-}}
-```
-"""
+        output = await generate_structured(
+            self.llm,
+            PROGRESS_BODY_METRICS,
+            BodyMetricsAnalysisOutput,
+            user_goal=user_goal,
+            target_metrics=json.dumps(target_metrics, ensure_ascii=False, indent=2),
+            metrics_history=json.dumps(metrics_history, ensure_ascii=False, indent=2),
+        )
 
-        response = await self.llm.apredict(prompt)
-        return self._parse_json_response(response)
+        return output.result()
 
     async def generate_weekly_report(
         self,
@@ -168,63 +120,27 @@ class ProgressAnalyzerAgent:
         """
         Generate a comprehensive weekly progress report.
 
+        The statistics come from ``week_data``, a summary built by
+        ProgressRepository.week_summaries; the model only writes the
+        narrative, and the report's numbers are set from the summary.
+
         Args:
-            week_data: All data from the past week (workouts, nutrition, metrics)
+            week_data: Week summary (training, nutrition, body metrics)
 
         Returns:
             Weekly report with insights
         """
-        prompt = f"""为用户生成本周的健身进度报告：
-
-**本周数据**：
-{json.dumps(week_data, ensure_ascii=False, indent=2)}
-
-请生成一份全面的周报，包括：
-1. 训练完成情况总结
-2. 营养摄入分析
-3. 身体指标变化
-4. 本周亮点和成就
-5. 需要改进的地方
-6. 下周建议
-
-以JSON格式返回：
-```json
-{{
-    "week_number": 周数,
-    "date_range": "日期范围",
-    "training_summary": {{
-        "workouts_completed": 完成次数,
-        "workouts_planned": 计划次数,
-        "completion_rate": 完成率,
-        "total_volume": 总训练量,
-        "highlights": ["本周训练亮点"]
-    }},
-    "nutrition_summary": {{
-        "average_calories": 平均热量,
-        "average_protein": 平均蛋白质,
-        "adherence_rate": 饮食计划遵守率,
-        "notes": "营养方面的观察"
-    }},
-    "body_metrics_change": {{
-        "weight_change": 体重变化,
-        "trend": "趋势"
-    }},
-    "achievements": [
-        "本周成就"
-    ],
-    "areas_for_improvement": [
-        "需要改进的地方"
-    ],
-    "next_week_focus": [
-        "下周重点"
-    ],
-    "motivational_message": "鼓励的话"
-}}
-```
-"""
+        output = await generate_structured(
+            self.llm,
+            PROGRESS_WEEKLY_REPORT,
+            WeeklyReportOutput,
+            # Compact: the summary is small and every token is prompt cost
+            week_data=json.dumps(week_data, ensure_ascii=False, separators=(",", ":")),
+        )
 
-        response = await self.llm.apredict(prompt)
-        return self._parse_json_response(response)
+        if output.data is None:
+            return output.result()
+        return _apply_week_summary(output.data, week_data)
 
     async def suggest_adjustments(
         self,
@@ -241,122 +157,68 @@ class ProgressAnalyzerAgent:
         Returns:
             Specific adjustment recommendations
         """
-        prompt = f"""基于进度分析，建议对当前计划的调整：
-
-**当前计划**：
-{json.dumps(current_plan, ensure_ascii=False, indent=2)}
-
-**进度分析**：
-{json.dumps(progress_analysis, ensure_ascii=False, indent=2)}
-
-请提供具体的调整建议：
-
-以JSON格式返回：
-```json
-{{
-    "adjustment_needed": true/false,
-    "urgency": "high/medium/low",
-    "workout_adjustments": [
-        {{
-            "type": "调整类型（增加重量/改变动作/调整组数等）",
-            "specific_change": "具体改变",
-            "reason": "原因",
-            "expected_outcome": "预期效果"
-        }}
-    ],
-    "nutrition_adjustments": [
-        {{
-            "nutrient": "营养素",
-            "current": 当前值,
-            "suggested": 建议值,
-            "reason": "原因"
-        }}
-    ],
-    "recovery_recommendations": [
-        "恢复建议"
-    ],
-    "implementation_plan": "如何实施这些调整",
-    "monitoring_points": [
-        "需要监控的指标"
-    ]
-}}
-```
-"""
+        output = await generate_structured(
+            self.llm,
+            PROGRESS_ADJUSTMENTS,
+            PlanAdjustmentsOutput,
+            current_plan=json.dumps(current_plan, ensure_ascii=False, indent=2),
+            progress_analysis=json.dumps(progress_analysis, ensure_ascii=False, indent=2),
+        )
 
-        response = await self.llm.apredict(prompt)
-        return self._parse_json_response(response)
+        return output.result()
 
     async def detect_issues(
         self,
-        user_data: Dict[str, Any]
+        series: HealthSeries
     ) -> Dict[str, Any]:
         """
         Detect potential issues like overtraining, under-eating, etc.
 
+        Issues are flagged by the local rule engine; the LLM is only called
+        to explain flagged issues, so a clean check makes no LLM call.
+
         Args:
-            user_data: Comprehensive user data
+            series: The user's daily series (first row)
 
         Returns:
             Issue detection and warnings
         """
-        prompt = f"""分析用户数据，检测潜在问题：
-
-**用户数据**：
-{json.dumps(user_data, ensure_ascii=False, indent=2)}
-
-检测以下问题：
-1. 过度训练迹象
-2. 营养不足
-3. 恢复不充分
-4. 不健康的减重速度
-5. 训练不平衡
-6. 其他健康风险
-
-以JSON格式返回：
-```json
-{{
-    "issues_detected": [
-        {{
-            "issue_type": "问题类型",
-            "severity": "high/medium/low",
-            "description": "问题描述",
-            "indicators": ["支持这个判断的指标"],
-            "recommendations": ["解决建议"],
-            "action_required": "是否需要立即行动"
-        }}
-    ],
-    "overall_health_score": 0-100,
-    "warnings": [
-        "警告信息"
-    ],
-    "positive_notes": [
-        "做得好的地方"
-    ]
-}}
-```
-"""
-
-        response = await self.llm.apredict(prompt)
-        return self._parse_json_response(response)
-
-    def _parse_json_response(self, llm_response: str) -> Dict[str, Any]:
-        """Parse JSON from LLM response."""
-        try:
-            if "```json" in llm_response:
-                start = llm_response.find("```json") + 7
-                end = llm_response.find("```", start)
-                json_str = llm_response[start:end].strip()
-            elif "```" in llm_response:
-                start = llm_response.find("```") + 3
-                end = llm_response.find("```", start)
-                json_str = llm_response[start:end].strip()
-            else:
-                json_str = llm_response.strip()
-
-            return json.loads(json_str)
+        metrics = compute_metrics(series)
+        findings = self.rule_engine.evaluate(series, metrics)[0]
+        issues = [finding.to_issue() for finding in findings]
+        result = {
+            "issues_detected": issues,
+            "overall_health_score": health_score(findings),
+            "warnings": [finding.description for finding in findings if finding.rule.severity == "high"],
+            "positive_notes": [],
+        }
+        if not findings:
+            result["positive_notes"].append("近期训练、饮食和身体数据均在正常范围内")
+            return result
+
+        output = await generate_structured(
+            self.llm,
+            PROGRESS_ISSUES,
+            IssueDetectionOutput,
+            issues=json.dumps(issues, ensure_ascii=False, separators=(",", ":")),
+            metrics=json.dumps(metric_snapshot(metrics, 0), ensure_ascii=False, separators=(",", ":")),
+        )
 
-        except json.JSONDecodeError:
-            return {
-                "error": "Failed to parse response",
-                "raw_response": llm_response
+        # Type, severity and the measured values stay the rules'; the model
+        # adds the explanation and recommendations
+        if output.data is not None:
+            explanations = {
+                explanation.get("issue_type"): explanation
+                for explanation in output.data.get("issues_detected", [])
             }
+            for issue in issues:
+                explanation = explanations.get(issue["issue_type"])
+                if explanation is None:
+                    continue
+                if explanation.get("description"):
+                    issue["indicators"].insert(0, issue["description"])
+                    issue["description"] = explanation["description"]
+                issue["recommendations"] = explanation.get("recommendations") or []
+            result["positive_notes"] = output.data.get("positive_notes", [])
+
+        return result
@@ -0,0 +1,694 @@
+"""
+Prompt registry.
+
+All agent prompts are parsed and compiled once at import time. Each prompt
+is split into a static prefix (role, instructions, output format) and a
+dynamic suffix (user data). The static prefix always comes first and is
+byte-identical across calls, so provider-side prompt caching can reuse it.
+
+Prompts that expect JSON keep their output format separate from the
+instructions. When the model returns structured output natively (tool
+calling), the format example is left out of the prompt.
+"""
+from string import Formatter
+from typing import Dict, List, Any, Tuple
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+
+STRUCTURED_OUTPUT_HINT = "请通过调用提供的函数返回结果。"
+
+
+class CompiledPrompt:
+    """
+    A prompt with a static prefix and a pre-parsed dynamic suffix.
+
+    The suffix template is parsed into literal/field pieces once, so
+    rendering is a single join with no format-string parsing per call.
+    """
+
+    def __init__(self, name: str, static: str, dynamic: str, output_format: str = ""):
+        self.name = name
+        self.instructions = static.strip()
+        self.output_format = output_format.strip()
+
+        # Full prefix for prompt-only (fenced JSON) generation
+        self.static = "\n\n".join(part for part in (self.instructions, self.output_format) if part)
+        self.system_message = SystemMessage(content=self.static)
+
+        # Prefix for native structured output; the schema travels as a tool
+        self.structured_static = f"{self.instructions}\n\n{STRUCTURED_OUTPUT_HINT}"
+        self.structured_system_message = SystemMessage(content=self.structured_static)
+
+        self._pieces: List[Tuple[str, str]] = []
+        for literal, field, spec, conversion in Formatter().parse(dynamic.strip()):
+            if spec or conversion:
+                raise ValueError(f"Prompt '{name}': format specs are not supported ({field})")
+            self._pieces.append((literal, field))
+
+        self.fields = frozenset(field for _, field in self._pieces if field)
+
+    def render_dynamic(self, **values: Any) -> str:
+        """Render only the dynamic suffix."""
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' missing values: {sorted(missing)}")
+
+        return "".join(
+            literal + (str(values[field]) if field else "")
+            for literal, field in self._pieces
+        )
+
+    def render(self, **values: Any) -> str:
+        """Render the full prompt as a single string, static prefix first."""
+        return f"{self.static}\n\n{self.render_dynamic(**values)}"
+
+    def to_messages(self, **values: Any) -> List[BaseMessage]:
+        """Render as a cached system message followed by the dynamic user message."""
+        return [self.system_message, HumanMessage(content=self.render_dynamic(**values))]
+
+    def to_structured_messages(self, **values: Any) -> List[BaseMessage]:
+        """Like to_messages, without the output format example."""
+        return [self.structured_system_message, HumanMessage(content=self.render_dynamic(**values))]
+
+
+_registry: Dict[str, CompiledPrompt] = {}
+
+
+def register(name: str, static: str, dynamic: str = "", output_format: str = "") -> CompiledPrompt:
+    """Compile and register a prompt."""
+    if name in _registry:
+        raise ValueError(f"Prompt '{name}' already registered")
+
+    prompt = CompiledPrompt(name, static, dynamic, output_format)
+    _registry[name] = prompt
+    return prompt
+
+
+def registered_prompts() -> Dict[str, CompiledPrompt]:
+    """All compiled prompts, keyed by name."""
+    return dict(_registry)
+
+
+# Fitness agent
+
+FITNESS_SYSTEM = register(
+    "fitness.system",
+    static="""
+你是一个专业的健身训练规划助手，名叫 Fitness Planner AI。
+你的目标是帮助用户达成他们的健身目标，提供个性化的训练计划、营养建议和进度追踪。
+
+你的能力包括：
+1. **用户引导**：帮助用户设定清晰、可量化的健身目标
+2. **训练计划**：根据用户的目标、经验水平和训练频率，生成科学的训练计划
+3. **营养建议**：计算每日所需的营养素，并提供饮食搭配建议
+4. **进度分析**：分析用户的训练数据和身体指标，提供调整建议
+
+你的特点：
+- 专业：基于运动科学和营养学原理提供建议
+- 个性化：根据每个用户的独特情况定制方案
+- 耐心：引导初学者，挑战高级用户
+- 鼓励：积极正面，帮助用户保持动力
+- 安全：始终将用户的安全放在首位
+
+请用友好、专业的方式回应用户。如果需要更多信息才能提供建议，请主动询问。
+
+如果上下文中附有"相关参考资料"，请优先依据这些资料回答，可以用 [1]、[2] 标注引用的资料编号；
+资料没有涉及的内容按专业知识回答，不要编造资料中没有的数据。
+""",
+    dynamic="""
+当前对话上下文：
+{context}{knowledge}
+""",
+)
+
+FITNESS_INTENT = register(
+    "fitness.intent",
+    static="""
+分析用户消息，识别用户的意图和需求。
+
+请识别以下几类意图之一：
+1. onboarding - 用户想要开始健身，需要引导设置目标
+2. workout_plan - 用户需要训练计划
+3. nutrition_advice - 用户需要营养建议
+4. progress_update - 用户汇报进度或身体数据
+5. question - 用户提问
+6. general - 一般对话
+""",
+    output_format="""
+请以JSON格式返回：
+{
+    "intent": "意图类型",
+    "confidence": 0.0-1.0,
+    "extracted_info": {}
+}
+""",
+    dynamic="""
+用户消息：{message}
+""",
+)
+
+# Workout planner
+
+WORKOUT_PLAN = register(
+    "workout.plan",
+    static="""
+作为专业的健身教练，为用户生成一个详细的周训练计划（用户信息见下方）。
+
+**任务要求**：
+1. 根据用户的训练频率合理分配训练部位
+2. 对于每个训练日，提供：
+   - 训练日名称（如：胸+三头、背+二头等）
+   - 目标肌群
+   - 具体动作列表（每个动作包括：名称、组数、次数、休息时间）
+3. 解释为什么这样安排训练（训练原理）
+4. 提供渐进建议
+
+确保计划科学、安全，适合用户的经验水平。
+""",
+    output_format="""
+请以以下JSON格式返回：
+```json
+{
+    "plan_name": "计划名称",
+    "workout_type": "训练类型（如：push_pull_legs, body_part_split等）",
+    "duration_weeks": 12,
+    "frequency_per_week": 每周训练次数,
+    "rationale": "为什么选择这个训练方案的详细解释",
+    "weekly_schedule": [
+        {
+            "day": 1,
+            "name": "训练日名称",
+            "target_muscles": ["目标肌群1", "目标肌群2"],
+            "exercises": [
+                {
+                    "name": "动作名称",
+                    "sets": 3,
+                    "reps": 10,
+                    "rest_seconds": 60,
+                    "notes": "动作要点"
+                }
+            ]
+        }
+    ],
+    "progression_advice": "如何随着时间推进训练强度"
+}
+```
+""",
+    dynamic="""
+**用户信息**：
+- 健身目标：{goal}
+- 经验水平：{experience}
+- 训练频率：每周{frequency}次
+- 可用器械：{equipment}
+- 年龄：{age}
+- 性别：{gender}
+""",
+)
+
+WORKOUT_SPLIT = register(
+    "workout.split",
+    static="""
+为用户的训练参数推荐最佳的训练分化方式（如：推拉腿、上下肢分化、部位分化等），并解释原因。
+""",
+    output_format="""
+以JSON格式返回：
+{
+    "recommended_split": "分化名称",
+    "split_type": "类型代码",
+    "days_breakdown": ["周一：...", "周二：...", ...],
+    "rationale": "为什么推荐这个分化方式",
+    "pros": ["优点1", "优点2"],
+    "cons": ["缺点1", "缺点2"]
+}
+""",
+    dynamic="""
+训练频率：每周{frequency}次
+健身目标：{goal}
+经验水平：{experience}
+""",
+)
+
+WORKOUT_ADJUST = register(
+    "workout.adjust",
+    static="""
+基于用户的当前训练计划和进度数据，分析是否需要调整训练强度。
+
+请分析：
+1. 用户是否在进步
+2. 是否需要增加强度（重量、组数、次数）
+3. 是否需要调整动作或休息时间
+4. 具体的调整建议
+""",
+    output_format="""
+以JSON格式返回：
+{
+    "adjustment_needed": true/false,
+    "progress_assessment": "进度评估",
+    "recommendations": [
+        {
+            "exercise": "动作名称",
+            "current": "当前参数",
+            "suggested": "建议参数",
+            "reason": "调整原因"
+        }
+    ],
+    "overall_feedback": "总体反馈"
+}
+""",
+    dynamic="""
+**当前训练计划**：
+{current_plan}
+
+**进度数据**：
+{progress_data}
+""",
+)
+
+# Nutrition planner
+
+NUTRITION_MACROS = register(
+    "nutrition.macros",
+    static="""
+作为营养师，为用户计算每日营养需求（用户信息见下方）。
+
+**任务**：
+1. 计算基础代谢率（BMR）
+2. 计算每日总能量消耗（TDEE）
+3. 根据目标调整热量摄入
+4. 分配三大营养素（蛋白质、碳水、脂肪）比例
+5. 提供详细解释
+""",
+    output_format="""
+请以JSON格式返回：
+```json
+{
+    "bmr": 基础代谢率,
+    "tdee": 每日总消耗,
+    "target_calories": 目标热量,
+    "calorie_adjustment": "热量调整说明",
+    "macros": {
+        "protein_g": 蛋白质克数,
+        "carbs_g": 碳水化合物克数,
+        "fats_g": 脂肪克数,
+        "fiber_g": 纤维克数
+    },
+    "macro_percentages": {
+        "protein": "百分比",
+        "carbs": "百分比",
+        "fats": "百分比"
+    },
+    "rationale": "为什么这样分配营养素的详细解释",
+    "meal_timing": "建议的进餐时间和频率"
+}
+```
+""",
+    dynamic="""
+**用户信息**：
+- 体重：{weight}kg
+- 身高：{height}cm
+- 年龄：{age}岁
+- 性别：{gender}
+- 健身目标：{goal}
+- 运动频率：每周{activity_level}次
+""",
+)
+
+NUTRITION_MEAL_PLAN = register(
+    "nutrition.meal_plan",
+    static="""
+作为营养师，为一份已经配好的饮食计划中的每一餐起一个简短的菜名，并用一句话描述做法或搭配要点（计划见下方）。
+
+**要求**：
+1. 食物和份量已经按用户的营养目标计算好，不要修改、增加或删除食物，也不要给出营养数据
+2. 菜名简洁自然，例如"香煎鸡胸配糙米饭"
+3. 每一餐按编号返回
+4. 另外给出一条备餐建议和一条水分摄入建议
+""",
+    output_format="""
+请以JSON格式返回：
+```json
+{
+    "meals": [
+        {
+            "meal": 1,
+            "name": "菜名",
+            "description": "做法或搭配要点"
+        }
+    ],
+    "meal_prep_tips": "备餐建议",
+    "hydration_reminder": "水分摄入建议"
+}
+```
+""",
+    dynamic="""
+**饮食计划**：
+{meals}
+""",
+)
+
+NUTRITION_MEAL_ANALYSIS = register(
+    "nutrition.meal_analysis",
+    static="""
+分析用户今日的饮食记录（目标、当前摄入和餐食见下方）。
+
+**任务**：
+1. 分析当前营养素摄入是否达标
+2. 指出不足或过量的部分
+3. 提供即时反馈和建议
+""",
+    output_format="""
+请以JSON格式返回：
+```json
+{
+    "current_status": {
+        "calories": {"consumed": 已摄入, "remaining": 剩余, "percentage": 百分比},
+        "protein": {"consumed": 已摄入, "remaining": 剩余, "percentage": 百分比},
+        "carbs": {"consumed": 已摄入, "remaining": 剩余, "percentage": 百分比},
+        "fats": {"consumed": 已摄入, "remaining": 剩余, "percentage": 百分比}
+    },
+    "feedback": "总体反馈",
+    "recommendations": [
+        "建议1：还需要摄入xxx",
+        "建议2：..."
+    ],
+    "suggested_foods": [
+        "可以吃的食物建议"
+    ]
+}
+```
+""",
+    dynamic="""
+**目标营养素**：
+- 热量：{target_calories} kcal
+- 蛋白质：{target_protein_g}g
+- 碳水：{target_carbs_g}g
+- 脂肪：{target_fats_g}g
+
+**当前摄入**：
+- 热量：{calories} kcal
+- 蛋白质：{protein_g}g
+- 碳水：{carbs_g}g
+- 脂肪：{fats_g}g
+
+**已记录的餐食**：
+{meals}
+""",
+)
+
+NUTRITION_FOOD_PARSE = register(
+    "nutrition.food_parse",
+    static="""
+用户会用自然语言描述他们吃的食物。
+请解析这段描述，识别食物种类和份量，并估算营养价值。
+""",
+    output_format="""
+以JSON格式返回：
+```json
+{
+    "foods": [
+        {
+            "name": "食物名称",
+            "amount_g": 估计重量（克）,
+            "amount_description": "份量描述",
+            "calories": 估计热量,
+            "protein_g": 估计蛋白质,
+            "carbs_g": 估计碳水,
+            "fats_g": 估计脂肪,
+            "confidence": "估算置信度（high/medium/low）"
+        }
+    ],
+    "total_macros": {
+        "calories": 总热量,
+        "protein_g": 总蛋白质,
+        "carbs_g": 总碳水,
+        "fats_g": 总脂肪
+    },
+    "notes": "解析说明或不确定的地方"
+}
+```
+""",
+    dynamic="""
+用户描述："{description}"
+""",
+)
+
+# Progress analyzer
+
+PROGRESS_TRAINING = register(
+    "progress.training",
+    static="""
+分析用户的训练进度（用户目标和训练历史见下方）。
+
+**分析要点**：
+1. 训练一致性（是否按计划完成）
+2. 力量/耐力进步趋势
+3. 主要动作的表现变化
+4. 是否存在平台期
+5. 建议的调整方向
+""",
+    output_format="""
+请以JSON格式返回：
+```json
+{
+    "consistency_score": 0-100,
+    "consistency_analysis": "训练一致性评估",
+    "strength_progress": {
+        "trend": "improving/stable/declining",
+        "key_lifts": [
+            {
+                "exercise": "动作名称",
+                "initial_weight": 初始重量,
+                "current_weight": 当前重量,
+                "improvement_percentage": 提升百分比,
+                "trend": "上升/稳定/下降"
+            }
+        ]
+    },
+    "plateau_detected": true/false,
+    "plateau_analysis": "平台期分析（如果存在）",
+    "recommendations": [
+        {
+            "category": "训练/营养/恢复",
+            "recommendation": "具体建议",
+            "priority": "high/medium/low",
+            "rationale": "建议原因"
+        }
+    ],
+    "overall_assessment": "总体评估",
+    "motivation_message": "鼓励的话"
+}
+```
+""",
+    dynamic="""
+**用户目标**：{user_goal}
+
+**训练历史**：
+{workout_history}
+""",
+)
+
+PROGRESS_BODY_METRICS = register(
+    "progress.body_metrics",
+    static="""
+分析用户的身体指标变化（用户目标、目标指标和历史数据见下方）。
+
+**分析要点**：
+1. 体重变化趋势和速率
+2. 体脂率变化（如果有数据）
+3. 是否朝着目标前进
+4. 变化速度是否健康和可持续
+5. 需要的调整建议
+""",
+    output_format="""
+请以JSON格式返回：
+```json
+{
+    "weight_analysis": {
+        "start_weight": 起始体重,
+        "current_weight": 当前体重,
+        "change": 变化量,
+        "change_percentage": 变化百分比,
+        "trend": "increasing/decreasing/stable",
+        "weekly_average_change": 周均变化,
+        "is_healthy_rate": true/false
+    },
+    "body_fat_analysis": {
+        "start_bf": 起始体脂,
+        "current_bf": 当前体脂,
+        "change": 变化量,
+        "trend": "improving/stable/worsening"
+    },
+    "goal_progress": {
+        "target_weight": 目标体重,
+        "current_weight": 当前体重,
+        "remaining": 剩余差距,
+        "percentage_complete": 完成百分比,
+        "estimated_weeks_to_goal": 预估达成周数
+    },
+    "health_assessment": "健康状况评估",
+    "recommendations": [
+        "调整建议"
+    ],
+    "concerns": [
+        "需要注意的问题（如果有）"
+    ]
+}
+```
+""",
+    dynamic="""
+**用户目标**：{user_goal}
+
+**目标指标**：
+{target_metrics}
+
+**历史数据**：
+{metrics_history}
+""",
+)
+
+PROGRESS_WEEKLY_REPORT = register(
+    "progress.weekly_report",
+    static="""
+为用户生成本周的健身进度报告（本周数据汇总见下方）。
+
+汇总中的数字已由系统根据训练、饮食和身体数据记录精确计算，请直接引用，不要重新计算或估算。
+daily_sessions 和 daily_calories 按周一到周日排列，null 表示当天没有记录。
+把篇幅用在解读数据和给出建议上。
+
+请生成一份全面的周报，包括：
+1. 训练完成情况总结
+2. 营养摄入分析
+3. 身体指标变化
+4. 本周亮点和成就
+5. 需要改进的地方
+6. 下周建议
+""",
+    output_format="""
+以JSON格式返回：
+```json
+{
+    "week_number": 周数,
+    "date_range": "日期范围",
+    "training_summary": {
+        "workouts_completed": 完成次数,
+        "workouts_planned": 计划次数,
+        "completion_rate": 完成率,
+        "total_volume": 总训练量,
+        "highlights": ["本周训练亮点"]
+    },
+    "nutrition_summary": {
+        "average_calories": 平均热量,
+        "average_protein": 平均蛋白质,
+        "adherence_rate": 饮食计划遵守率,
+        "notes": "营养方面的观察"
+    },
+    "body_metrics_change": {
+        "weight_change": 体重变化,
+        "trend": "趋势"
+    },
+    "achievements": [
+        "本周成就"
+    ],
+    "areas_for_improvement": [
+        "需要改进的地方"
+    ],
+    "next_week_focus": [
+        "下周重点"
+    ],
+    "motivational_message": "鼓励的话"
+}
+```
+""",
+    dynamic="""
+**本周数据汇总**：
+{week_data}
+""",
+)
+
+PROGRESS_ADJUSTMENTS = register(
+    "progress.adjustments",
+    static="""
+基于进度分析，建议对当前计划的调整（当前计划和进度分析见下方）。
+
+请提供具体的调整建议：
+""",
+    output_format="""
+以JSON格式返回：
+```json
+{
+    "adjustment_needed": true/false,
+    "urgency": "high/medium/low",
+    "workout_adjustments": [
+        {
+            "type": "调整类型（增加重量/改变动作/调整组数等）",
+            "specific_change": "具体改变",
+            "reason": "原因",
+            "expected_outcome": "预期效果"
+        }
+    ],
+    "nutrition_adjustments": [
+        {
+            "nutrient": "营养素",
+            "current": 当前值,
+            "suggested": 建议值,
+            "reason": "原因"
+        }
+    ],
+    "recovery_recommendations": [
+        "恢复建议"
+    ],
+    "implementation_plan": "如何实施这些调整",
+    "monitoring_points": [
+        "需要监控的指标"
+    ]
+}
+```
+""",
+    dynamic="""
+**当前计划**：
+{current_plan}
+
+**进度分析**：
+{progress_analysis}
+""",
+)
+
+PROGRESS_ISSUES = register(
+    "progress.issues",
+    static="""
+以下健康和训练问题已由规则根据用户近期的训练、饮食和身体数据检测出（问题和相关指标见下方）。
+
+请为每个问题：
+1. 用通俗的语言解释问题及其可能原因
+2. 给出具体可执行的解决建议
+3. 判断是否需要立即行动
+
+只解释列出的问题，不要新增或删除问题，也不要修改问题类型和严重程度。
+""",
+    output_format="""
+以JSON格式返回：
+```json
+{
+    "issues_detected": [
+        {
+            "issue_type": "问题类型（与输入相同）",
+            "severity": "high/medium/low（与输入相同）",
+            "description": "问题解释",
+            "indicators": ["支持这个判断的指标"],
+            "recommendations": ["解决建议"],
+            "action_required": "是否需要立即行动"
+        }
+    ],
+    "positive_notes": [
+        "做得好的地方"
+    ]
+}
+```
+""",
+    dynamic="""
+**检测到的问题**：
+{issues}
+
+**相关指标**：
+{metrics}
+""",
+)
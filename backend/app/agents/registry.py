@@ -0,0 +1,78 @@
+"""
+The application's agents, built on first use.
+
+Importing an agent module pulls in langchain and the OpenAI client and
+building one creates its LLM clients, together most of the application's
+import time. The API modules hold these lazy handles instead, so the
+application starts (and /health answers) without the agent stack; the
+first attribute access on a handle imports its module and builds the
+agent, once per process. With ``AGENT_PRELOAD`` the startup warmup
+(app.services.readiness) builds them in a worker thread, so the first
+request that needs one doesn't pay for it either.
+"""
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyAgent:
+    """
+    An agent imported and built the first time it is used.
+
+    Attribute access is forwarded to the agent, so a handle is used like the
+    agent itself.
+
+    Args:
+        module: Module defining the agent class, e.g. app.agents.fitness_agent
+        name: Agent class name
+    """
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+        self.build_seconds: Optional[float] = None
+        self._agent: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._agent is not None
+
+    def get(self) -> Any:
+        """The agent, importing and building it on the first call."""
+        agent = self._agent
+        if agent is None:
+            with self._lock:
+                if self._agent is None:
+                    start = time.perf_counter()
+                    agent_class = getattr(importlib.import_module(self.module), self.name)
+                    self._agent = agent_class()
+                    self.build_seconds = time.perf_counter() - start
+                    logger.info("Built %s in %.2f s", self.name, self.build_seconds)
+                agent = self._agent
+        return agent
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.get(), attribute)
+
+    def __repr__(self) -> str:
+        return f"<LazyAgent {self.name} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+fitness_agent = LazyAgent("app.agents.fitness_agent", "FitnessAgent")
+workout_agent = LazyAgent("app.agents.workout_planner", "WorkoutPlannerAgent")
+nutrition_agent = LazyAgent("app.agents.nutrition_planner", "NutritionPlannerAgent")
+progress_agent = LazyAgent("app.agents.progress_analyzer", "ProgressAnalyzerAgent")
+
+AGENTS = (fitness_agent, workout_agent, nutrition_agent, progress_agent)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        agent.name: {"loaded": agent.loaded, "build_seconds": round(agent.build_seconds, 3) if agent.build_seconds else None}
+        for agent in AGENTS
+    }
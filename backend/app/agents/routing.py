@@ -0,0 +1,108 @@
+"""
+Per-method model routing with a small-to-large cascade.
+
+Each structured agent call ("agent.method") has a cascade of model tiers.
+High-volume, low-difficulty calls (intent classification, split
+suggestions, macro and meal parsing) try the small model first; if its
+output doesn't validate against the response schema, the call is retried
+on the next tier. Plan generation and analyses go straight to the large
+model.
+
+Tiers are "small" (LLM_SMALL_MODEL), "large" (the agent's own model) or a
+literal model name. LLM_ROUTES overrides the defaults per method, e.g.
+``workout.split=large;fitness.intent=gpt-4o-mini>large``.
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+from app.core.config import settings
+
+# Operation -> cascade of tiers; unlisted operations use the large model only
+DEFAULT_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "fitness.intent": ("small", "large"),
+    "workout.split": ("small", "large"),
+    "nutrition.macros": ("small", "large"),
+    "nutrition.food_parse": ("small", "large"),
+}
+
+
+def parse_routes(spec: str) -> Dict[str, Tuple[str, ...]]:
+    """
+    Parse a routes override.
+
+    Args:
+        spec: ``operation=tier>tier`` entries separated by ";"
+
+    Returns:
+        Operation -> cascade of tiers
+    """
+    routes = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        operation, separator, cascade = entry.partition("=")
+        tiers = tuple(tier.strip() for tier in cascade.split(">") if tier.strip())
+        if not separator or not operation.strip() or not tiers:
+            raise ValueError(f"Invalid LLM_ROUTES entry: {entry!r}")
+        routes[operation.strip()] = tiers
+    return routes
+
+
+class ModelRouter:
+    """
+    Resolves model cascades and tracks how often calls escalate.
+
+    Args:
+        routes: Operation -> cascade of tiers
+        small_model: Model for the "small" tier; empty disables that tier
+    """
+
+    def __init__(self, routes: Dict[str, Sequence[str]], small_model: str):
+        self.routes = routes
+        self.small_model = small_model
+        # operation -> counters
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def cascade(self, operation: str, large_model: str) -> List[str]:
+        """Models to try for an operation, in order."""
+        models = []
+        for tier in self.routes.get(operation, ("large",)):
+            if tier == "large":
+                model = large_model
+            elif tier == "small":
+                model = self.small_model
+            else:
+                model = tier
+            if model and model not in models:
+                models.append(model)
+        return models or [large_model]
+
+    def record(self, operation: str, model: str, attempts: int, valid: bool) -> None:
+        """
+        Record the outcome of one routed call.
+
+        Args:
+            operation: "agent.method" name
+            model: Model whose output was returned
+            attempts: Models tried, including the one returned
+            valid: Whether the returned output validated
+        """
+        stats = self._stats.setdefault(operation, {"calls": 0, "escalations": 0, "failures": 0, "served_by": {}})
+        stats["calls"] += 1
+        if attempts > 1:
+            stats["escalations"] += 1
+        if not valid:
+            stats["failures"] += 1
+        stats["served_by"][model] = stats["served_by"].get(model, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            operation: {
+                **stats,
+                "served_by": dict(stats["served_by"]),
+                "escalation_rate": round(stats["escalations"] / stats["calls"], 4),
+            }
+            for operation, stats in sorted(self._stats.items())
+        }
+
+
+model_router = ModelRouter(
+    routes={**DEFAULT_ROUTES, **parse_routes(settings.LLM_ROUTES)},
+    small_model=settings.LLM_SMALL_MODEL,
+)
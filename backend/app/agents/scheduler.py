@@ -0,0 +1,355 @@
+"""
+Scheduling of agent LLM calls: coalescing, adaptive concurrency, priorities.
+
+All agent calls go through ``llm_scheduler.submit`` (or
+``llm_scheduler.stream`` for replies streamed token by token):
+
+- Single-flight: identical in-flight requests (same model, parameters and
+  messages) share one provider call.
+- AIMD concurrency limit: the number of concurrent provider calls grows by
+  one per window of fast successes and is cut multiplicatively on 429s and
+  on latency spikes, so bursts back off before the provider starts
+  rejecting them.
+- Priority classes: when the limit is reached, waiting calls are admitted
+  interactive first (chat, intent, meal parsing), then standard (plan
+  generation), then background (reports and analyses).
+
+Rate limit and transient errors are retried here rather than by the OpenAI
+client, so the limiter sees every 429.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+from app.core.config import settings
+from app.core.telemetry import record_span, span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Admission order when the concurrency limit is reached; lower goes first."""
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+
+# Operation ("agent.method") -> priority; unlisted operations are STANDARD
+OPERATION_PRIORITIES = {
+    "fitness.chat": Priority.INTERACTIVE,
+    "fitness.chat_stream": Priority.INTERACTIVE,
+    "fitness.intent": Priority.INTERACTIVE,
+    "nutrition.food_parse": Priority.INTERACTIVE,
+    "progress.training": Priority.BACKGROUND,
+    "progress.body_metrics": Priority.BACKGROUND,
+    "progress.weekly_report": Priority.BACKGROUND,
+    "progress.adjustments": Priority.BACKGROUND,
+    "progress.issues": Priority.BACKGROUND,
+}
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit with additive increase / multiplicative decrease.
+
+    Args:
+        initial: Starting limit
+        minimum: Lower bound for the limit
+        maximum: Upper bound for the limit
+        backoff: Factor applied on a rate limit error
+        latency_tolerance: A call slower than this multiple of the
+            operation's typical latency counts as congestion; 0 disables
+    """
+
+    # Latency-triggered decrease factor, gentler than a 429
+    LATENCY_BACKOFF = 0.9
+    # Minimum seconds between two decreases, so one congestion event
+    # seen by many concurrent calls only shrinks the limit once
+    DECREASE_COOLDOWN = 1.0
+    # Weight of a new sample in the per-operation latency average
+    LATENCY_SMOOTHING = 0.1
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        self._typical_latency: Dict[str, float] = {}
+
+        self.increases = 0
+        self.decreases = 0
+
+    async def acquire(self, priority: Priority = Priority.STANDARD) -> None:
+        """Wait for a slot; higher priority waiters are admitted first."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just before cancellation: hand the slot on
+                self.release()
+            else:
+                self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def on_success(self, operation: str, latency: float) -> None:
+        typical = self._typical_latency.get(operation)
+        self._typical_latency[operation] = (
+            latency if typical is None
+            else typical + self.LATENCY_SMOOTHING * (latency - typical)
+        )
+
+        if self.latency_tolerance and typical is not None and latency > typical * self.latency_tolerance:
+            self._decrease(self.LATENCY_BACKOFF)
+            return
+
+        # Additive increase: about +1 per `limit` successful calls
+        if self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.increases += 1
+            self._wake()
+
+    def on_rate_limited(self) -> None:
+        self._decrease(self.backoff)
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+        self.decreases += 1
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, _ in self._waiters:
+            queued[Priority(priority).name.lower()] += 1
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": queued,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls through single-flight coalescing and the AIMD limiter.
+
+    Args:
+        limiter: Concurrency limiter shared by all calls
+        max_retries: Retries for rate limit and transient errors
+    """
+
+    def __init__(self, limiter: AIMDLimiter, max_retries: int):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def submit(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[T]],
+        key: Optional[Hashable] = None,
+    ) -> T:
+        """
+        Run ``call`` under the concurrency limit.
+
+        Args:
+            operation: "agent.method" name, selects the priority class
+            call: Starts the provider request; may be invoked again on retry
+            key: Identity of the request for coalescing; None disables it
+
+        Returns:
+            The call's result, possibly shared with identical callers
+        """
+        priority = OPERATION_PRIORITIES.get(operation, Priority.STANDARD)
+        if key is None:
+            return await self._execute(operation, priority, call)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            with span("coalesced", "queue", operation=operation):
+                return await asyncio.shield(task)
+
+        # A separate task, so a cancelled leader doesn't fail its followers
+        task = asyncio.create_task(self._execute(operation, priority, call))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _execute(self, operation: str, priority: Priority, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            await self.limiter.acquire(priority)
+            started_at = time.perf_counter()
+            if started_at - queued_at > 0.001:
+                record_span("queue", "queue", queued_at, started_at, priority=priority.name.lower())
+
+            self.calls += 1
+            try:
+                result = await call()
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                if _rate_limited(e):
+                    self.rate_limited += 1
+                    self.limiter.on_rate_limited()
+                if attempt >= self.max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.info("Retrying %s in %.1fs after %s", operation, delay, type(e).__name__)
+            else:
+                self.limiter.on_success(operation, time.perf_counter() - started_at)
+                return result
+            finally:
+                self.limiter.release()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, operation: str, start: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Run a streaming call under the concurrency limit.
+
+        The slot is held until the stream ends or the consumer closes it.
+        Errors are retried only before the first chunk; once chunks have
+        been yielded a retry would repeat them. The limiter sees the time
+        to the first chunk, which tracks provider load regardless of reply
+        length.
+
+        Args:
+            operation: "agent.method" name, selects the priority class
+            start: Opens the provider stream; may be invoked again on retry
+        """
+        priority = OPERATION_PRIORITIES.get(operation, Priority.STANDARD)
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            await self.limiter.acquire(priority)
+            started_at = time.perf_counter()
+            if started_at - queued_at > 0.001:
+                record_span("queue", "queue", queued_at, started_at, priority=priority.name.lower())
+
+            self.calls += 1
+            first_chunk_at = None
+            try:
+                async for chunk in start():
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                    yield chunk
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                if _rate_limited(e):
+                    self.rate_limited += 1
+                    self.limiter.on_rate_limited()
+                if first_chunk_at is not None or attempt >= self.max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.info("Retrying %s in %.1fs after %s", operation, delay, type(e).__name__)
+            else:
+                self.limiter.on_success(operation, (first_chunk_at or time.perf_counter()) - started_at)
+                return
+            finally:
+                self.limiter.release()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.limiter.stats(),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
+
+
+def _retryable(error: Exception) -> bool:
+    """Rate limit and transient provider errors."""
+    # Imported here so importing the scheduler doesn't load the OpenAI
+    # client; by the time a call fails, the agents have loaded it
+    import openai
+
+    return isinstance(error, (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    ))
+
+
+def _rate_limited(error: Exception) -> bool:
+    import openai
+
+    return isinstance(error, openai.RateLimitError)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Provider's Retry-After if given, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+
+
+llm_scheduler = LLMScheduler(
+    AIMDLimiter(
+        initial=settings.LLM_CONCURRENCY_INITIAL,
+        minimum=settings.LLM_CONCURRENCY_MIN,
+        maximum=settings.LLM_CONCURRENCY_MAX,
+        latency_tolerance=settings.LLM_LATENCY_TOLERANCE,
+    ),
+    max_retries=settings.LLM_MAX_RETRIES,
+)
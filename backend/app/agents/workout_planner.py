@@ -1,9 +1,10 @@
 """
 Workout Planning Agent - Specialized in creating training plans.
 """
-from typing import Dict, List, Any
-from langchain_openai import ChatOpenAI
-from app.core.config import settings
+from typing import Dict, Any, Optional
+from app.agents.llm import create_llm, generate_structured
+from app.agents.prompts import WORKOUT_PLAN, WORKOUT_SPLIT, WORKOUT_ADJUST
+from app.schemas.agent_outputs import WorkoutPlanOutput, WorkoutSplitOutput, IntensityAdjustmentOutput
 import json
 
 
@@ -15,11 +16,9 @@ class WorkoutPlannerAgent:
 
     def __init__(self):
         """Initialize the workout planner agent."""
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
+        self.llm = create_llm(
             temperature=0.3,  # Lower temperature for more consistent plans
             max_tokens=3000,
-            openai_api_key=settings.OPENAI_API_KEY,
         )
 
     async def generate_workout_plan(
@@ -35,115 +34,59 @@ class WorkoutPlannerAgent:
         Returns:
             Structured workout plan
         """
-        prompt = self._create_workout_plan_prompt(user_profile)
-        response = await self.llm.apredict(prompt)
+        output = await generate_structured(
+            self.llm,
+            WORKOUT_PLAN,
+            WorkoutPlanOutput,
+            **self._workout_plan_prompt_values(user_profile)
+        )
 
-        # Parse and structure the response
-        plan = self._parse_workout_plan(response, user_profile)
+        # Structure the response
+        plan = self._build_workout_plan(output.data, output.raw, user_profile)
 
         return plan
 
-    def _create_workout_plan_prompt(self, user_profile: Dict[str, Any]) -> str:
-        """Create a detailed prompt for workout plan generation."""
-
-        goal = user_profile.get("fitness_goal", "general_fitness")
-        experience = user_profile.get("experience_level", "beginner")
-        frequency = user_profile.get("training_frequency", 3)
-        equipment = user_profile.get("equipment_access", "bodyweight")
-
-        prompt = f"""作为专业的健身教练，为以下用户生成一个详细的周训练计划：
-
-**用户信息**：
-- 健身目标：{goal}
-- 经验水平：{experience}
-- 训练频率：每周{frequency}次
-- 可用器械：{equipment}
-- 年龄：{user_profile.get('age', 'N/A')}
-- 性别：{user_profile.get('gender', 'N/A')}
-
-**任务要求**：
-1. 根据训练频率（{frequency}次/周）合理分配训练部位
-2. 对于每个训练日，提供：
-   - 训练日名称（如：胸+三头、背+二头等）
-   - 目标肌群
-   - 具体动作列表（每个动作包括：名称、组数、次数、休息时间）
-3. 解释为什么这样安排训练（训练原理）
-4. 提供渐进建议
-
-请以以下JSON格式返回：
-```json
-{{
-    "plan_name": "计划名称",
-    "workout_type": "训练类型（如：push_pull_legs, body_part_split等）",
-    "duration_weeks": 12,
-    "frequency_per_week": {frequency},
-    "rationale": "为什么选择这个训练方案的详细解释",
-    "weekly_schedule": [
-        {{
-            "day": 1,
-            "name": "训练日名称",
-            "target_muscles": ["目标肌群1", "目标肌群2"],
-            "exercises": [
-                {{
-                    "name": "动作名称",
-                    "sets": 3,
-                    "reps": 10,
-                    "rest_seconds": 60,
-                    "notes": "动作要点"
-                }}
-            ]
-        }}
-    ],
-    "progression_advice": "如何随着时间推进训练强度"
-}}
-```
-
-确保计划科学、安全，适合用户的经验水平。
-"""
-
-        return prompt
+    def _workout_plan_prompt_values(self, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Prompt values for workout plan generation."""
+        return dict(
+            goal=user_profile.get("fitness_goal", "general_fitness"),
+            experience=user_profile.get("experience_level", "beginner"),
+            frequency=user_profile.get("training_frequency", 3),
+            equipment=user_profile.get("equipment_access", "bodyweight"),
+            age=user_profile.get("age", "N/A"),
+            gender=user_profile.get("gender", "N/A"),
+        )
 
-    def _parse_workout_plan(self, llm_response: str, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_workout_plan(
+        self,
+        plan: Optional[Dict[str, Any]],
+        llm_response: str,
+        user_profile: Dict[str, Any]
+    ) -> Dict[str, Any]:
         """
-        Parse LLM response into structured workout plan.
+        Attach user context to a parsed plan, or build a fallback plan.
         """
-        try:
-            # Try to extract JSON from response
-            # Look for content between ```json and ```
-            if "```json" in llm_response:
-                start = llm_response.find("```json") + 7
-                end = llm_response.find("```", start)
-                json_str = llm_response[start:end].strip()
-            elif "```" in llm_response:
-                start = llm_response.find("```") + 3
-                end = llm_response.find("```", start)
-                json_str = llm_response[start:end].strip()
-            else:
-                json_str = llm_response.strip()
-
-            plan = json.loads(json_str)
-
+        if plan is not None:
             # Add user context
             plan["user_id"] = user_profile.get("user_id")
             plan["generation_prompt"] = llm_response
 
             return plan
 
-        except json.JSONDecodeError:
-            # Fallback: return a basic structure
-            frequency = user_profile.get("training_frequency", 3)
-
-            return {
-                "plan_name": "个性化训练计划",
-                "workout_type": "custom",
-                "duration_weeks": 12,
-                "frequency_per_week": frequency,
-                "rationale": llm_response,
-                "weekly_schedule": [],
-                "progression_advice": "请咨询专业教练",
-                "generation_prompt": llm_response,
-                "user_id": user_profile.get("user_id")
-            }
+        # Fallback: return a basic structure
+        frequency = user_profile.get("training_frequency", 3)
+
+        return {
+            "plan_name": "个性化训练计划",
+            "workout_type": "custom",
+            "duration_weeks": 12,
+            "frequency_per_week": frequency,
+            "rationale": llm_response,
+            "weekly_schedule": [],
+            "progression_advice": "请咨询专业教练",
+            "generation_prompt": llm_response,
+            "user_id": user_profile.get("user_id")
+        }
 
     async def suggest_workout_split(
         self,
@@ -154,46 +97,24 @@ class WorkoutPlannerAgent:
         """
         Suggest optimal workout split based on frequency and goals.
         """
-        prompt = f"""为以下训练参数推荐最佳的训练分化方式：
-
-训练频率：每周{frequency}次
-健身目标：{goal}
-经验水平：{experience}
-
-请推荐训练分化方式（如：推拉腿、上下肢分化、部位分化等），并解释原因。
-
-以JSON格式返回：
-{{
-    "recommended_split": "分化名称",
-    "split_type": "类型代码",
-    "days_breakdown": ["周一：...", "周二：...", ...],
-    "rationale": "为什么推荐这个分化方式",
-    "pros": ["优点1", "优点2"],
-    "cons": ["缺点1", "缺点2"]
-}}
-"""
-
-        response = await self.llm.apredict(prompt)
-
-        try:
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                json_str = response[start:end].strip()
-            else:
-                json_str = response.strip()
-
-            return json.loads(json_str)
+        output = await generate_structured(
+            self.llm,
+            WORKOUT_SPLIT,
+            WorkoutSplitOutput,
+            frequency=frequency,
+            goal=goal,
+            experience=experience,
+        )
 
-        except json.JSONDecodeError:
-            return {
-                "recommended_split": "自定义",
-                "split_type": "custom",
-                "days_breakdown": [],
-                "rationale": response,
-                "pros": [],
-                "cons": []
-            }
+        response = output.raw
+        return output.result(fallback={
+            "recommended_split": "自定义",
+            "split_type": "custom",
+            "days_breakdown": [],
+            "rationale": response,
+            "pros": [],
+            "cons": []
+        })
 
     async def adjust_workout_intensity(
         self,
@@ -203,52 +124,18 @@ class WorkoutPlannerAgent:
         """
         Suggest adjustments to workout intensity based on progress.
         """
-        prompt = f"""基于以下进度数据，分析是否需要调整训练强度：
-
-**当前训练计划**：
-{json.dumps(current_plan, ensure_ascii=False, indent=2)}
-
-**进度数据**：
-{json.dumps(progress_data, ensure_ascii=False, indent=2)}
-
-请分析：
-1. 用户是否在进步
-2. 是否需要增加强度（重量、组数、次数）
-3. 是否需要调整动作或休息时间
-4. 具体的调整建议
-
-以JSON格式返回：
-{{
-    "adjustment_needed": true/false,
-    "progress_assessment": "进度评估",
-    "recommendations": [
-        {{
-            "exercise": "动作名称",
-            "current": "当前参数",
-            "suggested": "建议参数",
-            "reason": "调整原因"
-        }}
-    ],
-    "overall_feedback": "总体反馈"
-}}
-"""
+        output = await generate_structured(
+            self.llm,
+            WORKOUT_ADJUST,
+            IntensityAdjustmentOutput,
+            current_plan=json.dumps(current_plan, ensure_ascii=False, indent=2),
+            progress_data=json.dumps(progress_data, ensure_ascii=False, indent=2),
+        )
 
-        response = await self.llm.apredict(prompt)
-
-        try:
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                json_str = response[start:end].strip()
-            else:
-                json_str = response.strip()
-
-            return json.loads(json_str)
-
-        except json.JSONDecodeError:
-            return {
-                "adjustment_needed": False,
-                "progress_assessment": response,
-                "recommendations": [],
-                "overall_feedback": "继续保持当前训练"
-            }
+        response = output.raw
+        return output.result(fallback={
+            "adjustment_needed": False,
+            "progress_assessment": response,
+            "recommendations": [],
+            "overall_feedback": "继续保持当前训练"
+        })
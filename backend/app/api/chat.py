@@ -1,25 +1,22 @@
 """
 Chat API endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, WebSocket
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import current_user_id
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.responses import FastJSONResponse
 from app.schemas.chat import ChatRequest, ChatResponse, OnboardingResponse
-from app.agents.fitness_agent import FitnessAgent
-from app.agents.workout_planner import WorkoutPlannerAgent
-from app.agents.nutrition_planner import NutritionPlannerAgent
-from app.agents.progress_analyzer import ProgressAnalyzerAgent
-from typing import Dict, Any
+from app.agents.registry import fitness_agent
+from app.services.chat_sessions import ChatSession, chat_sessions
+from app.services.user_context import user_context_cache
+from app.services.usage import QuotaExceededError
+from typing import Dict, Any, Optional
 import uuid
 
 router = APIRouter()
 
-# Initialize agents (in production, use dependency injection)
-fitness_agent = FitnessAgent()
-workout_agent = WorkoutPlannerAgent()
-nutrition_agent = NutritionPlannerAgent()
-progress_agent = ProgressAnalyzerAgent()
-
 # Simple in-memory storage for conversations (in production, use database)
 conversations: Dict[str, list] = {}
 
@@ -27,6 +24,7 @@ conversations: Dict[str, list] = {}
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     request: ChatRequest,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -39,17 +37,15 @@ async def send_message(
         # Get conversation history
         chat_history = conversations.get(conversation_id, [])
 
-        # TODO: Get user context from database
-        user_context = {
-            # This should be fetched from database based on authenticated user
-            # For now, using placeholder
-        }
+        # Cached profile and pre-rendered context, no DB hit on warm paths
+        user_context = await user_context_cache.get(db, user_id)
 
         # Get response from agent
         response = await fitness_agent.chat(
             message=request.message,
-            user_context=user_context,
-            chat_history=chat_history if request.include_history else None
+            user_context=user_context.profile,
+            chat_history=chat_history if request.include_history else None,
+            context=user_context.rendered
         )
 
         # Store messages in conversation
@@ -68,17 +64,44 @@ async def send_message(
         # Analyze intent
         intent_data = await fitness_agent.analyze_intent(request.message)
 
-        return ChatResponse(
+        # Validated once here; response_model only documents the schema
+        return FastJSONResponse(ChatResponse(
             message=response,
             conversation_id=conversation_id,
             intent=intent_data.get("intent"),
             metadata=intent_data.get("extracted_info")
-        )
+        ))
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.websocket("/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    conversation_id: Optional[str] = None,
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Chat with the fitness agent over a WebSocket.
+
+    The user, their context and the conversation history stay resident for
+    the life of the connection, and replies are streamed token by token.
+    Pass ``conversation_id`` to continue a stored conversation. See
+    app.services.chat_sessions for the message protocol.
+    """
+    conversation_id = conversation_id or str(uuid.uuid4())
+    session = ChatSession(
+        user_id=user_id,
+        conversation_id=conversation_id,
+        transcript=conversations.setdefault(conversation_id, []),
+        token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+    )
+    await chat_sessions.serve(websocket, session, fitness_agent)
+
+
 @router.post("/onboarding", response_model=OnboardingResponse)
 async def onboarding_chat(
     request: ChatRequest,
@@ -120,12 +143,14 @@ async def onboarding_chat(
         # Check if onboarding is complete (simplified logic)
         onboarding_complete = len(chat_history) > 10  # Example threshold
 
-        return OnboardingResponse(
+        return FastJSONResponse(OnboardingResponse(
             message=response,
             onboarding_complete=onboarding_complete,
             next_steps=["创建训练计划", "设置营养目标"] if onboarding_complete else None
-        )
+        ))
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
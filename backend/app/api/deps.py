@@ -0,0 +1,85 @@
+"""
+Shared API dependencies.
+"""
+from typing import Optional
+from fastapi import Depends, HTTPException, WebSocketException, status
+from fastapi.security import OAuth2PasswordBearer
+from starlette.requests import HTTPConnection
+from app.core.config import settings
+from app.core.security import InvalidTokenError, access_tokens
+from app.services.auth import AuthenticatedUser, auth_user_cache
+from app.services.usage import bind_user
+
+# Acting user of requests without a token while AUTH_REQUIRED is off
+DEVELOPMENT_USER_ID = 1
+
+
+class BearerToken(OAuth2PasswordBearer):
+    """
+    Access token of a request, or None.
+
+    Read from the Authorization header, or for WebSocket handshakes (where
+    browsers can't set headers) from the ``access_token`` query parameter.
+    """
+
+    async def __call__(self, connection: HTTPConnection) -> Optional[str]:
+        scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            return token
+        if connection.scope["type"] == "websocket":
+            return connection.query_params.get("access_token")
+        return None
+
+
+bearer_token = BearerToken(tokenUrl="/api/users/login", auto_error=False)
+
+
+def _unauthorized(connection: HTTPConnection, detail: str) -> Exception:
+    if connection.scope["type"] == "websocket":
+        return WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def get_current_user(
+    connection: HTTPConnection,
+    token: Optional[str] = Depends(bearer_token)
+) -> AuthenticatedUser:
+    """
+    The user of the request's access token; 401 without a valid one.
+
+    Verified tokens and account status are cached, so warm requests neither
+    decode the token again nor query the database.
+    """
+    if token is None:
+        raise _unauthorized(connection, "Not authenticated")
+    try:
+        claims = access_tokens.verify(token)
+    except InvalidTokenError:
+        raise _unauthorized(connection, "Invalid or expired token")
+
+    user = await auth_user_cache.get(int(claims["sub"]))
+    if user is None or not user.is_active:
+        raise _unauthorized(connection, "Invalid or expired token")
+    return user
+
+
+async def current_user_id(
+    connection: HTTPConnection,
+    token: Optional[str] = Depends(bearer_token)
+) -> int:
+    """
+    Id of the requesting user, bound for LLM usage accounting and quotas.
+
+    Requests without a token act as the development user unless
+    AUTH_REQUIRED is set; a token that is sent must be valid.
+    """
+    if token is None and not settings.AUTH_REQUIRED:
+        user_id = DEVELOPMENT_USER_ID
+    else:
+        user_id = (await get_current_user(connection, token)).id
+    bind_user(user_id)
+    return user_id
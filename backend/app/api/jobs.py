@@ -0,0 +1,112 @@
+"""
+Background job API endpoints.
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from app.api.deps import current_user_id
+from app.core.responses import FastJSONResponse, dumps
+from app.models.job import Job, JobStatus
+from app.services.jobs import job_queue, job_view
+from app.services.usage import usage_ledger
+from typing import Dict, Any
+
+router = APIRouter()
+
+
+async def enqueue_job(kind: str, payload: Dict[str, Any], user_id: int, wait: bool = False):
+    """
+    Queue a job for an endpoint.
+
+    Args:
+        kind: Registered job kind
+        payload: Handler input
+        user_id: Owner of the job
+        wait: Wait for the result and return it like a synchronous call
+
+    Returns:
+        202 with the job id and status URLs, or the job result when waiting
+
+    Raises:
+        QuotaExceededError: The user's quota is used up, before queueing or
+            (when waiting) during the job, answered 429 like any endpoint
+    """
+    # Fail fast instead of queueing a job that can't call the LLM
+    await usage_ledger.check_quota(user_id)
+
+    job = await job_queue.submit(kind, payload, user_id=user_id)
+
+    if wait:
+        job = await job_queue.wait(job.id)
+        if job.status == JobStatus.FAILED and job.error_code == "quota_exceeded":
+            # Raises with the current usage
+            await usage_ledger.check_quota(user_id)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(job.retry_after)},
+                detail=job.error,
+            )
+        if job.status == JobStatus.FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Job failed: {job.error}"
+            )
+        return FastJSONResponse(job.result)
+
+    status_url = f"/api/jobs/{job.id}"
+    return FastJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": status_url},
+        content={
+            "success": True,
+            "job_id": job.id,
+            "status": job.status.value,
+            "status_url": status_url,
+            "events_url": f"{status_url}/events",
+        },
+    )
+
+
+async def _get_owned_job(job_id: str, user_id: int) -> Job:
+    job = await job_queue.get(job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Get a job's status, and its result once it has succeeded.
+    """
+    return FastJSONResponse(job_view(await _get_owned_job(job_id, user_id)))
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Subscribe to a job's status changes as server-sent events.
+
+    Sends one event per change (queued, running, retries) and closes the
+    stream after the succeeded or failed event.
+    """
+    await _get_owned_job(job_id, user_id)
+
+    async def events():
+        async for job in job_queue.watch(job_id):
+            data = dumps(job_view(job)).decode()
+            yield f"event: {job.status.value}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,16 +3,24 @@ Nutrition API endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
-from app.agents.nutrition_planner import NutritionPlannerAgent
-from typing import Dict, Any, List
+from app.core.database import AsyncSessionLocal, get_db
+from app.agents.registry import nutrition_agent
+from app.api.deps import current_user_id
+from app.api.jobs import enqueue_job
+from app.repositories.nutrition import NutritionRepository
+from app.schemas.nutrition import MealAnalysisRequest, MealLogCreate, MealPlanRequest
+from app.services.jobs import job_queue
+from app.services.meal_optimizer import food_catalog_cache
+from app.services.user_context import user_context_cache
+from app.services.usage import QuotaExceededError
+from typing import Dict, Any, Optional
 
 router = APIRouter()
-nutrition_agent = NutritionPlannerAgent()
 
 
 @router.post("/plan/generate")
 async def generate_nutrition_plan(
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -20,9 +28,11 @@ async def generate_nutrition_plan(
     Implements FR-3: 营养建议与追踪
     """
     try:
-        # TODO: Get current user from auth
-        user_profile = {
-            "user_id": 1,
+        user_context = await user_context_cache.get(db, user_id)
+
+        # Fall back to a placeholder profile until onboarding data exists
+        user_profile = user_context.profile or {
+            "user_id": user_id,
             "weight": 75,
             "height": 175,
             "age": 25,
@@ -42,6 +52,8 @@ async def generate_nutrition_plan(
             "message": "营养计划已生成"
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -49,51 +61,94 @@ async def generate_nutrition_plan(
         )
 
 
-@router.post("/meal-plan/generate")
-async def generate_meal_plan(
-    macro_targets: Dict[str, float] = None,
-    db: AsyncSession = Depends(get_db)
-):
+@job_queue.handler("meal_plan")
+async def run_meal_plan_job(payload: Dict[str, Any], user_id: int) -> Dict[str, Any]:
     """
-    Generate a daily meal plan with specific foods.
-    Implements FR-3.2: 饮食搭配建议
+    Generate a daily meal plan, or ``days`` consecutive plans (background job).
+
+    Targets come from the payload, else the user's active nutrition plan;
+    restrictions and allergies come from the user's profile.
     """
-    try:
-        # TODO: Get user preferences and current nutrition plan
-        if not macro_targets:
-            macro_targets = {
-                "calories": 2500,
-                "protein_g": 180,
-                "carbs_g": 250,
-                "fats_g": 70
-            }
-
-        user_preferences = {
-            "dietary_restrictions": "无",
-            "allergies": "无",
-            "meals_per_day": 3
+    async with AsyncSessionLocal() as db:
+        user_context = await user_context_cache.get(db, user_id)
+        plan = await NutritionRepository(db).active_plan_targets(user_id)
+        catalog = await food_catalog_cache.get(db)
+
+    macro_targets = payload.get("macro_targets")
+    if not macro_targets and plan is not None:
+        macro_targets = {
+            "calories": plan.daily_calories,
+            "protein_g": plan.daily_protein_g,
+            "carbs_g": plan.daily_carbs_g,
+            "fats_g": plan.daily_fats_g,
         }
-
-        meal_plan = await nutrition_agent.generate_meal_plan(
+    macro_targets = macro_targets or {
+        "calories": 2500,
+        "protein_g": 180,
+        "carbs_g": 250,
+        "fats_g": 70
+    }
+
+    user_preferences = {
+        "dietary_restrictions": user_context.profile.get("dietary_restrictions") or "无",
+        "allergies": user_context.profile.get("allergies") or "无",
+        "meals_per_day": (plan.meals_per_day if plan is not None else None) or 3
+    }
+
+    days = payload.get("days") or 1
+    if days > 1:
+        week_plan = await nutrition_agent.generate_week_meal_plan(
             macro_targets=macro_targets,
-            user_preferences=user_preferences
+            user_preferences=user_preferences,
+            catalog=catalog,
+            days=days
         )
-
         return {
             "success": True,
-            "meal_plan": meal_plan
+            "meal_plan": week_plan
         }
 
-    except Exception as e:
+    meal_plan = await nutrition_agent.generate_meal_plan(
+        macro_targets=macro_targets,
+        user_preferences=user_preferences,
+        catalog=catalog
+    )
+
+    return {
+        "success": True,
+        "meal_plan": meal_plan
+    }
+
+
+@router.post("/meal-plan/generate")
+async def generate_meal_plan(
+    request: Optional[MealPlanRequest] = None,
+    days: int = 1,
+    wait: bool = False,
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Generate a daily meal plan with specific foods.
+    Implements FR-3.2: 饮食搭配建议
+
+    Foods and portions are computed from the food catalog to hit the macro
+    targets; days=2..7 plans consecutive days that vary the foods.
+
+    Returns a job id immediately; poll /api/jobs/{job_id} or subscribe to
+    its events for the meal plan. With wait=true, returns the meal plan itself.
+    """
+    if not 1 <= days <= 7:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate meal plan: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="days must be between 1 and 7"
         )
+    macro_targets = request.macro_targets.model_dump() if request and request.macro_targets else None
+    return await enqueue_job("meal_plan", {"macro_targets": macro_targets, "days": days}, user_id, wait=wait)
 
 
 @router.post("/meal/log")
 async def log_meal(
-    meal_data: Dict[str, Any],
+    meal_data: MealLogCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -125,6 +180,8 @@ async def parse_meal_description(
             "parsed_data": parsed_data
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -148,8 +205,7 @@ async def get_todays_meals(
 
 @router.post("/meals/analyze")
 async def analyze_meals(
-    meals: List[Dict[str, Any]],
-    target_macros: Dict[str, float],
+    request: MealAnalysisRequest,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -158,8 +214,8 @@ async def analyze_meals(
     """
     try:
         analysis = await nutrition_agent.analyze_meal_log(
-            meals=meals,
-            target_macros=target_macros
+            meals=[meal.model_dump(mode="json", exclude_none=True) for meal in request.meals],
+            target_macros=request.target_macros.model_dump()
         )
 
         return {
@@ -167,6 +223,8 @@ async def analyze_meals(
             "analysis": analysis
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3,18 +3,44 @@ Progress tracking and analysis API endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.core.database import get_db
-from app.agents.progress_analyzer import ProgressAnalyzerAgent
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
+from app.agents.registry import progress_agent
+from app.api.deps import current_user_id
+from app.api.jobs import enqueue_job
+from app.repositories.progress import ProgressRepository
+from app.schemas.progress import BodyMetricsCreate, ProgressLogCreate
+from app.services.health_rules import load_health_series
+from app.services.jobs import job_queue
+from app.services.usage import QuotaExceededError
+from app.services.weekly_reports import (
+    BATCH_JOB_KIND,
+    WeeklyReportBatch,
+    WeeklyReportScheduler,
+    generate_user_report,
+    report_week,
+)
+from typing import Dict, Any, List, Optional
+from datetime import date, datetime, timedelta, timezone
 
 router = APIRouter()
-progress_agent = ProgressAnalyzerAgent()
+weekly_report_batch = WeeklyReportBatch(
+    progress_agent,
+    chunk_size=settings.WEEKLY_REPORT_CHUNK_SIZE,
+    concurrency=settings.WEEKLY_REPORT_CONCURRENCY,
+    stale_after=settings.JOB_STALE_AFTER_SECONDS,
+)
+weekly_report_scheduler = WeeklyReportScheduler(
+    job_queue,
+    weekday=settings.WEEKLY_REPORT_BATCH_WEEKDAY,
+    hour=settings.WEEKLY_REPORT_BATCH_HOUR,
+    stale_after=settings.JOB_STALE_AFTER_SECONDS,
+)
 
 
 @router.post("/body-metrics")
 async def log_body_metrics(
-    metrics: Dict[str, Any],
+    metrics: BodyMetricsCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -82,6 +108,8 @@ async def analyze_training_progress(
             "analysis": analysis
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -134,6 +162,8 @@ async def analyze_body_metrics_progress(
             "analysis": analysis
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -141,35 +171,60 @@ async def analyze_body_metrics_progress(
         )
 
 
+@job_queue.handler("weekly_report")
+async def run_weekly_report_job(payload: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    """
+    Generate and store one user's weekly progress report (background job).
+    """
+    week_start = date.fromisoformat(payload["week_start"])
+    report = await generate_user_report(progress_agent, user_id, week_start)
+
+    return {
+        "success": True,
+        "report": report,
+        "week_start": week_start.isoformat(),
+        "cached": False
+    }
+
+
+@job_queue.handler(BATCH_JOB_KIND)
+async def run_weekly_report_batch_job(payload: Dict[str, Any], user_id: Optional[int]) -> Dict[str, Any]:
+    """
+    Generate the weekly reports of all active users (scheduled job).
+    """
+    return await weekly_report_batch.run(date.fromisoformat(payload["week_start"]))
+
+
 @router.post("/report/weekly")
 async def generate_weekly_report(
+    week_start: Optional[date] = None,
+    wait: bool = False,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Generate weekly progress report.
+    Get weekly progress report.
     Implements FR-4.4: 周报生成
-    """
-    try:
-        # TODO: Fetch actual week data from database
-        week_data = {
-            "week_number": 1,
-            "workouts": [],
-            "meals": [],
-            "body_metrics": []
-        }
 
-        report = await progress_agent.generate_weekly_report(week_data)
+    Reports of the last complete week are generated for all users by the
+    weekly batch, so this is usually a read of the stored report. Otherwise
+    (new user, other week, batch not run yet) the report is generated as a
+    job: returns a job id immediately; poll /api/jobs/{job_id} or subscribe
+    to its events for the report. With wait=true, returns the report itself.
+    """
+    week_start = week_start or report_week()
+    week_start -= timedelta(days=week_start.weekday())
 
+    report = await ProgressRepository(db).get_weekly_report(user_id, week_start)
+    if report is not None:
         return {
             "success": True,
-            "report": report
+            "report": report,
+            "week_start": week_start.isoformat(),
+            "cached": True
         }
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate weekly report: {str(e)}"
-        )
+    return await enqueue_job("weekly_report", {"week_start": week_start.isoformat()}, user_id, wait=wait)
 
 
 @router.post("/adjustments/suggest")
@@ -202,6 +257,8 @@ async def suggest_plan_adjustments(
             "adjustments": adjustments
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -211,27 +268,27 @@ async def suggest_plan_adjustments(
 
 @router.post("/health-check")
 async def check_health_issues(
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Detect potential health or training issues.
+
+    Checks the last 4 weeks of training, nutrition and body metrics against
+    the health rules; only flagged issues are sent to the LLM for an
+    explanation.
     """
     try:
-        # TODO: Fetch comprehensive user data
-        user_data = {
-            "workouts": [],
-            "nutrition": [],
-            "body_metrics": [],
-            "sleep": []
-        }
-
-        issues = await progress_agent.detect_issues(user_data)
+        series = await load_health_series(db, [user_id], datetime.now(timezone.utc).date())
+        issues = await progress_agent.detect_issues(series)
 
         return {
             "success": True,
             "health_check": issues
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -241,7 +298,7 @@ async def check_health_issues(
 
 @router.post("/log")
 async def create_progress_log(
-    log_data: Dict[str, Any],
+    log_data: ProgressLogCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -2,10 +2,19 @@
 User API endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
-from app.schemas.user import UserCreate, UserResponse, UserOnboarding, UserUpdate
-from typing import List
+from app.core.security import access_tokens, password_hasher
+from app.models.user import User
+from app.schemas.user import Token, UserCreate, UserResponse, UserOnboarding, UserUpdate
+from app.core.config import settings
+from app.api.deps import current_user_id, get_current_user
+from app.services.auth import AuthenticatedUser, authenticate
+from app.services.user_context import user_context_cache
+from app.services.usage import usage_ledger
+from typing import Dict, Any, List
 
 router = APIRouter()
 
@@ -17,61 +26,97 @@ async def create_user(
 ):
     """
     Create a new user.
+
+    The password is hashed in the password hashing pool, off the event loop.
     """
-    # TODO: Implement user creation with password hashing
-    # This is a placeholder
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="User creation not yet implemented"
+    taken = (await db.execute(
+        select(User.id).where(or_(User.email == user.email, User.username == user.username)).limit(1)
+    )).first()
+    if taken is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email or username already registered"
+        )
+
+    db_user = User(
+        email=user.email,
+        username=user.username,
+        full_name=user.full_name,
+        hashed_password=await password_hasher.hash(user.password),
     )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+
+    return db_user
+
+
+@router.post("/login", response_model=Token)
+async def login(
+    form: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Exchange a username (or email) and password for an access token.
+
+    Send the token as ``Authorization: Bearer <token>``.
+    """
+    user_id = await authenticate(db, form.username, form.password)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return Token(access_token=access_tokens.create(user_id))
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(
+async def read_current_user(
+    current_user: AuthenticatedUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get current authenticated user.
     """
-    # TODO: Implement authentication and get current user
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Authentication not yet implemented"
-    )
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    return user
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Update current user's profile.
     """
-    # TODO: Implement user update
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="User update not yet implemented"
-    )
+    return await _update_profile(db, user_id, user_update.model_dump(exclude_unset=True))
 
 
 @router.post("/me/onboarding", response_model=UserResponse)
 async def complete_onboarding(
     onboarding_data: UserOnboarding,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Complete user onboarding by setting fitness goals and profile.
     Implements FR-1: 用户引导与目标设定
     """
-    # TODO: Implement onboarding completion
-    # - Update user profile with onboarding data
-    # - Set onboarding_completed = True
-    # - Generate initial workout and nutrition plans
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Onboarding not yet implemented"
-    )
+    # TODO: Generate initial workout and nutrition plans
+    changes = onboarding_data.model_dump(exclude_unset=True)
+    changes["onboarding_completed"] = True
+
+    return await _update_profile(db, user_id, changes)
 
 
 @router.get("/me/profile")
@@ -86,3 +131,42 @@ async def get_user_profile(
         status_code=status.HTTP_501_NOT_IMPLEMENTED,
         detail="Profile retrieval not yet implemented"
     )
+
+
+@router.get("/me/usage")
+async def get_llm_usage(
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Get today's LLM token usage and the remaining daily quota.
+    """
+    used = await usage_ledger.tokens_used_today(user_id)
+    quota = settings.LLM_DAILY_TOKEN_QUOTA
+
+    return {
+        "tokens_used_today": used,
+        "daily_token_quota": quota or None,
+        "tokens_remaining": max(quota - used, 0) if quota else None
+    }
+
+
+async def _update_profile(db: AsyncSession, user_id: int, changes: Dict[str, Any]) -> User:
+    """
+    Apply profile changes and drop the user's cached agent context.
+    """
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    for field, value in changes.items():
+        setattr(user, field, value)
+
+    # Commit before invalidating so a concurrent read can't re-cache
+    # the old profile
+    await db.commit()
+    user_context_cache.invalidate(user_id)
+
+    return user
@@ -3,85 +3,108 @@ Workout API endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
-from app.agents.workout_planner import WorkoutPlannerAgent
+from app.core.database import AsyncSessionLocal, get_db
+from app.core.responses import FastJSONResponse
+from app.agents.registry import workout_agent
+from app.api.deps import current_user_id
+from app.api.jobs import enqueue_job
+from app.repositories.workout import WorkoutRepository
+from app.schemas.workout import WorkoutSessionLog
+from app.services.jobs import job_queue
+from app.services.user_context import user_context_cache
+from app.services.usage import QuotaExceededError
 from typing import Dict, Any
 
 router = APIRouter()
-workout_agent = WorkoutPlannerAgent()
+
+
+@job_queue.handler("workout_plan")
+async def run_workout_plan_job(payload: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    """
+    Generate a personalized workout plan for a user (background job).
+    """
+    async with AsyncSessionLocal() as db:
+        user_context = await user_context_cache.get(db, user_id)
+
+    # Fall back to a placeholder profile until onboarding data exists
+    user_profile = user_context.profile or {
+        "user_id": user_id,
+        "fitness_goal": "muscle_gain",
+        "experience_level": "intermediate",
+        "training_frequency": 5,
+        "equipment_access": "gym",
+        "age": 25,
+        "gender": "male"
+    }
+
+    # Generate workout plan using AI agent
+    plan = await workout_agent.generate_workout_plan(user_profile)
+
+    # TODO: Save plan to database
+
+    return {
+        "success": True,
+        "plan": plan,
+        "message": "训练计划已生成"
+    }
 
 
 @router.post("/plan/generate")
 async def generate_workout_plan(
-    db: AsyncSession = Depends(get_db)
+    wait: bool = False,
+    user_id: int = Depends(current_user_id)
 ):
     """
     Generate a personalized workout plan for the current user.
     Implements FR-2: 智能化训练计划定制
-    """
-    try:
-        # TODO: Get current user from auth
-        # For now, using placeholder user profile
-        user_profile = {
-            "user_id": 1,
-            "fitness_goal": "muscle_gain",
-            "experience_level": "intermediate",
-            "training_frequency": 5,
-            "equipment_access": "gym",
-            "age": 25,
-            "gender": "male"
-        }
 
-        # Generate workout plan using AI agent
-        plan = await workout_agent.generate_workout_plan(user_profile)
-
-        # TODO: Save plan to database
-
-        return {
-            "success": True,
-            "plan": plan,
-            "message": "训练计划已生成"
-        }
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate workout plan: {str(e)}"
-        )
+    Returns a job id immediately; poll /api/jobs/{job_id} or subscribe to
+    its events for the plan. With wait=true, returns the plan itself.
+    """
+    return await enqueue_job("workout_plan", {}, user_id, wait=wait)
 
 
 @router.get("/plan/current")
 async def get_current_workout_plan(
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get user's current active workout plan.
     """
-    # TODO: Fetch from database
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Not yet implemented"
-    )
+    plan = await WorkoutRepository(db).get_active_plan_view(user_id)
+    if plan is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active workout plan"
+        )
+
+    # Plain dicts of JSON types: skip jsonable_encoder
+    return FastJSONResponse(plan)
 
 
 @router.get("/plan/{plan_id}")
 async def get_workout_plan(
     plan_id: int,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get a specific workout plan by ID.
     """
-    # TODO: Fetch from database
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Not yet implemented"
-    )
+    plan = await WorkoutRepository(db).get_plan_view(plan_id, user_id)
+    if plan is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workout plan not found"
+        )
+
+    return FastJSONResponse(plan)
 
 
 @router.post("/session/log")
 async def log_workout_session(
-    session_data: Dict[str, Any],
+    session_data: WorkoutSessionLog,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -98,16 +121,18 @@ async def log_workout_session(
 @router.get("/sessions")
 async def get_workout_sessions(
     limit: int = 10,
+    user_id: int = Depends(current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get user's workout session history.
     """
-    # TODO: Fetch from database
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Not yet implemented"
-    )
+    sessions = await WorkoutRepository(db).get_sessions_view(user_id, limit=limit)
+
+    return FastJSONResponse({
+        "sessions": sessions,
+        "count": len(sessions)
+    })
 
 
 @router.post("/split/suggest")
@@ -132,6 +157,8 @@ async def suggest_workout_split(
             "suggestion": suggestion
         }
 
+    except QuotaExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -4,4 +4,5 @@
 包含应用的核心配置和基础设施代码：
 - config.py: 应用配置管理
 - database.py: 数据库连接和会话管理
+- telemetry.py: 请求追踪、Server-Timing 和 Prometheus 指标
 """
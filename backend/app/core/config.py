@@ -24,18 +24,163 @@ class Settings(BaseSettings):
 
     # LLM Configuration
     OPENAI_API_KEY: str = ""
+    # OpenAI-compatible endpoint, e.g. the local fake server; empty for the OpenAI API
+    LLM_BASE_URL: str = ""
     LLM_MODEL: str = "gpt-4-turbo-preview"
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 2000
+    # auto | tools | json_mode | prompt
+    LLM_STRUCTURED_OUTPUT: str = "auto"
+
+    # Model routing
+    # Small, fast model tried first for cheap methods; empty routes everything to LLM_MODEL
+    LLM_SMALL_MODEL: str = "gpt-3.5-turbo"
+    # Per-method cascade overrides, e.g. "workout.split=large;fitness.intent=small>large"
+    LLM_ROUTES: str = ""
+    # Build the agents (langchain, the OpenAI client) in the background after startup
+    # rather than on the first request that needs one
+    AGENT_PRELOAD: bool = True
+
+    # LLM scheduling
+    LLM_CONCURRENCY_INITIAL: int = 8
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 64
+    # Calls slower than this multiple of their usual latency shrink the limit; 0 disables
+    LLM_LATENCY_TOLERANCE: float = 2.0
+    LLM_MAX_RETRIES: int = 2
+
+    # Usage accounting
+    # Per-user daily LLM token quota (prompt + completion); 0 disables
+    LLM_DAILY_TOKEN_QUOTA: int = 0
+    LLM_USAGE_FLUSH_INTERVAL_SECONDS: int = 30
+    LLM_USAGE_FLUSH_BATCH_SIZE: int = 500
+
+    # Background jobs
+    # memory (this process's workers) | postgres (SELECT ... FOR UPDATE SKIP LOCKED, shared by several workers)
+    JOB_BACKEND: str = "memory"
+    JOB_WORKERS: int = 4
+    JOB_MAX_ATTEMPTS: int = 3
+    # Delay before the first retry, doubled per attempt
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    # Running jobs not finished within this time are claimed again (postgres backend)
+    JOB_STALE_AFTER_SECONDS: int = 600
+
+    # Weekly reports
+    # Generate every active user's report for the last complete week on a schedule
+    WEEKLY_REPORT_BATCH_ENABLED: bool = False
+    # UTC weekday (0 = Monday) and hour of the batch
+    WEEKLY_REPORT_BATCH_WEEKDAY: int = 0
+    WEEKLY_REPORT_BATCH_HOUR: int = 2
+    # Users per aggregate query and commit (the resume checkpoint)
+    WEEKLY_REPORT_CHUNK_SIZE: int = 500
+    # Report generations in flight
+    WEEKLY_REPORT_CONCURRENCY: int = 16
+
+    # Meal plans
+    # Days a food may appear in a week of plans
+    MEAL_PLAN_MAX_WEEKLY_USES: int = 3
+
+    # Chat sessions (WebSocket)
+    # Estimated tokens of conversation history sent with each message; oldest messages are dropped first
+    CHAT_HISTORY_TOKEN_BUDGET: int = 2000
+    # Open sockets per worker; further connections are closed with 1013
+    CHAT_WS_MAX_CONNECTIONS: int = 2000
+    CHAT_WS_HEARTBEAT_SECONDS: float = 20.0
+    # Clients that send nothing (pongs included) for this long are disconnected
+    CHAT_WS_IDLE_TIMEOUT_SECONDS: float = 60.0
+    # Clients that don't take a frame within this time are disconnected
+    CHAT_WS_SEND_TIMEOUT_SECONDS: float = 10.0
+
+    # Responses
+    # Compress responses at least this large with brotli or gzip, as the client accepts; 0 disables
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6
+    # 0-11; 4 is about as small as gzip level 6 in half the time, 5+ smaller but slower
+    RESPONSE_BROTLI_QUALITY: int = 4
+
+    # Caching
+    USER_CONTEXT_CACHE_TTL_SECONDS: int = 300
+    USER_CONTEXT_CACHE_MAX_SIZE: int = 10000
+    FOOD_CATALOG_CACHE_TTL_SECONDS: int = 3600
+
+    # Readiness
+    # Pool connections opened at startup, before /ready reports ready
+    READINESS_DB_CONNECTIONS: int = 5
+    # Each startup warmup step fails after this long
+    READINESS_WARMUP_TIMEOUT_SECONDS: float = 30.0
+    # /ready re-checks the database, and retries failed warmup steps, at most this often
+    READINESS_RECHECK_SECONDS: float = 10.0
+    READINESS_LLM_CHECK_SECONDS: float = 60.0
+    READINESS_LLM_TIMEOUT_SECONDS: float = 5.0
+
+    # Observability
+    SERVER_TIMING_ENABLED: bool = True
+    # Log the span tree of requests slower than this; 0 disables
+    SLOW_REQUEST_LOG_MS: int = 2000
+    # OTLP/HTTP collector, e.g. http://localhost:4318; empty disables export
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = ""
+    OTEL_SERVICE_NAME: str = "fitness-planner-backend"
 
     # Vector Database
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
     CHROMA_COLLECTION_NAME: str = "fitness_knowledge"
 
+    # Knowledge base
+    # Guides chunked and embedded by python -m app.knowledge.ingest
+    KNOWLEDGE_CORPUS_DIRECTORY: str = "./knowledge_base"
+    # Inject the chunks relevant to each chat message into the prompt
+    RAG_ENABLED: bool = True
+    RAG_TOP_K: int = 3
+    # Chunks farther than this cosine distance from the message are left out
+    RAG_MAX_DISTANCE: float = 0.92
+    RAG_CHUNK_CHARS: int = 500
+    RAG_CHUNK_OVERLAP_CHARS: int = 80
+    # hashing (built in, no model files) | minilm (ONNX all-MiniLM-L6-v2 from EMBEDDING_MODEL_DIRECTORY, English only)
+    EMBEDDING_MODEL: str = "hashing"
+    EMBEDDING_MODEL_DIRECTORY: str = "./models/all-MiniLM-L6-v2"
+    # Vector size of the hashing embedder
+    EMBEDDING_DIMENSIONS: int = 2048
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    # Content-addressed store of document embeddings; empty uses CHROMA_PERSIST_DIRECTORY/embedding_cache
+    EMBEDDING_CACHE_DIRECTORY: str = ""
+    # Query embeddings requested within this window are computed in one batch
+    EMBEDDING_BATCH_WINDOW_MS: float = 2.0
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+
     # Security
     SECRET_KEY: str = "change-this-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Reject requests without a bearer token; when off they act as user 1 (development)
+    AUTH_REQUIRED: bool = False
+    # bcrypt cost; hashes made with another cost are replaced at the next login
+    BCRYPT_ROUNDS: int = 12
+    # Password hashes computed at once, in threads off the event loop
+    PASSWORD_HASH_WORKERS: int = 2
+    # Verified access tokens kept until they expire
+    TOKEN_CACHE_SIZE: int = 10000
+    # Account status of authenticated users, cached per user
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+    AUTH_USER_CACHE_MAX_SIZE: int = 10000
+
+    # Rate limiting
+    # Token buckets per user (client address without a token) in front of /api routes
+    RATE_LIMIT_ENABLED: bool = True
+    # memory (per worker) | redis (shared by all workers; needs the redis package)
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    # Requests per minute and burst to routes that don't call the LLM; 0 disables
+    RATE_LIMIT_API_PER_MINUTE: int = 300
+    RATE_LIMIT_API_BURST: int = 60
+    # Requests per minute and burst to routes that call the LLM; 0 disables
+    RATE_LIMIT_LLM_PER_MINUTE: int = 10
+    RATE_LIMIT_LLM_BURST: int = 5
+    # Expected LLM tokens per minute and burst; each LLM request costs its route's estimate
+    RATE_LIMIT_LLM_TOKENS_PER_MINUTE: int = 20000
+    RATE_LIMIT_LLM_TOKENS_BURST: int = 30000
+    # Buckets kept per worker by the memory backend
+    RATE_LIMIT_MAX_KEYS: int = 100000
 
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173"]
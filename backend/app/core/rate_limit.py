@@ -0,0 +1,355 @@
+"""
+Per-user rate limiting with token buckets.
+
+Every /api request takes from token buckets keyed by the caller: the user
+of a valid access token, or the client address without one. Routes fall
+into two classes:
+
+- llm: routes that call the model (LLM_ROUTE_TOKENS). Each request takes
+  one request from the llm bucket and its route's expected LLM tokens from
+  a separate token bucket, so a plan generation spends the caller's budget
+  faster than a food parse.
+- api: everything else, which only reads and writes the database.
+
+A request either takes from all of its buckets or from none; when one is
+short, the request is answered 429 with a Retry-After of the seconds until
+all of them hold enough. Buckets refill continuously at their rate up to
+their burst size.
+
+Checks are O(1) and never touch the database: the caller comes from the
+verified token cache, and buckets live in process memory (memory backend,
+per worker) or in Redis (redis backend, shared by all workers, one script
+call per request). A Redis failure lets requests through rather than
+failing them.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from starlette.datastructures import Headers
+from app.core.config import settings
+from app.core.responses import FastJSONResponse
+from app.core.security import InvalidTokenError, access_tokens
+from app.core.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ("memory", "redis")
+
+RATE_LIMITED = metrics.counter("rate_limited_requests_total", "Requests rejected by the rate limiter", ["route_class"])
+
+# Expected LLM tokens (prompt + completion) of one request to each route
+# that calls the model. Routes missing here are limited as api routes; the
+# weekly report is one of them, as it is normally read from the stored
+# batch report (generating it on demand is a job, gated by the daily quota).
+LLM_ROUTE_TOKENS: Dict[Tuple[str, str], int] = {
+    ("POST", "/api/chat/message"): 2500,
+    ("POST", "/api/chat/onboarding"): 2000,
+    ("POST", "/api/workouts/plan/generate"): 6000,
+    ("POST", "/api/workouts/split/suggest"): 1500,
+    ("POST", "/api/nutrition/plan/generate"): 5000,
+    ("POST", "/api/nutrition/meal-plan/generate"): 4000,
+    ("POST", "/api/nutrition/meal/parse"): 800,
+    ("POST", "/api/nutrition/meals/analyze"): 1500,
+    ("POST", "/api/progress/analyze/training"): 2500,
+    ("POST", "/api/progress/analyze/body-metrics"): 2000,
+    ("POST", "/api/progress/adjustments/suggest"): 2500,
+    ("POST", "/api/progress/health-check"): 1500,
+}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Refill rate (per second) and capacity of a token bucket."""
+    rate: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, amount: float, burst: float) -> Optional["Limit"]:
+        """A limit of ``amount`` per minute; None (unlimited) when amount is 0."""
+        return cls(amount / 60, max(burst, 1)) if amount > 0 else None
+
+
+# (bucket key, limit, cost)
+Take = Tuple[str, Limit, float]
+
+
+class RateLimitBackend:
+    """Bucket storage."""
+
+    name = "base"
+
+    async def take(self, takes: Sequence[Take]) -> float:
+        """
+        Take each cost from its bucket, from all of them or from none.
+
+        Returns:
+            0 if taken, else the seconds until every bucket holds its cost
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in this process; every worker limits on its own.
+
+    Args:
+        max_keys: Buckets kept; the least recently used are dropped beyond it
+        clock: Monotonic time source in seconds
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> [tokens, updated at]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, takes: Sequence[Take]) -> float:
+        now = self.clock()
+        levels = []
+        wait = 0.0
+        for key, limit, cost in takes:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = limit.burst
+            else:
+                tokens = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / limit.rate)
+        if wait:
+            return wait
+
+        for (key, limit, cost), tokens in zip(takes, levels):
+            self._buckets[key] = [tokens - cost, now]
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._buckets), "max_keys": self.max_keys}
+
+
+# KEYS: bucket keys; ARGV: rate, burst, cost per key. Uses the server clock
+# so workers on different hosts agree.
+TAKE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = burst
+    if state[1] then
+        tokens = math.min(burst, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * rate)
+    end
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - tonumber(ARGV[3 * i])), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return '0'
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in Redis, shared by every worker.
+
+    Each check is one atomic script call. Keys expire once their bucket
+    would be full again, so idle callers take no memory.
+
+    Args:
+        url: Redis URL, e.g. redis://localhost:6379/0
+        prefix: Key prefix
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.url = url
+        self.prefix = prefix
+        # A slow or unreachable Redis must not hold requests up
+        self._client = redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._script = self._client.register_script(TAKE_SCRIPT)
+        self.errors = 0
+
+    async def take(self, takes: Sequence[Take]) -> float:
+        args: List[float] = []
+        for _, limit, cost in takes:
+            args += [limit.rate, limit.burst, cost]
+        try:
+            wait = await self._script(keys=[self.prefix + key for key, _, _ in takes], args=args)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limit check failed, letting the request through: %s", e)
+            return 0.0
+        return float(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"errors": self.errors}
+
+
+class RateLimiter:
+    """
+    Classifies requests and takes from the caller's buckets.
+
+    Args:
+        backend: Bucket storage
+        api_limit: Requests to api routes; None for no limit
+        llm_limit: Requests to llm routes; None for no limit
+        llm_token_limit: Expected LLM tokens of llm routes; None for no limit
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        api_limit: Optional[Limit],
+        llm_limit: Optional[Limit],
+        llm_token_limit: Optional[Limit],
+    ):
+        self.backend = backend
+        self.api_limit = api_limit
+        self.llm_limit = llm_limit
+        self.llm_token_limit = llm_token_limit
+        self.allowed = {"api": 0, "llm": 0}
+        self.rejected = {"api": 0, "llm": 0}
+
+    def takes(self, identity: str, method: str, path: str) -> Tuple[str, List[Take]]:
+        """Route class of a request and what it takes from which bucket."""
+        expected_tokens = LLM_ROUTE_TOKENS.get((method, path))
+        if expected_tokens is None:
+            return "api", [(f"api:{identity}", self.api_limit, 1)] if self.api_limit else []
+
+        takes: List[Take] = []
+        if self.llm_limit:
+            takes.append((f"llm:{identity}", self.llm_limit, 1))
+        if self.llm_token_limit:
+            # Capped at the burst, or the route could never run
+            cost = min(expected_tokens, self.llm_token_limit.burst)
+            takes.append((f"llm_tokens:{identity}", self.llm_token_limit, cost))
+        return "llm", takes
+
+    async def check(self, identity: str, method: str, path: str) -> float:
+        """
+        Take a request's cost from the caller's buckets.
+
+        Returns:
+            0 if the request may run, else the seconds to wait
+        """
+        route_class, takes = self.takes(identity, method, path)
+        wait = await self.backend.take(takes) if takes else 0.0
+        if wait:
+            self.rejected[route_class] += 1
+            RATE_LIMITED.inc(route_class=route_class)
+        else:
+            self.allowed[route_class] += 1
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        limits = {"api": self.api_limit, "llm": self.llm_limit, "llm_tokens": self.llm_token_limit}
+        return {
+            "backend": self.backend.name,
+            "limits": {
+                name: {"per_minute": round(limit.rate * 60, 2), "burst": limit.burst} if limit else None
+                for name, limit in limits.items()
+            },
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            **self.backend.stats(),
+        }
+
+
+def request_identity(scope: Dict[str, Any]) -> str:
+    """
+    Bucket owner of a request: the user of a valid bearer token, else the client address.
+
+    Invalid tokens fall back to the address; authentication rejects them later.
+    """
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            return f"user:{access_tokens.verify(token)['sub']}"
+        except InvalidTokenError:
+            pass
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def retry_after(wait: float) -> int:
+    """Whole seconds for a Retry-After header."""
+    return max(math.ceil(wait), 1)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that answers 429 to /api requests over the caller's limits.
+
+    Other paths (health checks, stats, metrics, docs) and WebSockets are not
+    limited; WebSocket chat messages are checked per message by the session.
+    """
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        wait = await self.limiter.check(request_identity(scope), scope["method"], scope["path"])
+        if wait:
+            response = FastJSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(retry_after(wait))},
+                content={"detail": "请求过于频繁，请稍后再试", "retry_after": retry_after(wait)},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def create_backend() -> RateLimitBackend:
+    """Rate limit backend selected by RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        try:
+            return RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.warning(
+                "RATE_LIMIT_BACKEND is redis but the redis package is not installed; "
+                "limiting per worker in memory"
+            )
+    return InMemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(
+    backend=create_backend(),
+    api_limit=Limit.per_minute(settings.RATE_LIMIT_API_PER_MINUTE, settings.RATE_LIMIT_API_BURST),
+    llm_limit=Limit.per_minute(settings.RATE_LIMIT_LLM_PER_MINUTE, settings.RATE_LIMIT_LLM_BURST),
+    llm_token_limit=Limit.per_minute(settings.RATE_LIMIT_LLM_TOKENS_PER_MINUTE, settings.RATE_LIMIT_LLM_TOKENS_BURST),
+)
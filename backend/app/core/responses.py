@@ -0,0 +1,162 @@
+"""
+Fast JSON responses and negotiated compression.
+
+``FastJSONResponse`` renders content with orjson instead of the standard
+library encoder. Pydantic models are dumped without validation, so an
+endpoint that returns ``FastJSONResponse(SomeResponse(...))`` is validated
+once, when the model is built, instead of being dumped, re-validated
+against ``response_model`` and re-encoded by FastAPI. Returning a response
+also skips FastAPI's ``jsonable_encoder`` pass, which walks every value of
+large plan and history payloads in Python.
+
+``CompressionMiddleware`` compresses responses of at least
+RESPONSE_COMPRESSION_MIN_BYTES with brotli or gzip, whichever the client
+prefers in ``Accept-Encoding``. Streamed responses (server-sent events) are
+passed through unchanged so events are not held back in a buffer.
+"""
+import gzip
+import logging
+from typing import Any, Dict, Optional, Tuple
+import orjson
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Content types worth compressing; everything else (images, event streams) passes through
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv", "application/javascript")
+
+
+def _default(value: Any) -> Any:
+    """Types orjson doesn't serialize natively."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # Decimal and similar numeric types, as jsonable_encoder does
+    if hasattr(value, "as_integer_ratio"):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content (dicts, lists, Pydantic models) to compact UTF-8 JSON."""
+    if isinstance(content, BaseModel):
+        # Faster than model_dump_json for models with extra fields
+        content = content.model_dump(by_alias=True)
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Compression
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response encoding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Header value, e.g. "gzip, deflate, br;q=0.9"
+
+    Returns:
+        "br", "gzip" or None; ties prefer br
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [("br", 2), ("gzip", 1)] if brotli is not None else [("gzip", 1)]
+    best: Tuple[float, int, Optional[str]] = (0.0, 0, None)
+    for name, preference in candidates:
+        weight = weights.get(name, wildcard)
+        if weight > 0 and (weight, preference) > best[:2]:
+            best = (weight, preference, name)
+    return best[2]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a response body with the negotiated encoding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses large responses with brotli or gzip.
+
+    Only single-message bodies of a compressible content type with no
+    Content-Encoding of their own are compressed. Smaller responses are sent
+    as they are, since compressing them costs more than it saves.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held until the first body message shows whether to compress
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
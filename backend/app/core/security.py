@@ -0,0 +1,183 @@
+"""
+Password hashing and access tokens.
+
+bcrypt is slow on purpose (a few hundred milliseconds per hash at the
+default cost), so hashing and checking passwords never run on the event
+loop. They run in a small dedicated thread pool, where bcrypt releases the
+GIL; a login storm queues for the pool while every other request keeps
+being served.
+
+Access tokens are JWTs carrying the user id. Clients send the same token
+with every request until it expires, so verified claims are kept in a small
+LRU keyed by the token and reused until the token's expiry; only tokens
+that verified are cached.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+import bcrypt
+from jose import JWTError, jwt
+from app.core.config import settings
+from app.core.telemetry import metrics, span
+
+T = TypeVar("T")
+
+PASSWORD_HASH_DURATION = metrics.histogram(
+    "password_hash_seconds",
+    "Time from queueing a bcrypt hash or check to its result",
+    ["operation"],
+)
+
+
+class InvalidTokenError(Exception):
+    """The access token is malformed, has a bad signature or has expired."""
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and checking in a bounded thread pool.
+
+    Args:
+        rounds: bcrypt cost factor (log2 of the iterations)
+        workers: Hashes computed at once; further calls wait for the pool
+    """
+
+    def __init__(self, rounds: int, workers: int):
+        self.rounds = rounds
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Checked when the user doesn't exist, so unknown usernames take as
+        # long as wrong passwords
+        self._dummy_hash: Optional[bytes] = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.hashes = 0
+        self.checks = 0
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with a new salt."""
+        hashed = await self._run("hash", bcrypt.hashpw, password.encode(), bcrypt.gensalt(self.rounds))
+        self.hashes += 1
+        return hashed.decode()
+
+    async def verify(self, password: str, hashed: Optional[str]) -> bool:
+        """Check a password against a stored hash; False (after the same work) when there is none."""
+        if hashed is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = await self._run("hash", bcrypt.hashpw, b"-", bcrypt.gensalt(self.rounds))
+            await self._run("verify", bcrypt.checkpw, password.encode(), self._dummy_hash)
+            return False
+        self.checks += 1
+        return await self._run("verify", bcrypt.checkpw, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Whether a stored hash was made with a different cost than the current one."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "hashes": self.hashes,
+            "checks": self.checks,
+        }
+
+    async def _run(self, operation: str, fn: Callable[..., T], *args: Any) -> T:
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        start = time.perf_counter()
+        try:
+            with span(f"auth.{operation}", "auth"):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_HASH_DURATION.observe(time.perf_counter() - start, operation=operation)
+
+
+class AccessTokens:
+    """
+    Issues access tokens and verifies them through an LRU of verified claims.
+
+    Args:
+        secret_key: Signing key
+        algorithm: JWT algorithm, e.g. HS256
+        expire_minutes: Token lifetime
+        cache_size: Verified tokens kept; 0 disables the cache
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, expire_minutes: int, cache_size: int):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.expire_minutes = expire_minutes
+        self.cache_size = cache_size
+        self._verified: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def create(self, user_id: int) -> str:
+        """A signed token for a user, valid for ``expire_minutes``."""
+        now = int(time.time())
+        claims = {"sub": str(user_id), "iat": now, "exp": now + self.expire_minutes * 60}
+        return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Verified claims of a token.
+
+        Raises:
+            InvalidTokenError: The token is invalid or has expired
+        """
+        entry = self._verified.get(token)
+        if entry is not None:
+            expires_at, claims = entry
+            if expires_at > time.time():
+                self._verified.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._verified[token]
+
+        self.misses += 1
+        try:
+            claims = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            int(claims["sub"])
+        except (JWTError, KeyError, TypeError, ValueError) as e:
+            self.rejected += 1
+            raise InvalidTokenError(str(e)) from e
+
+        if self.cache_size and "exp" in claims:
+            self._verified[token] = (claims["exp"], claims)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return claims
+
+    def clear(self) -> None:
+        self._verified.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._verified),
+            "max_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(rounds=settings.BCRYPT_ROUNDS, workers=settings.PASSWORD_HASH_WORKERS)
+
+access_tokens = AccessTokens(
+    secret_key=settings.SECRET_KEY,
+    algorithm=settings.ALGORITHM,
+    expire_minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES,
+    cache_size=settings.TOKEN_CACHE_SIZE,
+)
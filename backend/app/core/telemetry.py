@@ -0,0 +1,388 @@
+"""
+Request telemetry: per-request span trees, Prometheus metrics and optional
+OpenTelemetry export.
+
+Each HTTP request gets a span tree. LLM calls (via the LangChain callback
+handler in app.agents.callbacks), database queries (via engine events) and
+output parsing add child spans to whichever span is current. When the response starts, the tree is
+summarized per category into a ``Server-Timing`` header; when the request
+finishes, its totals feed the metrics served by ``/metrics``, slow requests
+are logged with their full tree, and the tree is exported to an OTLP
+collector if one is configured.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+INF_BUCKET = 'le="+Inf"'
+
+
+class Span:
+    """A timed operation within a request."""
+
+    __slots__ = ("name", "category", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, category: str, start: float, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "category": self.category,
+            "duration_ms": round(self.duration_ms, 2),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"children": [child.to_dict() for child in self.children]} if self.children else {}),
+        }
+
+
+class RequestTrace:
+    """Span tree of one HTTP request."""
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.wall_start_ns = time.time_ns()
+        self.root = Span("request", "app", time.perf_counter(), {"http.method": self.method, "http.target": self.path})
+
+    @property
+    def route(self) -> str:
+        """Matched route template, e.g. /api/workouts/plan/{plan_id}."""
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+    def to_unix_ns(self, perf_time: float) -> int:
+        return self.wall_start_ns + int((perf_time - self.root.start) * 1e9)
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """
+        Total duration (ms) and span count per category.
+
+        "app" spans only group other spans (the root, agent calls) and are
+        left out.
+        """
+        totals: Dict[str, Tuple[float, int]] = {}
+        for span in self.root.walk():
+            if span.category == "app":
+                continue
+            duration, count = totals.get(span.category, (0.0, 0))
+            totals[span.category] = (duration + span.duration_ms, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per category plus the total."""
+        entries = [
+            f'{category};dur={duration:.1f};desc="{count}"'
+            for category, (duration, count) in sorted(self.totals().items())
+        ]
+        entries.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, category: str = "app", **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the current span.
+
+    Does nothing outside a traced request.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, category, time.perf_counter(), attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def record_span(
+    name: str,
+    category: str,
+    start: float,
+    end: float,
+    parent: Optional[Span] = None,
+    **attributes: Any
+) -> None:
+    """Attach an already timed operation to ``parent`` (default: the current span)."""
+    parent = parent or _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, category, start, attributes)
+    child.end = end
+    parent.children.append(child)
+
+
+# Metrics
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with labels."""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> (bucket counts, sum, count)
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (bucket_counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, description, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+HTTP_DURATION = metrics.histogram("http_request_duration_seconds", "HTTP request duration", ("method", "route"))
+LLM_REQUESTS = metrics.counter("llm_requests_total", "LLM calls", ("model", "status"))
+LLM_DURATION = metrics.histogram("llm_request_duration_seconds", "LLM call duration", ("model",))
+LLM_TOKENS = metrics.counter("llm_tokens_total", "LLM tokens", ("model", "type"))
+DB_QUERIES = metrics.counter("db_queries_total", "Database queries")
+DB_DURATION = metrics.histogram("db_query_duration_seconds", "Database query duration", buckets=DB_BUCKETS)
+PARSE_DURATION = metrics.histogram("llm_output_parse_duration_seconds", "Structured output parse duration", ("schema",), DB_BUCKETS)
+
+
+# Hooks
+
+def instrument_engine(engine) -> None:
+    """Record database query spans and metrics for an async engine."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._telemetry_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_telemetry_start", None)
+        if start is None:
+            return
+        end = time.perf_counter()
+        DB_QUERIES.inc()
+        DB_DURATION.observe(end - start)
+        record_span("db", "db", start, end, operation=statement.lstrip().split(None, 1)[0].upper())
+
+
+# OpenTelemetry
+
+class OTelExporter:
+    """Exports finished request traces to an OTLP/HTTP collector."""
+
+    def __init__(self, endpoint: str, service_name: str):
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.trace import set_span_in_context
+
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces"))
+        )
+        self.tracer = provider.get_tracer(__name__)
+        self._set_span_in_context = set_span_in_context
+
+    def export(self, trace: RequestTrace) -> None:
+        self._export_span(trace, trace.root, None)
+
+    def _export_span(self, trace: RequestTrace, span: Span, context) -> None:
+        attributes = {"category": span.category, **span.attributes}
+        otel_span = self.tracer.start_span(
+            span.name,
+            context=context,
+            start_time=trace.to_unix_ns(span.start),
+            attributes={key: value for key, value in attributes.items() if value is not None},
+        )
+        child_context = self._set_span_in_context(otel_span)
+        for child in span.children:
+            self._export_span(trace, child, child_context)
+        otel_span.end(end_time=trace.to_unix_ns(span.end if span.end is not None else time.perf_counter()))
+
+
+def create_exporter() -> Optional[OTelExporter]:
+    """OTLP exporter if an endpoint is configured and the SDK is installed."""
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    try:
+        return OTelExporter(settings.OTEL_EXPORTER_OTLP_ENDPOINT, settings.OTEL_SERVICE_NAME)
+    except ImportError:
+        logger.warning(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk and "
+            "opentelemetry-exporter-otlp-proto-http are not installed; traces will not be exported"
+        )
+        return None
+
+
+# Middleware
+
+class TelemetryMiddleware:
+    """
+    ASGI middleware that traces each HTTP request.
+
+    Adds a Server-Timing header, updates HTTP metrics, logs requests slower
+    than SLOW_REQUEST_LOG_MS with their span tree and exports traces.
+    """
+
+    def __init__(self, app, exporter: Optional[OTelExporter] = None):
+        self.app = app
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            trace.root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._finish(trace, status_code)
+
+    def _finish(self, trace: RequestTrace, status_code: int) -> None:
+        # Route templates keep label cardinality bounded
+        route = trace.route
+        duration = trace.root.duration_ms / 1000
+        trace.root.attributes.update({"http.route": route, "http.status_code": status_code})
+
+        HTTP_REQUESTS.inc(method=trace.method, route=route, status=status_code)
+        HTTP_DURATION.observe(duration, method=trace.method, route=route)
+
+        if settings.SLOW_REQUEST_LOG_MS and trace.root.duration_ms >= settings.SLOW_REQUEST_LOG_MS:
+            logger.warning(
+                "Slow request %s %s %.0fms: %s",
+                trace.method,
+                trace.path,
+                trace.root.duration_ms,
+                json.dumps(trace.root.to_dict(), ensure_ascii=False),
+            )
+
+        if self.exporter is not None:
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("Failed to export trace: %s", e)
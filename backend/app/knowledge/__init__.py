@@ -0,0 +1,27 @@
+"""
+Knowledge base for retrieval-augmented chat.
+
+Guides in the corpus directory are chunked and embedded offline into the
+configured Chroma collection; chat retrieves the few chunks relevant to
+each message instead of carrying all the material in the system prompt.
+"""
+from app.knowledge.chunking import Chunk, chunk_markdown
+from app.knowledge.embeddings import HashingEmbedder, MiniLMEmbedder, content_key, create_embedder
+from app.knowledge.embedding_service import EmbeddingService, EmbeddingStore, embedding_service
+from app.knowledge.store import KnowledgeBase, RetrievedChunk, knowledge_base, render_references
+
+__all__ = [
+    "Chunk",
+    "chunk_markdown",
+    "HashingEmbedder",
+    "MiniLMEmbedder",
+    "content_key",
+    "create_embedder",
+    "EmbeddingService",
+    "EmbeddingStore",
+    "embedding_service",
+    "KnowledgeBase",
+    "RetrievedChunk",
+    "knowledge_base",
+    "render_references",
+]
@@ -0,0 +1,137 @@
+"""
+Markdown chunking for the knowledge base.
+
+Guides are split at headings first, so a chunk never mixes two exercises
+or topics, and every chunk carries its heading path as a title. Sections
+longer than the chunk size are packed paragraph by paragraph, and
+paragraphs that are still too long are packed sentence by sentence. When a
+section spans several chunks, each one repeats the last sentences of the
+previous chunk (up to the overlap size) so a point split across the
+boundary is still readable in either chunk.
+
+Chunk ids are derived from the chunk's title and text rather than its
+position, so editing one section of a guide leaves the ids of every other
+chunk unchanged.
+"""
+import re
+from dataclasses import dataclass, replace
+from typing import Iterator, List, Tuple
+
+from app.knowledge.embeddings import content_key
+
+HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*$")
+SENTENCE_END = re.compile(r"(?<=[。！？；!?;])|\n")
+TITLE_SEPARATOR = " > "
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A piece of a guide, small enough to inject into a prompt."""
+    id: str
+    source: str
+    title: str
+    text: str
+    position: int
+
+    @property
+    def embedding_text(self) -> str:
+        """Title and text; headings often name what the text is about."""
+        return f"{self.title}\n{self.text}"
+
+    def metadata(self) -> dict:
+        return {"source": self.source, "title": self.title, "position": self.position}
+
+
+def _sections(text: str) -> Iterator[Tuple[str, str]]:
+    """(heading path, body) of each section that has a body."""
+    path: List[Tuple[int, str]] = []
+    body: List[str] = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            return TITLE_SEPARATOR.join(title for _, title in path), content
+        return None
+
+    for line in text.splitlines():
+        match = HEADING.match(line)
+        if not match:
+            body.append(line)
+            continue
+        section = flush()
+        if section:
+            yield section
+        body = []
+        level = len(match.group(1))
+        path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+
+    section = flush()
+    if section:
+        yield section
+
+
+def _units(body: str, max_chars: int) -> List[str]:
+    """Paragraphs of a section, with over-long paragraphs split into sentences."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", body):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            sentence = sentence.strip()
+            # A sentence longer than a chunk is cut; guides rarely have one
+            units.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+    return units
+
+
+def _pack(units: List[str], max_chars: int, overlap_chars: int) -> List[str]:
+    """Pack units into chunks of about ``max_chars`` (joins not counted), overlapping by trailing units."""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for unit in units:
+        if current and size + len(unit) > max_chars:
+            chunks.append(current)
+            # Carry trailing units into the next chunk while they fit the overlap
+            carried: List[str] = []
+            for previous in reversed(current):
+                if sum(map(len, carried)) + len(previous) > overlap_chars:
+                    break
+                carried.insert(0, previous)
+            current = carried if sum(map(len, carried)) + len(unit) <= max_chars else []
+            size = sum(map(len, current))
+        current.append(unit)
+        size += len(unit)
+    if current:
+        chunks.append(current)
+    return ["\n".join(chunk) for chunk in chunks]
+
+
+def chunk_markdown(text: str, source: str, max_chars: int = 500, overlap_chars: int = 80) -> List[Chunk]:
+    """
+    Split a markdown guide into chunks.
+
+    Args:
+        text: Markdown source
+        source: Name the chunks are attributed to (e.g. the file name)
+        max_chars: Maximum characters of chunk text (excluding the title)
+        overlap_chars: Maximum characters repeated from the previous chunk
+            of the same section
+
+    Returns:
+        Chunks in document order, with ids ``<source>#<content hash prefix>``;
+        repeated chunks (same title and text) are kept once
+    """
+    chunks = []
+    seen = set()
+    for title, body in _sections(text):
+        for piece in _pack(_units(body, max_chars), max_chars, overlap_chars):
+            chunk = Chunk(id="", source=source, title=title, text=piece, position=len(chunks))
+            chunk_id = f"{source}#{content_key(chunk.embedding_text)[:16]}"
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                chunks.append(replace(chunk, id=chunk_id))
+    return chunks
@@ -0,0 +1,318 @@
+"""
+Embedding service: content-addressed caching and micro-batching.
+
+Document embeddings are stored on disk keyed by the SHA-256 of the
+embedded text, in a memory-mapped float32 matrix with one row per text.
+Re-ingesting the corpus after a deploy or an edit only computes the
+embeddings of chunks whose text changed; everything else is read back from
+the map.
+
+Query embeddings are cached in memory (LRU, also keyed by content hash).
+Concurrent cache misses that arrive within a few milliseconds of each
+other are embedded in a single call, which is what makes a model-based
+embedder affordable under load: its cost is dominated by the per-call
+overhead, not by the extra texts in the batch. Identical queries in
+flight at the same time share one embedding.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.knowledge.embeddings import content_key, create_embedder, embed_batched
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.txt"
+
+# Rows added to the vector file when it fills up (at least; it doubles)
+MIN_GROWTH_ROWS = 1024
+
+# Batches kept for the percentiles in stats()
+LATENCY_WINDOW = 1000
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk map from content hash to embedding.
+
+    Vectors live in ``vectors.f32`` (a raw float32 matrix, memory-mapped
+    and grown by doubling) and their keys in ``keys.txt``, one per line, in
+    row order. Vectors are flushed before their keys are appended, so a
+    crash mid-write leaves at most unused rows, never a key without its
+    vector. One store holds one embedding model's vectors.
+    """
+
+    def __init__(self, directory: str, dimensions: int):
+        self.directory = Path(directory)
+        self.dimensions = dimensions
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / VECTORS_FILE
+        self._keys_path = self.directory / KEYS_FILE
+        self._lock = threading.Lock()
+
+        row_bytes = 4 * dimensions
+        capacity = self._vectors_path.stat().st_size // row_bytes if self._vectors_path.exists() else 0
+        keys = self._keys_path.read_text(encoding="ascii").split() if self._keys_path.exists() else []
+        if len(keys) > capacity:
+            logger.warning("Embedding store %s has %d keys for %d vectors; ignoring the rest", directory, len(keys), capacity)
+            keys = keys[:capacity]
+        self._rows: Dict[str, int] = {key: row for row, key in enumerate(keys)}
+        self._size = len(keys)
+        self._vectors: Optional[np.memmap] = None
+        self._open(capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def _open(self, capacity: int) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        if capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        self.capacity = capacity
+
+    def get(self, keys: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up vectors by key.
+
+        Returns:
+            An (n, dimensions) array with the stored vectors filled in, and
+            the indices of the keys that were not found (their rows are zero)
+        """
+        vectors = np.zeros((len(keys), self.dimensions), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._rows.get(key)
+                if row is None:
+                    missing.append(i)
+                else:
+                    vectors[i] = self._vectors[row]
+        return vectors, missing
+
+    def put(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        """Append vectors for keys not stored yet."""
+        with self._lock:
+            new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+            # Same text twice in one call
+            new = list({key: vector for key, vector in new}.items())
+            if not new:
+                return
+
+            needed = self._size + len(new)
+            if needed > self.capacity:
+                capacity = max(needed, 2 * self.capacity, MIN_GROWTH_ROWS)
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(capacity * 4 * self.dimensions)
+                self._open(capacity)
+
+            start = self._size
+            self._vectors[start:needed] = np.stack([vector for _, vector in new])
+            self._vectors.flush()
+            with open(self._keys_path, "a", encoding="ascii") as f:
+                f.write("".join(f"{key}\n" for key, _ in new))
+            for offset, (key, _) in enumerate(new):
+                self._rows[key] = start + offset
+            self._size = needed
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of a window of timings; 0 when empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class EmbeddingService:
+    """
+    Embeds documents through the on-disk store and queries through an LRU
+    cache and a micro-batcher.
+
+    The embedder and the store are created on first use.
+    """
+
+    def __init__(
+        self,
+        embedder_factory,
+        cache_directory: str,
+        query_cache_size: int = 2048,
+        batch_window_ms: float = 2.0,
+        max_batch_size: int = 64,
+    ):
+        self.cache_directory = cache_directory
+        self.query_cache_size = query_cache_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._embedder_factory = embedder_factory
+        self._embedder = None
+        self._store: Optional[EmbeddingStore] = None
+        self._lock = threading.Lock()
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.query_hits = 0
+        self.query_misses = 0
+        self.query_coalesced = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.document_hits = 0
+        self.document_misses = 0
+        self._batch_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def embedder(self):
+        with self._lock:
+            if self._embedder is None:
+                self._embedder = self._embedder_factory()
+            return self._embedder
+
+    @property
+    def store(self) -> EmbeddingStore:
+        embedder = self.embedder
+        with self._lock:
+            if self._store is None:
+                self._store = EmbeddingStore(str(Path(self.cache_directory) / embedder.name), embedder.dimensions)
+            return self._store
+
+    # Documents
+
+    def embed_documents(self, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Embed texts, computing only those not in the store.
+
+        Blocking; meant for ingestion.
+
+        Returns:
+            An (n, dimensions) float32 array in the order of ``texts``
+        """
+        keys = [content_key(text) for text in texts]
+        store = self.store
+        vectors, missing = store.get(keys)
+        if missing:
+            computed = embed_batched(self.embedder, [texts[i] for i in missing], batch_size)
+            vectors[missing] = computed
+            store.put([keys[i] for i in missing], computed)
+        self.document_hits += len(texts) - len(missing)
+        self.document_misses += len(missing)
+        return vectors
+
+    # Queries
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embedding of a query, from the cache or the next micro-batch."""
+        key = content_key(text)
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.query_hits += 1
+            return vector
+
+        self.query_misses += 1
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.query_coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._pending.append((key, text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._embed_batch(batch))
+
+    async def _embed_batch(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        start = time.perf_counter()
+        try:
+            vectors = await asyncio.to_thread(self.embedder.embed, [text for _, text, _ in batch])
+        except Exception as e:
+            for key, _, future in batch:
+                self._inflight.pop(key, None)
+                future.set_exception(e)
+                # Mark retrieved so waiterless failures don't log warnings
+                future.exception()
+            return
+
+        self._batch_ms.append((time.perf_counter() - start) * 1000)
+        self.batches += 1
+        self.batched_queries += len(batch)
+        for (key, _, future), vector in zip(batch, vectors):
+            self._inflight.pop(key, None)
+            self._store_query(key, vector)
+            future.set_result(vector)
+
+    def _store_query(self, key: str, vector: np.ndarray) -> None:
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.query_cache_size:
+            self._cache.popitem(last=False)
+
+    def clear_query_cache(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache and batching counters; batch latency percentiles in ms."""
+        lookups = self.query_hits + self.query_misses
+        documents = self.document_hits + self.document_misses
+        return {
+            "model": self._embedder.name if self._embedder is not None else None,
+            "query_cache": {
+                "size": len(self._cache),
+                "max_size": self.query_cache_size,
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": round(self.query_hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.query_coalesced,
+            },
+            "batching": {
+                "window_ms": self.batch_window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "mean_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+                "batch_ms": {"p50": round(percentile(self._batch_ms, 0.5), 3), "p95": round(percentile(self._batch_ms, 0.95), 3)},
+            },
+            "documents": {
+                "stored": len(self._store) if self._store is not None else None,
+                "hits": self.document_hits,
+                "misses": self.document_misses,
+                "hit_rate": round(self.document_hits / documents, 4) if documents else 0.0,
+            },
+        }
+
+
+embedding_service = EmbeddingService(
+    embedder_factory=lambda: create_embedder(
+        settings.EMBEDDING_MODEL,
+        settings.EMBEDDING_MODEL_DIRECTORY,
+        settings.EMBEDDING_DIMENSIONS,
+    ),
+    cache_directory=settings.EMBEDDING_CACHE_DIRECTORY or str(Path(settings.CHROMA_PERSIST_DIRECTORY) / "embedding_cache"),
+    query_cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    batch_window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+)
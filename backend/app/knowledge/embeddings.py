@@ -0,0 +1,159 @@
+"""
+Local text embedders for the knowledge base.
+
+Nothing here touches the network. The default embedder hashes character
+n-grams into a fixed number of signed buckets: it needs no model files,
+handles Chinese text (where word boundaries are not marked) and embeds a
+query in well under a millisecond. The optional MiniLM embedder runs
+all-MiniLM-L6-v2 through ONNX Runtime from a local directory; it is an
+English model, so it only pays off for an English corpus.
+
+Embeddings are L2-normalized float32 vectors, so cosine distance is
+``1 - dot``.
+"""
+import hashlib
+import math
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Characters and question words too common to carry meaning; CJK runs are
+# split at them
+STOP_CHARS = frozenset("的了和是在与或及等并也就都而把被让从为这那个其之吗呢吧啊呀么")
+STOP_WORDS = re.compile(r"怎么样|怎么|什么|多少|如何|应该|可以|还能|能不能|需要|是否|为什么|一下|有没有")
+
+CJK_RUN = re.compile(r"[一-鿿]+")
+WORD = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+UNIGRAM_WEIGHT = 0.5
+BIGRAM_WEIGHT = 1.0
+WORD_WEIGHT = 1.0
+
+MINILM_FILES = ("model.onnx", "tokenizer.json")
+
+
+def content_key(text: str) -> str:
+    """Hex SHA-256 of a text; identical texts share one embedding."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dimensions: int) -> Tuple[int, float]:
+    """Bucket index and sign of a feature."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    # The sign comes from bits above the index so the two are independent
+    return h % dimensions, 1.0 if (h >> 20) & 1 else -1.0
+
+
+def _features(text: str) -> Dict[str, Tuple[int, float]]:
+    """N-gram features of a text with their counts and base weights."""
+    counts: Dict[str, Tuple[int, float]] = {}
+
+    def add(feature: str, weight: float) -> None:
+        count, _ = counts.get(feature, (0, weight))
+        counts[feature] = (count + 1, weight)
+
+    text = STOP_WORDS.sub(" ", text.lower())
+    for run in CJK_RUN.findall(text):
+        piece = []
+        for char in run + " ":
+            if char in STOP_CHARS or char == " ":
+                for i, c in enumerate(piece):
+                    add(c, UNIGRAM_WEIGHT)
+                    if i:
+                        add(piece[i - 1] + c, BIGRAM_WEIGHT)
+                piece = []
+            else:
+                piece.append(char)
+    for word in WORD.findall(text):
+        add("w:" + word, WORD_WEIGHT)
+    return counts
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder over character unigrams and bigrams.
+
+    Repeated features are damped logarithmically so a long chunk that
+    mentions a term many times doesn't drown out the rest of its content.
+    """
+
+    def __init__(self, dimensions: int = 2048):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an (n, dimensions) float32 array."""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, (count, weight) in _features(text).items():
+                index, sign = _bucket(feature, self.dimensions)
+                vectors[row, index] += sign * weight * (1.0 + math.log(count))
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+class MiniLMEmbedder:
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime, loaded from a local directory.
+
+    Uses chromadb's bundled implementation with its download path pointed
+    at ``model_directory``. The model files must already be there (an
+    ``onnx/`` folder with model.onnx and tokenizer.json); this never
+    downloads them.
+    """
+
+    dimensions = 384
+    name = "all-MiniLM-L6-v2"
+
+    def __init__(self, model_directory: str):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        path = Path(model_directory)
+        missing = [f for f in MINILM_FILES if not (path / ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME / f).exists()]
+        if missing:
+            raise FileNotFoundError(
+                f"Embedding model files missing from {path / ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME}: {missing}"
+            )
+
+        self._model = ONNXMiniLM_L6_V2()
+        self._model.DOWNLOAD_PATH = path
+        # Load directly instead of via __call__, which downloads missing files
+        self._model._init_model_and_tokenizer()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an (n, 384) float32 array."""
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.asarray(self._model._forward(list(texts)), dtype=np.float32)
+
+
+def create_embedder(model: str, model_directory: str = "", dimensions: int = 2048):
+    """
+    Build the configured embedder.
+
+    Args:
+        model: "hashing" or "minilm"
+        model_directory: Local directory of the MiniLM model files
+        dimensions: Vector size of the hashing embedder
+
+    Returns:
+        An object with ``name``, ``dimensions`` and ``embed(texts)``
+    """
+    if model == "hashing":
+        return HashingEmbedder(dimensions)
+    if model == "minilm":
+        return MiniLMEmbedder(model_directory)
+    raise ValueError(f"Unknown embedding model '{model}'")
+
+
+def embed_batched(embedder, texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """Embed many texts in batches of ``batch_size``."""
+    batches = [embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    return np.concatenate(batches) if batches else np.zeros((0, embedder.dimensions), dtype=np.float32)
@@ -0,0 +1,104 @@
+"""
+Offline ingestion of the knowledge base corpus.
+
+Reads every markdown guide in the corpus directory, chunks it, embeds the
+chunks through the embedding service and brings the Chroma collection in
+line with the corpus. Embeddings are cached on disk by content, so only
+new or edited chunks are embedded, and only the difference is written to
+Chroma. Run it after editing the guides or changing the embedding
+settings, then restart the API.
+
+Usage:
+    python -m app.knowledge.ingest [--corpus DIR] [--rebuild] [--query TEXT]
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.knowledge.chunking import Chunk, chunk_markdown
+from app.knowledge.store import KnowledgeBase, knowledge_base
+
+
+def load_corpus(corpus_directory: str, max_chars: int, overlap_chars: int) -> List[Chunk]:
+    """Chunks of every ``*.md`` file in the corpus directory, in file name order."""
+    paths = sorted(Path(corpus_directory).glob("*.md"))
+    if not paths:
+        raise FileNotFoundError(f"No markdown guides in {corpus_directory}")
+
+    chunks = []
+    for path in paths:
+        chunks.extend(chunk_markdown(path.read_text(encoding="utf-8"), path.name, max_chars, overlap_chars))
+    return chunks
+
+
+def ingest(
+    kb: KnowledgeBase,
+    corpus_directory: str,
+    max_chars: int,
+    overlap_chars: int,
+    rebuild: bool = False,
+) -> Dict[str, Any]:
+    """
+    Sync the collection with the corpus.
+
+    Args:
+        kb: Knowledge base to write to
+        corpus_directory: Directory of markdown guides
+        max_chars: Chunk size
+        overlap_chars: Chunk overlap
+        rebuild: Recreate the collection instead of writing the difference
+            (embeddings still come from the cache)
+
+    Returns:
+        Chunk count, how many chunks were embedded (not cached), the sync
+        counts and the time spent chunking, embedding and writing (seconds)
+    """
+    start = time.perf_counter()
+    chunks = load_corpus(corpus_directory, max_chars, overlap_chars)
+    chunked = time.perf_counter()
+    misses = kb.embeddings.document_misses
+    embeddings = kb.embeddings.embed_documents([chunk.embedding_text for chunk in chunks])
+    embedded = time.perf_counter()
+    if rebuild:
+        kb.reset()
+    changes = kb.sync(chunks, embeddings)
+    written = time.perf_counter()
+
+    return {
+        "chunks": len(chunks),
+        "embedded": kb.embeddings.document_misses - misses,
+        **changes,
+        "chunk_seconds": chunked - start,
+        "embed_seconds": embedded - chunked,
+        "write_seconds": written - embedded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk, embed and store the knowledge base corpus.")
+    parser.add_argument("--corpus", default=settings.KNOWLEDGE_CORPUS_DIRECTORY)
+    parser.add_argument("--rebuild", action="store_true", help="Recreate the collection instead of syncing it")
+    parser.add_argument("--query", help="Print the chunks retrieved for this query after ingesting")
+    args = parser.parse_args()
+
+    result = ingest(knowledge_base, args.corpus, settings.RAG_CHUNK_CHARS, settings.RAG_CHUNK_OVERLAP_CHARS, args.rebuild)
+    print(
+        f"{result['chunks']} chunks in '{knowledge_base.collection_name}' ({knowledge_base.persist_directory}) "
+        f"with {knowledge_base.embedder.name}: {result['embedded']} embedded, {result['chunks'] - result['embedded']} cached; "
+        f"{result['added']} added, {result['removed']} removed, {result['updated']} moved, {result['unchanged']} unchanged"
+    )
+    print(
+        f"Chunking {result['chunk_seconds'] * 1000:.0f} ms, embedding {result['embed_seconds'] * 1000:.0f} ms, "
+        f"writing {result['write_seconds'] * 1000:.0f} ms"
+    )
+
+    if args.query:
+        for chunk in asyncio.run(knowledge_base.retrieve(args.query)):
+            print(f"{chunk.distance:.3f}  {chunk.source} | {chunk.title}")
+
+
+if __name__ == "__main__":
+    main()
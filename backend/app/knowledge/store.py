@@ -0,0 +1,310 @@
+"""
+Knowledge base retrieval over the configured Chroma collection.
+
+The collection is filled offline by ``python -m app.knowledge.ingest``;
+the API only reads it. Each chat message is embedded locally through the
+embedding service (cached and micro-batched) and the nearest chunks are
+looked up with cosine distance.
+
+Chunk ids are derived from chunk content, so re-ingesting an edited corpus
+only adds the new chunks and deletes the stale ones; unchanged chunks stay
+in place, with their position metadata updated if they moved.
+
+Retrieval never fails a chat: a missing collection, a collection built
+with a different embedding model or a Chroma error all log a warning and
+return no chunks, and the agent answers without references.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.telemetry import DB_BUCKETS, metrics, span
+from app.knowledge.chunking import Chunk
+from app.knowledge.embedding_service import EmbeddingService, embedding_service, percentile
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_DURATION = metrics.histogram(
+    "knowledge_retrieval_duration_seconds", "Knowledge base retrieval duration", ("stage",), DB_BUCKETS
+)
+
+# Chunks written per Chroma call during ingestion
+ADD_BATCH_SIZE = 256
+
+# Retrievals kept for the latency percentiles in stats()
+LATENCY_WINDOW = 1000
+
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    """A chunk returned for a query, with its cosine distance."""
+    id: str
+    source: str
+    title: str
+    text: str
+    distance: float
+
+
+def render_references(chunks: Sequence[RetrievedChunk]) -> str:
+    """Numbered reference block for the chat prompt; empty without chunks."""
+    if not chunks:
+        return ""
+    entries = [f"[{i}] {chunk.title}\n{chunk.text}" for i, chunk in enumerate(chunks, 1)]
+    return "\n\n相关参考资料：\n" + "\n\n".join(entries)
+
+
+class KnowledgeBase:
+    """
+    Chroma collection of guide chunks.
+
+    The Chroma client is created on first use, so importing this module
+    stays cheap. Chroma calls are blocking and run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        embeddings: EmbeddingService,
+        top_k: int = 3,
+        max_distance: float = 1.0,
+    ):
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.top_k = top_k
+        self.max_distance = max_distance
+        self._client = None
+        self._collection = None
+        self._unavailable: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.queries = 0
+        self.failures = 0
+        self._embed_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._search_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._total_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def embedder(self):
+        return self.embeddings.embedder
+
+    def _get_client(self):
+        if self._client is None:
+            import chromadb
+            from chromadb.config import Settings as ChromaSettings
+
+            # Telemetry off: it would send events to a remote endpoint
+            self._client = chromadb.PersistentClient(
+                path=self.persist_directory,
+                settings=ChromaSettings(anonymized_telemetry=False),
+            )
+        return self._client
+
+    def _metadata(self) -> Dict[str, Any]:
+        embedder = self.embedder
+        return {"hnsw:space": "cosine", "embedding_model": embedder.name, "dimensions": embedder.dimensions}
+
+    def _open(self):
+        """The collection for queries, or None when it can't be used."""
+        with self._lock:
+            if self._collection is not None or self._unavailable:
+                return self._collection
+            try:
+                collection = self._get_client().get_collection(self.collection_name)
+            except Exception as e:
+                self._unavailable = f"collection '{self.collection_name}' not found ({e}); run python -m app.knowledge.ingest"
+                logger.warning("Knowledge base unavailable: %s", self._unavailable)
+                return None
+
+        model = (collection.metadata or {}).get("embedding_model")
+        if model != self.embedder.name:
+            with self._lock:
+                self._unavailable = f"collection built with '{model}', configured model is '{self.embedder.name}'; re-run ingestion"
+            logger.warning("Knowledge base unavailable: %s", self._unavailable)
+            return None
+
+        with self._lock:
+            self._collection = collection
+        return collection
+
+    def reopen(self) -> None:
+        """Forget why the collection was unavailable, so the next use tries again."""
+        with self._lock:
+            self._unavailable = None
+
+    # Ingestion
+
+    def reset(self) -> None:
+        """Drop and recreate the collection with the current embedder's metadata."""
+        client = self._get_client()
+        try:
+            client.delete_collection(self.collection_name)
+        except ValueError:
+            pass
+        client.create_collection(self.collection_name, metadata=self._metadata(), embedding_function=None)
+        with self._lock:
+            self._collection = None
+            self._unavailable = None
+
+    def sync(self, chunks: Sequence[Chunk], embeddings: np.ndarray) -> Dict[str, int]:
+        """
+        Make the collection hold exactly ``chunks``.
+
+        Recreates the collection if it is missing or was built with another
+        embedding model; otherwise only writes the difference.
+
+        Args:
+            chunks: Chunks of the whole corpus
+            embeddings: Their embeddings, row per chunk
+
+        Returns:
+            Counts of chunks added, removed, updated (moved) and unchanged
+        """
+        client = self._get_client()
+        try:
+            collection = client.get_collection(self.collection_name, embedding_function=None)
+        except ValueError:
+            collection = None
+        if collection is None or (collection.metadata or {}).get("embedding_model") != self.embedder.name:
+            self.reset()
+            collection = client.get_collection(self.collection_name, embedding_function=None)
+
+        existing = collection.get(include=["metadatas"])
+        stored = dict(zip(existing["ids"], existing["metadatas"]))
+        wanted = {chunk.id for chunk in chunks}
+
+        removed = [chunk_id for chunk_id in stored if chunk_id not in wanted]
+        added = [i for i, chunk in enumerate(chunks) if chunk.id not in stored]
+        moved = [chunk for chunk in chunks if chunk.id in stored and stored[chunk.id] != chunk.metadata()]
+
+        if removed:
+            collection.delete(ids=removed)
+        for start in range(0, len(added), ADD_BATCH_SIZE):
+            batch = added[start:start + ADD_BATCH_SIZE]
+            collection.add(
+                ids=[chunks[i].id for i in batch],
+                embeddings=embeddings[batch].tolist(),
+                documents=[chunks[i].text for i in batch],
+                metadatas=[chunks[i].metadata() for i in batch],
+            )
+        for start in range(0, len(moved), ADD_BATCH_SIZE):
+            batch = moved[start:start + ADD_BATCH_SIZE]
+            collection.update(ids=[chunk.id for chunk in batch], metadatas=[chunk.metadata() for chunk in batch])
+
+        with self._lock:
+            self._collection = None
+            self._unavailable = None
+        return {
+            "added": len(added),
+            "removed": len(removed),
+            "updated": len(moved),
+            "unchanged": len(chunks) - len(added) - len(moved),
+        }
+
+    def count(self) -> int:
+        collection = self._open()
+        return collection.count() if collection is not None else 0
+
+    # Retrieval
+
+    async def retrieve(self, query: str, k: Optional[int] = None) -> List[RetrievedChunk]:
+        """
+        The chunks most relevant to a query.
+
+        Args:
+            query: User message
+            k: Number of chunks (default top_k); fewer are returned when
+                some are farther than max_distance
+
+        Returns:
+            Chunks ordered by distance; empty if the knowledge base is
+            unavailable or retrieval fails
+        """
+        k = k or self.top_k
+        key = WHITESPACE.sub(" ", query).strip().lower()
+        if not key or self._unavailable:
+            return []
+
+        self.queries += 1
+        start = time.perf_counter()
+        with span("knowledge.retrieve", "retrieval", k=k):
+            try:
+                embedding = await self.embeddings.embed_query(key)
+                embedded = time.perf_counter()
+                results = await asyncio.to_thread(self._search, embedding, k)
+            except Exception as e:
+                self.failures += 1
+                logger.warning("Knowledge base retrieval failed: %s", e)
+                return []
+        end = time.perf_counter()
+
+        if results is None:
+            return []
+        self._embed_ms.append((embedded - start) * 1000)
+        self._search_ms.append((end - embedded) * 1000)
+        self._total_ms.append((end - start) * 1000)
+        RETRIEVAL_DURATION.observe(embedded - start, stage="embed")
+        RETRIEVAL_DURATION.observe(end - embedded, stage="search")
+
+        return [chunk for chunk in results if chunk.distance <= self.max_distance]
+
+    def _search(self, embedding: np.ndarray, k: int) -> Optional[List[RetrievedChunk]]:
+        """Query the collection; runs in a worker thread."""
+        collection = self._open()
+        if collection is None:
+            return None
+
+        result = collection.query(
+            query_embeddings=[embedding.tolist()],
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            RetrievedChunk(
+                id=chunk_id,
+                source=metadata.get("source", ""),
+                title=metadata.get("title", ""),
+                text=document,
+                distance=float(distance),
+            )
+            for chunk_id, document, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Retrieval counters, latency percentiles (ms) and embedding service counters."""
+        return {
+            "collection": self.collection_name,
+            "available": self._unavailable is None,
+            "unavailable_reason": self._unavailable,
+            "top_k": self.top_k,
+            "max_distance": self.max_distance,
+            "queries": self.queries,
+            "failures": self.failures,
+            "latency_ms": {
+                stage: {"p50": round(percentile(values, 0.5), 3), "p95": round(percentile(values, 0.95), 3)}
+                for stage, values in (("embed", self._embed_ms), ("search", self._search_ms), ("total", self._total_ms))
+            },
+            "embeddings": self.embeddings.stats(),
+        }
+
+
+knowledge_base = KnowledgeBase(
+    persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
+    collection_name=settings.CHROMA_COLLECTION_NAME,
+    embeddings=embedding_service,
+    top_k=settings.RAG_TOP_K,
+    max_distance=settings.RAG_MAX_DISTANCE,
+)
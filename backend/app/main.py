@@ -8,23 +8,74 @@ FastAPI 主应用入口文件
 4. 提供健康检查端点
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
-from app.api import chat, users, workouts, nutrition, progress
+from app.core.database import engine
+from app.core.rate_limit import RateLimitMiddleware, rate_limiter
+from app.core.responses import CompressionMiddleware, FastJSONResponse
+from app.core.security import access_tokens, password_hasher
+from app.core.telemetry import TelemetryMiddleware, create_exporter, instrument_engine, metrics
+from app.api import chat, users, workouts, nutrition, progress, jobs
+from app.api.deps import current_user_id
+from app.agents.output_parser import parse_stats
+from app.agents.routing import model_router
+from app.agents.scheduler import llm_scheduler
+from app.knowledge.store import knowledge_base
+from app.services.auth import auth_user_cache
+from app.services.chat_sessions import chat_sessions
+from app.services.jobs import job_queue
+from app.services.readiness import readiness
+from app.services.user_context import user_context_cache
+from app.services.usage import QuotaExceededError, usage_ledger
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期
+
+    启动时开启 LLM 用量账本的后台批量写入和后台任务的工作协程，
+    在启用时开启每周周报批量生成的定时提交；
+    并在后台预热数据库连接池、食物目录缓存、提示词和 Agent（不阻塞启动，/health 立即可用，
+    预热完成前 /ready 返回 503）；
+    关闭时停止预热和定时器、工作协程，并写入剩余的用量记录
+    """
+    usage_ledger.start()
+    await job_queue.start()
+    if settings.WEEKLY_REPORT_BATCH_ENABLED:
+        await progress.weekly_report_scheduler.start()
+    readiness.start()
+    yield
+    await readiness.stop()
+    await progress.weekly_report_scheduler.stop()
+    await job_queue.stop()
+    await usage_ledger.stop()
+
 
 # 创建 FastAPI 应用实例
 # title: API 文档标题
 # version: 版本号，从配置中读取
 # description: API 描述信息
 # debug: 调试模式，开启后提供详细错误信息
+# default_response_class: 默认使用 orjson 序列化响应
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="基于 AI 的智能健身训练规划和营养追踪系统",
     debug=settings.DEBUG,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
+# 限流中间件
+# 按用户（未携带令牌时按客户端地址）和路由类别（调用 LLM / 仅访问数据库）的令牌桶限流，
+# 超出时返回 429 和 Retry-After；放在 CORS 之内，429 响应也带有跨域头
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # 配置跨域资源共享 (CORS) 中间件
 # 允许前端应用从不同域名访问后端 API
 app.add_middleware(
@@ -35,24 +86,72 @@ app.add_middleware(
     allow_headers=["*"],                    # 允许所有请求头
 )
 
+# 响应压缩中间件
+# 超过阈值的响应按客户端 Accept-Encoding 使用 brotli 或 gzip 压缩
+if settings.RESPONSE_COMPRESSION_MIN_BYTES:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# 请求追踪中间件
+# 记录每个请求的 LLM、数据库、提示词构建和输出解析耗时，
+# 通过 Server-Timing 响应头返回，并汇总到 /metrics 指标
+app.add_middleware(TelemetryMiddleware, exporter=create_exporter())
+
+# 数据库查询计时（查询次数和耗时计入当前请求的追踪）
+instrument_engine(engine)
+
 
 # 注册各个功能模块的路由
 # 每个模块处理特定领域的功能
 
 # 聊天模块：处理与 AI Agent 的对话交互
-app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(
+    chat.router,
+    prefix="/api/chat",
+    tags=["Chat"],
+    dependencies=[Depends(current_user_id)],  # 绑定当前用户，用于 LLM 用量统计和配额
+)
 
 # 用户模块：处理用户注册、登录、个人信息管理
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 
 # 训练模块：处理训练计划生成、训练记录等
-app.include_router(workouts.router, prefix="/api/workouts", tags=["Workouts"])
+app.include_router(
+    workouts.router,
+    prefix="/api/workouts",
+    tags=["Workouts"],
+    dependencies=[Depends(current_user_id)],  # 绑定当前用户，用于 LLM 用量统计和配额
+)
 
 # 营养模块：处理营养计划、饮食记录等
-app.include_router(nutrition.router, prefix="/api/nutrition", tags=["Nutrition"])
+app.include_router(
+    nutrition.router,
+    prefix="/api/nutrition",
+    tags=["Nutrition"],
+    dependencies=[Depends(current_user_id)],  # 绑定当前用户，用于 LLM 用量统计和配额
+)
 
 # 进度模块：处理进度追踪、数据分析等
-app.include_router(progress.router, prefix="/api/progress", tags=["Progress"])
+app.include_router(
+    progress.router,
+    prefix="/api/progress",
+    tags=["Progress"],
+    dependencies=[Depends(current_user_id)],  # 绑定当前用户，用于 LLM 用量统计和配额
+)
+
+# 后台任务模块：查询计划/周报生成任务的状态和结果，或通过 SSE 订阅状态变化
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+
+
+@app.exception_handler(QuotaExceededError)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceededError):
+    """
+    用户当日 LLM token 配额用尽时返回 429，并告知配额重置前的等待秒数
+    """
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={"detail": "今日 AI 使用额度已用完，请明天再试", "used": exc.used, "quota": exc.quota},
+    )
 
 
 @app.get("/")
@@ -83,6 +182,125 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    就绪检查端点
+
+    用于负载均衡器判断是否向本 worker 转发流量：启动预热完成且数据库可用时返回 200，
+    否则返回 503；返回各组件（数据库连接池、食物目录、提示词、Agent、知识库、LLM 服务）
+    的状态、预热耗时和最近的错误。LLM 服务和知识库不可用不影响就绪
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if readiness.ready else 503)
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """
+    缓存统计端点
+
+    返回用户上下文缓存的命中率、容量和失效次数
+    用于监控缓存效果和调整 TTL
+    """
+    return {"user_context": user_context_cache.stats()}
+
+
+@app.get("/stats/usage")
+async def usage_stats():
+    """
+    LLM 用量统计端点
+
+    返回本进程记录的各 Agent 方法的调用次数、token 数和估算费用，
+    以及批量写入和配额拒绝的次数
+    """
+    return usage_ledger.stats()
+
+
+@app.get("/stats/llm")
+async def llm_stats():
+    """
+    LLM 调度统计端点
+
+    返回当前并发上限、进行中和各优先级排队的调用数，
+    以及合并的重复调用、429 次数和重试次数；
+    routing 为各 Agent 方法实际使用的模型和升级到大模型的比例；
+    parsing 为输出解析在各阶段（直接 JSON、提取、修复）成功和失败的次数
+    """
+    return {**llm_scheduler.stats(), "routing": model_router.stats(), "parsing": dict(parse_stats)}
+
+
+@app.get("/stats/chat")
+async def chat_stats():
+    """
+    WebSocket 聊天会话统计端点
+
+    返回本进程当前和峰值连接数、消息和回复数、忙碌拒绝次数、
+    合并发送的 token 数、因空闲或客户端读取过慢而断开的连接数，
+    以及首个 token 和完整回复耗时的 p50/p95（毫秒）
+    """
+    return chat_sessions.stats()
+
+
+@app.get("/stats/auth")
+async def auth_stats():
+    """
+    认证统计端点
+
+    返回密码哈希线程池的排队数和峰值、访问令牌验证缓存的命中率，
+    以及用户账号状态缓存的命中率
+    """
+    return {
+        "password_hashing": password_hasher.stats(),
+        "access_tokens": access_tokens.stats(),
+        "users": auth_user_cache.stats(),
+    }
+
+
+@app.get("/stats/rate-limit")
+async def rate_limit_stats():
+    """
+    限流统计端点
+
+    返回限流后端、各类路由的速率和突发上限，
+    以及本进程放行和拒绝的请求数
+    """
+    return rate_limiter.stats()
+
+
+@app.get("/stats/jobs")
+async def job_stats():
+    """
+    后台任务统计端点
+
+    返回任务后端、工作协程数、正在运行的任务数，
+    以及本进程提交、成功、失败和重试的任务数
+    """
+    return job_queue.stats()
+
+
+@app.get("/stats/knowledge")
+async def knowledge_stats():
+    """
+    知识库检索统计端点
+
+    返回知识库集合是否可用、检索次数，向量化、向量检索和总检索耗时的 p50/p95（毫秒），
+    以及向量服务的查询缓存命中率、批量大小和资料向量缓存命中数
+    """
+    return knowledge_base.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus 指标端点
+
+    以 Prometheus 文本格式返回请求数、请求耗时、LLM 调用次数/耗时/token 数
+    以及数据库查询次数/耗时
+    """
+    return metrics.render()
+
+
 # 程序入口点
 # 仅在直接运行此文件时执行（不通过 uvicorn 命令）
 if __name__ == "__main__":
@@ -93,4 +311,5 @@ if __name__ == "__main__":
         host=settings.HOST,     # 监听地址
         port=settings.PORT,     # 监听端口
         reload=settings.DEBUG,  # 调试模式下启用热重载
+        ws_per_message_deflate=False,  # WebSocket 不压缩：每个连接可省约 90KB 内存，逐 token 的小帧压缩收益很小
     )
@@ -4,7 +4,9 @@ Database models.
 from app.models.user import User
 from app.models.workout import WorkoutPlan, WorkoutSession, Exercise, WorkoutExercise
 from app.models.nutrition import NutritionPlan, MealLog, FoodItem
-from app.models.progress import ProgressLog, BodyMetrics
+from app.models.progress import ProgressLog, BodyMetrics, WeeklyReport, WeeklyReportRun
+from app.models.usage import LLMUsage
+from app.models.job import Job, JobStatus
 
 __all__ = [
     "User",
@@ -17,4 +19,9 @@ __all__ = [
     "FoodItem",
     "ProgressLog",
     "BodyMetrics",
+    "WeeklyReport",
+    "WeeklyReportRun",
+    "LLMUsage",
+    "Job",
+    "JobStatus",
 ]
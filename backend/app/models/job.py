@@ -0,0 +1,55 @@
+"""
+Background job models.
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON, Enum, Index
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+
+class JobStatus(str, enum.Enum):
+    """Job lifecycle states."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """
+    A queued unit of background work, e.g. a plan or report generation.
+
+    Workers claim queued jobs whose ``run_after`` has passed; a failed
+    attempt is requeued with a later ``run_after`` until ``max_attempts``.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+
+    payload = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Machine-readable failure reason, e.g. quota_exceeded, and the seconds
+    # until the job could succeed when known
+    error_code = Column(String(50), nullable=True)
+    retry_after = Column(Integer, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    # Worker holding the job and when it claimed it
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<Job(id='{self.id}', kind='{self.kind}', status='{self.status}')>"
@@ -1,7 +1,7 @@
 """
 Nutrition and meal tracking models.
 """
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Enum, Boolean, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -75,6 +75,12 @@ class FoodItem(Base):
     serving_size_g = Column(Float, default=100)
     serving_description = Column(String(255))
 
+    # Meal planning: protein, staple, vegetable, fruit, dairy or fat.
+    # Foods without a category are not used by the meal plan optimizer.
+    category = Column(String(50), nullable=True, index=True)
+    # Diet and allergen tags, e.g. ["meat", "pork"] or ["dairy"]
+    tags = Column(JSON, nullable=True)
+
     # Relationships
     meal_logs = relationship("MealLog", back_populates="food_item")
 
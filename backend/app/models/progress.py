@@ -1,7 +1,7 @@
 """
 Progress tracking models.
 """
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Text, Boolean, JSON, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -71,3 +71,59 @@ class ProgressLog(Base):
 
     def __repr__(self):
         return f"<ProgressLog(id={self.id}, user_id={self.user_id}, title='{self.title}')>"
+
+
+class WeeklyReport(Base):
+    """Generated weekly progress report, one per user and week."""
+
+    __tablename__ = "weekly_reports"
+    __table_args__ = (
+        UniqueConstraint("user_id", "week_start", name="uq_weekly_reports_user_week"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    week_start = Column(Date, nullable=False, index=True)  # Monday
+
+    # Aggregated week data sent to the LLM, and the report it produced
+    week_data = Column(JSON, nullable=False)
+    report = Column(JSON, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<WeeklyReport(id={self.id}, user_id={self.user_id}, week_start={self.week_start})>"
+
+
+class WeeklyReportRun(Base):
+    """
+    Checkpoint of a batch weekly report run.
+
+    Users are processed in id order; ``last_user_id`` is the last user whose
+    chunk was stored, so a restarted run continues after it. A batch job
+    holds the run (``claimed_by``) while it works on it and refreshes
+    ``claimed_at``; a claim older than JOB_STALE_AFTER_SECONDS is abandoned.
+    """
+
+    __tablename__ = "weekly_report_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    week_start = Column(Date, nullable=False, unique=True)
+    status = Column(String(20), nullable=False, default="running")  # running, completed
+
+    last_user_id = Column(Integer, nullable=False, default=0)
+    reports = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+
+    # Batch job working on the run
+    claimed_by = Column(String(100), nullable=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Timestamps
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<WeeklyReportRun(week_start={self.week_start}, status='{self.status}', last_user_id={self.last_user_id})>"
@@ -0,0 +1,43 @@
+"""
+LLM usage accounting models.
+"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LLMUsage(Base):
+    """
+    Aggregated LLM token usage.
+
+    One row per (day, user, agent, method, endpoint, model) per ledger
+    flush; sum rows to get totals for a period. ``user_id`` is not a
+    foreign key: the ledger is append-only and keeps usage of users that
+    don't exist (the development user) or were deleted.
+    """
+
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_user_day", "user_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)
+
+    # Attribution
+    agent = Column(String(50), nullable=False)
+    method = Column(String(100), nullable=False)
+    endpoint = Column(String(255), nullable=True)
+    model = Column(String(100), nullable=False)
+
+    # Usage
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<LLMUsage(day={self.day}, user_id={self.user_id}, agent='{self.agent}', method='{self.method}')>"
@@ -0,0 +1,12 @@
+"""
+Data access repositories.
+"""
+from app.repositories.workout import WorkoutRepository
+from app.repositories.progress import ProgressRepository
+from app.repositories.nutrition import NutritionRepository
+
+__all__ = [
+    "WorkoutRepository",
+    "ProgressRepository",
+    "NutritionRepository",
+]
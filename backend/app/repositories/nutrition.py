@@ -0,0 +1,54 @@
+"""
+Nutrition repository.
+
+Reads the food catalog for the meal plan optimizer and users' active
+nutrition targets as plain column rows.
+"""
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.nutrition import FoodItem, NutritionPlan
+
+FOOD_COLUMNS = (
+    FoodItem.id,
+    FoodItem.name,
+    FoodItem.category,
+    FoodItem.tags,
+    FoodItem.calories_per_100g,
+    FoodItem.protein_per_100g,
+    FoodItem.carbs_per_100g,
+    FoodItem.fats_per_100g,
+)
+
+
+class NutritionRepository:
+    """Query layer for the food catalog and nutrition plans."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def food_catalog(self) -> List[Row]:
+        """Foods with a planning category, in id order (one query)."""
+        stmt = (
+            select(*FOOD_COLUMNS)
+            .where(FoodItem.category.is_not(None))
+            .order_by(FoodItem.id)
+        )
+        return list((await self.db.execute(stmt)).all())
+
+    async def active_plan_targets(self, user_id: int) -> Optional[Row]:
+        """Daily targets and meals per day of the user's latest active plan."""
+        stmt = (
+            select(
+                NutritionPlan.daily_calories,
+                NutritionPlan.daily_protein_g,
+                NutritionPlan.daily_carbs_g,
+                NutritionPlan.daily_fats_g,
+                NutritionPlan.meals_per_day,
+            )
+            .where(NutritionPlan.user_id == user_id, NutritionPlan.is_active.is_(True))
+            .order_by(NutritionPlan.id.desc())
+            .limit(1)
+        )
+        return (await self.db.execute(stmt)).first()
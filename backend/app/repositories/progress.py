@@ -0,0 +1,477 @@
+"""
+Progress repository.
+
+Week summaries for weekly reports are computed in the database with one
+GROUP BY (user, day) query per table for a whole chunk of users, so
+building the input for N reports costs four queries instead of 4N, and the
+LLM gets exact, fixed-size statistics instead of raw rows to count.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import case, delete, distinct, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Date
+from app.models.nutrition import MealLog, NutritionPlan
+from app.models.progress import BodyMetrics, WeeklyReport, WeeklyReportRun
+from app.models.user import User
+from app.models.workout import WorkoutExercise, WorkoutSession
+
+
+def week_range(week_start: date) -> Tuple[datetime, datetime]:
+    """UTC datetimes bounding the week that starts on ``week_start``."""
+    start = datetime.combine(week_start, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=7)
+
+
+class utc_date(FunctionElement):
+    """
+    UTC calendar day of a timestamp, matching the UTC bounds of ``week_range``.
+
+    Postgres' ``date()`` of a timestamptz uses the session TimeZone; SQLite
+    stores the UTC time as given.
+    """
+
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(utc_date)
+def _utc_date_default(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(utc_date, "postgresql")
+def _utc_date_postgresql(element, compiler, **kw):
+    return f"date(timezone('UTC', {compiler.process(element.clauses, **kw)}))"
+
+
+def _round(value: Optional[float], digits: int = 1) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def as_date(day: Any) -> date:
+    """A SQL ``date()`` result as a date (SQLite returns a string)."""
+    return day if isinstance(day, date) else date.fromisoformat(str(day)[:10])
+
+
+def _day_index(day: Any, week_start: date) -> Optional[int]:
+    """Day of the week (0 = Monday) of a ``date()`` result; None outside the week."""
+    index = (as_date(day) - week_start).days
+    return index if 0 <= index < 7 else None
+
+
+def _empty_summary(week_start: date) -> Dict[str, Any]:
+    return {
+        "week_number": week_start.isocalendar()[1],
+        "week_start": week_start.isoformat(),
+        "week_end": (week_start + timedelta(days=6)).isoformat(),
+        "training": {
+            "sessions_planned": 0,
+            "sessions_completed": 0,
+            "completion_rate": None,
+            "total_volume_kg": 0.0,
+            # Completed sessions per day, Monday first
+            "daily_sessions": [0] * 7,
+        },
+        "nutrition": {
+            "meals_logged": 0,
+            "days_logged": 0,
+            "average_calories": None,
+            "average_protein_g": None,
+            "average_carbs_g": None,
+            "average_fats_g": None,
+            # Calories per day, Monday first; None for days without meals
+            "daily_calories": [None] * 7,
+        },
+        "body_metrics": {
+            "measurements": 0,
+            "start_weight": None,
+            "end_weight": None,
+            "weight_change": None,
+            "start_body_fat": None,
+            "end_body_fat": None,
+        },
+    }
+
+
+class ProgressRepository:
+    """Query layer for weekly report data, stored reports and batch runs."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # Users
+
+    async def active_user_ids(self, after: int, limit: int) -> List[int]:
+        """Next chunk of active user ids in id order (keyset pagination)."""
+        stmt = (
+            select(User.id)
+            .where(User.id > after, User.is_active.is_(True))
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return list((await self.db.scalars(stmt)).all())
+
+    # Week summaries
+
+    async def week_summaries(self, user_ids: Sequence[int], week_start: date) -> Dict[int, Dict[str, Any]]:
+        """
+        Fixed-size training, nutrition and body metric summaries of one week.
+
+        Issues one aggregate query per table (sessions, exercises, meals,
+        body metrics) grouped by user and day, regardless of the number of
+        users or rows; the per-day rows are folded into weekly totals here.
+
+        Returns:
+            User id -> summary; users without data get empty summaries
+        """
+        start, end = week_range(week_start)
+        summaries = {user_id: _empty_summary(week_start) for user_id in user_ids}
+        if not summaries:
+            return summaries
+
+        # Training: sessions scheduled or completed in the week
+        session_time = func.coalesce(WorkoutSession.completed_date, WorkoutSession.scheduled_date)
+        session_day = utc_date(session_time)
+        in_week = (WorkoutSession.user_id.in_(user_ids), session_time >= start, session_time < end)
+        stmt = (
+            select(
+                WorkoutSession.user_id,
+                session_day.label("day"),
+                func.count().label("planned"),
+                func.sum(case((WorkoutSession.completed.is_(True), 1), else_=0)).label("completed"),
+            )
+            .where(*in_week)
+            .group_by(WorkoutSession.user_id, session_day)
+        )
+        for row in (await self.db.execute(stmt)).all():
+            training = summaries[row.user_id]["training"]
+            training["sessions_planned"] += row.planned
+            training["sessions_completed"] += int(row.completed or 0)
+            index = _day_index(row.day, week_start)
+            if index is not None:
+                training["daily_sessions"][index] = int(row.completed or 0)
+
+        # Training volume: logged sets x reps x weight of the week's sessions
+        volume = func.sum(
+            func.coalesce(WorkoutExercise.actual_sets, 0)
+            * func.coalesce(WorkoutExercise.actual_reps, 0)
+            * func.coalesce(WorkoutExercise.actual_weight, 0)
+        )
+        stmt = (
+            select(WorkoutSession.user_id, session_day.label("day"), volume.label("volume"))
+            .join(WorkoutExercise, WorkoutExercise.workout_session_id == WorkoutSession.id)
+            .where(*in_week)
+            .group_by(WorkoutSession.user_id, session_day)
+        )
+        for row in (await self.db.execute(stmt)).all():
+            summaries[row.user_id]["training"]["total_volume_kg"] += row.volume or 0
+
+        for summary in summaries.values():
+            training = summary["training"]
+            training["total_volume_kg"] = round(training["total_volume_kg"], 1)
+            if training["sessions_planned"]:
+                training["completion_rate"] = round(100 * training["sessions_completed"] / training["sessions_planned"])
+
+        # Nutrition: totals per logged day
+        meal_day = utc_date(MealLog.meal_date)
+        stmt = (
+            select(
+                MealLog.user_id,
+                meal_day.label("day"),
+                func.count().label("meals"),
+                func.sum(MealLog.calories).label("calories"),
+                func.sum(MealLog.protein_g).label("protein"),
+                func.sum(MealLog.carbs_g).label("carbs"),
+                func.sum(MealLog.fats_g).label("fats"),
+            )
+            .where(MealLog.user_id.in_(user_ids), MealLog.meal_date >= start, MealLog.meal_date < end)
+            .group_by(MealLog.user_id, meal_day)
+        )
+        # user id -> [calories, protein, carbs, fats] over logged days
+        totals: Dict[int, List[float]] = {}
+        for row in (await self.db.execute(stmt)).all():
+            nutrition = summaries[row.user_id]["nutrition"]
+            nutrition["meals_logged"] += row.meals
+            nutrition["days_logged"] += 1
+            index = _day_index(row.day, week_start)
+            if index is not None:
+                nutrition["daily_calories"][index] = round(row.calories)
+            total = totals.setdefault(row.user_id, [0.0, 0.0, 0.0, 0.0])
+            for i, value in enumerate((row.calories, row.protein, row.carbs, row.fats)):
+                total[i] += value
+
+        for user_id, (calories, protein, carbs, fats) in totals.items():
+            nutrition = summaries[user_id]["nutrition"]
+            days = nutrition["days_logged"]
+            nutrition["average_calories"] = _round(calories / days, 0)
+            nutrition["average_protein_g"] = _round(protein / days)
+            nutrition["average_carbs_g"] = _round(carbs / days)
+            nutrition["average_fats_g"] = _round(fats / days)
+
+        # Body metrics: first and last measurement of the week
+        ranked = (
+            select(
+                BodyMetrics.user_id,
+                BodyMetrics.weight,
+                BodyMetrics.body_fat_percentage,
+                func.row_number().over(
+                    partition_by=BodyMetrics.user_id, order_by=BodyMetrics.measured_at
+                ).label("from_start"),
+                func.row_number().over(
+                    partition_by=BodyMetrics.user_id, order_by=BodyMetrics.measured_at.desc()
+                ).label("from_end"),
+            )
+            .where(BodyMetrics.user_id.in_(user_ids), BodyMetrics.measured_at >= start, BodyMetrics.measured_at < end)
+            .subquery()
+        )
+        stmt = (
+            select(
+                ranked.c.user_id,
+                func.count().label("measurements"),
+                func.max(case((ranked.c.from_start == 1, ranked.c.weight))).label("start_weight"),
+                func.max(case((ranked.c.from_end == 1, ranked.c.weight))).label("end_weight"),
+                func.max(case((ranked.c.from_start == 1, ranked.c.body_fat_percentage))).label("start_body_fat"),
+                func.max(case((ranked.c.from_end == 1, ranked.c.body_fat_percentage))).label("end_body_fat"),
+            )
+            .group_by(ranked.c.user_id)
+        )
+        for row in (await self.db.execute(stmt)).all():
+            metrics = summaries[row.user_id]["body_metrics"]
+            metrics["measurements"] = row.measurements
+            metrics["start_weight"] = row.start_weight
+            metrics["end_weight"] = row.end_weight
+            metrics["weight_change"] = _round(row.end_weight - row.start_weight)
+            metrics["start_body_fat"] = row.start_body_fat
+            metrics["end_body_fat"] = row.end_body_fat
+
+        return summaries
+
+    # Health check series
+
+    async def daily_health(self, user_ids: Sequence[int], first_day: date, last_day: date) -> Dict[str, List[Any]]:
+        """
+        Per-user, per-day inputs of the health rules.
+
+        Issues four queries regardless of the number of users or days.
+
+        Returns:
+            ``training`` (user_id, day, sessions, load), ``nutrition``
+            (user_id, day, calories, protein), ``weight`` (user_id, day,
+            weight) and ``targets`` (user_id, daily_calories) rows; days
+            are UTC ``date()`` results
+        """
+        start = datetime.combine(first_day, time.min, tzinfo=timezone.utc)
+        end = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+        # Completed sessions and their logged volume
+        session_time = func.coalesce(WorkoutSession.completed_date, WorkoutSession.scheduled_date)
+        session_day = utc_date(session_time)
+        load = func.sum(
+            func.coalesce(WorkoutExercise.actual_sets, 0)
+            * func.coalesce(WorkoutExercise.actual_reps, 0)
+            * func.coalesce(WorkoutExercise.actual_weight, 0)
+        )
+        training = (
+            select(
+                WorkoutSession.user_id,
+                session_day.label("day"),
+                func.count(distinct(WorkoutSession.id)).label("sessions"),
+                func.coalesce(load, 0).label("load"),
+            )
+            .outerjoin(WorkoutExercise, WorkoutExercise.workout_session_id == WorkoutSession.id)
+            .where(
+                WorkoutSession.user_id.in_(user_ids),
+                WorkoutSession.completed.is_(True),
+                session_time >= start,
+                session_time < end,
+            )
+            .group_by(WorkoutSession.user_id, session_day)
+        )
+
+        meal_day = utc_date(MealLog.meal_date)
+        nutrition = (
+            select(
+                MealLog.user_id,
+                meal_day.label("day"),
+                func.sum(MealLog.calories).label("calories"),
+                func.sum(MealLog.protein_g).label("protein"),
+            )
+            .where(MealLog.user_id.in_(user_ids), MealLog.meal_date >= start, MealLog.meal_date < end)
+            .group_by(MealLog.user_id, meal_day)
+        )
+
+        metric_day = utc_date(BodyMetrics.measured_at)
+        weight = (
+            select(BodyMetrics.user_id, metric_day.label("day"), func.avg(BodyMetrics.weight).label("weight"))
+            .where(BodyMetrics.user_id.in_(user_ids), BodyMetrics.measured_at >= start, BodyMetrics.measured_at < end)
+            .group_by(BodyMetrics.user_id, metric_day)
+        )
+
+        targets = (
+            select(NutritionPlan.user_id, func.max(NutritionPlan.daily_calories).label("daily_calories"))
+            .where(NutritionPlan.user_id.in_(user_ids), NutritionPlan.is_active.is_(True))
+            .group_by(NutritionPlan.user_id)
+        )
+
+        return {
+            name: (await self.db.execute(stmt)).all()
+            for name, stmt in (("training", training), ("nutrition", nutrition), ("weight", weight), ("targets", targets))
+        }
+
+    # Stored reports
+
+    async def get_weekly_report(self, user_id: int, week_start: date) -> Optional[Dict[str, Any]]:
+        """The stored report for a user and week, if any."""
+        stmt = select(WeeklyReport.report).where(
+            WeeklyReport.user_id == user_id,
+            WeeklyReport.week_start == week_start,
+        )
+        return await self.db.scalar(stmt)
+
+    async def save_weekly_reports(
+        self,
+        week_start: date,
+        reports: Sequence[Tuple[int, Dict[str, Any], Dict[str, Any]]],
+    ) -> None:
+        """
+        Store reports, replacing existing ones for the same users and week.
+
+        Args:
+            week_start: Monday of the reported week
+            reports: (user id, week data, report) tuples
+        """
+        if not reports:
+            return
+        await self.db.execute(
+            delete(WeeklyReport).where(
+                WeeklyReport.week_start == week_start,
+                WeeklyReport.user_id.in_([user_id for user_id, _, _ in reports]),
+            )
+        )
+        await self.db.execute(
+            insert(WeeklyReport),
+            [
+                {"user_id": user_id, "week_start": week_start, "week_data": week_data, "report": report}
+                for user_id, week_data, report in reports
+            ],
+        )
+
+    # Batch runs
+
+    async def get_run(self, week_start: date) -> Optional[WeeklyReportRun]:
+        return await self.db.scalar(select(WeeklyReportRun).where(WeeklyReportRun.week_start == week_start))
+
+    async def create_run(self, week_start: date) -> Optional[WeeklyReportRun]:
+        """Create the run for a week; None if it exists already."""
+        try:
+            async with self.db.begin_nested():
+                run = WeeklyReportRun(
+                    week_start=week_start,
+                    status="running",
+                    last_user_id=0,
+                    reports=0,
+                    failures=0,
+                    claimed_at=datetime.now(timezone.utc),
+                )
+                self.db.add(run)
+        except IntegrityError:
+            # Created by another worker
+            return None
+        return run
+
+    async def get_or_create_run(self, week_start: date) -> WeeklyReportRun:
+        """The run for a week, created on first use."""
+        run = await self.get_run(week_start)
+        if run is not None:
+            return run
+        return await self.create_run(week_start) or await self.get_run(week_start)
+
+    async def claim_run(self, run_id: int, owner: str, stale_after: float) -> bool:
+        """
+        Take an unfinished run for a batch job.
+
+        Succeeds if no job holds the run, or its holder stopped refreshing
+        the claim more than ``stale_after`` seconds ago.
+        """
+        now = datetime.now(timezone.utc)
+        result = await self.db.execute(
+            update(WeeklyReportRun)
+            .where(
+                WeeklyReportRun.id == run_id,
+                WeeklyReportRun.status == "running",
+                (WeeklyReportRun.claimed_by.is_(None))
+                | (WeeklyReportRun.claimed_at < now - timedelta(seconds=stale_after)),
+            )
+            .values(claimed_by=owner, claimed_at=now)
+        )
+        return result.rowcount == 1
+
+    async def revive_run(self, week_start: date, stale_after: float) -> bool:
+        """
+        Mark an abandoned run as picked up for resubmission.
+
+        A run is abandoned when it is unfinished and no job has held it for
+        ``stale_after`` seconds, e.g. its job was lost or gave up. Only one
+        caller revives it.
+        """
+        now = datetime.now(timezone.utc)
+        result = await self.db.execute(
+            update(WeeklyReportRun)
+            .where(
+                WeeklyReportRun.week_start == week_start,
+                WeeklyReportRun.status == "running",
+                WeeklyReportRun.claimed_by.is_(None),
+                (WeeklyReportRun.claimed_at.is_(None))
+                | (WeeklyReportRun.claimed_at < now - timedelta(seconds=stale_after)),
+            )
+            .values(claimed_at=now)
+        )
+        return result.rowcount == 1
+
+    async def refresh_run_claim(self, run_id: int, owner: str) -> bool:
+        """Keep holding a run; False if the claim was lost."""
+        result = await self.db.execute(
+            update(WeeklyReportRun)
+            .where(WeeklyReportRun.id == run_id, WeeklyReportRun.claimed_by == owner)
+            .values(claimed_at=datetime.now(timezone.utc))
+        )
+        return result.rowcount == 1
+
+    async def release_run(self, run_id: int, owner: str) -> None:
+        # claimed_at stays: when the run was last worked on
+        await self.db.execute(
+            update(WeeklyReportRun)
+            .where(WeeklyReportRun.id == run_id, WeeklyReportRun.claimed_by == owner)
+            .values(claimed_by=None)
+        )
+
+    async def checkpoint_run(self, run_id: int, owner: str, last_user_id: int, reports: int, failures: int) -> bool:
+        """
+        Advance a run past a stored chunk.
+
+        Returns:
+            False if ``owner`` no longer holds the run
+        """
+        result = await self.db.execute(
+            update(WeeklyReportRun)
+            .where(WeeklyReportRun.id == run_id, WeeklyReportRun.claimed_by == owner)
+            .values(
+                last_user_id=last_user_id,
+                reports=WeeklyReportRun.reports + reports,
+                failures=WeeklyReportRun.failures + failures,
+                claimed_at=datetime.now(timezone.utc),
+            )
+        )
+        return result.rowcount == 1
+
+    async def complete_run(self, run_id: int, owner: str) -> bool:
+        result = await self.db.execute(
+            update(WeeklyReportRun)
+            .where(WeeklyReportRun.id == run_id, WeeklyReportRun.claimed_by == owner)
+            .values(status="completed", claimed_by=None, finished_at=func.now())
+        )
+        return result.rowcount == 1
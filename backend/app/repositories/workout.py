@@ -0,0 +1,199 @@
+"""
+Workout plan repository.
+
+Loads WorkoutPlan -> WorkoutSession -> WorkoutExercise -> Exercise trees
+in a constant number of queries, independent of how many sessions and
+exercises a plan contains.
+"""
+from typing import Dict, List, Any, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.models.workout import WorkoutPlan, WorkoutSession, WorkoutExercise, Exercise
+
+
+# Columns selected for read-only views. Selecting plain columns returns
+# Row tuples instead of ORM instances, so nothing goes through the
+# identity map or attribute instrumentation.
+PLAN_COLUMNS = (
+    WorkoutPlan.id,
+    WorkoutPlan.user_id,
+    WorkoutPlan.name,
+    WorkoutPlan.description,
+    WorkoutPlan.workout_type,
+    WorkoutPlan.frequency_per_week,
+    WorkoutPlan.duration_weeks,
+    WorkoutPlan.is_active,
+    WorkoutPlan.ai_rationale,
+    WorkoutPlan.created_at,
+    WorkoutPlan.start_date,
+    WorkoutPlan.end_date,
+)
+
+SESSION_COLUMNS = (
+    WorkoutSession.id,
+    WorkoutSession.workout_plan_id,
+    WorkoutSession.name,
+    WorkoutSession.day_of_week,
+    WorkoutSession.target_muscle_groups,
+    WorkoutSession.notes,
+    WorkoutSession.completed,
+    WorkoutSession.scheduled_date,
+    WorkoutSession.completed_date,
+)
+
+EXERCISE_COLUMNS = (
+    WorkoutExercise.id,
+    WorkoutExercise.workout_session_id,
+    WorkoutExercise.exercise_id,
+    WorkoutExercise.order,
+    WorkoutExercise.sets,
+    WorkoutExercise.reps,
+    WorkoutExercise.rest_seconds,
+    WorkoutExercise.weight,
+    WorkoutExercise.duration_seconds,
+    WorkoutExercise.actual_sets,
+    WorkoutExercise.actual_reps,
+    WorkoutExercise.actual_weight,
+    WorkoutExercise.actual_duration_seconds,
+    WorkoutExercise.completed,
+    WorkoutExercise.notes,
+    Exercise.name.label("exercise_name"),
+    Exercise.muscle_group,
+    Exercise.exercise_type,
+    Exercise.equipment_required,
+)
+
+
+class WorkoutRepository:
+    """
+    Query layer for workout plans and sessions.
+
+    ORM loaders (``load_*``) eager-load the full relationship tree with
+    ``selectinload`` chains and are meant for code that modifies plans.
+    View builders (``get_*_view``) return plain dictionaries built from row
+    tuples and are meant for read-only API responses.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # ORM loaders
+
+    @staticmethod
+    def _plan_tree_options():
+        """Eager-load options for the plan -> session -> exercise tree."""
+        return (
+            selectinload(WorkoutPlan.workout_sessions)
+            .selectinload(WorkoutSession.exercises)
+            .selectinload(WorkoutExercise.exercise),
+        )
+
+    async def load_plan(self, plan_id: int, user_id: int) -> Optional[WorkoutPlan]:
+        """
+        Load a plan with all sessions and exercises attached.
+
+        Issues four queries: plans, sessions, workout exercises, exercises.
+        """
+        stmt = (
+            select(WorkoutPlan)
+            .where(WorkoutPlan.id == plan_id, WorkoutPlan.user_id == user_id)
+            .options(*self._plan_tree_options())
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().first()
+
+    async def load_active_plan(self, user_id: int) -> Optional[WorkoutPlan]:
+        """Load the user's active plan with its full tree."""
+        stmt = (
+            select(WorkoutPlan)
+            .where(WorkoutPlan.user_id == user_id, WorkoutPlan.is_active.is_(True))
+            .order_by(WorkoutPlan.created_at.desc())
+            .limit(1)
+            .options(*self._plan_tree_options())
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().first()
+
+    # Read-only views
+
+    async def get_plan_view(self, plan_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a plan as a serialized tree.
+
+        Issues at most three queries regardless of plan size.
+        """
+        stmt = select(*PLAN_COLUMNS).where(
+            WorkoutPlan.id == plan_id,
+            WorkoutPlan.user_id == user_id,
+        )
+        plan_row = (await self.db.execute(stmt)).first()
+        if plan_row is None:
+            return None
+
+        return await self._build_plan_view(plan_row)
+
+    async def get_active_plan_view(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get the user's active plan as a serialized tree."""
+        stmt = (
+            select(*PLAN_COLUMNS)
+            .where(WorkoutPlan.user_id == user_id, WorkoutPlan.is_active.is_(True))
+            .order_by(WorkoutPlan.created_at.desc())
+            .limit(1)
+        )
+        plan_row = (await self.db.execute(stmt)).first()
+        if plan_row is None:
+            return None
+
+        return await self._build_plan_view(plan_row)
+
+    async def get_sessions_view(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the user's most recent sessions with their exercises.
+
+        Issues at most two queries regardless of ``limit``.
+        """
+        stmt = (
+            select(*SESSION_COLUMNS)
+            .where(WorkoutSession.user_id == user_id)
+            .order_by(
+                WorkoutSession.scheduled_date.desc().nulls_last(),
+                WorkoutSession.created_at.desc(),
+            )
+            .limit(limit)
+        )
+        session_rows = (await self.db.execute(stmt)).all()
+        return await self._attach_exercises(session_rows)
+
+    async def _build_plan_view(self, plan_row: Row) -> Dict[str, Any]:
+        """Attach sessions and exercises to a plan row."""
+        stmt = (
+            select(*SESSION_COLUMNS)
+            .where(WorkoutSession.workout_plan_id == plan_row.id)
+            .order_by(WorkoutSession.day_of_week, WorkoutSession.id)
+        )
+        session_rows = (await self.db.execute(stmt)).all()
+
+        plan = dict(plan_row._mapping)
+        plan["sessions"] = await self._attach_exercises(session_rows)
+        return plan
+
+    async def _attach_exercises(self, session_rows: Sequence[Row]) -> List[Dict[str, Any]]:
+        """Load exercises for all given sessions in a single query."""
+        sessions = [dict(row._mapping, exercises=[]) for row in session_rows]
+        if not sessions:
+            return sessions
+
+        by_id = {session["id"]: session for session in sessions}
+        stmt = (
+            select(*EXERCISE_COLUMNS)
+            .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+            .where(WorkoutExercise.workout_session_id.in_(by_id.keys()))
+            .order_by(WorkoutExercise.workout_session_id, WorkoutExercise.order)
+        )
+        for row in (await self.db.execute(stmt)).all():
+            exercise = dict(row._mapping)
+            by_id[exercise.pop("workout_session_id")]["exercises"].append(exercise)
+
+        return sessions
@@ -0,0 +1,234 @@
+"""
+Schemas for structured agent (LLM) outputs.
+
+One model per response type. Models are deliberately lenient: unknown keys
+are kept, only the keys handlers depend on are required, and numeric fields
+accept strings such as "25%" or "2500 kcal". They exist to guarantee the
+shape API handlers depend on, not to reject reasonable model output.
+"""
+import re
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from typing import Annotated, List, Optional, Dict, Any, Union
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _coerce_number(value: Any) -> Any:
+    """Pull the first number out of strings like '25%' or '约2500 kcal'."""
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value.replace(",", ""))
+        return float(match.group()) if match else None
+    return value
+
+
+def _coerce_bool(value: Any) -> Any:
+    """Accept 'true'/'false'/'是'/'否' style strings."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "是", "1")
+    return value
+
+
+def _coerce_text(value: Any) -> Any:
+    """Accept numbers and lists where free text is expected."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, list):
+        return "\n".join(str(item) for item in value)
+    return value
+
+
+Number = Annotated[Optional[float], BeforeValidator(_coerce_number)]
+Flag = Annotated[Optional[bool], BeforeValidator(_coerce_bool)]
+Text = Annotated[Optional[str], BeforeValidator(_coerce_text)]
+
+
+class AgentOutput(BaseModel):
+    """Base class for agent outputs; keeps keys the schema doesn't declare."""
+    model_config = ConfigDict(extra="allow")
+
+
+# Fitness agent
+
+class IntentAnalysis(AgentOutput):
+    """Intent classification of a user message."""
+    intent: str = "general"
+    confidence: Number = 0.5
+    extracted_info: Dict[str, Any] = Field(default_factory=dict)
+
+
+# Workout planner
+
+class PlannedExercise(AgentOutput):
+    name: str
+    sets: Number = None
+    reps: Union[int, str, None] = None
+    rest_seconds: Number = None
+    notes: Text = None
+
+
+class TrainingDay(AgentOutput):
+    day: Union[int, str, None] = None
+    name: Text = None
+    target_muscles: List[str] = Field(default_factory=list)
+    exercises: List[PlannedExercise] = Field(default_factory=list)
+
+
+class WorkoutPlanOutput(AgentOutput):
+    """Generated weekly workout plan."""
+    plan_name: str
+    workout_type: str = "custom"
+    duration_weeks: Number = 12
+    frequency_per_week: Number = None
+    rationale: Text = None
+    weekly_schedule: List[TrainingDay] = Field(default_factory=list)
+    progression_advice: Text = None
+
+
+class WorkoutSplitOutput(AgentOutput):
+    """Suggested workout split."""
+    recommended_split: str
+    split_type: str = "custom"
+    days_breakdown: List[str] = Field(default_factory=list)
+    rationale: Text = None
+    pros: List[str] = Field(default_factory=list)
+    cons: List[str] = Field(default_factory=list)
+
+
+class IntensityRecommendation(AgentOutput):
+    exercise: Text = None
+    current: Text = None
+    suggested: Text = None
+    reason: Text = None
+
+
+class IntensityAdjustmentOutput(AgentOutput):
+    """Suggested workout intensity adjustments."""
+    adjustment_needed: Flag = False
+    progress_assessment: Text = None
+    recommendations: List[IntensityRecommendation] = Field(default_factory=list)
+    overall_feedback: Text = None
+
+
+# Nutrition planner
+
+class Macros(AgentOutput):
+    protein_g: Number = None
+    carbs_g: Number = None
+    fats_g: Number = None
+    fiber_g: Number = None
+
+
+class MacroPlanOutput(AgentOutput):
+    """Daily calorie and macro targets."""
+    bmr: Number = None
+    tdee: Number = None
+    target_calories: Number
+    calorie_adjustment: Text = None
+    macros: Macros
+    macro_percentages: Dict[str, Any] = Field(default_factory=dict)
+    rationale: Text = None
+    meal_timing: Text = None
+
+
+class MealDescription(AgentOutput):
+    meal: Optional[int] = None
+    name: Text = None
+    description: Text = None
+
+
+class MealPlanOutput(AgentOutput):
+    """Names and descriptions of an optimized meal plan's meals."""
+    meals: List[MealDescription] = Field(default_factory=list)
+    meal_prep_tips: Text = None
+    hydration_reminder: Text = None
+
+
+class MealLogAnalysisOutput(AgentOutput):
+    """Feedback on a day's meal log."""
+    current_status: Dict[str, Any] = Field(default_factory=dict)
+    feedback: Text = None
+    recommendations: List[str] = Field(default_factory=list)
+    suggested_foods: List[str] = Field(default_factory=list)
+
+
+class ParsedFood(AgentOutput):
+    name: str
+    amount_g: Number = None
+    amount_description: Text = None
+    calories: Number = None
+    protein_g: Number = None
+    carbs_g: Number = None
+    fats_g: Number = None
+    confidence: Text = None
+
+
+class FoodParseOutput(AgentOutput):
+    """Foods parsed from a natural language description."""
+    foods: List[ParsedFood]
+    total_macros: Dict[str, Any] = Field(default_factory=dict)
+    notes: Text = None
+
+
+# Progress analyzer
+
+class TrainingProgressOutput(AgentOutput):
+    """Training progress analysis."""
+    consistency_score: Number = None
+    consistency_analysis: Text = None
+    strength_progress: Dict[str, Any] = Field(default_factory=dict)
+    plateau_detected: Flag = False
+    plateau_analysis: Text = None
+    recommendations: List[Dict[str, Any]] = Field(default_factory=list)
+    overall_assessment: Text = None
+    motivation_message: Text = None
+
+
+class BodyMetricsAnalysisOutput(AgentOutput):
+    """Body metrics trend analysis."""
+    weight_analysis: Dict[str, Any] = Field(default_factory=dict)
+    body_fat_analysis: Dict[str, Any] = Field(default_factory=dict)
+    goal_progress: Dict[str, Any] = Field(default_factory=dict)
+    health_assessment: Text = None
+    recommendations: List[str] = Field(default_factory=list)
+    concerns: List[str] = Field(default_factory=list)
+
+
+class WeeklyReportOutput(AgentOutput):
+    """Weekly progress report."""
+    week_number: Union[int, str, None] = None
+    date_range: Text = None
+    training_summary: Dict[str, Any] = Field(default_factory=dict)
+    nutrition_summary: Dict[str, Any] = Field(default_factory=dict)
+    body_metrics_change: Dict[str, Any] = Field(default_factory=dict)
+    achievements: List[str] = Field(default_factory=list)
+    areas_for_improvement: List[str] = Field(default_factory=list)
+    next_week_focus: List[str] = Field(default_factory=list)
+    motivational_message: Text = None
+
+
+class PlanAdjustmentsOutput(AgentOutput):
+    """Suggested workout and nutrition plan adjustments."""
+    adjustment_needed: Flag = False
+    urgency: Text = None
+    workout_adjustments: List[Dict[str, Any]] = Field(default_factory=list)
+    nutrition_adjustments: List[Dict[str, Any]] = Field(default_factory=list)
+    recovery_recommendations: List[str] = Field(default_factory=list)
+    implementation_plan: Text = None
+    monitoring_points: List[str] = Field(default_factory=list)
+
+
+class DetectedIssue(AgentOutput):
+    issue_type: str
+    severity: Text = None
+    description: Text = None
+    indicators: List[str] = Field(default_factory=list)
+    recommendations: List[str] = Field(default_factory=list)
+    action_required: Union[bool, str, None] = None
+
+
+class IssueDetectionOutput(AgentOutput):
+    """Health and training issue detection."""
+    issues_detected: List[DetectedIssue] = Field(default_factory=list)
+    overall_health_score: Number = None
+    warnings: List[str] = Field(default_factory=list)
+    positive_notes: List[str] = Field(default_factory=list)
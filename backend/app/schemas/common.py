@@ -0,0 +1,41 @@
+"""
+Strict base model and field types for request bodies.
+
+The opposite of the lenient agent output schemas: request bodies come from
+our own clients, so anything unexpected is a client bug and is rejected with
+a 422 instead of being guessed at. Unknown keys are errors, and numbers must
+be JSON numbers within physical bounds; strings such as "80", booleans and
+NaN/Infinity are not coerced.
+"""
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated
+
+
+class RequestModel(BaseModel):
+    """Base class for request bodies."""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
+
+def _number(**bounds):
+    return Field(strict=True, allow_inf_nan=False, **bounds)
+
+
+# Counts and ids
+Id = Annotated[int, Field(strict=True, ge=1)]
+Sets = Annotated[int, Field(strict=True, ge=0, le=50)]
+Reps = Annotated[int, Field(strict=True, ge=0, le=1000)]
+Seconds = Annotated[int, Field(strict=True, ge=0, le=86400)]
+
+# Nutrition
+Kcal = Annotated[float, _number(ge=0, le=20000)]
+Grams = Annotated[float, _number(ge=0, le=5000)]
+
+# Body and load
+Kilograms = Annotated[float, _number(ge=0, le=1000)]
+BodyWeight = Annotated[float, _number(ge=20, le=400)]
+Centimeters = Annotated[float, _number(gt=0, le=300)]
+Percentage = Annotated[float, _number(ge=0, le=100)]
+
+# Text
+Name = Annotated[str, Field(min_length=1, max_length=255)]
+Note = Annotated[str, Field(max_length=2000)]
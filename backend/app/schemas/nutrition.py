@@ -0,0 +1,67 @@
+"""
+Nutrition request schemas.
+"""
+from pydantic import Field, model_validator
+from typing import List, Literal, Optional
+from datetime import datetime
+from app.models.nutrition import MealType
+from app.schemas.common import Grams, Id, Kcal, Name, Note, RequestModel
+
+# Meals per analysis request; a day of logging fits well within this
+MAX_ANALYZED_MEALS = 50
+
+# MealType values as a Literal: validated inside pydantic-core, where enum
+# fields call back into Python for every item
+MealTypeName = Literal[tuple(meal_type.value for meal_type in MealType)]
+
+
+class MacroTargets(RequestModel):
+    """Daily calorie and macro targets."""
+    calories: Kcal = Field(..., gt=0)
+    protein_g: Grams
+    carbs_g: Grams
+    fats_g: Grams
+
+
+class MealPlanRequest(RequestModel):
+    """Request for meal plan generation; targets default to the active nutrition plan."""
+    macro_targets: Optional[MacroTargets] = None
+
+
+class MealLogCreate(RequestModel):
+    """Request for logging one food of a meal."""
+    meal_type: MealTypeName
+    meal_date: datetime
+    food_item_id: Optional[Id] = None
+    custom_food_name: Optional[Name] = None
+    serving_size_g: Grams = Field(..., gt=0)
+
+    calories: Kcal
+    protein_g: Grams
+    carbs_g: Grams
+    fats_g: Grams
+    fiber_g: Optional[Grams] = None
+
+    notes: Optional[Note] = None
+
+    @model_validator(mode="after")
+    def _named_food(self) -> "MealLogCreate":
+        if self.food_item_id is None and self.custom_food_name is None:
+            raise ValueError("food_item_id or custom_food_name is required")
+        return self
+
+
+class MealEntry(RequestModel):
+    """Totals of one logged meal, as sent for analysis."""
+    meal_type: MealTypeName
+    name: Optional[Name] = None
+    calories: Kcal
+    protein_g: Grams
+    carbs_g: Grams
+    fats_g: Grams
+
+
+class MealAnalysisRequest(RequestModel):
+    """Request for analyzing logged meals against targets."""
+    meals: List[MealEntry] = Field(..., min_length=1, max_length=MAX_ANALYZED_MEALS)
+    target_macros: MacroTargets
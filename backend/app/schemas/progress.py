@@ -0,0 +1,37 @@
+"""
+Progress tracking request schemas.
+"""
+from pydantic import Field
+from typing import Literal, Optional
+from datetime import datetime
+from app.schemas.common import BodyWeight, Centimeters, Kilograms, Name, Note, Percentage, RequestModel
+
+
+class BodyMetricsCreate(RequestModel):
+    """Request for logging body measurements; measured_at defaults to now."""
+    weight: BodyWeight  # kg
+    body_fat_percentage: Optional[Percentage] = None
+    muscle_mass: Optional[Kilograms] = None  # kg
+    bmi: Optional[float] = Field(None, strict=True, allow_inf_nan=False, ge=5, le=100)
+
+    # Body measurements (cm)
+    chest: Optional[Centimeters] = None
+    waist: Optional[Centimeters] = None
+    hips: Optional[Centimeters] = None
+    bicep_left: Optional[Centimeters] = None
+    bicep_right: Optional[Centimeters] = None
+    thigh_left: Optional[Centimeters] = None
+    thigh_right: Optional[Centimeters] = None
+    calf_left: Optional[Centimeters] = None
+    calf_right: Optional[Centimeters] = None
+
+    measured_at: Optional[datetime] = None
+    notes: Optional[Note] = None
+
+
+class ProgressLogCreate(RequestModel):
+    """Request for a general progress log entry; log_date defaults to now."""
+    title: Name
+    content: str = Field(..., min_length=1, max_length=10000)
+    log_type: Literal["general", "achievement", "issue", "note"] = "general"
+    log_date: Optional[datetime] = None
@@ -0,0 +1,27 @@
+"""
+Workout request schemas.
+"""
+from pydantic import Field
+from typing import List, Optional
+from datetime import datetime
+from app.schemas.common import Id, Kilograms, Name, Note, Reps, RequestModel, Seconds, Sets
+
+
+class ExerciseLog(RequestModel):
+    """Performed sets of one exercise."""
+    exercise_id: Id
+    sets: Sets
+    reps: Reps
+    weight: Optional[Kilograms] = None  # kg
+    duration_seconds: Optional[Seconds] = None  # for cardio/timed exercises
+    completed: bool = True
+    notes: Optional[Note] = None
+
+
+class WorkoutSessionLog(RequestModel):
+    """Request for logging a completed workout session."""
+    workout_plan_id: Optional[Id] = None
+    name: Name
+    completed_date: datetime
+    exercises: List[ExerciseLog] = Field(..., min_length=1, max_length=50)
+    notes: Optional[Note] = None
@@ -0,0 +1,30 @@
+"""
+Application services shared by API routers and agents.
+"""
+from app.services.user_context import UserContext, UserContextCache, user_context_cache
+from app.services.usage import QuotaExceededError, UsageLedger, bind_user, usage_ledger
+from app.services.jobs import JobQueue, job_queue
+from app.services.health_rules import HealthSeries, RuleEngine, load_health_series
+from app.services.meal_optimizer import Exclusions, FoodCatalog, MealPlanOptimizer, food_catalog_cache
+from app.services.weekly_reports import WeeklyReportBatch, WeeklyReportScheduler
+
+__all__ = [
+    "UserContext",
+    "UserContextCache",
+    "user_context_cache",
+    "QuotaExceededError",
+    "UsageLedger",
+    "bind_user",
+    "usage_ledger",
+    "JobQueue",
+    "job_queue",
+    "HealthSeries",
+    "RuleEngine",
+    "load_health_series",
+    "Exclusions",
+    "FoodCatalog",
+    "MealPlanOptimizer",
+    "food_catalog_cache",
+    "WeeklyReportBatch",
+    "WeeklyReportScheduler",
+]
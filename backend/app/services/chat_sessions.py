@@ -0,0 +1,414 @@
+"""
+Chat sessions over WebSocket.
+
+Every POST to /api/chat/message re-resolves the user, looks up the
+conversation and sends its whole history again. A WebSocket session keeps
+that state resident for the life of the connection: the user, their
+context (revalidated against the user context cache on each turn, so a
+profile change still shows up, without a DB round trip while the cache
+entry is fresh) and the conversation history, trimmed to
+CHAT_HISTORY_TOKEN_BUDGET so the prompt stays bounded however long the
+session runs. The full transcript still goes to the shared conversation
+store, so the conversation endpoints see it.
+
+Protocol, JSON text frames:
+
+    client -> server
+        {"type": "message", "content": "..."}
+        {"type": "ping"} | {"type": "pong"}
+    server -> client
+        {"type": "session", "conversation_id": "...", "history_messages": n}
+        {"type": "token", "content": "..."}        pieces of the reply, in order
+        {"type": "done", "conversation_id": "...", "message": "...", "intent": ..., "metadata": ...}
+        {"type": "error", "code": "invalid" | "busy" | "rate_limited" | "quota_exceeded" | "llm_error", "detail": "..."}
+        {"type": "ping"} | {"type": "pong"}
+
+Flow control:
+
+- One reply at a time per socket; a message sent while a reply is
+  streaming is answered with a "busy" error.
+- Each message takes from the user's rate limit buckets like a POST to
+  /api/chat/message; over the limit it is answered with a "rate_limited"
+  error carrying retry_after.
+- Tokens are not queued as frames. Tokens produced while a frame is being
+  written are merged into the next one, so a slow client gets fewer,
+  larger frames, the buffer never exceeds one reply, and the LLM stream
+  (and its scheduler slot) never waits on the socket.
+- A frame not written within CHAT_WS_SEND_TIMEOUT_SECONDS, or control
+  frames piling up behind a client that stopped reading, close the socket
+  with 1008.
+- The server pings every CHAT_WS_HEARTBEAT_SECONDS; a client that sends
+  nothing (pongs included) for CHAT_WS_IDLE_TIMEOUT_SECONDS is closed with
+  1001.
+- Connections beyond CHAT_WS_MAX_CONNECTIONS per worker are closed with
+  1013 (try again later) right after the handshake.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.rate_limit import rate_limiter, retry_after
+from app.core.telemetry import metrics
+from app.knowledge.embedding_service import percentile
+from app.schemas.chat import ChatRequest
+from app.services.usage import QuotaExceededError, estimate_tokens, usage_ledger
+from app.services.user_context import UserContext, user_context_cache
+
+logger = logging.getLogger(__name__)
+
+FIRST_TOKEN_DURATION = metrics.histogram(
+    "chat_ws_first_token_seconds", "Time from a WebSocket chat message to the first reply token"
+)
+
+# Close codes
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Control frames waiting behind a client that doesn't read
+MAX_QUEUED_FRAMES = 32
+
+# Replies kept for the latency percentiles in stats()
+LATENCY_WINDOW = 1000
+
+
+class ChatSession:
+    """
+    Conversation state of one connection.
+
+    Args:
+        user_id: Owner of the session
+        conversation_id: Conversation in the shared store
+        transcript: The conversation's stored messages; appended to
+        token_budget: Estimated tokens of history sent with each message
+    """
+
+    def __init__(self, user_id: int, conversation_id: str, transcript: List[Dict[str, str]], token_budget: int):
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.transcript = transcript
+        self.token_budget = token_budget
+        self.history_tokens = 0
+        self._history: Deque[Tuple[Dict[str, str], int]] = deque()
+        for message in transcript:
+            self._remember(message)
+
+    def history(self) -> List[Dict[str, str]]:
+        """Most recent messages within the token budget, oldest first."""
+        return [message for message, _ in self._history]
+
+    def add_exchange(self, message: str, reply: str) -> None:
+        for entry in ({"role": "user", "content": message}, {"role": "assistant", "content": reply}):
+            self.transcript.append(entry)
+            self._remember(entry)
+
+    def _remember(self, message: Dict[str, str]) -> None:
+        tokens = estimate_tokens(message["content"])
+        self._history.append((message, tokens))
+        self.history_tokens += tokens
+        while self._history and self.history_tokens > self.token_budget:
+            self._drop_oldest()
+        # History starts with a user message
+        while self._history and self._history[0][0]["role"] != "user":
+            self._drop_oldest()
+
+    def _drop_oldest(self) -> None:
+        _, tokens = self._history.popleft()
+        self.history_tokens -= tokens
+
+    async def user_context(self) -> UserContext:
+        """The user's context; only reaches the database when the cached entry expired or was invalidated."""
+        context = user_context_cache.peek(self.user_id)
+        if context is None:
+            async with AsyncSessionLocal() as db:
+                context = await user_context_cache.get(db, self.user_id)
+        return context
+
+
+class ChatConnection:
+    """
+    Serves one WebSocket: reads client frames, streams replies and sends
+    heartbeats, each in its own task.
+
+    Args:
+        websocket: Accepted socket
+        session: Conversation state
+        agent: FitnessAgent answering the messages
+        registry: Open connections and counters of this worker
+    """
+
+    def __init__(self, websocket: WebSocket, session: ChatSession, agent, registry: "ChatSessionRegistry"):
+        self.websocket = websocket
+        self.session = session
+        self.agent = agent
+        self.registry = registry
+        self._tokens: List[str] = []
+        self._frames: Deque[Dict[str, Any]] = deque()
+        self._wake = asyncio.Event()
+        self._stalled = False
+        self._reply: Optional[asyncio.Task] = None
+
+    def send(self, frame: Dict[str, Any]) -> None:
+        """Queue a control frame."""
+        if len(self._frames) >= MAX_QUEUED_FRAMES:
+            self._stalled = True
+            return
+        self._frames.append(frame)
+        self._wake.set()
+
+    def _push_token(self, token: str) -> None:
+        self._tokens.append(token)
+        self._wake.set()
+
+    async def run(self) -> None:
+        """Serve the connection until the client leaves or is disconnected."""
+        self.send({
+            "type": "session",
+            "conversation_id": self.session.conversation_id,
+            "history_messages": len(self.session.history()),
+        })
+        reader = asyncio.create_task(self._read())
+        writer = asyncio.create_task(self._write())
+        heartbeat = asyncio.create_task(self._heartbeat())
+        code = None
+        try:
+            done, _ = await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+            code = done.pop().result()
+        finally:
+            tasks = [task for task in (reader, writer, heartbeat, self._reply) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if code is not None:
+            try:
+                await self.websocket.close(code)
+            except Exception:
+                pass
+
+    async def _read(self) -> Optional[int]:
+        """Handle client frames; returns a close code, or None once the client has left."""
+        while True:
+            try:
+                text = await asyncio.wait_for(self.websocket.receive_text(), settings.CHAT_WS_IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self.registry.idle_closes += 1
+                return CLOSE_GOING_AWAY
+            except WebSocketDisconnect:
+                return None
+            except KeyError:
+                # Binary frame
+                self.send({"type": "error", "code": "invalid", "detail": "仅支持 JSON 文本消息"})
+                continue
+
+            try:
+                frame = json.loads(text)
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                kind = None
+
+            if kind == "message":
+                self._on_message(frame.get("content"))
+            elif kind == "ping":
+                self.send({"type": "pong"})
+            elif kind != "pong":
+                self.send({"type": "error", "code": "invalid", "detail": "无法识别的消息"})
+
+            if self._stalled:
+                self.registry.slow_client_closes += 1
+                return CLOSE_POLICY_VIOLATION
+
+    def _on_message(self, content: Any) -> None:
+        try:
+            request = ChatRequest.model_validate({"message": content})
+        except ValidationError:
+            self.send({"type": "error", "code": "invalid", "detail": "消息内容不能为空"})
+            return
+        if not request.message.strip():
+            self.send({"type": "error", "code": "invalid", "detail": "消息内容不能为空"})
+            return
+
+        if self._reply is not None and not self._reply.done():
+            self.registry.busy_rejections += 1
+            self.send({"type": "error", "code": "busy", "detail": "上一条消息仍在回复中"})
+            return
+        self._reply = asyncio.create_task(self._respond(request.message))
+
+    async def _respond(self, message: str) -> None:
+        """Stream the reply to one message, then send its done frame."""
+        self.registry.messages += 1
+        if settings.RATE_LIMIT_ENABLED:
+            wait = await rate_limiter.check(f"user:{self.session.user_id}", "POST", "/api/chat/message")
+            if wait:
+                self.send({
+                    "type": "error",
+                    "code": "rate_limited",
+                    "detail": "请求过于频繁，请稍后再试",
+                    "retry_after": retry_after(wait),
+                })
+                return
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        intent = None
+        try:
+            await usage_ledger.check_quota(self.session.user_id)
+            context = await self.session.user_context()
+            # Runs alongside the reply, so it adds no latency
+            intent = asyncio.create_task(self.agent.analyze_intent(message))
+
+            async for token in self.agent.stream_chat(
+                message,
+                user_context=context.profile,
+                chat_history=self.session.history(),
+                context=context.rendered,
+            ):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    FIRST_TOKEN_DURATION.observe(first_token_at - start)
+                    self.registry.first_token_ms.append((first_token_at - start) * 1000)
+                parts.append(token)
+                self.registry.tokens += 1
+                self._push_token(token)
+
+            reply = "".join(parts)
+            self.session.add_exchange(message, reply)
+            intent_data = await intent
+        except QuotaExceededError as e:
+            self.send({
+                "type": "error",
+                "code": "quota_exceeded",
+                "detail": "今日 AI 使用额度已用完，请明天再试",
+                "retry_after": e.retry_after,
+            })
+            return
+        except Exception as e:
+            self.registry.errors += 1
+            logger.warning("WebSocket chat reply failed: %s", e)
+            self.send({"type": "error", "code": "llm_error", "detail": str(e)})
+            return
+        finally:
+            if intent is not None and not intent.done():
+                intent.cancel()
+
+        self.registry.replies += 1
+        self.registry.reply_ms.append((time.perf_counter() - start) * 1000)
+        self.send({
+            "type": "done",
+            "conversation_id": self.session.conversation_id,
+            "message": reply,
+            "intent": intent_data.get("intent"),
+            "metadata": intent_data.get("extracted_info"),
+        })
+
+    async def _write(self) -> Optional[int]:
+        """Write queued frames; returns a close code, or None once the socket is gone."""
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._tokens or self._frames:
+                # Pending tokens go first, so a done frame always follows its reply
+                if self._tokens:
+                    frames = [{"type": "token", "content": "".join(self._tokens)}]
+                    self.registry.merged_tokens += len(self._tokens) - 1
+                    self._tokens.clear()
+                else:
+                    frames = []
+                if self._frames:
+                    frames.append(self._frames.popleft())
+
+                for frame in frames:
+                    try:
+                        await asyncio.wait_for(
+                            self.websocket.send_text(json.dumps(frame, ensure_ascii=False)),
+                            settings.CHAT_WS_SEND_TIMEOUT_SECONDS,
+                        )
+                    except asyncio.TimeoutError:
+                        self.registry.slow_client_closes += 1
+                        return CLOSE_POLICY_VIOLATION
+                    except Exception:
+                        return None
+                    self.registry.frames_sent += 1
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CHAT_WS_HEARTBEAT_SECONDS)
+            self.send({"type": "ping"})
+
+
+class ChatSessionRegistry:
+    """
+    Open chat connections of this worker, with the connection cap and
+    counters for /stats/chat.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._connections: Set[ChatConnection] = set()
+        self.peak_connections = 0
+
+        self.opened = 0
+        self.refused = 0
+        self.messages = 0
+        self.replies = 0
+        self.errors = 0
+        self.busy_rejections = 0
+        self.tokens = 0
+        self.merged_tokens = 0
+        self.frames_sent = 0
+        self.idle_closes = 0
+        self.slow_client_closes = 0
+        self.first_token_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.reply_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    async def serve(self, websocket: WebSocket, session: ChatSession, agent) -> None:
+        """Accept the socket and serve it, or close it when the worker is at capacity."""
+        await websocket.accept()
+        if len(self._connections) >= self.max_connections:
+            self.refused += 1
+            await websocket.close(CLOSE_TRY_AGAIN_LATER)
+            return
+
+        connection = ChatConnection(websocket, session, agent, self)
+        self._connections.add(connection)
+        self.opened += 1
+        self.peak_connections = max(self.peak_connections, len(self._connections))
+        try:
+            await connection.run()
+        finally:
+            self._connections.discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection counts, reply counters and latency percentiles (ms)."""
+        return {
+            "connections": len(self._connections),
+            "peak_connections": self.peak_connections,
+            "max_connections": self.max_connections,
+            "opened": self.opened,
+            "refused": self.refused,
+            "messages": self.messages,
+            "replies": self.replies,
+            "errors": self.errors,
+            "busy_rejections": self.busy_rejections,
+            "tokens": self.tokens,
+            "frames_sent": self.frames_sent,
+            "merged_tokens": self.merged_tokens,
+            "idle_closes": self.idle_closes,
+            "slow_client_closes": self.slow_client_closes,
+            "latency_ms": {
+                name: {"p50": round(percentile(values, 0.5), 3), "p95": round(percentile(values, 0.95), 3)}
+                for name, values in (("first_token", self.first_token_ms), ("reply", self.reply_ms))
+            },
+        }
+
+
+chat_sessions = ChatSessionRegistry(max_connections=settings.CHAT_WS_MAX_CONNECTIONS)
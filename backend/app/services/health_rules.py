@@ -0,0 +1,316 @@
+"""
+Rule engine for health and overtraining checks.
+
+Overtraining, under-eating and rapid weight change are threshold rules over
+a user's daily time series (weekly weight change above 1% of bodyweight,
+days below the calorie target, acute:chronic workload ratio above 1.5, ...).
+They are evaluated locally with numpy over a matrix with one row per user,
+so checking one user or thousands takes milliseconds; the LLM is only asked
+to explain the issues that were flagged.
+
+The rule set is declarative: each Rule compares one metric from
+``compute_metrics`` with a threshold.
+"""
+import operator
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.repositories.progress import ProgressRepository, as_date
+
+# Days of history per user: the chronic workload window
+WINDOW_DAYS = 28
+
+# Health score penalty per flagged issue
+SEVERITY_PENALTY = {"high": 25, "medium": 10, "low": 5}
+
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+@dataclass
+class HealthSeries:
+    """
+    Daily series of users over the same window.
+
+    Arrays are (users, days) with the last column being the most recent
+    day; NaN means nothing was recorded that day.
+    """
+    user_ids: List[int]
+    end: date
+    weight: np.ndarray          # kg, daily mean
+    calories: np.ndarray        # kcal eaten
+    protein: np.ndarray         # g eaten
+    training_load: np.ndarray   # kg lifted (sets x reps x weight), 0 on rest days
+    sessions: np.ndarray        # completed sessions, 0 on rest days
+    sleep_hours: np.ndarray
+    calorie_target: np.ndarray  # (users,) daily kcal target, NaN without a plan
+
+    @classmethod
+    def empty(cls, user_ids: Sequence[int], end: date, days: int = WINDOW_DAYS) -> "HealthSeries":
+        shape = (len(user_ids), days)
+        return cls(
+            user_ids=list(user_ids),
+            end=end,
+            weight=np.full(shape, np.nan),
+            calories=np.full(shape, np.nan),
+            protein=np.full(shape, np.nan),
+            training_load=np.zeros(shape),
+            sessions=np.zeros(shape),
+            sleep_hours=np.full(shape, np.nan),
+            calorie_target=np.full(len(user_ids), np.nan),
+        )
+
+    @property
+    def days(self) -> int:
+        return self.weight.shape[1]
+
+    def day_index(self, day: date) -> Optional[int]:
+        """Column of a day, or None outside the window."""
+        index = self.days - 1 - (self.end - day).days
+        return index if 0 <= index < self.days else None
+
+    @classmethod
+    def from_records(
+        cls,
+        user_data: Dict[str, Any],
+        end: date,
+        user_id: int = 0,
+        days: int = WINDOW_DAYS,
+    ) -> "HealthSeries":
+        """
+        Single-user series from record lists.
+
+        Args:
+            user_data: ``workouts`` ({date, volume}), ``nutrition``
+                ({date, calories, protein_g}), ``body_metrics`` ({date,
+                weight}) and ``sleep`` ({date, hours}) lists with ISO
+                dates, and an optional ``calorie_target``
+            end: Most recent day
+        """
+        series = cls.empty([user_id], end, days)
+
+        def add(records, array, key):
+            for record in records:
+                index = series.day_index(date.fromisoformat(str(record["date"])[:10]))
+                if index is None or record.get(key) is None:
+                    continue
+                current = array[0, index]
+                array[0, index] = (0 if np.isnan(current) else current) + record[key]
+
+        for workout in user_data.get("workouts", []):
+            index = series.day_index(date.fromisoformat(str(workout["date"])[:10]))
+            if index is not None:
+                series.sessions[0, index] += 1
+                series.training_load[0, index] += workout.get("volume") or 0
+        add(user_data.get("nutrition", []), series.calories, "calories")
+        add(user_data.get("nutrition", []), series.protein, "protein_g")
+        add(user_data.get("sleep", []), series.sleep_hours, "hours")
+        for metric in user_data.get("body_metrics", []):
+            index = series.day_index(date.fromisoformat(str(metric["date"])[:10]))
+            if index is not None and metric.get("weight") is not None:
+                series.weight[0, index] = metric["weight"]
+        if user_data.get("calorie_target"):
+            series.calorie_target[0] = user_data["calorie_target"]
+        return series
+
+
+async def load_health_series(
+    db: AsyncSession,
+    user_ids: Sequence[int],
+    end: date,
+    days: int = WINDOW_DAYS,
+) -> HealthSeries:
+    """
+    Users' series for the ``days`` days ending on ``end``, from the database.
+
+    Sleep isn't recorded yet, so its series stays empty.
+    """
+    series = HealthSeries.empty(user_ids, end, days)
+    rows = {user_id: row for row, user_id in enumerate(series.user_ids)}
+    data = await ProgressRepository(db).daily_health(series.user_ids, end - timedelta(days=days - 1), end)
+
+    for record in data["training"]:
+        column = series.day_index(as_date(record.day))
+        if column is not None:
+            series.sessions[rows[record.user_id], column] = record.sessions
+            series.training_load[rows[record.user_id], column] = record.load
+    for record in data["nutrition"]:
+        column = series.day_index(as_date(record.day))
+        if column is not None:
+            series.calories[rows[record.user_id], column] = record.calories
+            series.protein[rows[record.user_id], column] = record.protein
+    for record in data["weight"]:
+        column = series.day_index(as_date(record.day))
+        if column is not None:
+            series.weight[rows[record.user_id], column] = record.weight
+    for record in data["targets"]:
+        series.calorie_target[rows[record.user_id]] = record.daily_calories
+    return series
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last recorded value forward along each row."""
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def _mean(values: np.ndarray) -> np.ndarray:
+    """Row means ignoring NaN; NaN for rows with no values."""
+    counts = np.count_nonzero(~np.isnan(values), axis=1)
+    sums = np.nansum(values, axis=1)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def compute_metrics(series: HealthSeries) -> Dict[str, np.ndarray]:
+    """
+    Rule inputs, one value per user (NaN when the data is missing).
+
+    Returns:
+        Metric name -> (users,) array
+    """
+    weight = _forward_fill(series.weight)
+    current_weight = weight[:, -1]
+    week_ago_weight = weight[:, -8]
+
+    last_week_calories = series.calories[:, -7:]
+    below_target = last_week_calories < 0.8 * series.calorie_target[:, None]
+
+    # Acute: last 7 days; chronic: weekly mean of the 3 weeks before, so
+    # users without earlier training get no ratio rather than a spike
+    acute_load = series.training_load[:, -7:].sum(axis=1)
+    chronic_load = series.training_load[:, -28:-7].sum(axis=1) / 3
+
+    # Trailing run of days with a completed session
+    trained = (series.sessions > 0)[:, ::-1]
+    streak = np.where(trained.all(axis=1), series.days, np.argmin(trained, axis=1))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "weekly_weight_change_pct": (current_weight - week_ago_weight) / week_ago_weight * 100,
+            "average_calories": _mean(last_week_calories),
+            "deficit_days": np.where(np.isnan(series.calorie_target), np.nan, below_target.sum(axis=1)),
+            "protein_per_kg": _mean(series.protein[:, -7:]) / current_weight,
+            "acwr": np.where(chronic_load > 0, acute_load / chronic_load, np.nan),
+            "consecutive_training_days": streak.astype(float),
+            "average_sleep_hours": _mean(series.sleep_hours[:, -7:]),
+        }
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Flags an issue when ``metric <op> threshold``."""
+    issue_type: str
+    metric: str
+    op: str
+    threshold: float
+    severity: str
+    # Formatted with value and threshold, and their absolute values
+    # magnitude and limit
+    description: str
+
+
+DEFAULT_RULES = (
+    Rule("rapid_weight_loss", "weekly_weight_change_pct", "<", -1.0, "high",
+         "一周内体重下降 {magnitude:.1f}%，超过体重的 {limit:g}%"),
+    Rule("rapid_weight_gain", "weekly_weight_change_pct", ">", 1.0, "medium",
+         "一周内体重上升 {value:.1f}%，超过体重的 {threshold:g}%"),
+    Rule("low_energy_intake", "average_calories", "<", 1200, "high",
+         "近 7 天平均摄入 {value:.0f} 千卡，低于 {threshold:g} 千卡"),
+    Rule("sustained_calorie_deficit", "deficit_days", ">=", 5, "medium",
+         "近 7 天有 {value:.0f} 天摄入低于目标热量的 80%"),
+    Rule("low_protein", "protein_per_kg", "<", 1.2, "low",
+         "近 7 天蛋白质摄入为每公斤体重 {value:.2f} 克，低于 {threshold:g} 克"),
+    Rule("training_load_spike", "acwr", ">", 1.5, "high",
+         "急慢性训练负荷比（ACWR）为 {value:.2f}，超过 {threshold:g}"),
+    Rule("no_rest_days", "consecutive_training_days", ">=", 7, "medium",
+         "已连续训练 {value:.0f} 天没有休息"),
+    Rule("insufficient_sleep", "average_sleep_hours", "<", 6.0, "medium",
+         "近 7 天平均睡眠 {value:.1f} 小时，少于 {threshold:g} 小时"),
+)
+
+
+@dataclass(frozen=True)
+class Finding:
+    """A rule that fired for one user."""
+    rule: Rule
+    value: float
+
+    @property
+    def description(self) -> str:
+        return self.rule.description.format(
+            value=self.value,
+            threshold=self.rule.threshold,
+            magnitude=abs(self.value),
+            limit=abs(self.rule.threshold),
+        )
+
+    def to_issue(self) -> Dict[str, Any]:
+        """Issue in the IssueDetectionOutput shape."""
+        return {
+            "issue_type": self.rule.issue_type,
+            "severity": self.rule.severity,
+            "description": self.description,
+            "indicators": [f"{self.rule.metric} = {self.value:.2f}（阈值 {self.rule.op} {self.rule.threshold:g}）"],
+            "recommendations": [],
+            "action_required": self.rule.severity == "high",
+        }
+
+
+def health_score(findings: Sequence[Finding]) -> int:
+    """100 minus a penalty per flagged issue."""
+    return max(0, 100 - sum(SEVERITY_PENALTY.get(f.rule.severity, 0) for f in findings))
+
+
+def metric_snapshot(metrics: Dict[str, np.ndarray], row: int) -> Dict[str, float]:
+    """One user's recorded metrics, rounded, for the explanation prompt."""
+    return {
+        name: round(float(values[row]), 2)
+        for name, values in metrics.items()
+        if not np.isnan(values[row])
+    }
+
+
+class RuleEngine:
+    """
+    Evaluates a rule set over HealthSeries.
+
+    Args:
+        rules: Rules to evaluate
+    """
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES):
+        unknown = {rule.op for rule in rules} - OPERATORS.keys()
+        if unknown:
+            raise ValueError(f"Unknown rule operators: {sorted(unknown)}")
+        self.rules = tuple(rules)
+
+    def evaluate(
+        self,
+        series: HealthSeries,
+        metrics: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[List[Finding]]:
+        """
+        Findings per user, in the order of ``series.user_ids``.
+
+        Args:
+            series: Users' daily series
+            metrics: Precomputed ``compute_metrics(series)``
+        """
+        metrics = compute_metrics(series) if metrics is None else metrics
+        findings: List[List[Finding]] = [[] for _ in series.user_ids]
+        for rule in self.rules:
+            values = metrics[rule.metric]
+            # NaN compares false, so missing data never fires a rule
+            with np.errstate(invalid="ignore"):
+                flagged = OPERATORS[rule.op](values, rule.threshold)
+            for row in np.flatnonzero(flagged):
+                findings[row].append(Finding(rule, float(values[row])))
+        return findings
+
@@ -0,0 +1,463 @@
+"""
+Background jobs for long-running generations.
+
+Endpoints that would otherwise hold an HTTP request for a whole LLM
+generation (workout plans, meal plans, weekly reports) enqueue a job and
+return its id right away. A bounded pool of workers runs the job's handler,
+retries failures with exponential backoff and stores the result in the
+``jobs`` table. Clients poll ``GET /api/jobs/{id}`` or subscribe to
+``GET /api/jobs/{id}/events`` (server-sent events).
+
+Two backends decide how workers find jobs:
+
+- memory (default): job ids are handed to this process's workers through
+  an in-memory queue. Jobs left queued or running by a previous run are
+  picked up again at startup.
+- postgres: workers in any number of processes claim jobs with
+  ``SELECT ... FOR UPDATE SKIP LOCKED``, so each job runs once. A job held
+  by a worker for longer than JOB_STALE_AFTER_SECONDS (e.g. the process
+  died) is claimed again. Workers refresh the claim of jobs they are still
+  running, so long jobs (e.g. the weekly report batch) are not taken over.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from sqlalchemy import and_, func, or_, select, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.job import Job, JobStatus
+from app.services.usage import QuotaExceededError, bind_user
+
+logger = logging.getLogger(__name__)
+
+# Handler: (payload, user id) -> JSON-serializable result
+JobHandler = Callable[[Dict[str, Any], Optional[int]], Awaitable[Dict[str, Any]]]
+
+FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+JOB_BACKENDS = ("memory", "postgres")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_view(job: Job) -> Dict[str, Any]:
+    """API representation of a job."""
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error,
+        "error_code": job.error_code,
+        "retry_after": job.retry_after,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobBackend:
+    """Stores jobs in the jobs table; subclasses decide how workers find them."""
+
+    name = "base"
+
+    async def enqueue(self, job: Job) -> None:
+        async with AsyncSessionLocal() as db:
+            db.add(job)
+            await db.commit()
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        """Mark the next runnable job as running; None if there is none."""
+        raise NotImplementedError
+
+    async def recover(self) -> None:
+        """Called once before the workers start."""
+
+    async def requeue(self, job: Job, delay: float) -> None:
+        """Make a job runnable again after ``delay`` seconds."""
+        await self._update(
+            job.id,
+            status=JobStatus.QUEUED,
+            run_after=_now() + timedelta(seconds=delay),
+            locked_by=None,
+            locked_at=None,
+        )
+
+    async def heartbeat(self, job_id: str) -> None:
+        """Refresh the claim on a job that is still running."""
+        await self._update(job_id, locked_at=_now())
+
+    async def finish(
+        self,
+        job_id: str,
+        status: JobStatus,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        error_code: Optional[str] = None,
+        retry_after: Optional[int] = None,
+    ) -> None:
+        await self._update(
+            job_id,
+            status=status,
+            result=result,
+            error=error,
+            error_code=error_code,
+            retry_after=retry_after,
+            finished_at=_now(),
+            locked_by=None,
+            locked_at=None,
+        )
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with AsyncSessionLocal() as db:
+            return await db.get(Job, job_id)
+
+    async def _update(self, job_id: str, **values: Any) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job).where(Job.id == job_id).values(**values),
+                execution_options={"synchronize_session": False},
+            )
+            await db.commit()
+
+    async def _claim_where(self, worker_id: str, condition) -> Optional[Job]:
+        """Atomically mark the job matching ``condition`` as running."""
+        async with AsyncSessionLocal() as db:
+            job = await db.scalar(
+                update(Job)
+                .where(condition)
+                .values(
+                    status=JobStatus.RUNNING,
+                    attempts=Job.attempts + 1,
+                    locked_by=worker_id,
+                    locked_at=func.now(),
+                )
+                .returning(Job),
+                execution_options={"synchronize_session": False},
+            )
+            await db.commit()
+            return job
+
+
+class InProcessJobBackend(JobBackend):
+    """Dispatches job ids to the workers of this process."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._ready: asyncio.Queue = asyncio.Queue()
+
+    async def enqueue(self, job: Job) -> None:
+        await super().enqueue(job)
+        self._ready.put_nowait(job.id)
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        job_id = await self._ready.get()
+        return await self._claim_where(worker_id, and_(Job.id == job_id, Job.status == JobStatus.QUEUED))
+
+    async def requeue(self, job: Job, delay: float) -> None:
+        await super().requeue(job, delay)
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, job.id)
+
+    async def recover(self) -> None:
+        # No other process runs these jobs, so anything marked running was
+        # interrupted by a restart
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.status == JobStatus.RUNNING)
+                .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None),
+                execution_options={"synchronize_session": False},
+            )
+            job_ids = (await db.scalars(
+                select(Job.id).where(Job.status == JobStatus.QUEUED).order_by(Job.run_after)
+            )).all()
+            await db.commit()
+
+        for job_id in job_ids:
+            self._ready.put_nowait(job_id)
+        if job_ids:
+            logger.info("Recovered %d queued jobs", len(job_ids))
+
+
+class PostgresJobBackend(JobBackend):
+    """
+    Shared queue in the jobs table for workers in several processes.
+
+    Args:
+        stale_after: Seconds after which a running job is considered
+            abandoned and claimed again
+    """
+
+    name = "postgres"
+
+    def __init__(self, stale_after: float):
+        self.stale_after = stale_after
+
+    async def claim(self, worker_id: str) -> Optional[Job]:
+        runnable = (
+            select(Job.id)
+            .where(or_(
+                and_(Job.status == JobStatus.QUEUED, Job.run_after <= func.now()),
+                and_(
+                    Job.status == JobStatus.RUNNING,
+                    Job.locked_at < func.now() - timedelta(seconds=self.stale_after),
+                ),
+            ))
+            .order_by(Job.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        return await self._claim_where(worker_id, Job.id == runnable)
+
+
+class JobQueue:
+    """
+    Bounded worker pool running registered job handlers.
+
+    Args:
+        backend: Where jobs are stored and claimed from
+        workers: Concurrent jobs per process
+        max_attempts: Attempts per job before it fails
+        retry_backoff: Delay before the first retry, doubled per attempt
+        poll_interval: Seconds between checks when no job is ready, and
+            between status reads while watching a job
+        heartbeat_interval: Seconds between claim refreshes of a running
+            job; 0 disables
+    """
+
+    def __init__(
+        self,
+        backend: JobBackend,
+        workers: int,
+        max_attempts: int,
+        retry_backoff: float,
+        poll_interval: float,
+        heartbeat_interval: float = 0,
+    ):
+        self.backend = backend
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        # job id -> events set when this process changes the job
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Register the handler for a job kind."""
+        def register(func: JobHandler) -> JobHandler:
+            self._handlers[kind] = func
+            return func
+        return register
+
+    async def submit(self, kind: str, payload: Dict[str, Any], user_id: Optional[int] = None) -> Job:
+        """
+        Queue a job.
+
+        Returns:
+            The stored job, status queued
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+
+        now = _now()
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            user_id=user_id,
+            status=JobStatus.QUEUED,
+            payload=payload,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            run_after=now,
+            created_at=now,
+        )
+        await self.backend.enqueue(job)
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.get(job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Job]:
+        """
+        Yield the job whenever its status or attempt changes, until it finishes.
+
+        Changes made in this process are seen immediately; changes made by
+        other workers on the next poll.
+        """
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        last = None
+        try:
+            while True:
+                event.clear()
+                job = await self.backend.get(job_id)
+                if job is None:
+                    return
+                if (job.status, job.attempts) != last:
+                    last = (job.status, job.attempts)
+                    yield job
+                if job.status in FINISHED:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(event)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def wait(self, job_id: str) -> Optional[Job]:
+        """The job once it has finished."""
+        job = None
+        async for job in self.watch(job_id):
+            pass
+        return job
+
+    def _notify(self, job_id: str) -> None:
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    async def start(self) -> None:
+        """Recover unfinished jobs and start the workers."""
+        if self._tasks:
+            return
+        await self.backend.recover()
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self.worker_id}:{i}"))
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers; interrupted jobs are picked up again later."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await self.backend.claim(worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Failed to claim a job: %s", e)
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        self._notify(job.id)
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            await self._finish(job, JobStatus.FAILED, error=f"Unknown job kind: {job.kind}")
+            return
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its worker died on the last attempt
+            await self._finish(job, JobStatus.FAILED, error="Job abandoned by its worker")
+            return
+
+        bind_user(job.user_id)
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job.id)) if self.heartbeat_interval > 0 else None
+        try:
+            result = await handler(job.payload, job.user_id)
+        except QuotaExceededError as e:
+            # Not retried: the quota resets tomorrow
+            await self._finish(job, JobStatus.FAILED, error=str(e), error_code="quota_exceeded", retry_after=e.retry_after)
+        except Exception as e:
+            if job.attempts < job.max_attempts:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                logger.warning("Job %s (%s) attempt %d failed, retrying in %.1fs: %s", job.id, job.kind, job.attempts, delay, e)
+                self.retried += 1
+                await self.backend.requeue(job, delay)
+            else:
+                logger.error("Job %s (%s) failed after %d attempts: %s", job.id, job.kind, job.attempts, e)
+                await self._finish(job, JobStatus.FAILED, error=str(e))
+        else:
+            await self._finish(job, JobStatus.SUCCEEDED, result=result)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            self.running -= 1
+            self._notify(job.id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.backend.heartbeat(job_id)
+            except Exception as e:
+                logger.warning("Failed to refresh job %s: %s", job_id, e)
+
+    async def _finish(
+        self,
+        job: Job,
+        status: JobStatus,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        error_code: Optional[str] = None,
+        retry_after: Optional[int] = None,
+    ) -> None:
+        await self.backend.finish(job.id, status, result=result, error=error, error_code=error_code, retry_after=retry_after)
+        if status == JobStatus.SUCCEEDED:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self._notify(job.id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "workers": self.workers,
+            "running": self.running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+def create_backend() -> JobBackend:
+    """Job backend selected by JOB_BACKEND."""
+    if settings.JOB_BACKEND not in JOB_BACKENDS:
+        raise ValueError(f"Unknown JOB_BACKEND: {settings.JOB_BACKEND}")
+    if settings.JOB_BACKEND == "postgres":
+        return PostgresJobBackend(stale_after=settings.JOB_STALE_AFTER_SECONDS)
+    return InProcessJobBackend()
+
+
+job_queue = JobQueue(
+    create_backend(),
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_backoff=settings.JOB_RETRY_BACKOFF_SECONDS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    heartbeat_interval=settings.JOB_STALE_AFTER_SECONDS / 3,
+)
@@ -0,0 +1,682 @@
+"""
+Meal plan optimizer over the food catalog.
+
+Daily meal plans are computed locally from FoodItem macros per 100 g
+instead of being invented by the LLM, so their totals add up and land on
+the targets:
+
+1. Greedy: each meal has a template of category slots (protein, staple,
+   vegetable, ...). Each slot gets the allowed food whose best portion
+   fits the meal's remaining macros most closely, skipping foods already
+   used that day and penalizing foods used earlier in the week.
+2. Portions: the day's portions are solved together as a bounded
+   least-squares problem over the daily calories, protein, carbs and fats
+   and each meal's share of the calories, pulled towards typical portions.
+3. Repair: while a macro is out of tolerance, a food that pulls it the
+   wrong way is swapped for a candidate of the same slot that pulls it the
+   right way (or, when a macro falls short, a food rich in it is added to
+   the largest meal), and the portions are solved again.
+
+Portions are rounded to kitchen-friendly steps and the totals are computed
+from the rounded portions. A day takes a few milliseconds; ``plan_week``
+plans consecutive days with shared variety bookkeeping. The LLM only names
+and describes the meals.
+"""
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.repositories.nutrition import NutritionRepository
+
+MACROS = ("calories", "protein", "carbs", "fats")
+
+# Target keys of macro_targets, in MACROS order, with their defaults
+TARGET_KEYS = (("calories", 2000.0), ("protein_g", 150.0), ("carbs_g", 200.0), ("fats_g", 60.0))
+
+# Allowed relative deviation of the daily totals from the targets
+TOLERANCES = {"calories": 0.05, "protein": 0.10, "carbs": 0.10, "fats": 0.10}
+
+# Meals' calories are kept near their share of the day, with less weight
+# than the daily totals
+MEAL_SHARE_TOLERANCE = 0.15
+MEAL_SHARE_WEIGHT = 0.5
+
+# Pull of the typical portions, per (100 g)^2 of deviation
+PORTION_RIDGE = 0.01
+
+# Slot score penalty per earlier use of a food in the week, and the
+# range of the random tie-breaking jitter
+VARIETY_PENALTY = 0.25
+JITTER = 0.2
+
+MAX_REPAIRS = 12
+
+# Foods the repair step may add to the largest meal when the slots can't
+# reach the targets, and their allowed categories
+MAX_EXTRA_FOODS = 3
+EXTRA_SLOT = ("staple", "protein", "dairy", "fruit", "fat")
+
+
+@dataclass(frozen=True)
+class Portion:
+    """Portion bounds, typical portion and rounding step in grams."""
+    low: float
+    typical: float
+    high: float
+    step: float
+
+
+PORTIONS = {
+    "protein": Portion(50, 150, 300, 5),
+    "staple": Portion(50, 150, 500, 5),
+    "vegetable": Portion(100, 200, 350, 10),
+    "fruit": Portion(80, 150, 300, 10),
+    "dairy": Portion(100, 250, 500, 10),
+    "fat": Portion(5, 10, 40, 1),
+}
+
+
+@dataclass(frozen=True)
+class MealTemplate:
+    """A meal's type, time, share of the daily calories and food slots."""
+    meal_type: str
+    time: str
+    share: float
+    # Allowed categories of each food in the meal
+    slots: Tuple[Tuple[str, ...], ...]
+
+
+BREAKFAST = MealTemplate("早餐", "07:30", 0.25, (("staple",), ("protein",), ("dairy", "fruit")))
+LUNCH = MealTemplate("午餐", "12:00", 0.35, (("protein",), ("staple",), ("vegetable",), ("fat",)))
+DINNER = MealTemplate("晚餐", "18:30", 0.30, (("protein",), ("staple",), ("vegetable",), ("fat",)))
+MORNING_SNACK = MealTemplate("加餐", "10:00", 0.10, (("fruit",), ("dairy", "fat")))
+AFTERNOON_SNACK = MealTemplate("加餐", "15:30", 0.10, (("dairy",), ("fruit", "fat")))
+EVENING_SNACK = MealTemplate("加餐", "21:00", 0.10, (("dairy",), ("fruit", "fat")))
+
+# Meals per day -> meals; shares are normalized per layout
+MEAL_LAYOUTS = {
+    2: (LUNCH, DINNER),
+    3: (BREAKFAST, LUNCH, DINNER),
+    4: (BREAKFAST, LUNCH, AFTERNOON_SNACK, DINNER),
+    5: (BREAKFAST, MORNING_SNACK, LUNCH, AFTERNOON_SNACK, DINNER),
+    6: (BREAKFAST, MORNING_SNACK, LUNCH, AFTERNOON_SNACK, DINNER, EVENING_SNACK),
+}
+
+# Built-in catalog used until the food_items table has categorized foods:
+# name, category, kcal, protein, carbs, fats per 100 g (cooked where it
+# applies), diet and allergen tags
+DEFAULT_FOODS = (
+    ("鸡胸肉", "protein", 165, 31.0, 0.0, 3.6, ("meat", "poultry")),
+    ("火鸡胸肉", "protein", 135, 30.0, 0.0, 1.0, ("meat", "poultry")),
+    ("瘦牛肉", "protein", 158, 26.0, 0.0, 6.0, ("meat", "beef")),
+    ("猪里脊", "protein", 143, 21.0, 0.0, 6.0, ("meat", "pork")),
+    ("三文鱼", "protein", 208, 20.0, 0.0, 13.0, ("fish",)),
+    ("鳕鱼", "protein", 82, 18.0, 0.0, 0.7, ("fish",)),
+    ("虾仁", "protein", 99, 24.0, 0.2, 0.3, ("shellfish",)),
+    ("鸡蛋", "protein", 144, 13.0, 1.1, 9.5, ("egg",)),
+    ("北豆腐", "protein", 116, 12.2, 3.0, 6.5, ("soy",)),
+    ("天贝", "protein", 192, 20.3, 7.6, 10.8, ("soy",)),
+    ("鹰嘴豆", "protein", 164, 8.9, 27.4, 2.6, ()),
+    ("烤面筋", "protein", 140, 25.0, 6.0, 1.9, ("gluten",)),
+    ("米饭", "staple", 116, 2.6, 25.9, 0.3, ()),
+    ("糙米饭", "staple", 111, 2.6, 23.0, 0.9, ()),
+    ("燕麦片", "staple", 389, 16.9, 66.3, 6.9, ("gluten",)),
+    ("全麦面包", "staple", 247, 13.0, 41.0, 3.4, ("gluten",)),
+    ("全麦意面", "staple", 124, 5.3, 25.0, 0.5, ("gluten",)),
+    ("红薯", "staple", 86, 1.6, 20.1, 0.1, ()),
+    ("土豆", "staple", 77, 2.0, 17.0, 0.1, ()),
+    ("玉米", "staple", 112, 4.0, 22.8, 1.2, ()),
+    ("藜麦", "staple", 120, 4.4, 21.3, 1.9, ()),
+    ("西兰花", "vegetable", 34, 2.8, 7.0, 0.4, ()),
+    ("菠菜", "vegetable", 23, 2.9, 3.6, 0.4, ()),
+    ("番茄", "vegetable", 18, 0.9, 3.9, 0.2, ()),
+    ("生菜", "vegetable", 15, 1.4, 2.9, 0.2, ()),
+    ("胡萝卜", "vegetable", 41, 0.9, 9.6, 0.2, ()),
+    ("青椒", "vegetable", 20, 0.9, 4.6, 0.2, ()),
+    ("黄瓜", "vegetable", 16, 0.7, 3.6, 0.1, ()),
+    ("蘑菇", "vegetable", 22, 3.1, 3.3, 0.3, ()),
+    ("香蕉", "fruit", 89, 1.1, 22.8, 0.3, ()),
+    ("苹果", "fruit", 52, 0.3, 13.8, 0.2, ()),
+    ("蓝莓", "fruit", 57, 0.7, 14.5, 0.3, ()),
+    ("橙子", "fruit", 47, 0.9, 11.8, 0.1, ()),
+    ("猕猴桃", "fruit", 61, 1.1, 14.7, 0.5, ()),
+    ("脱脂牛奶", "dairy", 34, 3.4, 5.0, 0.1, ("dairy",)),
+    ("希腊酸奶", "dairy", 97, 9.0, 3.6, 5.0, ("dairy",)),
+    ("无糖豆浆", "dairy", 33, 2.9, 1.8, 1.6, ("soy",)),
+    ("橄榄油", "fat", 884, 0.0, 0.0, 100.0, ()),
+    ("牛油果", "fat", 160, 2.0, 8.5, 14.7, ()),
+    ("杏仁", "fat", 579, 21.2, 21.6, 49.9, ("tree_nut",)),
+    ("核桃", "fat", 654, 15.2, 13.7, 65.2, ("tree_nut",)),
+    ("花生酱", "fat", 588, 25.1, 20.0, 50.4, ("peanut",)),
+)
+
+VEGETARIAN = frozenset({"meat", "fish", "shellfish"})
+VEGAN = VEGETARIAN | {"egg", "dairy"}
+
+# Restriction and allergy keywords -> excluded tags. The first keyword
+# contained in a term wins, so longer keywords come before their parts
+# ("纯素" before "素", "蛋奶素" before "蛋").
+EXCLUSION_KEYWORDS: Tuple[Tuple[str, FrozenSet[str]], ...] = (
+    ("纯素", VEGAN),
+    ("vegan", VEGAN),
+    ("蛋奶素", VEGETARIAN),
+    ("素", VEGETARIAN),
+    ("vegetarian", VEGETARIAN),
+    ("清真", frozenset({"pork"})),
+    ("halal", frozenset({"pork"})),
+    ("麸质", frozenset({"gluten"})),
+    ("小麦", frozenset({"gluten"})),
+    ("gluten", frozenset({"gluten"})),
+    ("wheat", frozenset({"gluten"})),
+    ("乳", frozenset({"dairy"})),
+    ("奶", frozenset({"dairy"})),
+    ("lactose", frozenset({"dairy"})),
+    ("dairy", frozenset({"dairy"})),
+    ("milk", frozenset({"dairy"})),
+    ("蛋", frozenset({"egg"})),
+    ("egg", frozenset({"egg"})),
+    ("海鲜", frozenset({"fish", "shellfish"})),
+    ("seafood", frozenset({"fish", "shellfish"})),
+    ("虾", frozenset({"shellfish"})),
+    ("蟹", frozenset({"shellfish"})),
+    ("贝", frozenset({"shellfish"})),
+    ("shellfish", frozenset({"shellfish"})),
+    ("鱼", frozenset({"fish"})),
+    ("fish", frozenset({"fish"})),
+    ("花生", frozenset({"peanut"})),
+    ("peanut", frozenset({"peanut"})),
+    ("坚果", frozenset({"tree_nut", "peanut"})),
+    ("nut", frozenset({"tree_nut"})),
+    ("大豆", frozenset({"soy"})),
+    ("豆制品", frozenset({"soy"})),
+    ("soy", frozenset({"soy"})),
+    ("猪", frozenset({"pork"})),
+    ("pork", frozenset({"pork"})),
+    ("牛肉", frozenset({"beef"})),
+    ("beef", frozenset({"beef"})),
+)
+
+# Values meaning "no restrictions"
+NO_PREFERENCE = frozenset({"", "无", "没有", "暂无", "none", "null", "no", "n/a"})
+
+_TERM_SPLIT = re.compile(r"[,，、;；/\s]+")
+
+
+def _terms(value: Any) -> List[str]:
+    """Lower-cased terms of a preference: a list, a JSON list or free text."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    items = value if isinstance(value, (list, tuple, set)) else [value]
+    return [
+        term
+        for item in items
+        for term in _TERM_SPLIT.split(str(item).strip().lower())
+        if term not in NO_PREFERENCE
+    ]
+
+
+@dataclass(frozen=True)
+class Exclusions:
+    """Foods a user must not be served: by tag, or by name fragment."""
+    tags: FrozenSet[str] = frozenset()
+    names: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_preferences(cls, dietary_restrictions: Any = None, allergies: Any = None) -> "Exclusions":
+        """
+        Exclusions from the profile's dietary_restrictions and allergies.
+
+        Terms matching a known keyword exclude its tags; other terms (e.g.
+        "芒果") exclude foods whose name contains them.
+        """
+        tags, names = set(), []
+        for term in _terms(dietary_restrictions) + _terms(allergies):
+            match = next((excluded for keyword, excluded in EXCLUSION_KEYWORDS if keyword in term), None)
+            if match is not None:
+                tags |= match
+            else:
+                names.append(term)
+        return cls(tags=frozenset(tags), names=tuple(names))
+
+
+@dataclass
+class FoodCatalog:
+    """Foods as arrays for the optimizer."""
+    ids: List[Optional[int]]
+    names: List[str]
+    categories: np.ndarray      # (foods,) category names
+    tags: List[FrozenSet[str]]
+    per_gram: np.ndarray        # (foods, 4) kcal, protein, carbs, fats per gram
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Tuple]) -> "FoodCatalog":
+        """Catalog from (id, name, category, tags, kcal, protein, carbs, fats per 100 g) tuples."""
+        return cls(
+            ids=[record[0] for record in records],
+            names=[record[1] for record in records],
+            categories=np.array([record[2] for record in records], dtype=object),
+            tags=[frozenset(record[3] or ()) for record in records],
+            per_gram=np.array([record[4:8] for record in records], dtype=float).reshape(-1, 4) / 100,
+        )
+
+    @classmethod
+    def default(cls) -> "FoodCatalog":
+        """The built-in DEFAULT_FOODS catalog."""
+        return cls.from_records([
+            (None, name, category, tags, kcal, protein, carbs, fats)
+            for name, category, kcal, protein, carbs, fats, tags in DEFAULT_FOODS
+        ])
+
+    def allowed(self, exclusions: Exclusions) -> np.ndarray:
+        """(foods,) mask of foods not excluded."""
+        return np.array([
+            not (tags & exclusions.tags) and not any(name in food.lower() for name in exclusions.names)
+            for food, tags in zip(self.names, self.tags)
+        ], dtype=bool)
+
+
+class FoodCatalogCache:
+    """
+    Process-wide food catalog, reloaded after ``ttl_seconds``.
+
+    Falls back to the built-in catalog while the food_items table has no
+    categorized foods.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._catalog: Optional[FoodCatalog] = None
+        self._expires_at = 0.0
+
+    async def get(self, db: AsyncSession) -> FoodCatalog:
+        if self._catalog is None or self._expires_at <= time.monotonic():
+            rows = await NutritionRepository(db).food_catalog()
+            self._catalog = FoodCatalog.from_records(rows) if rows else FoodCatalog.default()
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return self._catalog
+
+    def invalidate(self) -> None:
+        """Drop the cached catalog after foods change."""
+        self._catalog = None
+
+
+food_catalog_cache = FoodCatalogCache(settings.FOOD_CATALOG_CACHE_TTL_SECONDS)
+
+
+def target_vector(macro_targets: Optional[Dict[str, Any]]) -> np.ndarray:
+    """Daily targets in MACROS order; missing or invalid values get defaults."""
+    macro_targets = macro_targets or {}
+    values = []
+    for key, default in TARGET_KEYS:
+        try:
+            value = float(macro_targets.get(key) or default)
+        except (TypeError, ValueError):
+            value = default
+        values.append(value if value > 0 else default)
+    return np.array(values)
+
+
+def _bounded_least_squares(
+    A: np.ndarray,
+    b: np.ndarray,
+    x0: np.ndarray,
+    low: np.ndarray,
+    high: np.ndarray,
+    ridge: float,
+) -> np.ndarray:
+    """
+    Minimize ``|Ax - b|^2 + ridge * |x - x0|^2`` subject to ``low <= x <= high``.
+
+    Active-set heuristic: solve the free variables in closed form, pin the
+    ones that leave their bounds, repeat. Exact when no bound is active.
+    """
+    x = x0.copy()
+    free = np.ones(len(x0), dtype=bool)
+    for _ in range(len(x0) + 1):
+        Af = A[:, free]
+        rhs = Af.T @ (b - A[:, ~free] @ x[~free]) + ridge * x0[free]
+        x[free] = np.linalg.solve(Af.T @ Af + ridge * np.eye(Af.shape[1]), rhs)
+        outside = free & ((x < low) | (x > high))
+        np.clip(x, low, high, out=x)
+        if not outside.any():
+            break
+        free &= ~outside
+        if not free.any():
+            break
+    return x
+
+
+class MealPlanOptimizer:
+    """
+    Plans days of meals from a FoodCatalog.
+
+    Args:
+        catalog: Foods to plan with
+        max_weekly_uses: Days a food may appear in one ``plan_week``
+        tolerances: Allowed relative deviation per macro
+        seed: Seed of the tie-breaking jitter; None varies plans between calls
+    """
+
+    def __init__(
+        self,
+        catalog: FoodCatalog,
+        max_weekly_uses: int = settings.MEAL_PLAN_MAX_WEEKLY_USES,
+        tolerances: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.catalog = catalog
+        self.max_weekly_uses = max_weekly_uses
+        self.tolerances = np.array([(tolerances or TOLERANCES)[macro] for macro in MACROS])
+        self.rng = np.random.default_rng(seed)
+        portions = [PORTIONS.get(category) for category in catalog.categories]
+        self._planned = np.array([portion is not None for portion in portions], dtype=bool)
+        fallback = Portion(0, 0, 0, 1)
+        self._low = np.array([(portion or fallback).low for portion in portions])
+        self._typical = np.array([(portion or fallback).typical for portion in portions])
+        self._high = np.array([(portion or fallback).high for portion in portions])
+        self._step = np.array([(portion or fallback).step for portion in portions])
+
+    def plan_day(
+        self,
+        macro_targets: Optional[Dict[str, Any]],
+        meals_per_day: int = 3,
+        exclusions: Exclusions = Exclusions(),
+        usage: Optional[np.ndarray] = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        """
+        One day of meals.
+
+        Args:
+            macro_targets: calories, protein_g, carbs_g and fats_g
+            meals_per_day: Meals including snacks, clamped to 2-6
+            exclusions: Foods to leave out
+            usage: (foods,) days each food was used this week; updated
+            allowed: Precomputed ``catalog.allowed(exclusions)``
+
+        Returns:
+            The plan in the MealPlanOutput shape, with the targets and
+            whether each macro is within tolerance
+        """
+        targets = target_vector(macro_targets)
+        layout = MEAL_LAYOUTS[min(max(int(meals_per_day or 3), 2), 6)]
+        total_share = sum(meal.share for meal in layout)
+        shares = np.array([meal.share / total_share for meal in layout])
+        if allowed is None:
+            allowed = self.catalog.allowed(exclusions)
+        allowed = allowed & self._planned
+        usage = usage if usage is not None else np.zeros(len(self.catalog))
+        weights = 1 / (self.tolerances * targets)
+
+        foods, meal_of, slots = self._fill(targets, weights, layout, shares, allowed, usage)
+        grams, totals = self._portions(foods, meal_of, targets, weights, shares)
+        score = self._score(totals, targets)
+
+        # Repair: try a swap and, when a macro falls short, an extra food
+        # in the largest meal; keep whichever improves the score most
+        main_meal = int(np.argmax(shares))
+        tried = set()
+        repairs = extras = 0
+        while score[0] > 0 and repairs < MAX_REPAIRS:
+            trials = []
+            swap = self._propose_swap(foods, slots, totals, targets, weights, allowed, usage, tried)
+            if swap is not None:
+                tried.add(swap)
+                position, candidate = swap
+                trials.append((foods[:position] + [candidate] + foods[position + 1:], meal_of, slots, 0))
+            if extras < MAX_EXTRA_FOODS:
+                extra = self._propose_extra(foods, totals, targets, weights, allowed, usage, tried)
+                if extra is not None:
+                    tried.add((None, extra))
+                    trials.append((foods + [extra], meal_of + [main_meal], slots + [EXTRA_SLOT], 1))
+            if not trials:
+                break
+            repairs += 1
+            for trial_foods, trial_meals, trial_slots, added in trials:
+                trial_grams, trial_totals = self._portions(trial_foods, trial_meals, targets, weights, shares)
+                trial_score = self._score(trial_totals, targets)
+                if trial_score < score:
+                    foods, meal_of, slots = trial_foods, trial_meals, trial_slots
+                    grams, totals, score = trial_grams, trial_totals, trial_score
+                    extras += added
+
+        for food in set(foods):
+            usage[food] += 1
+        return self._to_dict(layout, foods, meal_of, grams, totals, targets, repairs)
+
+    def plan_week(
+        self,
+        macro_targets: Optional[Dict[str, Any]],
+        meals_per_day: int = 3,
+        exclusions: Exclusions = Exclusions(),
+        days: int = 7,
+    ) -> List[Dict[str, Any]]:
+        """
+        Consecutive days of plans; no food appears on more than
+        ``max_weekly_uses`` days unless the catalog leaves no alternative.
+        """
+        allowed = self.catalog.allowed(exclusions)
+        usage = np.zeros(len(self.catalog))
+        plans = []
+        for day in range(days):
+            plan = self.plan_day(macro_targets, meals_per_day, exclusions, usage=usage, allowed=allowed)
+            plans.append({"day": day + 1, **plan})
+        return plans
+
+    # Greedy fill
+
+    def _fill(
+        self,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        layout: Sequence[MealTemplate],
+        shares: np.ndarray,
+        allowed: np.ndarray,
+        usage: np.ndarray,
+    ) -> Tuple[List[int], List[int], List[Tuple[str, ...]]]:
+        """Pick a food per slot; returns foods, their meal index and slot."""
+        per_gram = self.catalog.per_gram
+        used_today = np.zeros(len(self.catalog), dtype=bool)
+        foods, meal_of, slots = [], [], []
+
+        for meal_index, (meal, share) in enumerate(zip(layout, shares)):
+            remaining = share * targets
+            for slot_index, slot in enumerate(meal.slots):
+                candidates = self._candidates(slot, allowed, used_today, usage)
+                if not len(candidates):
+                    continue
+                # Each remaining slot covers an equal part of what the meal still needs
+                need = np.maximum(remaining, 0) / (len(meal.slots) - slot_index) * weights
+                content = per_gram[candidates] * weights
+                grams = (content @ need) / np.maximum((content * content).sum(axis=1), 1e-12)
+                grams = np.clip(grams, self._low[candidates], self._high[candidates])
+                misfit = ((need - grams[:, None] * content) ** 2).sum(axis=1) / max(need @ need, 1e-12)
+                score = misfit + VARIETY_PENALTY * usage[candidates] + self.rng.uniform(0, JITTER, len(candidates))
+                best = int(np.argmin(score))
+                food = int(candidates[best])
+                foods.append(food)
+                meal_of.append(meal_index)
+                slots.append(slot)
+                used_today[food] = True
+                remaining = remaining - grams[best] * per_gram[food]
+
+        return foods, meal_of, slots
+
+    def _candidates(
+        self,
+        slot: Tuple[str, ...],
+        allowed: np.ndarray,
+        used: np.ndarray,
+        usage: np.ndarray,
+    ) -> np.ndarray:
+        """Foods for a slot, relaxing the weekly limit when nothing else fits."""
+        in_slot = allowed & np.isin(self.catalog.categories, slot) & ~used
+        fresh = in_slot & (usage < self.max_weekly_uses)
+        return np.flatnonzero(fresh if fresh.any() else in_slot)
+
+    # Portions and repair
+
+    def _portions(
+        self,
+        foods: Sequence[int],
+        meal_of: Sequence[int],
+        targets: np.ndarray,
+        weights: np.ndarray,
+        shares: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rounded grams of each food and the resulting daily totals."""
+        foods = np.asarray(foods)
+        if not len(foods):
+            return np.zeros(0), np.zeros(len(MACROS))
+        # Variables are portions in units of 100 g
+        content = self.catalog.per_gram[foods] * 100
+        meal_rows = np.zeros((len(shares), len(foods)))
+        meal_rows[np.asarray(meal_of), np.arange(len(foods))] = content[:, 0]
+        meal_weights = MEAL_SHARE_WEIGHT / (MEAL_SHARE_TOLERANCE * shares * targets[0])
+
+        A = np.vstack([content.T * weights[:, None], meal_rows * meal_weights[:, None]])
+        b = np.concatenate([targets * weights, shares * targets[0] * meal_weights])
+        x = _bounded_least_squares(
+            A, b,
+            self._typical[foods] / 100,
+            self._low[foods] / 100,
+            self._high[foods] / 100,
+            PORTION_RIDGE,
+        )
+
+        step = self._step[foods]
+        grams = np.clip(np.round(x * 100 / step) * step, self._low[foods], self._high[foods])
+        return grams, grams @ self.catalog.per_gram[foods]
+
+    def _score(self, totals: np.ndarray, targets: np.ndarray) -> Tuple[float, float]:
+        """(excess over tolerance, squared deviation in tolerances); lower is better."""
+        deviation = (totals - targets) / (self.tolerances * targets)
+        return float(np.maximum(np.abs(deviation) - 1, 0).sum()), float(deviation @ deviation)
+
+    def _density(self, totals: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        (foods,) how strongly each food corrects the worst macro, signed so
+        that higher is better.
+        """
+        deviation = (totals - targets) / (self.tolerances * targets)
+        macro = int(np.argmax(np.abs(deviation)))
+        per_gram = self.catalog.per_gram
+        if macro == 0:
+            # Energy density per gram
+            density = per_gram[:, 0]
+        else:
+            # Share of the food's (tolerance-weighted) macros that is this macro
+            weighted = per_gram[:, 1:] * weights[1:]
+            density = weighted[:, macro - 1] / np.maximum(weighted.sum(axis=1), 1e-12)
+        return -np.sign(deviation[macro]) * density
+
+    def _propose_swap(
+        self,
+        foods: Sequence[int],
+        slots: Sequence[Tuple[str, ...]],
+        totals: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        allowed: np.ndarray,
+        usage: np.ndarray,
+        tried: set,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        (position, food) replacing the chosen food that pulls the worst
+        macro the wrong way with the candidate that pulls it most the right
+        way, or None when no untried swap helps.
+        """
+        density = self._density(totals, targets, weights)
+        used = np.zeros(len(self.catalog), dtype=bool)
+        used[list(foods)] = True
+        for position in np.argsort([density[food] for food in foods]):
+            position = int(position)
+            candidates = self._candidates(slots[position], allowed, used, usage)
+            candidates = [
+                int(food) for food in candidates
+                if density[food] > density[foods[position]] and (position, int(food)) not in tried
+            ]
+            if candidates:
+                return position, max(candidates, key=lambda food: density[food] - VARIETY_PENALTY * usage[food] / 10)
+        return None
+
+    def _propose_extra(
+        self,
+        foods: Sequence[int],
+        totals: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray,
+        allowed: np.ndarray,
+        usage: np.ndarray,
+        tried: set,
+    ) -> Optional[int]:
+        """An extra food richest in the worst macro when it falls short, else None."""
+        if np.all(totals >= targets * (1 - self.tolerances)):
+            return None
+        density = self._density(totals, targets, weights)
+        used = np.zeros(len(self.catalog), dtype=bool)
+        used[list(foods)] = True
+        candidates = [
+            int(food) for food in self._candidates(EXTRA_SLOT, allowed, used, usage)
+            if (None, int(food)) not in tried
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda food: density[food] - VARIETY_PENALTY * usage[food] / 10)
+
+    def _to_dict(
+        self,
+        layout: Sequence[MealTemplate],
+        foods: Sequence[int],
+        meal_of: Sequence[int],
+        grams: np.ndarray,
+        totals: np.ndarray,
+        targets: np.ndarray,
+        repairs: int,
+    ) -> Dict[str, Any]:
+        catalog = self.catalog
+        meals = [
+            {"meal_type": meal.meal_type, "time": meal.time, "foods": [], "total_macros": None}
+            for meal in layout
+        ]
+        meal_totals = np.zeros((len(layout), len(MACROS)))
+        for food, meal_index, amount in zip(foods, meal_of, grams):
+            macros = amount * catalog.per_gram[food]
+            meal_totals[meal_index] += macros
+            meals[meal_index]["foods"].append({
+                "food_id": catalog.ids[food],
+                "name": catalog.names[food],
+                "category": catalog.categories[food],
+                "amount": float(amount),
+                **_rounded(macros),
+            })
+        for meal, macros in zip(meals, meal_totals):
+            meal["total_macros"] = _rounded(macros)
+
+        deviation = np.abs(totals - targets) / targets
+        return {
+            "daily_plan": [meal for meal in meals if meal["foods"]],
+            "daily_totals": _rounded(totals),
+            "targets": _rounded(targets),
+            "within_tolerance": {
+                macro: bool(value <= tolerance + 1e-9)
+                for macro, value, tolerance in zip(MACROS, deviation, self.tolerances)
+            },
+            "repairs": repairs,
+        }
+
+
+def _rounded(macros: np.ndarray) -> Dict[str, float]:
+    return {macro: round(float(value), 1) for macro, value in zip(MACROS, macros)}
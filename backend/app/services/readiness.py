@@ -0,0 +1,307 @@
+"""
+Startup warmup and readiness.
+
+/health only says the process is up. Right after a worker starts, its
+database pool is empty, the food catalog isn't loaded, the prompts aren't
+compiled and the agents aren't built, so the first requests routed to it
+pay for all of that. The lifespan starts ``readiness.warm()`` in the
+background, which runs the warmup steps at once (those importing
+langchain, openai or chromadb in worker threads, one at a time):
+
+- database: opens READINESS_DB_CONNECTIONS pool connections;
+- food_catalog: loads the meal planner's food catalog cache;
+- prompts: imports (and so compiles) the prompt registry;
+- agents: builds the agents (with AGENT_PRELOAD);
+- knowledge_base: opens the guide collection (with RAG_ENABLED);
+- llm: lists the models of the LLM endpoint.
+
+/ready answers 503 until every required step has succeeded, then 200, and
+reports each component's status, warmup time and last error. The database
+and the LLM endpoint are re-checked, and failed steps retried, in the
+background when /ready is polled, at most every READINESS_RECHECK_SECONDS
+(the LLM endpoint every READINESS_LLM_CHECK_SECONDS); a retried knowledge
+base step opens the collection again, so it recovers once ingestion has
+run (and the configured embedding model matches). The knowledge base
+and the LLM endpoint are not required: without them chat answers without
+references, or AI endpoints fail, but everything else still works, and
+every worker would go unready at once during a provider outage.
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, TypeVar
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.core.telemetry import metrics
+from app.services.meal_optimizer import food_catalog_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Step = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+# Steps that import langchain, openai or chromadb take turns: importing
+# packages that share dependencies (pydantic.v1) from several threads at
+# once can see half-initialized modules
+_import_lock = threading.Lock()
+
+WARMUP_DURATION = metrics.histogram(
+    "warmup_seconds",
+    "Time taken by each startup warmup step",
+    ["component"],
+)
+READINESS_FAILURES = metrics.counter(
+    "readiness_check_failures_total",
+    "Failed warmup steps and readiness checks",
+    ["component"],
+)
+
+
+class Component:
+    """
+    One thing a worker needs before it serves traffic.
+
+    Args:
+        name: Component name in the /ready report
+        warm: Startup step; returns details for the report
+        required: Whether the worker is unready while this has failed
+        check: Cheaper periodic check once warm, if any
+        recheck_seconds: Re-run ``check`` at most this often; 0 never
+    """
+
+    def __init__(self, name: str, warm: Step, required: bool, check: Optional[Step], recheck_seconds: float):
+        self.name = name
+        self.warm = warm
+        self.required = required
+        self.check = check
+        self.recheck_seconds = recheck_seconds
+        self.status = "pending"
+        self.detail: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+        self.check_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.running = False
+
+    def report(self, now: float) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "warmup_ms": round(self.warmup_seconds * 1000, 1) if self.warmup_seconds is not None else None,
+            "last_check_ms": round(self.check_seconds * 1000, 1) if self.check_seconds is not None else None,
+            "checked_seconds_ago": round(now - self.checked_at, 1) if self.checked_at is not None else None,
+            "detail": self.detail,
+            "error": self.error,
+        }
+
+
+class Readiness:
+    """
+    Runs the warmup steps and tracks whether the worker is ready.
+
+    Args:
+        timeout_seconds: Each step fails after this long
+        retry_seconds: Failed steps are retried at most this often
+    """
+
+    def __init__(self, timeout_seconds: float, retry_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.components: Dict[str, Component] = {}
+        self.warmup_seconds: Optional[float] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(
+        self,
+        name: str,
+        warm: Step,
+        required: bool = True,
+        check: Optional[Step] = None,
+        recheck_seconds: float = 0,
+    ) -> None:
+        self.components[name] = Component(name, warm, required, check, recheck_seconds)
+
+    @property
+    def ready(self) -> bool:
+        return all(c.status == "ready" for c in self.components.values() if c.required)
+
+    def start(self) -> None:
+        """Warm up in the background."""
+        self._spawn(self.warm())
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def warm(self) -> None:
+        """Run every warmup step at once."""
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run(component, component.warm) for component in self.components.values()))
+        self.warmup_seconds = time.perf_counter() - start
+        failed = [c.name for c in self.components.values() if c.status == "failed"]
+        logger.info(
+            "Warmup finished in %.2f s: %s%s",
+            self.warmup_seconds,
+            "ready" if self.ready else "not ready",
+            f" (failed: {', '.join(failed)})" if failed else "",
+        )
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Readiness and per-component state.
+
+        Starts background re-checks of components that are due; the report
+        shows the state before they finish.
+        """
+        now = time.monotonic()
+        for component in self.components.values():
+            if self._due(component, now):
+                step = component.check if component.status == "ready" else component.warm
+                self._spawn(self._run(component, step))
+
+        if self.ready:
+            status = "ready"
+        elif any(c.status == "pending" for c in self.components.values()):
+            status = "warming"
+        else:
+            status = "unready"
+        return {
+            "status": status,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "components": {name: c.report(now) for name, c in self.components.items()},
+        }
+
+    def _due(self, component: Component, now: float) -> bool:
+        if component.running or component.checked_at is None:
+            return False
+        if component.status == "failed":
+            return now - component.checked_at >= self.retry_seconds
+        return bool(component.check and component.recheck_seconds) and now - component.checked_at >= component.recheck_seconds
+
+    async def _run(self, component: Component, step: Step) -> None:
+        warming = component.warmup_seconds is None
+        component.running = True
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(step(), self.timeout_seconds)
+        except Exception as e:
+            # TimeoutError's message is empty
+            component.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            if component.status != "failed":
+                logger.warning("%s not ready: %s", component.name, component.error)
+            component.status = "failed"
+            READINESS_FAILURES.inc(component=component.name)
+        else:
+            if component.status == "failed":
+                logger.info("%s ready", component.name)
+            component.status = "ready"
+            component.error = None
+            component.detail = detail or {}
+        finally:
+            component.running = False
+        elapsed = time.perf_counter() - start
+        component.checked_at = time.monotonic()
+        component.check_seconds = elapsed
+        if warming:
+            component.warmup_seconds = elapsed
+            WARMUP_DURATION.observe(elapsed, component=component.name)
+
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+async def _in_thread(fn: Callable[..., T], *args: Any) -> T:
+    """Run an importing call in a worker thread, one at a time."""
+    def locked() -> T:
+        with _import_lock:
+            return fn(*args)
+
+    return await asyncio.to_thread(locked)
+
+
+async def warm_database_pool() -> Dict[str, Any]:
+    """Open READINESS_DB_CONNECTIONS connections at once, returning them to the pool."""
+    async with AsyncExitStack() as stack:
+        connections = await asyncio.gather(*(
+            stack.enter_async_context(engine.connect()) for _ in range(settings.READINESS_DB_CONNECTIONS)
+        ))
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+    return {"connections": len(connections), "pool": engine.pool.status()}
+
+
+async def check_database() -> Dict[str, Any]:
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    return {"pool": engine.pool.status()}
+
+
+async def load_food_catalog() -> Dict[str, Any]:
+    async with AsyncSessionLocal() as db:
+        catalog = await food_catalog_cache.get(db)
+    return {"foods": len(catalog), "source": "database" if catalog.ids and catalog.ids[0] is not None else "built-in"}
+
+
+async def compile_prompts() -> Dict[str, Any]:
+    # Prompts are compiled at import; langchain loads in a worker thread
+    # rather than on the event loop
+    prompts = await _in_thread(importlib.import_module, "app.agents.prompts")
+    return {"prompts": len(prompts.registered_prompts())}
+
+
+async def build_agents() -> Dict[str, Any]:
+    from app.agents import registry
+
+    for agent in registry.AGENTS:
+        await _in_thread(agent.get)
+    return registry.stats()
+
+
+async def open_knowledge_base() -> Dict[str, Any]:
+    from app.knowledge.store import knowledge_base
+
+    # A retry looks again, e.g. once ingestion has run
+    knowledge_base.reopen()
+    chunks = await _in_thread(knowledge_base.count)
+    reason = knowledge_base.stats()["unavailable_reason"]
+    if reason:
+        raise RuntimeError(reason)
+    return {"chunks": chunks}
+
+
+async def check_llm() -> Dict[str, Any]:
+    """List the endpoint's models: reachable, and the API key is accepted."""
+    openai = await _in_thread(importlib.import_module, "openai")
+    client = openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.LLM_BASE_URL or None,
+        timeout=settings.READINESS_LLM_TIMEOUT_SECONDS,
+        max_retries=0,
+    )
+    try:
+        await client.models.list()
+    finally:
+        await client.close()
+    return {"endpoint": str(client.base_url)}
+
+
+readiness = Readiness(
+    timeout_seconds=settings.READINESS_WARMUP_TIMEOUT_SECONDS,
+    retry_seconds=settings.READINESS_RECHECK_SECONDS,
+)
+readiness.add("database", warm_database_pool, check=check_database, recheck_seconds=settings.READINESS_RECHECK_SECONDS)
+readiness.add("food_catalog", load_food_catalog)
+readiness.add("prompts", compile_prompts)
+if settings.AGENT_PRELOAD:
+    readiness.add("agents", build_agents)
+if settings.RAG_ENABLED:
+    readiness.add("knowledge_base", open_knowledge_base, required=False)
+readiness.add("llm", check_llm, required=False, check=check_llm, recheck_seconds=settings.READINESS_LLM_CHECK_SECONDS)
@@ -0,0 +1,342 @@
+"""
+LLM token usage ledger and per-user daily quotas.
+
+Every LLM call made through ``create_llm`` clients is recorded (by the
+callback in app.agents.callbacks) with its prompt and completion tokens
+and tagged with the agent and method (from the run metadata), the API
+route and the user. Usage is aggregated in memory and
+flushed to the ``llm_usage`` table in batches, so recording costs no DB
+round trip on the request path.
+
+Streamed calls get no token usage from the provider; their prompt and
+completion tokens are estimated from the text (estimate_tokens).
+
+Quotas are checked before a call is made: once a user's prompt plus
+completion tokens for the current UTC day reach LLM_DAILY_TOKEN_QUOTA,
+further calls raise QuotaExceededError until the next day. Today's totals are
+loaded from the DB once per user and then kept up to date in memory.
+"""
+import asyncio
+import contextvars
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.usage import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+# USD per 1K (prompt, completion) tokens; matched by longest model prefix
+MODEL_PRICES = {
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4-1106": (0.01, 0.03),
+    "gpt-4-0125": (0.01, 0.03),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+# One token per CJK character, about four characters per token otherwise
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]|[^\u4e00-\u9fff]{1,4}", re.S)
+
+# (day, user_id, agent, method, endpoint, model)
+UsageKey = Tuple[date, Optional[int], str, str, Optional[str], str]
+
+_current_user: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("usage_user", default=None)
+
+
+def bind_user(user_id: Optional[int]) -> None:
+    """Attribute LLM calls in the current request to a user."""
+    _current_user.set(user_id)
+
+
+def current_user() -> Optional[int]:
+    return _current_user.get()
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD from the price table; 0 for unknown models."""
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            prompt_price, completion_price = MODEL_PRICES[prefix]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+    return 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text, without a tokenizer."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _empty_usage() -> List[float]:
+    # calls, prompt tokens, completion tokens, cost
+    return [0, 0, 0, 0.0]
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class QuotaExceededError(Exception):
+    """A user has used up their daily LLM token quota."""
+
+    def __init__(self, user_id: int, used: int, quota: int):
+        self.user_id = user_id
+        self.used = used
+        self.quota = quota
+        super().__init__(f"Daily LLM token quota exceeded for user {user_id}: {used}/{quota}")
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds until the quota resets (next UTC midnight)."""
+        now = datetime.now(timezone.utc)
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+        return int((tomorrow - now).total_seconds()) + 1
+
+
+class UsageLedger:
+    """
+    In-memory usage aggregation with batched DB flushes and quota checks.
+
+    Args:
+        flush_interval: Seconds between background flushes
+        batch_size: Pending calls that trigger an early flush
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # Usage not yet written
+        self._pending: Dict[UsageKey, List[float]] = defaultdict(_empty_usage)
+        self._pending_calls = 0
+        # Tokens used today per user, persisted + pending
+        self._daily: Dict[Tuple[date, int], int] = {}
+
+        self._flush_lock = asyncio.Lock()
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Process-lifetime totals for /stats/usage
+        self._totals: Dict[Tuple[str, str], List[float]] = defaultdict(_empty_usage)
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._flush_failures = 0
+        self._dropped_rows = 0
+        self._quota_rejections = 0
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        agent: str,
+        method: str,
+        endpoint: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> None:
+        """Add one call's usage to the pending batch."""
+        day = _today()
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+        for entry in (
+            self._pending[(day, user_id, agent, method, endpoint, model)],
+            self._totals[(agent, method)],
+        ):
+            entry[0] += 1
+            entry[1] += prompt_tokens
+            entry[2] += completion_tokens
+            entry[3] += cost
+
+        if user_id is not None and (day, user_id) in self._daily:
+            self._daily[(day, user_id)] += prompt_tokens + completion_tokens
+
+        self._pending_calls += 1
+        if self._pending_calls >= self.batch_size:
+            self._flush_now.set()
+
+    async def tokens_used_today(self, user_id: int) -> int:
+        """Prompt + completion tokens the user has used today."""
+        key = (_today(), user_id)
+        if key not in self._daily:
+            # Under the flush lock: a batch committed while the total loads
+            # would otherwise be in neither the total nor the pending usage
+            async with self._flush_lock:
+                if key not in self._daily:
+                    persisted = await self._load_daily(*key)
+                    pending = sum(
+                        usage[1] + usage[2]
+                        for (day, pending_user, *_), usage in self._pending.items()
+                        if (day, pending_user) == key
+                    )
+                    self._daily[key] = persisted + pending
+        return self._daily[key]
+
+    async def check_quota(self, user_id: Optional[int] = None) -> None:
+        """
+        Raise QuotaExceededError if the user has no tokens left today.
+
+        Uses the user bound to the current request when none is given.
+        Calls without a user are not limited.
+        """
+        quota = settings.LLM_DAILY_TOKEN_QUOTA
+        user_id = user_id if user_id is not None else _current_user.get()
+        if not quota or user_id is None:
+            return
+
+        used = await self.tokens_used_today(user_id)
+        if used >= quota:
+            self._quota_rejections += 1
+            raise QuotaExceededError(user_id, used, quota)
+
+    async def _load_daily(self, day: date, user_id: int) -> int:
+        try:
+            async with AsyncSessionLocal() as db:
+                total = await db.scalar(
+                    select(func.coalesce(func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens), 0))
+                    .where(LLMUsage.user_id == user_id, LLMUsage.day == day)
+                )
+                return int(total or 0)
+        except Exception as e:
+            # Fail open: a usage DB outage shouldn't take the agents down
+            logger.warning("Failed to load LLM usage for user %s: %s", user_id, e)
+            return 0
+
+    async def flush(self) -> int:
+        """
+        Write pending usage to the DB in one batch.
+
+        A batch the DB rejects (constraint or data errors) is written row by
+        row and the rows rejected on their own are dropped, so one bad row
+        doesn't hold back everyone's usage; any other failure keeps the
+        batch for the next flush.
+
+        Returns:
+            Number of rows written
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, defaultdict(_empty_usage)
+            self._pending_calls = 0
+            self._flush_now.clear()
+
+            rows = [
+                {
+                    "day": day,
+                    "user_id": user_id,
+                    "agent": agent,
+                    "method": method,
+                    "endpoint": endpoint,
+                    "model": model,
+                    "calls": int(calls),
+                    "prompt_tokens": int(prompt_tokens),
+                    "completion_tokens": int(completion_tokens),
+                    "cost_usd": round(cost, 6),
+                }
+                for (day, user_id, agent, method, endpoint, model), (calls, prompt_tokens, completion_tokens, cost)
+                in batch.items()
+            ]
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    try:
+                        await db.execute(insert(LLMUsage), rows)
+                    except (IntegrityError, DataError) as e:
+                        await db.rollback()
+                        logger.warning("LLM usage batch of %d rows rejected, writing rows one by one: %s", len(rows), e)
+                        rows = await self._insert_each(db, rows)
+                    await db.commit()
+            except Exception as e:
+                # Keep the batch for the next attempt
+                logger.warning("Failed to flush %d LLM usage rows: %s", len(rows), e)
+                self._flush_failures += 1
+                for key, usage in batch.items():
+                    pending = self._pending[key]
+                    for i, value in enumerate(usage):
+                        pending[i] += value
+                self._pending_calls += sum(int(usage[0]) for usage in batch.values())
+                return 0
+
+            self._flushes += 1
+            self._flushed_rows += len(rows)
+
+            # Drop daily totals from previous days
+            today = _today()
+            for key in [key for key in self._daily if key[0] != today]:
+                del self._daily[key]
+
+            return len(rows)
+
+    async def _insert_each(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert rows one at a time, dropping those the DB rejects; returns the rest."""
+        written = []
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(LLMUsage), [row])
+            except (IntegrityError, DataError) as e:
+                logger.error("Dropping LLM usage row %s: %s", row, e)
+                self._dropped_rows += 1
+            else:
+                written.append(row)
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flush loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage recorded by this process, per agent method."""
+        return {
+            "by_method": {
+                f"{agent}.{method}": {
+                    "calls": int(calls),
+                    "prompt_tokens": int(prompt_tokens),
+                    "completion_tokens": int(completion_tokens),
+                    "cost_usd": round(cost, 4),
+                }
+                for (agent, method), (calls, prompt_tokens, completion_tokens, cost) in sorted(self._totals.items())
+            },
+            "pending_calls": self._pending_calls,
+            "flushes": self._flushes,
+            "flushed_rows": self._flushed_rows,
+            "flush_failures": self._flush_failures,
+            "dropped_rows": self._dropped_rows,
+            "quota_rejections": self._quota_rejections,
+            "daily_token_quota": settings.LLM_DAILY_TOKEN_QUOTA,
+        }
+
+
+usage_ledger = UsageLedger(
+    flush_interval=settings.LLM_USAGE_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.LLM_USAGE_FLUSH_BATCH_SIZE,
+)
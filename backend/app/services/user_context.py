@@ -0,0 +1,249 @@
+"""
+Read-through cache for user profile context.
+
+Every chat turn and planner call needs the same handful of profile fields
+and the rendered context string that goes into the system prompt. Both are
+cached per user with a TTL and invalidated explicitly when the profile
+changes.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.user import User
+
+NEW_USER_CONTEXT = "新用户，暂无个人信息。"
+
+GOAL_NAMES = {
+    "muscle_gain": "增肌",
+    "fat_loss": "减脂",
+    "strength": "力量提升",
+    "endurance": "耐力提升",
+    "general_fitness": "整体健康",
+    "body_recomposition": "身体重组"
+}
+
+LEVEL_NAMES = {
+    "beginner": "初学者",
+    "intermediate": "中级",
+    "advanced": "高级"
+}
+
+EQUIPMENT_NAMES = {
+    "gym": "健身房",
+    "home": "家庭器械",
+    "bodyweight": "自重训练",
+    "minimal": "基础器械"
+}
+
+# User columns needed to build agent context
+PROFILE_COLUMNS = (
+    User.id,
+    User.full_name,
+    User.age,
+    User.gender,
+    User.height,
+    User.weight,
+    User.body_fat_percentage,
+    User.fitness_goal,
+    User.experience_level,
+    User.equipment_access,
+    User.training_frequency,
+    User.dietary_restrictions,
+    User.allergies,
+    User.target_weight,
+    User.target_body_fat,
+    User.goal_timeframe,
+)
+
+
+def render_user_context(user_context: Optional[Dict[str, Any]]) -> str:
+    """Build context string from user information."""
+    if not user_context:
+        return NEW_USER_CONTEXT
+
+    context_parts = []
+
+    # Basic info
+    if user_context.get("name"):
+        context_parts.append(f"姓名：{user_context['name']}")
+
+    if user_context.get("age"):
+        context_parts.append(f"年龄：{user_context['age']}岁")
+
+    if user_context.get("gender"):
+        context_parts.append(f"性别：{user_context['gender']}")
+
+    # Body metrics
+    if user_context.get("height"):
+        context_parts.append(f"身高：{user_context['height']}cm")
+
+    if user_context.get("weight"):
+        context_parts.append(f"体重：{user_context['weight']}kg")
+
+    if user_context.get("body_fat_percentage"):
+        context_parts.append(f"体脂率：{user_context['body_fat_percentage']}%")
+
+    # Fitness profile
+    if user_context.get("fitness_goal"):
+        goal = GOAL_NAMES.get(user_context["fitness_goal"], user_context["fitness_goal"])
+        context_parts.append(f"健身目标：{goal}")
+
+    if user_context.get("experience_level"):
+        level = LEVEL_NAMES.get(user_context["experience_level"], user_context["experience_level"])
+        context_parts.append(f"经验水平：{level}")
+
+    if user_context.get("training_frequency"):
+        context_parts.append(f"训练频率：每周{user_context['training_frequency']}次")
+
+    if user_context.get("equipment_access"):
+        equipment = EQUIPMENT_NAMES.get(user_context["equipment_access"], user_context["equipment_access"])
+        context_parts.append(f"器械条件：{equipment}")
+
+    # Goals
+    if user_context.get("target_weight"):
+        context_parts.append(f"目标体重：{user_context['target_weight']}kg")
+
+    if user_context.get("goal_timeframe"):
+        context_parts.append(f"目标时间：{user_context['goal_timeframe']}周")
+
+    # Dietary info
+    if user_context.get("dietary_restrictions"):
+        context_parts.append(f"饮食限制：{user_context['dietary_restrictions']}")
+
+    if user_context.get("allergies"):
+        context_parts.append(f"过敏原：{user_context['allergies']}")
+
+    return "\n".join(context_parts) if context_parts else NEW_USER_CONTEXT
+
+
+@dataclass(frozen=True)
+class UserContext:
+    """Cached profile fields and the pre-rendered prompt context."""
+    user_id: int
+    profile: Dict[str, Any] = field(default_factory=dict)
+    rendered: str = NEW_USER_CONTEXT
+
+    @classmethod
+    def from_profile(cls, user_id: int, profile: Dict[str, Any]) -> "UserContext":
+        return cls(user_id=user_id, profile=profile, rendered=render_user_context(profile))
+
+
+class UserContextCache:
+    """
+    TTL + LRU cache of UserContext entries keyed by user id.
+
+    Misses load the profile columns in a single query. Concurrent misses for
+    the same user share one load. Missing users are cached as empty contexts
+    so repeated lookups don't hit the database either.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, db: AsyncSession, user_id: int) -> UserContext:
+        """Get a user's context, loading it from the database on a miss."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, context = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return context
+            del self._entries[user_id]
+
+        self.misses += 1
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            context = await self._load(db, user_id)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so waiterless failures don't log warnings
+            future.exception()
+            raise
+        else:
+            future.set_result(context)
+            # Skip storing if the entry was invalidated while loading
+            if self._loading.get(user_id) is future:
+                self._store(user_id, context)
+            return context
+        finally:
+            if self._loading.get(user_id) is future:
+                del self._loading[user_id]
+
+    def peek(self, user_id: int) -> Optional[UserContext]:
+        """A user's cached context if it is still fresh, without loading it."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached context after their profile changes."""
+        self._entries.pop(user_id, None)
+        self._loading.pop(user_id, None)
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop all cached contexts."""
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _store(self, user_id: int, context: UserContext) -> None:
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, context)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _load(self, db: AsyncSession, user_id: int) -> UserContext:
+        row = (await db.execute(select(*PROFILE_COLUMNS).where(User.id == user_id))).first()
+        if row is None:
+            return UserContext(user_id=user_id)
+
+        profile = {"user_id": row.id, "name": row.full_name}
+        for column in PROFILE_COLUMNS[2:]:
+            value = getattr(row, column.key)
+            # Enum columns are stored as str enums; keep plain values
+            profile[column.key] = getattr(value, "value", value)
+
+        return UserContext.from_profile(user_id, {k: v for k, v in profile.items() if v is not None})
+
+
+user_context_cache = UserContextCache(
+    ttl_seconds=settings.USER_CONTEXT_CACHE_TTL_SECONDS,
+    max_size=settings.USER_CONTEXT_CACHE_MAX_SIZE,
+)
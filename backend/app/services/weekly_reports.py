@@ -0,0 +1,313 @@
+"""
+Scheduled batch generation of weekly progress reports.
+
+Once a week every active user gets a report for the last complete week
+(Monday to Sunday, UTC). The batch walks users in id order in chunks of
+WEEKLY_REPORT_CHUNK_SIZE:
+
+1. week summaries for the whole chunk come from one GROUP BY query per
+   table (see ``ProgressRepository.week_summaries``);
+2. reports are generated with at most WEEKLY_REPORT_CONCURRENCY LLM calls
+   in flight, each attributed to its user for usage accounting;
+3. the chunk's reports and the run checkpoint (last user id) are committed
+   together.
+
+A batch interrupted by a crash or deploy resumes after the last committed
+chunk, so no user is reported twice. Every worker's scheduler triggers the
+batch, but only the one creating the week's run submits the job, and a job
+claims the run before working on it (refreshing the claim as it goes), so
+one job at a time generates a week's reports. ``/api/progress/report/weekly``
+then only reads the stored report.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from app.core.database import AsyncSessionLocal
+from app.models.job import Job
+from app.repositories.progress import ProgressRepository
+from app.services.usage import bind_user
+
+logger = logging.getLogger(__name__)
+
+BATCH_JOB_KIND = "weekly_report_batch"
+
+
+def report_week(today: Optional[date] = None) -> date:
+    """Monday of the last complete week."""
+    today = today or datetime.now(timezone.utc).date()
+    return today - timedelta(days=today.weekday() + 7)
+
+
+def is_report(report: Dict[str, Any]) -> bool:
+    """Whether an agent result is a report rather than a parse failure."""
+    return "error" not in report
+
+
+async def generate_user_report(agent, user_id: int, week_start: date) -> Dict[str, Any]:
+    """
+    Generate and store one user's report (on-demand path).
+
+    Returns:
+        The report, or the agent's error payload (not stored)
+    """
+    async with AsyncSessionLocal() as db:
+        week_data = (await ProgressRepository(db).week_summaries([user_id], week_start))[user_id]
+
+    report = await agent.generate_weekly_report(week_data)
+    if is_report(report):
+        async with AsyncSessionLocal() as db:
+            await ProgressRepository(db).save_weekly_reports(week_start, [(user_id, week_data, report)])
+            await db.commit()
+    return report
+
+
+class WeeklyReportBatch:
+    """
+    Generates the reports of one week for all active users.
+
+    Args:
+        agent: ProgressAnalyzerAgent
+        chunk_size: Users per aggregate query and commit
+        concurrency: Report generations in flight
+        stale_after: Seconds after which a run claimed by a job that stopped
+            refreshing the claim can be taken over
+    """
+
+    def __init__(self, agent, chunk_size: int, concurrency: int, stale_after: float):
+        self.agent = agent
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.stale_after = stale_after
+
+    async def run(self, week_start: date, max_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Generate the week's reports, resuming an interrupted run.
+
+        The run is claimed first; if another job holds it, nothing is
+        generated and the summary's status is "claimed".
+
+        Args:
+            week_start: Monday of the reported week
+            max_chunks: Stop after this many chunks (benchmarks)
+
+        Returns:
+            Run summary with throughput and time split
+        """
+        started = time.perf_counter()
+        aggregate_seconds = 0.0
+        generate_seconds = 0.0
+        users = reports = failures = 0
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        async with AsyncSessionLocal() as db:
+            repo = ProgressRepository(db)
+            run = await repo.get_or_create_run(week_start)
+            await db.commit()
+            run_id, status, last_user_id = run.id, run.status, run.last_user_id
+            claimed = status != "completed" and await repo.claim_run(run_id, owner, self.stale_after)
+            await db.commit()
+            if claimed:
+                # Another job may have checkpointed since the read above
+                await db.refresh(run)
+                last_user_id = run.last_user_id
+        resumed_from = last_user_id
+
+        if status == "completed":
+            logger.info("Weekly reports for %s already generated", week_start)
+        elif not claimed:
+            logger.info("Weekly reports for %s are being generated by another job", week_start)
+            status = "claimed"
+        else:
+            heartbeat = asyncio.create_task(self._heartbeat(run_id, owner))
+            try:
+                status, stats = await self._run_chunks(week_start, run_id, owner, last_user_id, max_chunks)
+            finally:
+                heartbeat.cancel()
+                if status != "completed":
+                    # Let a retry (or the next run) pick it up right away
+                    async with AsyncSessionLocal() as db:
+                        await ProgressRepository(db).release_run(run_id, owner)
+                        await db.commit()
+            users, reports, failures, aggregate_seconds, generate_seconds = stats
+
+        seconds = time.perf_counter() - started
+        summary = {
+            "week_start": week_start.isoformat(),
+            "status": status,
+            "resumed_from": resumed_from,
+            "users": users,
+            "reports": reports,
+            "failures": failures,
+            "seconds": round(seconds, 3),
+            "users_per_second": round(users / seconds, 1) if seconds else 0.0,
+            "database_seconds": round(aggregate_seconds, 3),
+            "generation_seconds": round(generate_seconds, 3),
+        }
+        logger.info("Weekly report batch: %s", summary)
+        return summary
+
+    async def _run_chunks(
+        self,
+        week_start: date,
+        run_id: int,
+        owner: str,
+        last_user_id: int,
+        max_chunks: Optional[int],
+    ) -> Tuple[str, Tuple[int, int, int, float, float]]:
+        """Process chunks of a claimed run; returns its status and counts."""
+        aggregate_seconds = 0.0
+        generate_seconds = 0.0
+        users = reports = failures = chunks = 0
+        status = "running"
+        if last_user_id:
+            logger.info("Resuming weekly reports for %s after user %d", week_start, last_user_id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while max_chunks is None or chunks < max_chunks:
+            step = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                repo = ProgressRepository(db)
+                user_ids = await repo.active_user_ids(last_user_id, self.chunk_size)
+                if not user_ids:
+                    if await repo.complete_run(run_id, owner):
+                        status = "completed"
+                    else:
+                        status = "lost"
+                    await db.commit()
+                    break
+                summaries = await repo.week_summaries(user_ids, week_start)
+            aggregate_seconds += time.perf_counter() - step
+
+            step = time.perf_counter()
+            results = await asyncio.gather(*(
+                self._generate(semaphore, user_id, week_data)
+                for user_id, week_data in summaries.items()
+            ))
+            generate_seconds += time.perf_counter() - step
+
+            stored = [result for result in results if result is not None]
+            step = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                repo = ProgressRepository(db)
+                if not await repo.checkpoint_run(run_id, owner, user_ids[-1], len(stored), len(results) - len(stored)):
+                    # Taken over after our claim went stale: its reports are the other job's to store
+                    logger.warning("Lost the weekly report run for %s, stopping", week_start)
+                    status = "lost"
+                    break
+                await repo.save_weekly_reports(week_start, stored)
+                await db.commit()
+            aggregate_seconds += time.perf_counter() - step
+
+            last_user_id = user_ids[-1]
+            chunks += 1
+            users += len(user_ids)
+            reports += len(stored)
+            failures += len(results) - len(stored)
+
+        return status, (users, reports, failures, aggregate_seconds, generate_seconds)
+
+    async def _heartbeat(self, run_id: int, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await ProgressRepository(db).refresh_run_claim(run_id, owner)
+                    await db.commit()
+            except Exception as e:
+                logger.warning("Failed to refresh weekly report run %d: %s", run_id, e)
+
+    async def _generate(
+        self,
+        semaphore: asyncio.Semaphore,
+        user_id: int,
+        week_data: Dict[str, Any],
+    ) -> Optional[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+        async with semaphore:
+            bind_user(user_id)
+            try:
+                report = await self.agent.generate_weekly_report(week_data)
+            except Exception as e:
+                # Quota exceeded or a failed call: skip the user, keep the batch going
+                logger.warning("Weekly report for user %d failed: %s", user_id, e)
+                return None
+        if not is_report(report):
+            return None
+        return user_id, week_data, report
+
+
+class WeeklyReportScheduler:
+    """
+    Submits the weekly report batch job at a fixed weekly time (UTC).
+
+    A batch slot missed while the service was down is made up at startup.
+
+    Args:
+        queue: JobQueue with a handler for BATCH_JOB_KIND
+        weekday: 0 = Monday
+        hour: Hour of day
+        stale_after: Seconds after which an unfinished run no job holds is
+            submitted again
+    """
+
+    def __init__(self, queue, weekday: int, hour: int, stale_after: float):
+        self.queue = queue
+        self.weekday = weekday
+        self.hour = hour
+        self.stale_after = stale_after
+        self._task: Optional[asyncio.Task] = None
+
+    def last_slot(self, now: datetime) -> datetime:
+        """The most recent scheduled time at or before ``now``."""
+        slot = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        slot -= timedelta(days=(now.weekday() - self.weekday) % 7)
+        if slot > now:
+            slot -= timedelta(days=7)
+        return slot
+
+    async def trigger(self, week_start: Optional[date] = None) -> Optional[Job]:
+        """
+        Submit the batch for a week unless it has already been started.
+
+        Every worker calls this; only the one creating the week's run submits
+        the job. A run abandoned by its job (see
+        ``ProgressRepository.revive_run``) is submitted again, once.
+
+        Returns:
+            The submitted job, or None if the week has a run already
+        """
+        week_start = week_start or report_week()
+        async with AsyncSessionLocal() as db:
+            repo = ProgressRepository(db)
+            created = await repo.create_run(week_start) is not None
+            revived = not created and await repo.revive_run(week_start, self.stale_after)
+            await db.commit()
+        if not (created or revived):
+            # Completed, or held by a job that resumes it on retry
+            return None
+        logger.info("Submitting weekly report batch for %s%s", week_start, " (abandoned run)" if revived else "")
+        return await self.queue.submit(BATCH_JOB_KIND, {"week_start": week_start.isoformat()})
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.trigger(report_week(self.last_slot(now).date()))
+            except Exception as e:
+                logger.warning("Failed to submit weekly report batch: %s", e)
+            next_slot = self.last_slot(now) + timedelta(days=7)
+            await asyncio.sleep((next_slot - now).total_seconds())
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks and query-count checks.
+
+Run from the backend directory, e.g. ``python -m benchmarks.plan_tree_queries``.
+"""
@@ -0,0 +1,205 @@
+"""
+Cold start profile: import time per module and time to a healthy /health and a ready /ready.
+
+Imports ``app.main`` in a fresh interpreter under ``python -X importtime``
+and reports the total, the packages that take the most time (own import
+time summed per top-level package, application modules per module) and
+the slowest application modules including what they import.
+
+Then starts uvicorn ``--runs`` times and reports the time from launching
+the process to the first 200 from /health, then from /ready (the startup
+warmup done: pool connections, food catalog, prompts, agents), and the
+warmup time of each component as /ready reports it.
+
+Checks that importing the application and serving /health loads none of
+the agent stack (langchain, the OpenAI client, the agents), and that the
+agents are built on first use.
+
+Usage:
+    python -m benchmarks.cold_start [--top 15] [--runs 3] [--port 8765]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND = Path(__file__).resolve().parent.parent
+DATABASE = Path(tempfile.gettempdir()) / "fitness-cold-start.db"
+
+# Imported only once an agent is used
+AGENT_MODULES = ("langchain_core", "langchain_openai", "openai", "app.agents.llm", "app.agents.fitness_agent")
+
+# Launch to healthy and to ready, median of the runs
+MAX_HEALTHY_SECONDS = 10
+MAX_READY_SECONDS = 20
+
+
+def environment() -> Dict[str, str]:
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-benchmark"),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{DATABASE}",
+        # No LLM endpoint to check; /ready doesn't wait for it
+        "LLM_BASE_URL": os.getenv("LLM_BASE_URL", "http://127.0.0.1:9/v1"),
+    }
+
+
+def python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=BACKEND, env=environment(), capture_output=True, text=True, check=True,
+    )
+
+
+def create_tables() -> None:
+    python(
+        "import asyncio, app.main\n"
+        "from app.core.database import Base, engine\n"
+        "async def create():\n"
+        "    async with engine.begin() as conn:\n"
+        "        await conn.run_sync(Base.metadata.create_all)\n"
+        "asyncio.run(create())"
+    )
+
+
+def import_times() -> List[Tuple[str, int, int]]:
+    """(module, own microseconds, cumulative microseconds) of importing app.main."""
+    result = python("import app.main", "-X", "importtime")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+def package(module: str) -> str:
+    """Grouping key: the module itself for application modules, else its top-level package."""
+    return module if module.startswith("app.") else module.split(".")[0]
+
+
+def report_imports(top: int) -> float:
+    rows = import_times()
+    total_ms = next(cumulative for name, _, cumulative in rows if name == "app.main") / 1000
+
+    own = defaultdict(int)
+    for name, own_us, _ in rows:
+        own[package(name)] += own_us
+    print(f"Importing app.main: {total_ms:.0f} ms, {len(rows)} modules\n")
+    print(f"{'own time':>10}  package or application module")
+    for name, us in sorted(own.items(), key=lambda item: -item[1])[:top]:
+        print(f"{us / 1000:8.1f}ms  {name}")
+
+    print(f"\n{'cumulative':>10}  application module (with its imports)")
+    first_party = [(name, cumulative) for name, _, cumulative in rows if name.startswith("app.") and name != "app.main"]
+    for name, us in sorted(first_party, key=lambda item: -item[1])[:top]:
+        print(f"{us / 1000:8.1f}ms  {name}")
+    return total_ms
+
+
+def free_port(port: int) -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", port))
+    return port
+
+
+def poll(process: subprocess.Popen, port: int, path: str, start: float) -> Tuple[float, bytes]:
+    """Seconds from ``start`` to the first 200 from ``path``, and the response body."""
+    while time.perf_counter() - start < MAX_READY_SECONDS * 3:
+        # A bare connection per poll: cheap, so polling doesn't slow the
+        # starting server down on a small machine
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            if response.status == 200:
+                return time.perf_counter() - start, response.read()
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        time.sleep(0.01)
+    raise RuntimeError(f"{path} did not answer 200")
+
+
+def time_to_ready(port: int) -> Tuple[float, float, Dict[str, float]]:
+    """Seconds from launching uvicorn to healthy and to ready, and each component's warmup ms."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=environment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        healthy, _ = poll(process, port, "/health", start)
+        ready, body = poll(process, port, "/ready", start)
+    finally:
+        process.terminate()
+        process.wait()
+    components = json.loads(body)["components"]
+    return healthy, ready, {name: component["warmup_ms"] for name, component in components.items()}
+
+
+def check_lazy_agents() -> None:
+    # Without the lifespan: the startup warmup loads the agents on purpose
+    code = f"""
+import json, sys
+from fastapi.testclient import TestClient
+import app.main
+client = TestClient(app.main.app)
+assert client.get("/health").status_code == 200
+before = [name for name in {AGENT_MODULES!r} if name in sys.modules]
+from app.agents.registry import workout_agent
+workout_agent.get()
+after = [name for name in {AGENT_MODULES!r} if name in sys.modules]
+print(json.dumps([before, after]))
+"""
+    before, after = json.loads(python(code).stdout.strip().splitlines()[-1])
+    assert not before, f"loaded before any agent was used: {before}"
+    assert set(after) >= {"langchain_core", "openai", "app.agents.llm"}, after
+    print(f"\nImport and /health load none of {', '.join(AGENT_MODULES)}; the first agent use loads them")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    report_imports(args.top)
+
+    create_tables()
+    try:
+        port = free_port(args.port)
+        runs = [time_to_ready(port) for _ in range(args.runs)]
+        healthy = [run[0] for run in runs]
+        ready = [run[1] for run in runs]
+        print()
+        for label, timings in (("healthy /health", healthy), ("ready /ready", ready)):
+            print(f"Launch to {label}: median {statistics.median(timings):.2f} s ({', '.join(f'{t:.2f}' for t in timings)})")
+        print("Warmup per component (last run): " + ", ".join(
+            f"{name} {ms:.0f} ms" if ms is not None else f"{name} -" for name, ms in runs[-1][2].items()
+        ))
+        assert statistics.median(healthy) < MAX_HEALTHY_SECONDS, healthy
+        assert statistics.median(ready) < MAX_READY_SECONDS, ready
+
+        check_lazy_agents()
+    finally:
+        DATABASE.unlink(missing_ok=True)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark of the embedding service behind knowledge base ingestion and retrieval.
+
+1. Ingests a corpus made of ``--copies`` variants of the guides into a
+   temporary Chroma directory and reports documents per second for a cold
+   ingest (everything embedded), a re-ingest of the unchanged corpus (as
+   after a deploy: nothing embedded, nothing written), a re-ingest after
+   editing one guide (only its changed chunks embedded and replaced) and a
+   rebuild of the collection from cached embeddings.
+2. Reopens the on-disk store in a new service and checks that every
+   vector is read back unchanged.
+3. Embeds ``--queries`` concurrent distinct queries with a simulated
+   model embedder (fixed per-call overhead, one call at a time, like an
+   ONNX session) with and without micro-batching, and reports latency and
+   throughput; then checks that identical concurrent queries share one
+   embedding and that cached queries skip the model.
+
+Usage:
+    python -m benchmarks.embedding_service [--copies 20] [--queries 512] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import numpy as np
+
+# Simulated model: per-call overhead and per-text cost (seconds)
+MODEL_CALL_SECONDS = 0.004
+MODEL_TEXT_SECONDS = 0.0001
+
+MIN_BATCHING_SPEEDUP = 3.0
+MAX_CACHED_P95_MS = 1.0
+
+
+class SimulatedModelEmbedder:
+    """Hashing embedder with the cost profile of a model run one call at a time."""
+
+    def __init__(self):
+        from app.knowledge.embeddings import HashingEmbedder
+
+        self._embedder = HashingEmbedder()
+        self.name = "simulated-model"
+        self.dimensions = self._embedder.dimensions
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.calls += 1
+            time.sleep(MODEL_CALL_SECONDS + MODEL_TEXT_SECONDS * len(texts))
+            return self._embedder.embed(texts)
+
+
+def write_corpus(source: str, target: Path, copies: int) -> None:
+    """``copies`` variants of each guide, each with distinct text."""
+    target.mkdir(parents=True, exist_ok=True)
+    for path in sorted(Path(source).glob("*.md")):
+        text = path.read_text(encoding="utf-8")
+        for copy in range(copies):
+            variant = "\n".join(
+                f"{line}（第 {copy} 版）" if line and not line.startswith("#") else line
+                for line in text.splitlines()
+            )
+            (target / f"{path.stem}_{copy:03d}.md").write_text(variant, encoding="utf-8")
+
+
+def edit_one_guide(corpus: Path) -> None:
+    """Change every paragraph of the first section of one guide."""
+    path = sorted(corpus.glob("*.md"))[0]
+    lines = path.read_text(encoding="utf-8").splitlines()
+    headings = [i for i, line in enumerate(lines) if line.startswith("#")] + [len(lines)]
+    for first, second in zip(headings, headings[1:]):
+        body = [i for i in range(first + 1, second) if lines[i]]
+        if body:
+            for i in body:
+                lines[i] += "（已修订）"
+            break
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def check_ingest(corpus: Path, persist_directory: str) -> None:
+    from app.core.config import settings
+    from app.knowledge.embedding_service import EmbeddingService
+    from app.knowledge.embeddings import HashingEmbedder
+    from app.knowledge.ingest import ingest
+    from app.knowledge.store import KnowledgeBase
+
+    cache_directory = os.path.join(persist_directory, "embedding_cache")
+    service = EmbeddingService(HashingEmbedder, cache_directory)
+    kb = KnowledgeBase(persist_directory, "benchmark_corpus", service)
+
+    def run(label: str, rebuild: bool = False):
+        result = ingest(kb, str(corpus), settings.RAG_CHUNK_CHARS, settings.RAG_CHUNK_OVERLAP_CHARS, rebuild)
+        seconds = result["chunk_seconds"] + result["embed_seconds"] + result["write_seconds"]
+        print(
+            f"{label}: {result['chunks']} chunks in {seconds:.2f} s ({result['chunks'] / seconds:,.0f} docs/s; "
+            f"embedding {result['embed_seconds'] * 1000:.0f} ms, writing {result['write_seconds'] * 1000:.0f} ms); "
+            f"{result['embedded']} embedded, {result['added']} added, {result['removed']} removed, {result['updated']} moved"
+        )
+        assert kb.count() == result["chunks"]
+        return result
+
+    cold = run("Cold ingest")
+    assert cold["embedded"] == cold["added"] == cold["chunks"]
+
+    unchanged = run("Re-ingest, unchanged")
+    assert unchanged["embedded"] == unchanged["added"] == unchanged["removed"] == unchanged["updated"] == 0
+
+    edit_one_guide(corpus)
+    edited = run("Re-ingest, one guide edited")
+    assert 0 < edited["embedded"] < cold["chunks"] / 100, edited
+    assert edited["added"] == edited["removed"] == edited["embedded"], edited
+
+    rebuilt = run("Rebuild from cache", rebuild=True)
+    assert rebuilt["embedded"] == 0 and rebuilt["added"] == rebuilt["chunks"]
+
+    # A fresh process: the memory-mapped store is read back as written
+    texts = [chunk.embedding_text for chunk in _chunks(corpus)]
+    reopened = EmbeddingService(HashingEmbedder, cache_directory)
+    start = time.perf_counter()
+    vectors = reopened.embed_documents(texts)
+    seconds = time.perf_counter() - start
+    assert reopened.document_misses == 0
+    assert np.allclose(vectors, HashingEmbedder().embed(texts), atol=1e-6)
+    print(
+        f"Reopened store: {len(reopened.store)} vectors, {len(texts)} read back in {seconds * 1000:.0f} ms "
+        f"({len(texts) / seconds:,.0f} docs/s), identical to recomputed"
+    )
+
+
+def _chunks(corpus: Path):
+    from app.core.config import settings
+    from app.knowledge.ingest import load_corpus
+
+    return load_corpus(str(corpus), settings.RAG_CHUNK_CHARS, settings.RAG_CHUNK_OVERLAP_CHARS)
+
+
+async def check_queries(cache_directory: str, count: int, concurrency: int) -> None:
+    from app.knowledge.embedding_service import EmbeddingService
+
+    queries = [f"第 {i} 个问题：深蹲膝盖内扣怎么办" for i in range(count)]
+
+    async def run(window_ms: float, max_batch_size: int):
+        embedder = SimulatedModelEmbedder()
+        service = EmbeddingService(lambda: embedder, cache_directory, batch_window_ms=window_ms, max_batch_size=max_batch_size)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(query):
+            async with semaphore:
+                start = time.perf_counter()
+                await service.embed_query(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(query) for query in queries))
+        seconds = time.perf_counter() - start
+        return service, embedder, latencies, count / seconds
+
+    unbatched, unbatched_model, unbatched_ms, unbatched_rate = await run(0, 1)
+    batched, batched_model, batched_ms, batched_rate = await run(2, 64)
+    for label, model, latencies, rate in (
+        ("Unbatched", unbatched_model, unbatched_ms, unbatched_rate),
+        ("Micro-batched", batched_model, batched_ms, batched_rate),
+    ):
+        print(
+            f"{label}: {count} queries at concurrency {concurrency}; {rate:,.0f} queries/s, "
+            f"p50 {statistics.median(latencies):.1f} ms, p95 {sorted(latencies)[int(0.95 * len(latencies))]:.1f} ms; "
+            f"{model.calls} model calls"
+        )
+    print(f"Mean batch size {batched.stats()['batching']['mean_batch_size']}, speedup {batched_rate / unbatched_rate:.1f}x")
+    assert unbatched_model.calls == count
+    assert batched_rate >= MIN_BATCHING_SPEEDUP * unbatched_rate, (batched_rate, unbatched_rate)
+
+    # Identical concurrent queries: one embedding
+    calls = batched_model.calls
+    await asyncio.gather(*(batched.embed_query("同一个新问题") for _ in range(50)))
+    assert batched_model.calls == calls + 1
+    assert batched.query_coalesced == 49
+
+    # Cached queries never reach the model
+    cached = []
+    for query in queries:
+        start = time.perf_counter()
+        await batched.embed_query(query)
+        cached.append((time.perf_counter() - start) * 1000)
+    assert batched_model.calls == calls + 1
+    p95 = sorted(cached)[int(0.95 * len(cached))]
+    print(f"Coalesced 50 identical queries into 1 model call; cached queries p50 {statistics.median(cached) * 1000:.0f} us, p95 {p95 * 1000:.0f} us")
+    assert p95 < MAX_CACHED_P95_MS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default="knowledge_base")
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="embedding-service-"))
+    try:
+        corpus = workdir / "corpus"
+        write_corpus(args.corpus, corpus, args.copies)
+        persist_directory = str(workdir / "chroma")
+        check_ingest(corpus, persist_directory)
+        asyncio.run(check_queries(str(workdir / "query_cache"), args.queries, args.concurrency))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
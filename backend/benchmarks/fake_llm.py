@@ -0,0 +1,466 @@
+"""
+Offline OpenAI-compatible LLM server for load and latency benchmarks.
+
+Serves ``/v1/chat/completions`` (plain and streaming) with simulated
+provider latency, so the backend can be benchmarked without network access
+or API costs. Point the backend at it with
+``LLM_BASE_URL=http://localhost:8100/v1``.
+
+Responses come from one of three sources:
+
+- synthetic (default): tool calls get arguments generated from the tool's
+  JSON schema, so structured agent calls parse and validate; plain
+  requests get a fixed-length Chinese reply.
+- record: requests are forwarded to ``--upstream`` and the responses are
+  appended to the ``--fixtures`` JSONL file.
+- replay: responses are looked up in ``--fixtures`` by a hash of the
+  request; misses fall back to synthetic unless ``--strict`` is set.
+
+Latency model: time to first token (``--latency-ms`` ± ``--jitter-ms``)
+plus completion tokens divided by ``--token-rate``. ``--max-concurrency``
+rejects excess in-flight requests with 429 like a provider rate limit.
+``--model NAME=LATENCY_MS[:TOKEN_RATE[:INVALID_RATE]]`` gives a model its
+own speed and a fraction of synthetic structured replies that are not valid
+JSON, e.g. to exercise small-to-large model routing.
+``GET /stats`` reports request, token and concurrency counters.
+
+Usage:
+    python -m benchmarks.fake_llm [--port 8100] [--latency-ms 300] [--token-rate 50]
+    python -m benchmarks.fake_llm --record fixtures.jsonl --upstream https://api.openai.com/v1
+    python -m benchmarks.fake_llm --replay fixtures.jsonl [--strict]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+INVALID_REPLY = "抱歉，我无法按照要求的格式给出回答，建议咨询专业教练。"
+
+SYNTHETIC_REPLY = "根据你的训练情况，建议保持当前计划，注意动作质量和充分休息，每周逐步增加训练量。"
+
+# Request fields that determine the response; used for fixture keys
+KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "response_format", "temperature", "max_tokens")
+
+_TOKEN_RE = re.compile(r"[一-鿿]|[^一-鿿]{1,4}", re.S)
+
+
+@dataclass
+class ModelBehaviour:
+    """Per-model latency and reliability of synthetic replies."""
+    latency_ms: Optional[float] = None
+    token_rate: Optional[float] = None
+    # Fraction of structured replies that fail to parse
+    invalid_rate: float = 0.0
+
+
+@dataclass
+class FakeLLMConfig:
+    """Behaviour of the fake server."""
+    latency_ms: float = 300.0
+    jitter_ms: float = 50.0
+    token_rate: float = 50.0
+    reply_tokens: int = 120
+    max_concurrency: int = 0
+    mode: str = "synthetic"
+    fixtures: Optional[str] = None
+    upstream: str = "https://api.openai.com/v1"
+    strict: bool = False
+    seed: Optional[int] = None
+    # Model name -> overrides of latency_ms, token_rate and invalid_rate
+    models: Dict[str, ModelBehaviour] = field(default_factory=dict)
+
+
+def parse_model_behaviour(spec: str) -> Tuple[str, ModelBehaviour]:
+    """Parse ``NAME=LATENCY_MS[:TOKEN_RATE[:INVALID_RATE]]``."""
+    name, separator, values = spec.partition("=")
+    parts = values.split(":") if separator else []
+    if not name or not parts or len(parts) > 3:
+        raise ValueError(f"Invalid model behaviour: {spec!r}")
+    numbers = [float(part) for part in parts]
+    return name, ModelBehaviour(*numbers)
+
+
+def split_tokens(text: str) -> List[str]:
+    """Approximate tokenization: one token per CJK character, four other characters per token."""
+    return _TOKEN_RE.findall(text)
+
+
+def count_tokens(text: str) -> int:
+    return len(split_tokens(text))
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    """Stable hash of the parts of a request that determine the response."""
+    canonical = json.dumps(
+        {field: body.get(field) for field in KEY_FIELDS},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def synthesize(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None, name: str = "") -> Any:
+    """Example instance of a JSON schema, filling every declared property."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+
+    if "$ref" in schema:
+        return synthesize(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, name)
+    if schema.get("default") is not None:
+        return schema["default"]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return synthesize(options[0], defs, name) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {
+            key: synthesize(prop, defs, key)
+            for key, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [synthesize(schema.get("items", {}), defs, name) for _ in range(3)]
+    if kind == "integer":
+        return int(schema.get("minimum", 3))
+    if kind == "number":
+        return float(schema.get("minimum", 10))
+    if kind == "boolean":
+        return False
+    return f"{schema.get('title', name) or 'text'}示例"
+
+
+class FixtureStore:
+    """Recorded responses keyed by request hash, stored as JSONL."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]] = entry["response"]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.responses.get(key)
+
+    async def add(self, key: str, request: Dict[str, Any], response: Dict[str, Any]) -> None:
+        async with self._lock:
+            self.responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as f:
+                entry = {"key": key, "request": request, "response": response}
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _synthetic_message(body: Dict[str, Any], reply_tokens: int, invalid: bool = False) -> Dict[str, Any]:
+    tools = body.get("tools")
+    if tools:
+        function = tools[0]["function"]
+        choice = body.get("tool_choice")
+        if isinstance(choice, dict):
+            name = choice["function"]["name"]
+            function = next(t["function"] for t in tools if t["function"]["name"] == name)
+        arguments = INVALID_REPLY if invalid else json.dumps(synthesize(function.get("parameters", {})), ensure_ascii=False)
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": arguments},
+            }],
+        }
+
+    if invalid:
+        return {"role": "assistant", "content": INVALID_REPLY}
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return {"role": "assistant", "content": json.dumps({"response": SYNTHETIC_REPLY}, ensure_ascii=False)}
+
+    tokens = split_tokens(SYNTHETIC_REPLY)
+    reply = "".join(tokens[i % len(tokens)] for i in range(reply_tokens))
+    return {"role": "assistant", "content": reply}
+
+
+def _completion_text(message: Dict[str, Any]) -> str:
+    tool_calls = message.get("tool_calls") or []
+    if tool_calls:
+        return "".join(call["function"]["arguments"] for call in tool_calls)
+    return message.get("content") or ""
+
+
+def _completion(body: Dict[str, Any], message: Dict[str, Any], usage: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+        }],
+        "usage": usage,
+    }
+
+
+def _chunk(completion: Dict[str, Any], delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    chunk = {
+        "id": completion["id"],
+        "object": "chat.completion.chunk",
+        "created": completion["created"],
+        "model": completion["model"],
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    """Build the fake server application."""
+    app = FastAPI(title="Fake LLM")
+    rng = random.Random(config.seed)
+    store = FixtureStore(config.fixtures) if config.fixtures else None
+    stats = {
+        "requests": 0,
+        "streamed": 0,
+        "rejected": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "in_flight": 0,
+        "peak_in_flight": 0,
+        "replay_hits": 0,
+        "replay_misses": 0,
+        "recorded": 0,
+        "invalid": 0,
+        "by_model": {},
+    }
+    app.state.stats = stats
+
+    def behaviour(model: str) -> ModelBehaviour:
+        return config.models.get(model) or ModelBehaviour()
+
+    def first_token_delay(model: str) -> float:
+        latency = behaviour(model).latency_ms
+        latency = config.latency_ms if latency is None else latency
+        return max(0.0, latency + rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+
+    def token_rate(model: str) -> float:
+        return behaviour(model).token_rate or config.token_rate
+
+    async def upstream_completion(request: Request, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        headers = {"Authorization": request.headers.get("authorization") or f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+        async with httpx.AsyncClient(base_url=config.upstream, timeout=120) as client:
+            response = await client.post("/chat/completions", json={**body, "stream": False}, headers=headers)
+        return response.status_code, response.json()
+
+    async def stream(completion: Dict[str, Any], delay: float, rate: float):
+        message = completion["choices"][0]["message"]
+        await asyncio.sleep(delay)
+        yield _chunk(completion, {"role": "assistant", "content": "" if not message.get("tool_calls") else None})
+
+        tool_calls = message.get("tool_calls") or []
+        if tool_calls:
+            call = tool_calls[0]
+            yield _chunk(completion, {"tool_calls": [{
+                "index": 0, "id": call["id"], "type": "function",
+                "function": {"name": call["function"]["name"], "arguments": ""},
+            }]})
+            pieces = split_tokens(call["function"]["arguments"])
+        else:
+            pieces = split_tokens(message.get("content") or "")
+
+        for piece in pieces:
+            if config.mode != "record":
+                await asyncio.sleep(1 / rate)
+            if tool_calls:
+                yield _chunk(completion, {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+            else:
+                yield _chunk(completion, {"content": piece})
+
+        yield _chunk(completion, {}, completion["choices"][0]["finish_reason"])
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+
+        if config.max_concurrency and stats["in_flight"] >= config.max_concurrency:
+            stats["rejected"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": "1"},
+                content={"error": {
+                    "message": "Rate limit reached for requests",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }},
+            )
+
+        model = body.get("model", "fake")
+        stats["requests"] += 1
+        stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        streamed = bool(body.get("stream"))
+        try:
+            key = request_key(body)
+            completion = None
+
+            if config.mode == "record":
+                status, completion = await upstream_completion(request, body)
+                if status != 200:
+                    return JSONResponse(status_code=status, content=completion)
+                await store.add(key, {field: body.get(field) for field in KEY_FIELDS}, completion)
+                stats["recorded"] += 1
+            elif config.mode == "replay":
+                recorded = store.get(key)
+                if recorded is not None:
+                    stats["replay_hits"] += 1
+                    completion = {**recorded, "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "created": int(time.time())}
+                else:
+                    stats["replay_misses"] += 1
+                    if config.strict:
+                        return JSONResponse(status_code=404, content={"error": {
+                            "message": f"No recorded response for request {key}",
+                            "type": "invalid_request_error",
+                            "code": "fixture_not_found",
+                        }})
+
+            if completion is None:
+                invalid = (
+                    bool(body.get("tools") or body.get("response_format"))
+                    and rng.random() < behaviour(model).invalid_rate
+                )
+                stats["invalid"] += invalid
+                message = _synthetic_message(body, config.reply_tokens, invalid)
+                prompt_tokens = sum(count_tokens(m.get("content") or "") for m in body.get("messages", []))
+                completion_tokens = count_tokens(_completion_text(message))
+                completion = _completion(body, message, {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                })
+
+            usage = completion.get("usage") or {}
+            stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+            # Recorded responses already took real time upstream
+            delay = 0.0 if config.mode == "record" else first_token_delay(model)
+
+            if streamed:
+                stats["streamed"] += 1
+                # The generator outlives this handler, so it tracks its own concurrency slot
+                stats["in_flight"] += 1
+
+                async def tracked():
+                    try:
+                        async for event in stream(completion, delay, token_rate(model)):
+                            yield event
+                    finally:
+                        stats["in_flight"] -= 1
+
+                return StreamingResponse(tracked(), media_type="text/event-stream")
+
+            if config.mode != "record":
+                await asyncio.sleep(delay + usage.get("completion_tokens", 0) / token_rate(model))
+            return completion
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        for counter in stats:
+            if counter == "by_model":
+                stats[counter] = {}
+            elif counter != "in_flight":
+                stats[counter] = 0
+        return stats
+
+    return app
+
+
+def serve_in_thread(app: FastAPI) -> Tuple[str, uvicorn.Server]:
+    """
+    Run an app on a free local port in a daemon thread.
+
+    Returns:
+        Base URL of the OpenAI-compatible API and the server (set
+        ``server.should_exit`` to stop it)
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="completion tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=120, help="length of synthetic text replies")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="429 above this many in-flight requests")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--model", action="append", default=[], metavar="NAME=LATENCY_MS[:TOKEN_RATE[:INVALID_RATE]]",
+        help="per-model latency, token rate and fraction of invalid structured replies",
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="FIXTURES", help="forward to --upstream and record responses")
+    source.add_argument("--replay", metavar="FIXTURES", help="answer from recorded responses")
+    parser.add_argument("--upstream", default="https://api.openai.com/v1")
+    parser.add_argument("--strict", action="store_true", help="404 on replay misses instead of synthesizing")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        max_concurrency=args.max_concurrency,
+        mode="record" if args.record else "replay" if args.replay else "synthetic",
+        fixtures=args.record or args.replay,
+        upstream=args.upstream,
+        strict=args.strict,
+        seed=args.seed,
+        models=dict(parse_model_behaviour(spec) for spec in args.model),
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
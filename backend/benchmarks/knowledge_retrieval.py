@@ -0,0 +1,195 @@
+"""
+Benchmark of knowledge base retrieval for chat.
+
+1. Ingests the corpus into a temporary Chroma directory with the configured
+   local embedder and reports chunking, embedding and write times.
+2. Checks that labeled questions retrieve a chunk of the expected section
+   within the top k, and that small talk retrieves nothing (every chunk is
+   beyond RAG_MAX_DISTANCE).
+3. Measures retrieval latency with cold and cached query embeddings and
+   checks that repeated questions skip the embedding step.
+4. Runs FitnessAgent.chat against the fake LLM server with retrieval on and
+   off, and checks that the references add far fewer prompt tokens than the
+   whole corpus would.
+
+Usage:
+    python -m benchmarks.knowledge_retrieval [--corpus knowledge_base] [--rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fake_llm import FakeLLMConfig, count_tokens, create_app, serve_in_thread
+
+MIN_HIT_RATE = 0.85
+MIN_SMALL_TALK_FILTERED = 0.75
+MAX_CACHED_P95_MS = 50
+# Injected references as a share of the whole corpus's tokens
+MAX_PROMPT_SHARE = 0.25
+
+# Question -> part of the title of a section that answers it
+LABELED_QUERIES = {
+    "深蹲的时候膝盖内扣怎么办": "杠铃深蹲 > 常见错误",
+    "脚跟离地怎么办": "杠铃深蹲 > 常见错误",
+    "硬拉腰疼": "传统硬拉",
+    "卧推肩膀疼": "杠铃卧推",
+    "引体向上一个都做不了": "引体向上 > 进阶方法",
+    "推举时腰往后仰": "站姿杠铃推举",
+    "臀推怎么做": "臀桥与臀推",
+    "杠铃划船动作要领": "杠铃划船",
+    "训练前怎么热身": "热身方法",
+    "增肌做几组几次": "组数、次数与强度",
+    "RPE是什么意思": "RPE 与 RIR",
+    "一周练四天怎么安排": "训练分化",
+    "多久减载一次": "减载周",
+    "新手怎么练": "新手计划示例",
+    "有氧和力量怎么安排": "有氧训练安排",
+    "平台期怎么办": "平台期处理",
+    "基础代谢怎么算": "热量需求计算",
+    "减脂每天吃多少热量": "减脂的热量缺口",
+    "增肌要吃多少": "增肌的热量盈余",
+    "每天应该吃多少蛋白质": "蛋白质",
+    "脂肪要吃多少": "脂肪",
+    "喝多少水": "饮水",
+    "肌酸有用吗": "补剂",
+    "外卖怎么吃": "饮食执行技巧",
+    "睡不好影响增肌吗": "睡眠",
+    "过度训练有什么表现": "过度训练的信号",
+    "训练量突然增加受伤": "急慢性负荷比",
+    "休息日做什么": "休息日安排",
+    "练完第二天肌肉酸痛": "延迟性肌肉酸痛",
+    "腰疼还能练吗": "常见疼痛处理",
+}
+
+SMALL_TALK = ["你好", "今天天气怎么样", "帮我写一首诗", "我叫小明", "明天提醒我开会", "推荐一部电影", "好的我知道了", "谢谢"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def check_ingest(kb, corpus: str):
+    from app.core.config import settings
+    from app.knowledge.ingest import ingest, load_corpus
+
+    result = ingest(kb, corpus, settings.RAG_CHUNK_CHARS, settings.RAG_CHUNK_OVERLAP_CHARS)
+    chunks = load_corpus(corpus, settings.RAG_CHUNK_CHARS, settings.RAG_CHUNK_OVERLAP_CHARS)
+    assert kb.count() == len(chunks) == result["chunks"]
+    print(
+        f"Ingest: {result['chunks']} chunks with {kb.embedder.name}; chunking {result['chunk_seconds'] * 1000:.1f} ms, "
+        f"embedding {result['embed_seconds'] * 1000:.1f} ms, writing {result['write_seconds'] * 1000:.0f} ms"
+    )
+    return chunks
+
+
+async def check_relevance(kb) -> None:
+    hits = 0
+    for query, section in LABELED_QUERIES.items():
+        chunks = await kb.retrieve(query)
+        if any(section in chunk.title for chunk in chunks):
+            hits += 1
+        else:
+            print(f"  miss: {query} -> {[chunk.title for chunk in chunks]}")
+    filtered = 0
+    for query in SMALL_TALK:
+        filtered += not await kb.retrieve(query)
+
+    print(
+        f"Relevance: expected section in top {kb.top_k} for {hits}/{len(LABELED_QUERIES)} questions; "
+        f"{filtered}/{len(SMALL_TALK)} small talk messages retrieved nothing"
+    )
+    assert hits >= MIN_HIT_RATE * len(LABELED_QUERIES), hits
+    assert filtered >= MIN_SMALL_TALK_FILTERED * len(SMALL_TALK), filtered
+
+
+async def check_latency(kb, rounds: int) -> None:
+    kb.embeddings.clear_query_cache()
+    queries = list(LABELED_QUERIES)
+
+    cold = []
+    for query in queries:
+        start = time.perf_counter()
+        await kb.retrieve(query)
+        cold.append((time.perf_counter() - start) * 1000)
+
+    hits_before = kb.embeddings.query_hits
+    cached = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            # Same question, different spacing and case
+            await kb.retrieve(f"  {query.upper()} ")
+            cached.append((time.perf_counter() - start) * 1000)
+    hits = kb.embeddings.query_hits - hits_before
+    assert hits == rounds * len(queries), hits
+
+    stats = kb.stats()
+    print(
+        f"Latency: cold p50 {statistics.median(cold):.2f} ms, p95 {percentile(cold, 0.95):.2f} ms; "
+        f"cached p50 {statistics.median(cached):.2f} ms, p95 {percentile(cached, 0.95):.2f} ms "
+        f"(embed p50 {stats['latency_ms']['embed']['p50']} ms, search p50 {stats['latency_ms']['search']['p50']} ms); "
+        f"query cache hit rate {stats['embeddings']['query_cache']['hit_rate']:.2%}"
+    )
+    assert percentile(cached, 0.95) < MAX_CACHED_P95_MS
+
+
+async def check_chat(llm_app, chunks) -> None:
+    from app.agents.fitness_agent import FitnessAgent
+    from app.core.config import settings
+
+    agent = FitnessAgent()
+    questions = ["深蹲的时候膝盖内扣怎么办", "每天应该吃多少蛋白质", "练完第二天肌肉酸痛"]
+
+    async def prompt_tokens(enabled: bool) -> int:
+        settings.RAG_ENABLED = enabled
+        before = llm_app.state.stats["prompt_tokens"]
+        for question in questions:
+            await agent.chat(question, context="体重：80kg")
+        return llm_app.state.stats["prompt_tokens"] - before
+
+    without = await prompt_tokens(False)
+    with_references = await prompt_tokens(True)
+    settings.RAG_ENABLED = True
+
+    added = (with_references - without) / len(questions)
+    corpus_tokens = sum(count_tokens(f"{chunk.title}\n{chunk.text}") for chunk in chunks)
+    print(
+        f"Chat: references add {added:.0f} prompt tokens per message; "
+        f"the whole corpus would add {corpus_tokens} ({added / corpus_tokens:.1%})"
+    )
+    assert 0 < added <= MAX_PROMPT_SHARE * corpus_tokens, (added, corpus_tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default="knowledge_base")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    # Settings and agent clients are created at import time, so the
+    # environment has to point at the fake LLM and the temporary collection
+    # before anything imports app
+    llm_app = create_app(FakeLLMConfig(latency_ms=20, jitter_ms=0, token_rate=10000, seed=0))
+    base_url, server = serve_in_thread(llm_app)
+    os.environ["LLM_BASE_URL"] = base_url
+    persist_directory = tempfile.mkdtemp(prefix="knowledge-")
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = persist_directory
+
+    from app.knowledge.store import knowledge_base
+
+    chunks = check_ingest(knowledge_base, args.corpus)
+    asyncio.run(check_relevance(knowledge_base))
+    asyncio.run(check_latency(knowledge_base, args.rounds))
+    asyncio.run(check_chat(llm_app, chunks))
+    server.should_exit = True
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
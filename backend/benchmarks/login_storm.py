@@ -0,0 +1,255 @@
+"""
+Event-loop latency during a login storm.
+
+Runs the API in-process on a temporary SQLite database, registers
+``--users`` accounts and then, while a probe measures how late the event
+loop wakes from 10 ms sleeps and how long a cheap request (``GET /``)
+takes:
+
+1. idles, for a baseline;
+2. sends ``--logins`` concurrent logins (bcrypt in the password hashing
+   pool) and checks that loop lag and probe latency stay flat;
+3. checks the same bcrypt work run on the event loop, as a handler calling
+   bcrypt directly would, for comparison.
+
+Then checks the token path: cached verification cost against a full JWT
+decode, that authenticated requests with a warm token run no account
+query, that bad, expired and missing tokens are answered 401, and that a
+hash made with an outdated cost is replaced at login.
+
+Usage:
+    python -m benchmarks.login_storm [--users 8] [--logins 32]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# Queued logins are slow by design; don't log each one
+os.environ.setdefault("SLOW_REQUEST_LOG_MS", "0")
+# Every login comes from one client address
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+_workdir = Path(tempfile.mkdtemp(prefix="login-storm-"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir / 'auth.db'}"
+
+import bcrypt
+import httpx
+from sqlalchemy import select, update
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.core.security import access_tokens, password_hasher
+from app.main import app
+from app.models.user import User
+from app.services.auth import auth_user_cache
+
+PASSWORD = "correct horse battery"
+
+# Loop lag (late wake-ups of a 10 ms sleep) and probe latency during the storm
+MAX_STORM_LAG_P99_MS = 50
+MAX_STORM_PROBE_P99_MS = 100
+
+
+class LoopProbe:
+    """Measures event-loop lag and the latency of a cheap request until stopped."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.lags: List[float] = []
+        self.requests: List[float] = []
+        self._stopped = asyncio.Event()
+
+    async def run(self) -> None:
+        await asyncio.gather(self._lag(), self._requests())
+
+    def stop(self) -> Dict[str, float]:
+        self._stopped.set()
+        return {
+            "lag_p50": statistics.median(self.lags),
+            "lag_p99": percentile(self.lags, 0.99),
+            "lag_max": max(self.lags),
+            "probe_p50": statistics.median(self.requests),
+            "probe_p99": percentile(self.requests, 0.99),
+        }
+
+    async def _lag(self) -> None:
+        while not self._stopped.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            self.lags.append(max((time.perf_counter() - start) * 1000 - 10, 0.0))
+
+    async def _requests(self) -> None:
+        while not self._stopped.is_set():
+            start = time.perf_counter()
+            response = await self.client.get("/")
+            assert response.status_code == 200
+            self.requests.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.02)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def report(label: str, result: Dict[str, float]) -> None:
+    print(
+        f"{label:<26} loop lag p50 {result['lag_p50']:6.1f} ms, p99 {result['lag_p99']:6.1f} ms, "
+        f"max {result['lag_max']:6.1f} ms; GET / p50 {result['probe_p50']:6.1f} ms, p99 {result['probe_p99']:6.1f} ms"
+    )
+
+
+async def probed(client: httpx.AsyncClient, work) -> Dict[str, float]:
+    probe = LoopProbe(client)
+    task = asyncio.create_task(probe.run())
+    await asyncio.sleep(0.2)
+    await work()
+    # Let samples taken across the end of the work land
+    await asyncio.sleep(0.05)
+    result = probe.stop()
+    await task
+    return result
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str = PASSWORD) -> httpx.Response:
+    return await client.post("/api/users/login", data={"username": username, "password": password})
+
+
+async def check_storm(client: httpx.AsyncClient, users: int, logins: int) -> None:
+    start = time.perf_counter()
+    for i in range(users):
+        response = await client.post(
+            "/api/users/", json={"email": f"user{i}@example.com", "username": f"user{i}", "password": PASSWORD}
+        )
+        assert response.status_code == 201, response.text
+    print(
+        f"Registered {users} users in {time.perf_counter() - start:.1f} s "
+        f"(bcrypt cost {password_hasher.rounds}, {password_hasher.workers} hashing threads)"
+    )
+
+    report("Idle", await probed(client, lambda: asyncio.sleep(1.0)))
+
+    latencies = []
+
+    async def one(i: int) -> None:
+        started = time.perf_counter()
+        response = await login(client, f"user{i % users}")
+        assert response.status_code == 200, response.text
+        latencies.append(time.perf_counter() - started)
+
+    async def storm():
+        await asyncio.gather(*(one(i) for i in range(logins)))
+
+    start = time.perf_counter()
+    pooled = await probed(client, storm)
+    seconds = time.perf_counter() - start
+    report(f"{logins} logins, pooled", pooled)
+    print(
+        f"  {logins / seconds:.1f} logins/s, login p50 {statistics.median(latencies) * 1000:.0f} ms, "
+        f"max {max(latencies) * 1000:.0f} ms; peak pool queue {password_hasher.peak_pending}"
+    )
+    assert pooled["lag_p99"] < MAX_STORM_LAG_P99_MS, pooled
+    assert pooled["probe_p99"] < MAX_STORM_PROBE_P99_MS, pooled
+
+    # What a handler calling bcrypt directly does to the loop
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(password_hasher.rounds))
+
+    async def on_loop():
+        for _ in range(max(logins // 8, 2)):
+            bcrypt.checkpw(PASSWORD.encode(), hashed)
+            await asyncio.sleep(0)
+
+    blocking = await probed(client, on_loop)
+    report(f"{max(logins // 8, 2)} checks on the loop", blocking)
+    assert blocking["lag_max"] > 5 * pooled["lag_p99"], (blocking, pooled)
+
+
+async def check_tokens(client: httpx.AsyncClient) -> None:
+    token = (await login(client, "user0")).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    access_tokens.clear()
+    start = time.perf_counter()
+    access_tokens.verify(token)
+    cold_us = (time.perf_counter() - start) * 1e6
+    runs = 10000
+    start = time.perf_counter()
+    for _ in range(runs):
+        access_tokens.verify(token)
+    cached_us = (time.perf_counter() - start) / runs * 1e6
+    access_tokens.clear()
+    start = time.perf_counter()
+    for _ in range(200):
+        access_tokens.clear()
+        access_tokens.verify(token)
+    decode_us = (time.perf_counter() - start) / 200 * 1e6
+    print(f"Token verification: first {cold_us:.0f} us, full decode {decode_us:.0f} us, cached {cached_us:.2f} us")
+    assert cached_us * 10 < decode_us
+
+    # Warm token: no account query per request
+    response = await client.get("/api/workouts/sessions", headers=headers)
+    assert response.status_code == 200
+    misses = auth_user_cache.misses
+    for _ in range(100):
+        response = await client.get("/api/workouts/sessions", headers=headers)
+        assert response.status_code == 200
+    assert auth_user_cache.misses == misses
+    print(f"100 authenticated requests with a warm token: {auth_user_cache.misses - misses} account queries")
+
+    access_tokens.expire_minutes, minutes = -1, access_tokens.expire_minutes
+    expired = access_tokens.create(1)
+    access_tokens.expire_minutes = minutes
+    for bad in ("Bearer garbage", f"Bearer {token[:-2]}xx", f"Bearer {expired}"):
+        response = await client.get("/api/users/me", headers={"Authorization": bad})
+        assert response.status_code == 401 and response.headers["www-authenticate"] == "Bearer", bad
+    assert (await client.get("/api/users/me")).status_code == 401
+    assert (await login(client, "user0", "wrong password")).status_code == 401
+    assert (await login(client, "nobody")).status_code == 401
+    me = await client.get("/api/users/me", headers=headers)
+    assert me.status_code == 200 and me.json()["username"] == "user0"
+    print("Bad, expired and missing tokens and wrong passwords are answered 401")
+
+    # Outdated cost: replaced at the next login
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(User).where(User.username == "user1")
+            .values(hashed_password=bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode())
+        )
+        await db.commit()
+    assert (await login(client, "user1")).status_code == 200
+    async with AsyncSessionLocal() as db:
+        hashed = (await db.execute(select(User.hashed_password).where(User.username == "user1"))).scalar_one()
+    assert not password_hasher.needs_rehash(hashed), hashed
+    print(f"Cost-4 hash replaced with a cost-{password_hasher.rounds} hash at login")
+
+
+async def run(users: int, logins: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+        await check_storm(client, users, logins)
+        await check_tokens(client)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args.users, args.logins))
+    finally:
+        shutil.rmtree(_workdir, ignore_errors=True)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
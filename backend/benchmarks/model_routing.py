@@ -0,0 +1,146 @@
+"""
+Benchmark of small-to-large model routing.
+
+Starts the fake LLM server with two models: a slow, expensive large model
+(LLM_MODEL) and a fast, cheap small model (LLM_SMALL_MODEL) that returns an
+unparseable structured reply for a fraction of requests. Runs the routed
+agent methods (intent, split suggestion, macros, food parsing) plus plan
+generation, once with every call on the large model and once with routing,
+and reports per-method latency, estimated cost and escalation rate.
+
+Checks that every call still returns valid output, that escalations
+happen, and that plan generation never leaves the large model.
+
+Usage:
+    python -m benchmarks.model_routing [--calls N] [--invalid-rate 0.1]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.core.config import settings
+from benchmarks.fake_llm import FakeLLMConfig, ModelBehaviour, create_app, serve_in_thread
+
+PROFILE = {
+    "user_id": 1,
+    "fitness_goal": "muscle_gain",
+    "experience_level": "intermediate",
+    "training_frequency": 4,
+    "equipment_access": "full_gym",
+    "age": 28,
+    "gender": "male",
+    "weight": 75,
+    "height": 178,
+}
+
+
+def operations(fitness, workout, nutrition) -> List[Tuple[str, Callable[[int], Awaitable[Dict[str, Any]]]]]:
+    return [
+        ("fitness.intent", lambda i: fitness.analyze_intent(f"我想调整一下第 {i} 周的训练计划")),
+        ("workout.split", lambda i: workout.suggest_workout_split(3 + i % 3, "muscle_gain", "intermediate")),
+        ("nutrition.macros", lambda i: nutrition.calculate_macros({**PROFILE, "weight": 60 + i})),
+        ("nutrition.food_parse", lambda i: nutrition.parse_food_description(f"午饭吃了 {i + 1} 碗米饭和一份宫保鸡丁")),
+        ("workout.plan", lambda i: workout.generate_workout_plan({**PROFILE, "age": 20 + i})),
+    ]
+
+
+async def run_mode(ops, calls: int) -> Dict[str, Dict[str, Any]]:
+    from app.services.usage import usage_ledger
+
+    before = usage_ledger.stats()["by_method"]
+    results = {}
+    for operation, call in ops:
+        latencies = []
+
+        async def one(i: int) -> None:
+            start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        after = usage_ledger.stats()["by_method"][operation]
+        cost = after["cost_usd"] - before.get(operation, {}).get("cost_usd", 0)
+        results[operation] = {
+            "p50_ms": statistics.median(latencies) * 1000,
+            "cost_usd": cost,
+        }
+    return results
+
+
+async def run(args) -> None:
+    large, small = settings.LLM_MODEL, settings.LLM_SMALL_MODEL
+    config = FakeLLMConfig(
+        latency_ms=args.large_latency_ms,
+        jitter_ms=20,
+        token_rate=args.large_token_rate,
+        seed=1,
+        models={
+            small: ModelBehaviour(
+                latency_ms=args.small_latency_ms,
+                token_rate=args.small_token_rate,
+                invalid_rate=args.invalid_rate,
+            ),
+        },
+    )
+    base_url, server = serve_in_thread(create_app(config))
+    settings.LLM_BASE_URL = base_url
+
+    from app.agents import FitnessAgent, NutritionPlannerAgent, WorkoutPlannerAgent
+    from app.agents.routing import model_router
+
+    ops = operations(FitnessAgent(), WorkoutPlannerAgent(), NutritionPlannerAgent())
+    try:
+        print(f"{args.calls} calls per method; large={large}, small={small} (invalid rate {args.invalid_rate})")
+
+        model_router.small_model = ""
+        baseline = await run_mode(ops, args.calls)
+        model_router.small_model = small
+        before = model_router.stats()
+        routed = await run_mode(ops, args.calls)
+        routing = {
+            operation: {
+                counter: value - before.get(operation, {}).get(counter, 0)
+                for counter, value in stats.items() if counter in ("calls", "escalations", "failures")
+            }
+            for operation, stats in model_router.stats().items()
+        }
+        served_by = model_router.stats()["workout.plan"]["served_by"]
+
+        print(f"{'method':<22}{'p50 ms':>16}{'cost $':>20}{'escalated':>11}")
+        for operation, _ in ops:
+            b, r = baseline[operation], routed[operation]
+            rate = routing[operation]["escalations"] / routing[operation]["calls"]
+            print(
+                f"{operation:<22}{b['p50_ms']:>7.0f} -> {r['p50_ms']:<6.0f}"
+                f"{b['cost_usd']:>9.4f} -> {r['cost_usd']:<8.4f}{rate:>10.1%}"
+            )
+        total_before = sum(result["cost_usd"] for result in baseline.values())
+        total_after = sum(result["cost_usd"] for result in routed.values())
+        print(f"total cost ${total_before:.4f} -> ${total_after:.4f}")
+
+        assert not any(stats["failures"] for stats in routing.values()), "escalation should recover every call"
+        assert any(stats["escalations"] for stats in routing.values()), "some small-model replies should escalate"
+        assert set(served_by) == {large}, "plan generation should stay on the large model"
+        assert total_after < total_before, "routing should cut cost"
+    finally:
+        server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20, help="calls per method")
+    parser.add_argument("--invalid-rate", type=float, default=0.1, help="small model's unparseable reply rate")
+    parser.add_argument("--large-latency-ms", type=float, default=800.0)
+    parser.add_argument("--large-token-rate", type=float, default=40.0)
+    parser.add_argument("--small-latency-ms", type=float, default=250.0)
+    parser.add_argument("--small-token-rate", type=float, default=150.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
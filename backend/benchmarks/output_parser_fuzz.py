@@ -0,0 +1,160 @@
+"""
+Fuzz and benchmark suite for the structured output parser.
+
+Generates random workout plans, applies the defects seen in real LLM
+output (prose around fences, trailing commas, Python literals, truncation,
+unclosed fences, noise) and reports per defect class:
+
+- recovery rate of the shared parser vs. the old per-agent fence scanning
+- parse latency (p50/p99)
+
+Invariant checked on every input: the parser either returns a dict that
+validates against the schema or raises OutputParseError, nothing else.
+
+Usage:
+    python -m benchmarks.output_parser_fuzz [--samples N] [--seed S]
+"""
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+from app.agents.output_parser import OutputParseError, parse_output
+from app.schemas.agent_outputs import WorkoutPlanOutput
+
+EXERCISES = ["卧推", "深蹲", "硬拉", "引体向上", "推举", "划船", "弯举", "臂屈伸"]
+MUSCLES = ["胸", "背", "腿", "肩", "二头", "三头", "核心"]
+
+
+def random_plan(rng: random.Random) -> dict:
+    days = rng.randint(2, 6)
+    return {
+        "plan_name": f"计划{rng.randint(1, 999)}",
+        "workout_type": rng.choice(["push_pull_legs", "upper_lower", "full_body"]),
+        "duration_weeks": rng.choice([8, 12, 16]),
+        "frequency_per_week": days,
+        "rationale": "根据目标和经验水平安排训练。" * rng.randint(1, 4),
+        "weekly_schedule": [
+            {
+                "day": day + 1,
+                "name": f"训练日{day + 1}",
+                "target_muscles": rng.sample(MUSCLES, 2),
+                "exercises": [
+                    {
+                        "name": rng.choice(EXERCISES),
+                        "sets": rng.randint(3, 5),
+                        "reps": rng.randint(5, 15),
+                        "rest_seconds": rng.choice([60, 90, 120]),
+                        "notes": "保持动作标准",
+                        "superset": rng.random() < 0.2,
+                    }
+                    for _ in range(rng.randint(3, 6))
+                ],
+            }
+            for day in range(days)
+        ],
+        "progression_advice": "每周增加2.5%重量",
+    }
+
+
+def fenced_prose(rng, doc):
+    return f"好的，这是为你设计的计划：\n\n```json\n{doc}\n```\n\n祝训练顺利！"
+
+
+def trailing_commas(rng, doc):
+    return doc.replace("}", ",}").replace("]", ",]")
+
+
+def python_literals(rng, doc):
+    return doc.replace("true", "True").replace("false", "False").replace("null", "None")
+
+
+def truncated(rng, doc):
+    # Cut somewhere after the plan name, as when max_tokens is hit
+    cut = rng.randint(len(doc) // 3, len(doc) - 1)
+    return "```json\n" + doc[:cut]
+
+
+def unclosed_fence(rng, doc):
+    return f"```json\n{doc}\n"
+
+
+def noise(rng, doc):
+    return "".join(rng.choice(string.printable + "{}[]\":,") for _ in range(rng.randint(0, 400)))
+
+
+MUTATIONS = {
+    "clean": lambda rng, doc: doc,
+    "fenced_prose": fenced_prose,
+    "trailing_commas": trailing_commas,
+    "python_literals": python_literals,
+    "truncated": truncated,
+    "unclosed_fence": unclosed_fence,
+    "noise": noise,
+}
+
+
+def legacy_parse(text: str) -> dict:
+    """The fence scanning previously copied into each agent."""
+    if "```json" in text:
+        start = text.find("```json") + 7
+        end = text.find("```", start)
+        json_str = text[start:end].strip()
+    elif "```" in text:
+        start = text.find("```") + 3
+        end = text.find("```", start)
+        json_str = text[start:end].strip()
+    else:
+        json_str = text.strip()
+    return json.loads(json_str)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'defect':<16} {'parser':>8} {'legacy':>8} {'p50 µs':>9} {'p99 µs':>9}")
+
+    for name, mutate in MUTATIONS.items():
+        recovered = legacy_recovered = 0
+        timings = []
+
+        for _ in range(args.samples):
+            doc = json.dumps(random_plan(rng), ensure_ascii=False, indent=rng.choice([None, 2]))
+            text = mutate(rng, doc)
+
+            start = time.perf_counter()
+            try:
+                result = parse_output(text, WorkoutPlanOutput)
+            except OutputParseError:
+                result = None
+            timings.append((time.perf_counter() - start) * 1e6)
+
+            if result is not None:
+                # Invariant: anything returned validates against the schema
+                WorkoutPlanOutput.model_validate(result)
+                recovered += 1
+
+            try:
+                WorkoutPlanOutput.model_validate(legacy_parse(text))
+                legacy_recovered += 1
+            except Exception:
+                pass
+
+        print(
+            f"{name:<16} {recovered / args.samples:>8.1%} {legacy_recovered / args.samples:>8.1%} "
+            f"{statistics.median(timings):>9.1f} {percentile(timings, 0.99):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
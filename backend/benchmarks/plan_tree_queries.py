@@ -0,0 +1,132 @@
+"""
+Query-count assertions for the workout plan repository.
+
+Seeds plans of different sizes inside a transaction that is rolled back
+afterwards, loads each one through WorkoutRepository and asserts that the
+number of SQL statements does not grow with the number of sessions or
+exercises.
+
+Usage:
+    python -m benchmarks.plan_tree_queries [--database-url URL]
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.core.config import settings
+from app.core.database import Base
+from app.models import User, WorkoutPlan, WorkoutSession, WorkoutExercise, Exercise
+from app.models.workout import MuscleGroup
+from app.repositories.workout import WorkoutRepository
+
+# (sessions per plan, exercises per session)
+PLAN_SIZES = [(1, 1), (3, 5), (7, 12)]
+
+# Expected statement counts, independent of plan size
+EXPECTED_QUERIES = {
+    "get_plan_view": 3,
+    "get_active_plan_view": 3,
+    "get_sessions_view": 2,
+    "load_plan": 4,
+}
+
+
+class QueryCounter:
+    """Counts statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+async def seed_plan(db: AsyncSession, user: User, exercises, n_sessions: int, n_exercises: int) -> WorkoutPlan:
+    """Create a plan with the given number of sessions and exercises."""
+    plan = WorkoutPlan(user=user, name=f"plan-{n_sessions}x{n_exercises}", is_active=True)
+    for day in range(n_sessions):
+        session = WorkoutSession(user=user, workout_plan=plan, name=f"day-{day}", day_of_week=day)
+        for order in range(n_exercises):
+            session.exercises.append(
+                WorkoutExercise(exercise=exercises[order % len(exercises)], order=order)
+            )
+    db.add(plan)
+    await db.flush()
+    return plan
+
+
+async def run(database_url: str) -> None:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    counter = QueryCounter(engine)
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+
+        try:
+            user = User(email="bench@example.com", username="bench_user", hashed_password="x")
+            exercises = [
+                Exercise(name=f"exercise-{i}", muscle_group=MuscleGroup.FULL_BODY)
+                for i in range(12)
+            ]
+            db.add_all([user, *exercises])
+            await db.flush()
+
+            for n_sessions, n_exercises in PLAN_SIZES:
+                plan = await seed_plan(db, user, exercises, n_sessions, n_exercises)
+                # Drop seeded instances so loads go to the database
+                db.expunge_all()
+                repo = WorkoutRepository(db)
+
+                checks = {
+                    "get_plan_view": lambda: repo.get_plan_view(plan.id, user.id),
+                    "get_active_plan_view": lambda: repo.get_active_plan_view(user.id),
+                    "get_sessions_view": lambda: repo.get_sessions_view(user.id, limit=n_sessions),
+                    "load_plan": lambda: repo.load_plan(plan.id, user.id),
+                }
+
+                for name, call in checks.items():
+                    counter.reset()
+                    start = time.perf_counter()
+                    await call()
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    db.expunge_all()
+
+                    print(
+                        f"{name:<22} sessions={n_sessions:<3} exercises={n_exercises:<3} "
+                        f"queries={counter.count:<2} time={elapsed_ms:.2f}ms"
+                    )
+                    assert counter.count == EXPECTED_QUERIES[name], (
+                        f"{name} issued {counter.count} queries, "
+                        f"expected {EXPECTED_QUERIES[name]}"
+                    )
+
+                # Deactivate so the next plan becomes the active one
+                await db.execute(
+                    WorkoutPlan.__table__.update().values(is_active=False)
+                )
+        finally:
+            await db.close()
+            await transaction.rollback()
+
+    await engine.dispose()
+    print("OK: query counts are constant across plan sizes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark of per-call prompt construction overhead.
+
+Compares the previous per-message construction (format the whole system
+prompt, build ChatPromptTemplate and ConversationChain) against the
+compiled prompts and chain reused by the agents. No LLM calls are made.
+
+Usage:
+    python -m benchmarks.prompt_overhead [--iterations N]
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain.chains import ConversationChain
+from langchain.memory import ConversationBufferMemory
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from app.agents.fitness_agent import FitnessAgent
+from app.agents.prompts import FITNESS_SYSTEM, WORKOUT_PLAN
+from app.services.user_context import render_user_context
+
+PROFILE = {
+    "name": "张三",
+    "age": 28,
+    "gender": "male",
+    "height": 178,
+    "weight": 76,
+    "fitness_goal": "muscle_gain",
+    "experience_level": "intermediate",
+    "training_frequency": 4,
+    "equipment_access": "gym",
+}
+
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"消息 {i}"}
+    for i in range(10)
+]
+
+# Single format string equivalent to the old per-call f-string prompts
+LEGACY_SYSTEM = FITNESS_SYSTEM.static + "\n\n当前对话上下文：\n{context}\n"
+LEGACY_WORKOUT = (
+    WORKOUT_PLAN.static.replace("{", "{{").replace("}", "}}")
+    + "\n\n**用户信息**：\n- 健身目标：{goal}\n- 经验水平：{experience}\n"
+    "- 训练频率：每周{frequency}次\n- 可用器械：{equipment}\n"
+    "- 年龄：{age}\n- 性别：{gender}\n"
+)
+WORKOUT_VALUES = dict(
+    goal="muscle_gain", experience="intermediate", frequency=4,
+    equipment="gym", age=28, gender="male",
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    agent = FitnessAgent()
+    context = render_user_context(PROFILE)
+
+    def legacy_chat():
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", LEGACY_SYSTEM.format(context=render_user_context(PROFILE))),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}")
+        ])
+        memory = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
+        for msg in HISTORY:
+            if msg["role"] == "user":
+                memory.chat_memory.add_user_message(msg["content"])
+            else:
+                memory.chat_memory.add_ai_message(msg["content"])
+        ConversationChain(llm=agent.llm, memory=memory, prompt=prompt)
+        prompt.format_messages(chat_history=memory.chat_memory.messages, input="今天练什么？")
+
+    def compiled_chat():
+        agent.prompt.format_messages(
+            context=FITNESS_SYSTEM.render_dynamic(context=context, knowledge=""),
+            chat_history=agent._to_messages(HISTORY),
+            input="今天练什么？",
+        )
+
+    def legacy_workout():
+        LEGACY_WORKOUT.format(**WORKOUT_VALUES)
+
+    def compiled_workout():
+        WORKOUT_PLAN.render(**WORKOUT_VALUES)
+
+    def compiled_workout_messages():
+        WORKOUT_PLAN.to_messages(**WORKOUT_VALUES)
+
+    cases = [
+        ("chat: per-call template + chain", legacy_chat),
+        ("chat: compiled template, reused chain", compiled_chat),
+        ("workout plan: per-call format", legacy_workout),
+        ("workout plan: compiled render", compiled_workout),
+        ("workout plan: compiled to messages", compiled_workout_messages),
+    ]
+
+    print(f"{'case':<40} {'per call':>12}")
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=args.iterations, repeat=3))
+        print(f"{name:<40} {seconds / args.iterations * 1e6:>9.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
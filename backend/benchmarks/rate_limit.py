@@ -0,0 +1,237 @@
+"""
+Cost and behavior of the rate limiter.
+
+Reports the cost of one check (caller identity from a bearer token plus
+the bucket update) with 1,000 and ``--callers`` active callers, which
+should be the same: checks are O(1) and never touch the database.
+
+Then checks, with a fake clock:
+
+- llm routes are limited per request and by expected tokens, so a caller
+  gets fewer plan generations than food parses out of the same budget;
+- a rejected request takes nothing from any of its buckets, and the wait
+  it is given is enough;
+- callers, and api and llm routes, are limited independently;
+- the middleware answers 429 with Retry-After, keys buckets by token user
+  or client address, and leaves non-/api paths alone;
+- the application has the middleware mounted.
+
+With ``--redis-url``, also runs the checks against the redis backend and
+checks that two workers share one limit.
+
+Usage:
+    python -m benchmarks.rate_limit [--callers 100000] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+from app.core.config import settings
+from app.core.rate_limit import (
+    LLM_ROUTE_TOKENS,
+    InMemoryRateLimitBackend,
+    Limit,
+    RateLimitBackend,
+    RateLimiter,
+    RateLimitMiddleware,
+    RedisRateLimitBackend,
+    request_identity,
+)
+from app.core.security import access_tokens
+
+CHAT = ("POST", "/api/chat/message")
+PLAN = ("POST", "/api/workouts/plan/generate")
+PARSE = ("POST", "/api/nutrition/meal/parse")
+SESSIONS = ("GET", "/api/workouts/sessions")
+
+# Per check, identity included
+MAX_CHECK_US = 30
+
+# Small limits so waits stay short against a real Redis:
+# 10 LLM requests at once, 30,000 expected tokens at once refilling 6,000/s
+API = Limit(rate=50, burst=20)
+LLM = Limit(rate=1, burst=10)
+LLM_TOKENS = Limit(rate=6000, burst=30000)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+async def real_sleep(seconds: float) -> None:
+    await asyncio.sleep(seconds)
+
+
+def limiter(backend: RateLimitBackend) -> RateLimiter:
+    return RateLimiter(backend, api_limit=API, llm_limit=LLM, llm_token_limit=LLM_TOKENS)
+
+
+async def allowed(limiter: RateLimiter, identity: str, route, times: int) -> int:
+    return sum([not await limiter.check(identity, *route) for _ in range(times)])
+
+
+async def check_cost(callers: int) -> None:
+    token_scopes = [
+        {"type": "http", "headers": [(b"authorization", f"Bearer {access_tokens.create(i)}".encode())], "client": ("10.0.0.1", 1)}
+        for i in range(100)
+    ]
+    for scope in token_scopes:
+        request_identity(scope)
+
+    per_check = {}
+    for active in (1000, callers):
+        backend = InMemoryRateLimitBackend(max_keys=callers * 2)
+        limits = RateLimiter(backend, api_limit=Limit.per_minute(10**9, 10**9), llm_limit=None, llm_token_limit=None)
+        identities = [f"user:{i}" for i in range(active)]
+        for identity in identities:
+            await limits.check(identity, *SESSIONS)
+
+        runs = 100000
+        start = time.perf_counter()
+        for i in range(runs):
+            await limits.check(request_identity(token_scopes[i % 100]) if i % 2 else identities[i % active], *SESSIONS)
+        per_check[active] = (time.perf_counter() - start) / runs * 1e6
+        print(f"{active:>7} active callers: {per_check[active]:.2f} us per check (identity from a cached token on half)")
+
+    assert per_check[callers] < MAX_CHECK_US, per_check
+    assert per_check[callers] < per_check[1000] * 2.5, per_check
+
+
+async def check_behavior(label: str, make_backend: Callable[[], RateLimitBackend], advance: Callable[[float], Awaitable[None]]) -> None:
+    limits = limiter(make_backend())
+    run = uuid.uuid4().hex[:8]
+    alice, bob = f"user:alice-{run}", f"user:bob-{run}"
+
+    # Expected tokens: plan generations (6,000) run out before food parses (800)
+    plans = await allowed(limits, alice, PLAN, 20)
+    parses = await allowed(limits, bob, PARSE, 20)
+    assert plans == LLM_TOKENS.burst // LLM_ROUTE_TOKENS[PLAN], plans
+    assert parses == LLM.burst, parses
+    print(f"[{label}] from a full budget: {plans} plan generations, {parses} food parses")
+
+    # Rejections take nothing: alice's request bucket still has what the plans left
+    wait = await limits.check(alice, *PLAN)
+    assert 0 < wait <= LLM_ROUTE_TOKENS[PLAN] / LLM_TOKENS.rate + 0.05, wait
+    backend = limits.backend
+    assert not await backend.take([(f"llm:{alice}", LLM, LLM.burst - plans - 0.5)])
+    assert await backend.take([(f"llm:{alice}", LLM, 1), (f"llm_tokens:{alice}", LLM_TOKENS, 10**6)])
+    assert not await backend.take([(f"llm:{alice}", LLM, 0.5)])
+
+    # Other callers and api routes are unaffected
+    assert await allowed(limits, f"user:carol-{run}", CHAT, 1) == 1
+    assert await allowed(limits, alice, SESSIONS, API.burst + 5) == API.burst
+
+    # The given wait is enough
+    wait = await limits.check(alice, *PLAN)
+    await advance(wait + 0.05)
+    assert not await limits.check(alice, *PLAN)
+    print(f"[{label}] rejected requests take nothing; after the {wait:.2f} s Retry-After the next plan runs")
+
+
+async def check_shared(url: str) -> None:
+    prefix = f"ratelimit-benchmark:{uuid.uuid4().hex[:8]}:"
+    workers = [limiter(RedisRateLimitBackend(url, prefix=prefix)) for _ in range(2)]
+    runs = [await workers[i % 2].check("user:1", *CHAT) for i in range(2 * LLM.burst)]
+    assert sum(not wait for wait in runs) == LLM.burst, runs
+    print(f"[redis] two workers share one limit: {LLM.burst} of {len(runs)} chat messages allowed")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        await workers[0].check("user:2", *SESSIONS)
+    print(f"[redis] {(time.perf_counter() - start) * 1000:.2f} us per check (one script call)")
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def check_middleware() -> None:
+    clock = FakeClock()
+    limits = limiter(InMemoryRateLimitBackend(max_keys=1000, clock=clock))
+    transport = httpx.ASGITransport(app=RateLimitMiddleware(ok_app, limits), client=("203.0.113.7", 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def statuses(path: str, headers: Dict[str, str], times: int, method: str = "POST") -> List[int]:
+            return [(await client.request(method, path, headers=headers)).status_code for _ in range(times)]
+
+        user_1 = {"Authorization": f"Bearer {access_tokens.create(1)}"}
+        user_2 = {"Authorization": f"Bearer {access_tokens.create(2)}"}
+        assert statuses_ok(await statuses(CHAT[1], user_1, LLM.burst)), "burst rejected"
+        response = await client.post(CHAT[1], headers=user_1)
+        assert response.status_code == 429, response.status_code
+        assert response.headers["retry-after"] == "1", response.headers
+        assert response.json()["retry_after"] == 1
+        print(f"429 after {LLM.burst} chat messages: Retry-After {response.headers['retry-after']}, {response.json()}")
+
+        # Buckets per token user, then per address (invalid tokens included)
+        assert statuses_ok(await statuses(CHAT[1], user_2, LLM.burst))
+        assert statuses_ok(await statuses(CHAT[1], {}, 5))
+        assert statuses_ok(await statuses(CHAT[1], {"Authorization": "Bearer garbage"}, 5))
+        assert (await client.post(CHAT[1], headers={"Authorization": "Bearer garbage"})).status_code == 429
+        assert statuses_ok(await statuses(SESSIONS[1], user_1, API.burst, "GET"))
+        assert statuses_ok(await statuses("/health", user_1, 200, "GET"))
+        await clock.advance(1)
+        assert (await client.post(CHAT[1], headers=user_1)).status_code == 200
+    print("Buckets per token user or client address; /health not limited; refilled after Retry-After")
+
+
+def statuses_ok(statuses: List[int]) -> bool:
+    return all(status == 200 for status in statuses)
+
+
+async def check_app() -> None:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, client=("198.51.100.9", 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        statuses = [(await client.get("/api/users/me")).status_code for _ in range(settings.RATE_LIMIT_API_BURST + 5)]
+        assert statuses[0] == 401 and statuses[-1] == 429, statuses
+        response = await client.get("/api/users/me")
+        assert "retry-after" in response.headers and "server-timing" in response.headers
+        stats = (await client.get("/stats/rate-limit")).json()
+    print(
+        f"Application: 429 once the api burst of {statuses.index(429)} requests is spent; "
+        f"/stats/rate-limit {stats['backend']} backend, rejected {stats['rejected']}"
+    )
+
+
+async def run(callers: int, redis_url: str) -> None:
+    await check_cost(callers)
+
+    clock = FakeClock()
+    await check_behavior("memory", lambda: InMemoryRateLimitBackend(max_keys=1000, clock=clock), clock.advance)
+    if redis_url:
+        await check_behavior("redis", lambda: RedisRateLimitBackend(redis_url, prefix="ratelimit-benchmark:"), real_sleep)
+        await check_shared(redis_url)
+    else:
+        print("[redis] skipped (no --redis-url)")
+
+    await check_middleware()
+    await check_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--callers", type=int, default=100000)
+    parser.add_argument("--redis-url", default="", help="Also check the redis backend, e.g. redis://localhost:6379/15")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.callers, args.redis_url))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
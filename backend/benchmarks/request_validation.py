@@ -0,0 +1,232 @@
+"""
+Validation cost and strictness of the request body schemas.
+
+For each schema, builds a batch of ``--items`` valid payloads and reports
+the time to validate the batch:
+
+- untyped: ``List[Dict[str, Any]]``, what the endpoints accepted before
+  (only checks that the items are objects);
+- typed: the schema from parsed JSON, as FastAPI validates request bodies,
+  and with ``json.loads`` included;
+- from bytes: the schema straight from the raw JSON bytes
+  (``validate_json``), parsing and validating in one pass.
+
+Then checks that the documented example bodies validate, that invalid
+payloads (numeric strings, booleans, NaN, out-of-bounds values, unknown
+keys, missing fields) are rejected, and that the endpoints return 422 for
+them.
+
+Usage:
+    python -m benchmarks.request_validation [--items 1000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from pydantic import TypeAdapter, ValidationError
+from app.schemas.nutrition import MealAnalysisRequest, MealEntry, MealLogCreate, MealPlanRequest
+from app.schemas.progress import BodyMetricsCreate, ProgressLogCreate
+from app.schemas.workout import WorkoutSessionLog
+
+# Typed validation from parsed JSON, per validated model
+MAX_US_PER_MODEL = 15
+
+
+def exercise(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "exercise_id": rng.randint(1, 200),
+        "sets": rng.randint(3, 5),
+        "reps": rng.randint(5, 12),
+        "weight": round(rng.uniform(20, 140), 1),
+        "completed": True,
+        "notes": "感觉良好，下次可以加重",
+    }
+
+
+def workout_session(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "workout_plan_id": 1,
+        "name": "推日训练",
+        "completed_date": "2024-01-15T18:00:00Z",
+        "exercises": [exercise(rng) for _ in range(6)],
+        "notes": "整体训练强度适中，状态不错",
+    }
+
+
+def meal_log(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "meal_type": rng.choice(["breakfast", "lunch", "dinner", "snack"]),
+        "meal_date": "2024-01-15T12:30:00+08:00",
+        "custom_food_name": "鸡胸肉",
+        "serving_size_g": 150,
+        "calories": round(rng.uniform(100, 800), 1),
+        "protein_g": round(rng.uniform(0, 60), 1),
+        "carbs_g": round(rng.uniform(0, 120), 1),
+        "fats_g": round(rng.uniform(0, 40), 1),
+        "fiber_g": 2.5,
+    }
+
+
+def meal_entry(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "meal_type": rng.choice(["breakfast", "lunch", "dinner", "snack"]),
+        "calories": rng.randint(200, 900),
+        "protein_g": rng.randint(10, 60),
+        "carbs_g": rng.randint(20, 120),
+        "fats_g": rng.randint(2, 40),
+    }
+
+
+def body_metrics(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "weight": round(rng.uniform(60, 90), 1),
+        "body_fat_percentage": round(rng.uniform(10, 25), 1),
+        "muscle_mass": 65.0,
+        "chest": 102,
+        "waist": 82,
+        "bicep_right": 38,
+        "measured_at": "2024-01-15T08:00:00Z",
+        "notes": "早晨空腹测量",
+    }
+
+
+def progress_log(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "title": "深蹲突破 100kg",
+        "content": "今天深蹲 100kg 完成 3 组 5 次，膝盖无不适。" * rng.randint(1, 5),
+        "log_type": "achievement",
+    }
+
+
+# (label, schema, item builder, models per item)
+SCHEMAS = [
+    ("WorkoutSessionLog (6 exercises)", WorkoutSessionLog, workout_session, 7),
+    ("MealLogCreate", MealLogCreate, meal_log, 1),
+    ("MealEntry", MealEntry, meal_entry, 1),
+    ("BodyMetricsCreate", BodyMetricsCreate, body_metrics, 1),
+    ("ProgressLogCreate", ProgressLogCreate, progress_log, 1),
+]
+
+# Documented request bodies (docs/API_GUIDE.md)
+EXAMPLES = [
+    (WorkoutSessionLog, workout_session(random.Random(0))),
+    (MealPlanRequest, {"macro_targets": {"calories": 2700, "protein_g": 180, "carbs_g": 350, "fats_g": 63}}),
+    (MealAnalysisRequest, {
+        "meals": [
+            {"meal_type": "breakfast", "calories": 649, "protein_g": 31, "carbs_g": 94, "fats_g": 18},
+            {"meal_type": "lunch", "calories": 503, "protein_g": 36, "carbs_g": 79, "fats_g": 4},
+        ],
+        "target_macros": {"calories": 2700, "protein_g": 180, "carbs_g": 350, "fats_g": 63},
+    }),
+    (BodyMetricsCreate, body_metrics(random.Random(0))),
+]
+
+
+def invalid_payloads() -> List[tuple]:
+    """(schema, payload, reason) that must fail validation."""
+    rng = random.Random(0)
+    cases = []
+    for key, value in (
+        ("weight", "80"), ("weight", True), ("weight", float("nan")), ("weight", float("inf")),
+        ("weight", 5), ("weight", 1000), ("body_fat_percentage", 120), ("waist", -1),
+        ("height", 180), ("measured_at", "yesterday"),
+    ):
+        cases.append((BodyMetricsCreate, {**body_metrics(rng), key: value}, f"{key}={value!r}"))
+    session = workout_session(rng)
+    cases += [
+        (WorkoutSessionLog, {**session, "exercises": []}, "no exercises"),
+        (WorkoutSessionLog, {**session, "exercises": [{**exercise(rng), "reps": 8.5}]}, "fractional reps"),
+        (WorkoutSessionLog, {**session, "exercises": [{**exercise(rng), "sets": "4"}]}, "sets as string"),
+        (WorkoutSessionLog, {key: value for key, value in session.items() if key != "name"}, "missing name"),
+        (MealLogCreate, {key: value for key, value in meal_log(rng).items() if key != "custom_food_name"}, "no food"),
+        (MealLogCreate, {**meal_log(rng), "meal_type": "brunch"}, "unknown meal type"),
+        (MealLogCreate, {**meal_log(rng), "serving_size_g": 0}, "empty serving"),
+        (MealAnalysisRequest, {"meals": [meal_entry(rng)] * 51, "target_macros": EXAMPLES[1][1]["macro_targets"]}, "51 meals"),
+        (MealPlanRequest, {"macro_targets": {"calories": 0, "protein_g": 180, "carbs_g": 350, "fats_g": 63}}, "zero calories"),
+        (ProgressLogCreate, {**progress_log(rng), "log_type": "diary"}, "unknown log type"),
+        (ProgressLogCreate, {**progress_log(rng), "title": "   "}, "blank title"),
+    ]
+    return cases
+
+
+def median_ms(run: Callable[[], Any], repeat: int = 20) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def check_cost(items: int) -> None:
+    untyped = TypeAdapter(List[Dict[str, Any]])
+    print(f"{'schema':<32} {'untyped':>9} {'typed':>9} {'json+typed':>11} {'from bytes':>11} {'per item':>9}   ({items} items)")
+    for label, schema, build, models in SCHEMAS:
+        rng = random.Random(1)
+        batch = [build(rng) for _ in range(items)]
+        raw = json.dumps(batch, ensure_ascii=False).encode()
+        typed = TypeAdapter(List[schema])
+        assert len(typed.validate_python(batch)) == len(typed.validate_json(raw)) == items
+
+        untyped_ms = median_ms(lambda: untyped.validate_python(batch))
+        typed_ms = median_ms(lambda: typed.validate_python(batch))
+        parsed_ms = median_ms(lambda: typed.validate_python(json.loads(raw)))
+        bytes_ms = median_ms(lambda: typed.validate_json(raw))
+        per_item_us = typed_ms * 1000 / items
+        print(
+            f"{label:<32} {untyped_ms:>7.2f}ms {typed_ms:>7.2f}ms {parsed_ms:>9.2f}ms {bytes_ms:>9.2f}ms {per_item_us:>7.2f}us"
+        )
+        assert per_item_us < MAX_US_PER_MODEL * models, (label, per_item_us)
+
+
+def check_strictness() -> None:
+    for schema, payload in EXAMPLES:
+        schema.model_validate(payload)
+
+    cases = invalid_payloads()
+    for schema, payload, reason in cases:
+        try:
+            schema.model_validate(payload)
+        except ValidationError:
+            continue
+        raise AssertionError(f"{schema.__name__} accepted {reason}")
+    print(f"{len(EXAMPLES)} documented bodies accepted, {len(cases)} invalid bodies rejected")
+
+
+def check_endpoints() -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    for path, body in (
+        ("/api/progress/body-metrics", {**body_metrics(random.Random(0)), "weight": "76.5"}),
+        ("/api/workouts/session/log", {"name": "推日训练", "completed_date": "2024-01-15T18:00:00Z", "exercises": []}),
+        ("/api/nutrition/meal/log", {"meal_type": "lunch"}),
+        ("/api/progress/log", {"title": "x", "content": "y", "mood": 5}),
+        ("/api/nutrition/meals/analyze", {"meals": [{"calories": 500}], "target_macros": {}}),
+        ("/api/nutrition/meal-plan/generate", {"macro_targets": {"calories": "2700"}}),
+    ):
+        response = client.post(path, json=body)
+        assert response.status_code == 422, (path, response.status_code, response.text)
+    print("Endpoints answer 422 to invalid bodies before reaching the handlers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    args = parser.parse_args()
+
+    check_cost(args.items)
+    check_strictness()
+    check_endpoints()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
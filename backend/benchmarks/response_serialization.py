@@ -0,0 +1,364 @@
+"""
+Serialization time and bytes on the wire of large API responses.
+
+Builds representative payloads (a 12-week workout plan job result in the
+weekly_schedule format, the repository view of a 12-week plan, a week of
+optimizer meal plans, two years of daily body metrics and a 12-week plan
+returned as a Pydantic ``response_model``) and for each one:
+
+- times FastAPI's default path (``serialize_response``: jsonable_encoder,
+  or dump + re-validate + serialize for a model, then ``json.dumps``)
+  against ``FastJSONResponse`` and checks both produce the same JSON;
+- reports raw, gzip and brotli sizes and compression times at the
+  configured levels.
+
+Then runs a small app through CompressionMiddleware and checks encoding
+negotiation: brotli or gzip as accepted, nothing below the size threshold,
+for identity-only clients or for server-sent events.
+
+Usage:
+    python -m benchmarks.response_serialization [--repeat 50]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import brotli
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app.core.config import settings
+from app.core.responses import CompressionMiddleware, FastJSONResponse, compress
+from app.schemas.agent_outputs import WorkoutPlanOutput
+
+# FastJSONResponse must be at least this much faster: dicts skip
+# jsonable_encoder, models skip re-validation
+MIN_SPEEDUP = 10.0
+MIN_MODEL_SPEEDUP = 2.0
+
+# Compressed / raw size of the JSON payloads
+MAX_BROTLI_RATIO = 0.2
+
+WEEKS = 12
+DAYS_PER_WEEK = 5
+EXERCISES_PER_DAY = 6
+
+EXERCISES = [
+    ("杠铃深蹲", "legs"), ("罗马尼亚硬拉", "legs"), ("卧推", "chest"), ("上斜哑铃卧推", "chest"),
+    ("引体向上", "back"), ("杠铃划船", "back"), ("站姿推举", "shoulders"), ("侧平举", "shoulders"),
+    ("杠铃弯举", "arms"), ("绳索下压", "arms"), ("平板支撑", "core"), ("悬垂举腿", "core"),
+]
+DAY_NAMES = ["上肢推", "上肢拉", "下肢", "肩与手臂", "全身"]
+
+
+def weekly_schedule(rng: random.Random) -> List[Dict[str, Any]]:
+    """Training days of a 12-week plan, as the planner's weekly_schedule."""
+    days = []
+    for week in range(WEEKS):
+        for day in range(DAYS_PER_WEEK):
+            exercises = []
+            for name, muscle in rng.sample(EXERCISES, EXERCISES_PER_DAY):
+                exercises.append({
+                    "name": name,
+                    "sets": 3 + week // 4,
+                    "reps": rng.choice([5, 8, 10, 12, "8-12", "力竭"]),
+                    "rest_seconds": rng.choice([60, 90, 120, 180]),
+                    "notes": f"第{week + 1}周：比上周增加 2.5kg，保持{muscle}发力感",
+                })
+            days.append({
+                "day": week * 7 + day + 1,
+                "name": f"第{week + 1}周 {DAY_NAMES[day]}",
+                "target_muscles": sorted({muscle for _, muscle in EXERCISES[day * 2:day * 2 + 3]}),
+                "exercises": exercises,
+            })
+    return days
+
+
+def workout_plan(rng: random.Random) -> Dict[str, Any]:
+    plan = {
+        "plan_name": "12 周增肌计划",
+        "workout_type": "push_pull_legs",
+        "duration_weeks": WEEKS,
+        "frequency_per_week": DAYS_PER_WEEK,
+        "rationale": "根据中级训练者的恢复能力，采用推拉腿分化并每四周增加一组训练量。",
+        "weekly_schedule": weekly_schedule(rng),
+        "progression_advice": "每周在完成全部次数后增加 2.5kg；第 4、8 周减量 40%。",
+    }
+    plan["user_id"] = 1
+    plan["generation_prompt"] = json.dumps(plan, ensure_ascii=False)
+    return plan
+
+
+def workout_plan_job(rng: random.Random) -> Dict[str, Any]:
+    """GET /api/jobs/{id} of a finished workout plan job."""
+    return {
+        "job_id": "9f0c3a5e-2b1d-4c55-9a51-0f3e6b7d2c11",
+        "kind": "workout_plan",
+        "status": "succeeded",
+        "attempts": 1,
+        "result": {"success": True, "plan": workout_plan(rng), "message": "训练计划已生成"},
+        "error": None,
+        "created_at": "2026-01-05T08:00:00+00:00",
+        "finished_at": "2026-01-05T08:00:21+00:00",
+    }
+
+
+def workout_plan_view(rng: random.Random) -> Dict[str, Any]:
+    """GET /api/workouts/plan/{id}: WorkoutRepository.get_plan_view rows."""
+    start = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    sessions = []
+    for index, day in enumerate(weekly_schedule(rng)):
+        scheduled = start + timedelta(days=day["day"] - 1)
+        sessions.append({
+            "id": index + 1,
+            "workout_plan_id": 1,
+            "name": day["name"],
+            "day_of_week": scheduled.weekday(),
+            "target_muscle_groups": json.dumps(day["target_muscles"]),
+            "notes": None,
+            "completed": index < 30,
+            "scheduled_date": scheduled,
+            "completed_date": scheduled + timedelta(hours=19) if index < 30 else None,
+            "exercises": [
+                {
+                    "id": index * EXERCISES_PER_DAY + order + 1,
+                    "exercise_id": order + 1,
+                    "order": order,
+                    "sets": exercise["sets"],
+                    "reps": str(exercise["reps"]),
+                    "rest_seconds": exercise["rest_seconds"],
+                    "weight": round(rng.uniform(20, 140), 1),
+                    "duration_seconds": None,
+                    "actual_sets": exercise["sets"] if index < 30 else None,
+                    "actual_reps": json.dumps([10, 10, 9]) if index < 30 else None,
+                    "actual_weight": json.dumps([60.0, 60.0, 57.5]) if index < 30 else None,
+                    "actual_duration_seconds": None,
+                    "completed": index < 30,
+                    "notes": exercise["notes"],
+                    "exercise_name": exercise["name"],
+                    "muscle_group": "legs",
+                    "exercise_type": "compound",
+                    "equipment_required": "barbell",
+                }
+                for order, exercise in enumerate(day["exercises"])
+            ],
+        })
+    return {
+        "id": 1,
+        "user_id": 1,
+        "name": "12 周增肌计划",
+        "description": "推拉腿分化",
+        "workout_type": "push_pull_legs",
+        "frequency_per_week": DAYS_PER_WEEK,
+        "duration_weeks": WEEKS,
+        "is_active": True,
+        "ai_rationale": "根据中级训练者的恢复能力，采用推拉腿分化。",
+        "created_at": start - timedelta(days=1),
+        "start_date": start,
+        "end_date": start + timedelta(weeks=WEEKS),
+        "sessions": sessions,
+    }
+
+
+def meal_plan_job(rng: random.Random) -> Dict[str, Any]:
+    """Result of a week-long meal plan job, from the real optimizer."""
+    from app.services.meal_optimizer import Exclusions, FoodCatalog, MealPlanOptimizer
+
+    optimizer = MealPlanOptimizer(FoodCatalog.default(), seed=0)
+    targets = {"calories": 2600, "protein_g": 180, "carbs_g": 280, "fats_g": 75}
+    plans = optimizer.plan_week(targets, 5, Exclusions())
+    return {
+        "success": True,
+        "meal_plan": {
+            "week_plan": plans,
+            "meal_names": {str(day["day"]): [f"第{day['day']}天 餐{i + 1}" for i in range(5)] for day in plans},
+            "meal_prep_tips": "周日统一备好鸡胸肉和糙米，分装冷藏。",
+        },
+        "message": "一周饮食计划已生成",
+    }
+
+
+def metric_history(rng: random.Random) -> Dict[str, Any]:
+    """Two years of daily body measurements."""
+    start = datetime(2024, 1, 1, 7, 30, tzinfo=timezone.utc)
+    weight = 82.0
+    metrics = []
+    for day in range(730):
+        weight += rng.uniform(-0.25, 0.2)
+        measured = start + timedelta(days=day, minutes=rng.randint(0, 90))
+        metrics.append({
+            "id": day + 1,
+            "weight": round(weight, 1),
+            "body_fat_percentage": round(18 + (weight - 75) * 0.4, 1),
+            "muscle_mass": round(weight * 0.45, 1),
+            "bmi": round(weight / 1.78 ** 2, 1),
+            "chest": 102.5, "waist": round(weight + 4.0, 1), "hips": 98.0,
+            "bicep_left": 36.5, "bicep_right": 37.0, "thigh_left": 58.0, "thigh_right": 58.5,
+            "calf_left": 38.0, "calf_right": 38.0,
+            "notes": "晨起空腹" if day % 7 else "晨起空腹，周末聚餐后",
+            "measured_at": measured,
+            "created_at": measured + timedelta(seconds=3),
+        })
+    return {"metrics": metrics, "count": len(metrics)}
+
+
+def fastapi_default(payload: Any, field=None) -> Callable[[], bytes]:
+    """FastAPI's path for a returned value: serialize_response, then JSONResponse."""
+    def render() -> bytes:
+        # Nothing in serialize_response awaits for async endpoints; step the coroutine directly
+        coroutine = serialize_response(field=field, response_content=payload)
+        try:
+            coroutine.send(None)
+        except StopIteration as done:
+            return JSONResponse(done.value).body
+        raise RuntimeError("serialize_response suspended")
+    return render
+
+
+def best_of(render: Callable[[], bytes], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def check_payloads(repeat: int) -> None:
+    rng = random.Random(0)
+    plan_model = WorkoutPlanOutput.model_validate(workout_plan(rng))
+    payloads = [
+        ("Workout plan job, 12 weeks", workout_plan_job(rng), None),
+        ("Workout plan view, 12 weeks", workout_plan_view(rng), None),
+        ("Meal plan job, 7 days", meal_plan_job(rng), None),
+        ("Body metrics, 730 days", metric_history(rng), None),
+        ("Workout plan response_model", plan_model, create_response_field("response", WorkoutPlanOutput)),
+    ]
+
+    print(f"{'payload':<30} {'default':>9} {'fast':>8} {'speedup':>8} {'raw':>9} {'gzip':>16} {'brotli':>16}")
+    for label, payload, field in payloads:
+        default_render = fastapi_default(payload, field)
+        fast_render = lambda: FastJSONResponse(payload).body  # noqa: E731
+
+        # Same document either way
+        body = fast_render()
+        assert json.loads(body) == json.loads(default_render()), label
+
+        default_ms = best_of(default_render, repeat)
+        fast_ms = best_of(fast_render, repeat)
+        sizes = {}
+        for encoding in ("gzip", "br"):
+            start = time.perf_counter()
+            compressed = compress(body, encoding)
+            sizes[encoding] = (len(compressed), (time.perf_counter() - start) * 1000)
+        assert gzip.decompress(compress(body, "gzip")) == body
+        assert brotli.decompress(compress(body, "br")) == body
+
+        print(
+            f"{label:<30} {default_ms:>7.2f}ms {fast_ms:>6.2f}ms {default_ms / fast_ms:>7.1f}x "
+            f"{len(body) / 1024:>7.1f}KB "
+            f"{sizes['gzip'][0] / 1024:>6.1f}KB {sizes['gzip'][1]:>5.2f}ms "
+            f"{sizes['br'][0] / 1024:>6.1f}KB {sizes['br'][1]:>5.2f}ms"
+        )
+        assert default_ms >= (MIN_SPEEDUP if field is None else MIN_MODEL_SPEEDUP) * fast_ms, (label, default_ms, fast_ms)
+        assert sizes["br"][0] <= MAX_BROTLI_RATIO * len(body), (label, sizes["br"][0], len(body))
+    print(f"(gzip level {settings.RESPONSE_GZIP_LEVEL}, brotli quality {settings.RESPONSE_BROTLI_QUALITY})")
+
+
+async def request(app, path: str, accept_encoding: str) -> Dict[str, Any]:
+    """Run one GET through an ASGI app; returns headers and the raw body."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else [],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+    messages = []
+    requested = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return {"headers": headers, "body": body, "messages": len(messages) - 1}
+
+
+async def check_negotiation() -> None:
+    plan = workout_plan_job(random.Random(0))
+    api = FastAPI(default_response_class=FastJSONResponse)
+
+    @api.get("/plan")
+    async def get_plan():
+        return FastJSONResponse(plan)
+
+    @api.get("/small")
+    async def get_small():
+        return {"status": "ok"}
+
+    @api.get("/events")
+    async def get_events():
+        async def events():
+            for i in range(3):
+                yield f"event: running\ndata: {json.dumps(plan)}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app = CompressionMiddleware(api, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+    raw = FastJSONResponse(plan).body
+
+    response = await request(app, "/plan", "gzip, deflate, br")
+    assert response["headers"]["content-encoding"] == "br"
+    assert response["headers"]["vary"] == "Accept-Encoding"
+    assert int(response["headers"]["content-length"]) == len(response["body"])
+    assert brotli.decompress(response["body"]) == raw
+    print(f"Accept-Encoding: gzip, deflate, br -> br, {len(raw):,} -> {len(response['body']):,} bytes")
+
+    response = await request(app, "/plan", "gzip;q=1.0, br;q=0.5")
+    assert response["headers"]["content-encoding"] == "gzip"
+    assert gzip.decompress(response["body"]) == raw
+    print(f"Accept-Encoding: gzip;q=1.0, br;q=0.5 -> gzip, {len(raw):,} -> {len(response['body']):,} bytes")
+
+    for accept_encoding in ("", "identity", "br;q=0, gzip;q=0"):
+        response = await request(app, "/plan", accept_encoding)
+        assert "content-encoding" not in response["headers"] and response["body"] == raw, accept_encoding
+
+    response = await request(app, "/small", "gzip, br")
+    assert "content-encoding" not in response["headers"] and json.loads(response["body"]) == {"status": "ok"}
+
+    response = await request(app, "/events", "gzip, br")
+    assert "content-encoding" not in response["headers"] and response["messages"] > 1
+    print("Identity, small responses and server-sent events are sent uncompressed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    check_payloads(args.repeat)
+    asyncio.run(check_negotiation())
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
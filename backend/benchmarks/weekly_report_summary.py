@@ -0,0 +1,274 @@
+"""
+Exactness and prompt size of the SQL week summaries.
+
+Seeds users with a realistic week of training (sessions with logged sets),
+meals and body measurements inside a transaction that is rolled back
+afterwards, then for each user:
+
+- builds the week summary with ProgressRepository.week_summaries and
+  checks every statistic against a Python reference computed from the raw
+  rows;
+- renders the weekly report prompt twice, once with the raw rows (the
+  previous input: workout, meal and measurement lists for the model to
+  count and sum) and once with the summary, and compares prompt tokens.
+
+Also asserts that the summary costs one query per table whatever the
+number of users.
+
+Usage:
+    python -m benchmarks.weekly_report_summary [--database-url URL] [--users 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+from collections import defaultdict
+from datetime import datetime, time as clock, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.core.config import settings
+from app.core.database import Base
+from app.agents.prompts import PROGRESS_WEEKLY_REPORT
+from app.models import BodyMetrics, Exercise, MealLog, User, WorkoutExercise, WorkoutSession
+from app.models.nutrition import MealType
+from app.models.workout import MuscleGroup
+from app.repositories.progress import ProgressRepository
+from app.services.weekly_reports import report_week
+from benchmarks.fake_llm import count_tokens
+
+# Queries per summary call: sessions, exercises, meals, body metrics
+EXPECTED_QUERIES = 4
+
+# Minimum reduction of the week data's prompt tokens
+MIN_TOKEN_REDUCTION = 10
+
+EXERCISES = ["杠铃卧推", "杠铃深蹲", "硬拉", "引体向上", "哑铃推举", "杠铃划船", "腿举", "二头弯举"]
+FOODS = ["燕麦牛奶", "鸡胸肉沙拉", "米饭", "清蒸鱼", "西兰花炒牛肉", "全麦面包", "蛋白粉", "香蕉", "酸奶"]
+
+
+class QueryCounter:
+    """Counts statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+def seed_week(rng: random.Random, user: User, exercises: List[Exercise], start: datetime) -> Tuple[Dict[str, List], List]:
+    """
+    Build one week of data for a user.
+
+    Returns:
+        The raw rows as dicts (the previous prompt input) and the model
+        instances to add
+    """
+    raw = {"workouts": [], "meals": [], "body_metrics": []}
+    rows = []
+
+    for day in sorted(rng.sample(range(7), rng.randint(3, 5))):
+        completed = rng.random() < 0.85
+        session = WorkoutSession(
+            user=user,
+            name=f"训练日 {day + 1}",
+            scheduled_date=start + timedelta(days=day, hours=10),
+            completed=completed,
+        )
+        raw_session = {"date": (start + timedelta(days=day)).date().isoformat(), "name": session.name,
+                       "completed": completed, "exercises": []}
+        for order, exercise in enumerate(rng.sample(exercises, 6)):
+            sets, reps, weight = rng.randint(3, 5), rng.randint(5, 12), round(rng.uniform(20, 120), 1)
+            session.exercises.append(WorkoutExercise(
+                exercise=exercise,
+                order=order,
+                sets=sets,
+                reps=reps,
+                weight=weight,
+                actual_sets=sets if completed else None,
+                actual_reps=reps if completed else None,
+                actual_weight=weight if completed else None,
+                completed=completed,
+            ))
+            raw_session["exercises"].append({
+                "exercise": exercise.name, "sets": sets, "reps": reps, "weight": weight,
+                "actual_sets": sets if completed else None,
+                "actual_reps": reps if completed else None,
+                "actual_weight": weight if completed else None,
+            })
+        raw["workouts"].append(raw_session)
+        rows.append(session)
+
+    meal_types = [MealType.BREAKFAST, MealType.LUNCH, MealType.DINNER, MealType.SNACK]
+    for day in sorted(rng.sample(range(7), rng.randint(4, 7))):
+        for meal_type in meal_types[:rng.randint(3, 4)]:
+            food = rng.choice(FOODS)
+            meal = MealLog(
+                user=user,
+                meal_type=meal_type,
+                meal_date=start + timedelta(days=day, hours=7 + 4 * meal_types.index(meal_type)),
+                custom_food_name=food,
+                serving_size_g=round(rng.uniform(100, 400)),
+                calories=round(rng.uniform(200, 900), 1),
+                protein_g=round(rng.uniform(5, 60), 1),
+                carbs_g=round(rng.uniform(10, 120), 1),
+                fats_g=round(rng.uniform(3, 40), 1),
+            )
+            raw["meals"].append({
+                "date": meal.meal_date.isoformat(), "meal_type": meal_type.value, "food": food,
+                "serving_size_g": meal.serving_size_g, "calories": meal.calories,
+                "protein_g": meal.protein_g, "carbs_g": meal.carbs_g, "fats_g": meal.fats_g,
+            })
+            rows.append(meal)
+
+    weight = rng.uniform(55, 95)
+    for day in sorted(rng.sample(range(7), rng.randint(1, 4))):
+        metric = BodyMetrics(
+            user=user,
+            weight=round(weight + rng.uniform(-1, 1), 1),
+            body_fat_percentage=round(rng.uniform(12, 25), 1),
+            measured_at=start + timedelta(days=day, hours=7),
+        )
+        raw["body_metrics"].append({
+            "date": metric.measured_at.isoformat(), "weight": metric.weight,
+            "body_fat_percentage": metric.body_fat_percentage,
+        })
+        rows.append(metric)
+
+    return raw, rows
+
+
+def reference_summary(raw: Dict[str, List]) -> Dict[str, Any]:
+    """The summary's statistics computed in Python from the raw rows."""
+    sessions = raw["workouts"]
+    completed = [s for s in sessions if s["completed"]]
+    volume = sum(
+        (e["actual_sets"] or 0) * (e["actual_reps"] or 0) * (e["actual_weight"] or 0)
+        for s in sessions for e in s["exercises"]
+    )
+
+    days = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    for meal in raw["meals"]:
+        total = days[meal["date"][:10]]
+        for i, key in enumerate(("calories", "protein_g", "carbs_g", "fats_g")):
+            total[i] += meal[key]
+
+    metrics = raw["body_metrics"]
+    return {
+        "sessions_planned": len(sessions),
+        "sessions_completed": len(completed),
+        "completion_rate": round(100 * len(completed) / len(sessions)),
+        "total_volume_kg": round(volume, 1),
+        "meals_logged": len(raw["meals"]),
+        "days_logged": len(days),
+        "average_calories": round(sum(d[0] for d in days.values()) / len(days)),
+        "average_protein_g": round(sum(d[1] for d in days.values()) / len(days), 1),
+        "weight_change": round(metrics[-1]["weight"] - metrics[0]["weight"], 1),
+    }
+
+
+def summary_values(summary: Dict[str, Any]) -> Dict[str, Any]:
+    training, nutrition, metrics = summary["training"], summary["nutrition"], summary["body_metrics"]
+    return {
+        "sessions_planned": training["sessions_planned"],
+        "sessions_completed": training["sessions_completed"],
+        "completion_rate": training["completion_rate"],
+        "total_volume_kg": training["total_volume_kg"],
+        "meals_logged": nutrition["meals_logged"],
+        "days_logged": nutrition["days_logged"],
+        "average_calories": nutrition["average_calories"],
+        "average_protein_g": nutrition["average_protein_g"],
+        "weight_change": metrics["weight_change"],
+    }
+
+
+def prompt_tokens(week_data: str) -> Dict[str, int]:
+    """Tokens of the week data and of the whole prompt."""
+    messages = PROGRESS_WEEKLY_REPORT.to_messages(week_data=week_data)
+    return {
+        "data": count_tokens(week_data),
+        "prompt": sum(count_tokens(message.content) for message in messages),
+    }
+
+
+async def run(database_url: str, users: int) -> None:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    counter = QueryCounter(engine)
+    rng = random.Random(0)
+    week_start = report_week()
+    start = datetime.combine(week_start, clock.min, tzinfo=timezone.utc)
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+
+        try:
+            exercises = [Exercise(name=f"{name}-summary", muscle_group=MuscleGroup.FULL_BODY) for name in EXERCISES]
+            db.add_all(exercises)
+            raws = {}
+            for i in range(users):
+                user = User(email=f"summary_{i}@example.com", username=f"summary_user_{i}", hashed_password="x")
+                raw, rows = seed_week(rng, user, exercises, start)
+                db.add_all([user, *rows])
+                await db.flush()
+                raws[user.id] = raw
+            db.expunge_all()
+
+            repo = ProgressRepository(db)
+            for size in (1, users):
+                counter.reset()
+                summaries = await repo.week_summaries(list(raws)[:size], week_start)
+                assert counter.count == EXPECTED_QUERIES, (size, counter.count)
+
+            raw_tokens, summary_tokens = [], []
+            for user_id, raw in raws.items():
+                summary = summaries[user_id]
+                expected = reference_summary(raw)
+                actual = summary_values(summary)
+                assert actual == expected, (user_id, actual, expected)
+
+                # Previous input: the raw rows, pretty-printed
+                raw_tokens.append(prompt_tokens(json.dumps(raw, ensure_ascii=False, indent=2)))
+                summary_tokens.append(prompt_tokens(json.dumps(summary, ensure_ascii=False, separators=(",", ":"))))
+        finally:
+            await db.close()
+            await transaction.rollback()
+
+    await engine.dispose()
+
+    print(f"{'input':<10} {'data tokens':>12} {'prompt tokens':>14}")
+    for name, tokens in (("raw rows", raw_tokens), ("summary", summary_tokens)):
+        data = statistics.mean(t["data"] for t in tokens)
+        prompt = statistics.mean(t["prompt"] for t in tokens)
+        print(f"{name:<10} {data:>12.0f} {prompt:>14.0f}")
+
+    data_reduction = statistics.mean(r["data"] / s["data"] for r, s in zip(raw_tokens, summary_tokens))
+    prompt_reduction = statistics.mean(r["prompt"] / s["prompt"] for r, s in zip(raw_tokens, summary_tokens))
+    print(f"Reduction: week data {data_reduction:.1f}x, whole prompt {prompt_reduction:.1f}x")
+    assert data_reduction >= MIN_TOKEN_REDUCTION, data_reduction
+    print(f"OK: {users} summaries match the reference; {EXPECTED_QUERIES} queries regardless of users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users))
+
+
+if __name__ == "__main__":
+    main()